@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Benchmark how much disk the memory DB (`codex_mem.sqlite3`) needs per stored
+event under different storage layouts, and what that costs at write and query
+time.
+
+A deterministic synthetic corpus of tool outputs (shell logs, test runs, diffs,
+file reads; 200 B to ~6 KB each) is written into a fresh DB per layout:
+- `standalone_fts`: schema v2, FTS5 tables keep their own copy of the text
+- `external_fts`: schema v3, contentless events FTS5 kept in sync by triggers
+- `prefix_fts`: current schema (contentless FTS5 with prefix indexes), content
+  stored as-is
+- `compressed_fts`: current schema, content over 4 KB stored zlib-compressed
+
+`--vocab-size` mixes that many random identifiers into the text, so the term
+dictionary is as large as on a real code base and `tok*` prefix terms have many
+terms to expand. `--lines-scale` multiplies the lines per event, for corpora of
+10-100 KB logs.
+
+Reports file size, bytes per event, per-table sizes (via `dbstat` when the
+SQLite build has it), insert throughput and median FTS search latency for whole
+words and for short prefixes, and median `get_item_detail` latency.
+`prefix_search_uncapped_median_ms` expands every token to `tok*`, as
+`build_fts_query` did before short tokens were capped.
+Outputs are aggregate-only.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import pathlib
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+SCRIPT_DIR = pathlib.Path(__file__).resolve().parent
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPT_DIR))
+
+import codex_mem
+
+WORDS = (
+    "build test compile error warning import module config cache request response handler "
+    "session index query vector token parser stream buffer socket retry timeout commit "
+    "migration schema table column render layout widget service client server worker queue"
+).split()
+TOOLS = ("shell", "pytest", "git_diff", "read_file", "grep")
+QUERIES = ("timeout retry", "schema migration", "parser error", "socket buffer", "widget render layout")
+PREFIX_QUERIES = ("ti re", "sch mig", "ka lo", "mi ne su", "vize")
+SYLLABLES = "ka lo mi ne su ra to vi ze pu do fe gi ha ju".split()
+
+
+def make_vocab(size: int, seed: int) -> List[str]:
+    rng = random.Random(seed + 1)
+    return ["".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 5))) + str(rng.randint(0, 99)) for _ in range(size)]
+
+
+def synthetic_event(rng: random.Random, idx: int, vocab: Sequence[str], lines_scale: int = 1) -> Tuple[str, str, str, str]:
+    tool = TOOLS[idx % len(TOOLS)]
+    lines: List[str] = []
+    for line_no in range(rng.randint(4, 80) * max(1, lines_scale)):
+        words = " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 10)))
+        if vocab:
+            words += " " + " ".join(rng.choice(vocab) for _ in range(rng.randint(1, 3)))
+        if tool == "pytest":
+            lines.append(f"tests/test_{rng.choice(WORDS)}.py::{rng.choice(WORDS)} {'PASSED' if rng.random() > 0.1 else 'FAILED'}")
+        elif tool == "git_diff":
+            lines.append(f"{'+' if line_no % 2 else '-'}    {words}({rng.randint(0, 99)})")
+        else:
+            lines.append(f"{rng.choice(WORDS)}/{rng.choice(WORDS)}.py:{rng.randint(1, 900)}: {words}")
+    title = f"{tool}: {rng.choice(WORDS)} {rng.choice(WORDS)}"
+    return tool, title, "\n".join(lines), json.dumps([tool, rng.choice(WORDS)])
+
+
+def iter_rows(
+    count: int, seed: int, vector: bytes, vocab: Sequence[str], lines_scale: int = 1
+) -> Iterator[Tuple[object, ...]]:
+    rng = random.Random(seed)
+    for idx in range(count):
+        tool, title, content, tags_json = synthetic_event(rng, idx, vocab, lines_scale)
+        yield (
+            f"s{idx // 200}",
+            "bench",
+            "tool_use",
+            "tool",
+            title,
+            content,
+            tool,
+            None,
+            tags_json,
+            "{}",
+            f"2026-01-01T00:00:00.{idx:07d}",
+            vector,
+            "public",
+        )
+
+
+EVENT_INSERT_SQL = """
+    INSERT INTO events(
+        session_id, project, event_kind, role, title, content,
+        tool_name, file_path, tags_json, metadata_json, created_at, vector, visibility
+    )
+    VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def setup_standalone_fts(conn: sqlite3.Connection) -> None:
+    codex_mem.migrate_schema(conn, codex_mem.MIGRATIONS[:2])
+
+
+def insert_standalone_fts(conn: sqlite3.Connection, rows: Sequence[Tuple[object, ...]]) -> None:
+    for row in rows:
+        event_id = conn.execute(EVENT_INSERT_SQL, row).lastrowid
+        conn.execute(
+            "INSERT INTO events_fts(rowid, title, content, tags) VALUES(?, ?, ?, ?)",
+            (event_id, row[4], row[5], " ".join(json.loads(str(row[8])))),
+        )
+
+
+def setup_external_fts(conn: sqlite3.Connection) -> None:
+    codex_mem.migrate_schema(conn, codex_mem.MIGRATIONS[:3])
+    codex_mem.run_backfills(conn, migrations=codex_mem.MIGRATIONS[:3])
+
+
+def insert_plain(conn: sqlite3.Connection, rows: Sequence[Tuple[object, ...]]) -> None:
+    conn.executemany(EVENT_INSERT_SQL, rows)
+
+
+def setup_current(conn: sqlite3.Connection) -> None:
+    codex_mem.migrate_schema(conn)
+    codex_mem.run_backfills(conn)
+
+
+COMPRESSED_INSERT_SQL = """
+    INSERT INTO events(
+        session_id, project, event_kind, role, title, content,
+        tool_name, file_path, tags_json, metadata_json, created_at, vector, visibility,
+        content_codec, content_raw_bytes
+    )
+    VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def insert_compressed(conn: sqlite3.Connection, rows: Sequence[Tuple[object, ...]]) -> None:
+    for row in rows:
+        value, codec, raw_bytes = codex_mem.encode_event_content(str(row[5]), codex_mem.DEFAULT_CONTENT_CODEC)
+        event_id = conn.execute(COMPRESSED_INSERT_SQL, row[:5] + (value,) + row[6:] + (codec, raw_bytes)).lastrowid
+        if codec:
+            # The contentless events index only indexes plain rows by trigger.
+            codex_mem.index_event_text(conn, int(event_id), str(row[4]), str(row[5]), str(row[8]))
+
+
+LAYOUTS: Dict[str, Tuple[Callable[[sqlite3.Connection], None], Callable[[sqlite3.Connection, Sequence[Tuple[object, ...]]], None]]] = {
+    "standalone_fts": (setup_standalone_fts, insert_standalone_fts),
+    "external_fts": (setup_external_fts, insert_plain),
+    "prefix_fts": (setup_current, insert_plain),
+    "compressed_fts": (setup_current, insert_compressed),
+}
+
+
+def table_sizes(conn: sqlite3.Connection) -> Dict[str, int]:
+    try:
+        rows = conn.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name ORDER BY 2 DESC").fetchall()
+    except sqlite3.OperationalError:
+        return {}
+    return {str(name): int(size) for name, size in rows if int(size) >= 1 << 20}
+
+
+def search_ms(conn: sqlite3.Connection, queries: Sequence[str], runs: int) -> float:
+    samples: List[float] = []
+    for _ in range(max(1, runs)):
+        for query in queries:
+            start = time.perf_counter()
+            codex_mem.search_events(
+                conn,
+                query=query,
+                project="bench",
+                session_id=None,
+                since=None,
+                until=None,
+                include_private=False,
+                limit=20,
+            )
+            samples.append(time.perf_counter() - start)
+    return round(statistics.median(samples) * 1000.0, 3)
+
+
+def detail_ms(conn: sqlite3.Connection, events: int, runs: int, seed: int) -> float | None:
+    if "content_codec" not in codex_mem._table_columns(conn, "events"):
+        return None
+    rng = random.Random(seed)
+    samples: List[float] = []
+    for _ in range(max(1, runs) * 10):
+        event_id = rng.randint(1, max(1, events))
+        start = time.perf_counter()
+        codex_mem.get_item_detail(conn, "event", event_id, codex_mem.DEFAULT_SNIPPET_CHARS)
+        samples.append(time.perf_counter() - start)
+    return round(statistics.median(samples) * 1000.0, 3)
+
+
+def uncapped_search_ms(conn: sqlite3.Connection, queries: Sequence[str], runs: int) -> float:
+    capped = codex_mem.fts_min_prefix_chars
+    codex_mem.fts_min_prefix_chars = lambda _conn, _table: 1
+    try:
+        return search_ms(conn, queries, runs)
+    finally:
+        codex_mem.fts_min_prefix_chars = capped
+
+
+def run_layout(name: str, work_dir: pathlib.Path, args: argparse.Namespace) -> Dict[str, object]:
+    setup, insert = LAYOUTS[name]
+    db_path = work_dir / f"{name}.sqlite3"
+    conn = sqlite3.connect(str(db_path))
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    setup(conn)
+    vector = bytes(random.Random(args.seed).getrandbits(8) for _ in range(4 * codex_mem.DEFAULT_VECTOR_DIM))
+    vocab = make_vocab(args.vocab_size, args.seed)
+    batch: List[Tuple[object, ...]] = []
+    content_bytes = 0
+    start = time.perf_counter()
+    for row in iter_rows(args.events, args.seed, vector, vocab, args.lines_scale):
+        content_bytes += len(str(row[5]).encode("utf-8"))
+        batch.append(row)
+        if len(batch) >= args.batch:
+            insert(conn, batch)
+            conn.commit()
+            batch = []
+    if batch:
+        insert(conn, batch)
+        conn.commit()
+    insert_sec = time.perf_counter() - start
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    size = db_path.stat().st_size
+    result = {
+        "layout": name,
+        "db_bytes": size,
+        "bytes_per_event": round(size / max(1, args.events), 1),
+        "content_bytes": content_bytes,
+        "db_to_content_ratio": round(size / max(1, content_bytes), 3),
+        "insert_events_per_sec": round(args.events / insert_sec) if insert_sec > 0 else 0,
+        "fts_prefix": codex_mem.fts_table_prefix(conn, "events_fts"),
+        "search_median_ms": search_ms(conn, QUERIES, args.runs),
+        "prefix_search_median_ms": search_ms(conn, PREFIX_QUERIES, args.runs),
+        "prefix_search_uncapped_median_ms": uncapped_search_ms(conn, PREFIX_QUERIES, args.runs),
+        "detail_median_ms": detail_ms(conn, args.events, args.runs, args.seed),
+        "tables_over_1mb": table_sizes(conn),
+    }
+    conn.close()
+    if not args.keep:
+        db_path.unlink()
+        for suffix in ("-wal", "-shm"):
+            pathlib.Path(str(db_path) + suffix).unlink(missing_ok=True)
+    return result
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Benchmark memory DB size per event across storage layouts.")
+    p.add_argument("--events", type=int, default=100_000)
+    p.add_argument("--vocab-size", type=int, default=0, help="Random identifiers mixed into the text (default: 0).")
+    p.add_argument("--lines-scale", type=int, default=1, help="Multiply the lines per event (default: 1).")
+    p.add_argument("--batch", type=int, default=1000, help="Events per insert transaction (default: 1000).")
+    p.add_argument("--layout", action="append", choices=sorted(LAYOUTS), help="Layouts to run (default: all).")
+    p.add_argument("--runs", type=int, default=5, help="Search repetitions per query (default: 5).")
+    p.add_argument("--seed", type=int, default=7)
+    p.add_argument("--work-dir", default=None, help="Where to build the DBs (default: a temp dir).")
+    p.add_argument("--keep", action="store_true", help="Keep the generated DBs.")
+    p.add_argument("--out", default="-")
+    return p.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    layouts = args.layout or list(LAYOUTS)
+    with tempfile.TemporaryDirectory(prefix="codex_mem_storage_") as tmp:
+        work_dir = pathlib.Path(args.work_dir).resolve() if args.work_dir else pathlib.Path(tmp)
+        work_dir.mkdir(parents=True, exist_ok=True)
+        results = [run_layout(name, work_dir, args) for name in layouts]
+
+    baseline = results[0]["db_bytes"] if results else 0
+    for result in results:
+        result["size_vs_first"] = round(int(result["db_bytes"]) / baseline, 3) if baseline else 0.0
+    out = {
+        "benchmark": "memory_storage_v1",
+        "python": sys.version.split()[0],
+        "sqlite": sqlite3.sqlite_version,
+        "events": args.events,
+        "vocab_size": args.vocab_size,
+        "lines_scale": args.lines_scale,
+        "layouts": results,
+    }
+    out_text = json.dumps(out, ensure_ascii=False, indent=2) + "\n"
+    if str(args.out).strip() and str(args.out).strip() != "-":
+        out_path = pathlib.Path(args.out).resolve()
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        out_path.write_text(out_text, encoding="utf-8")
+    else:
+        sys.stdout.write(out_text)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
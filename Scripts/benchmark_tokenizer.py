@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Benchmark the shared tokenizer (`memory_runtime.tokens.tokenize`) against the
+per-module copy it replaced.
+
+Two workloads are built from the target repository:
+- `short_strings`: paths, symbol hints and module-style summaries, each seen
+  several times (what query-time scoring and module maps tokenize repeatedly)
+- `chunk_bodies`: ~1.8 KB slices of source files (what `index` tokenizes)
+
+Reports tokens/sec per workload for the legacy implementation and for the
+shared one (cold caches, then warm). Outputs are aggregate-only.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import pathlib
+import re
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List, Sequence
+
+SCRIPT_DIR = pathlib.Path(__file__).resolve().parent
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPT_DIR))
+
+from memory_runtime import tokens
+
+LEGACY_TOKEN_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]{0,}|[0-9]+|[\u4e00-\u9fff]+")
+LEGACY_IDENTIFIER_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+LEGACY_CAMEL_BOUNDARY_RE = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
+SYMBOL_RE = re.compile(r"^\s*(?:def|class)\s+([A-Za-z_][A-Za-z0-9_]*)", re.MULTILINE)
+
+
+def legacy_tokenize(text: str) -> List[str]:
+    tokens_out: List[str] = []
+    for token in LEGACY_TOKEN_RE.findall(text):
+        if token.isdigit():
+            tokens_out.append(token)
+            continue
+        if LEGACY_IDENTIFIER_RE.match(token):
+            pieces = [p for p in re.split(r"[_\-]+", token) if p]
+            for piece in pieces:
+                camel_parts = [p for p in LEGACY_CAMEL_BOUNDARY_RE.split(piece) if p]
+                if not camel_parts:
+                    continue
+                lowered = [part.lower() for part in camel_parts]
+                tokens_out.extend(lowered)
+                if len(lowered) > 1:
+                    tokens_out.append("".join(lowered))
+            continue
+        tokens_out.append(token.lower())
+    return tokens_out
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Benchmark the shared memoized tokenizer against the legacy copy.")
+    p.add_argument("--root", default=".")
+    p.add_argument("--glob", default="Scripts/**/*.py")
+    p.add_argument("--repeat", type=int, default=5, help="How often each short string recurs (default: 5).")
+    p.add_argument("--runs", type=int, default=5)
+    p.add_argument("--out", default="-")
+    return p.parse_args()
+
+
+def build_workloads(root: pathlib.Path, pattern: str, repeat: int) -> Dict[str, List[str]]:
+    short: List[str] = []
+    bodies: List[str] = []
+    for path in sorted(root.glob(pattern)):
+        text = path.read_text(encoding="utf-8", errors="replace")
+        rel = path.relative_to(root).as_posix()
+        symbols = SYMBOL_RE.findall(text)
+        short.append(rel)
+        short.append(", ".join(symbols[:4]))
+        short.append(f"python file `{rel}` with {text.count(chr(10))} lines. symbols: {', '.join(symbols[:6])}")
+        short.extend(symbols[:40])
+        bodies.extend(text[idx : idx + 1800] for idx in range(0, len(text), 1800))
+    return {"short_strings": short * max(1, repeat), "chunk_bodies": bodies}
+
+
+def time_tokenizer(fn: Callable[[str], List[str]], texts: Sequence[str], runs: int, reset: Callable[[], None]) -> Dict[str, float]:
+    samples: List[float] = []
+    token_count = 0
+    for _ in range(max(1, runs)):
+        reset()
+        start = time.perf_counter()
+        token_count = sum(len(fn(text)) for text in texts)
+        samples.append(time.perf_counter() - start)
+    median = statistics.median(samples)
+    return {
+        "median_ms": round(median * 1000.0, 3),
+        "tokens_per_sec": round(token_count / median) if median > 0 else 0,
+        "token_count": token_count,
+    }
+
+
+def clear_caches() -> None:
+    tokens._tokenize_short.cache_clear()
+    tokens._identifier_parts.cache_clear()
+    tokens._split_terms_short.cache_clear()
+
+
+def main() -> int:
+    args = parse_args()
+    root = pathlib.Path(args.root).resolve()
+    workloads = build_workloads(root, args.glob, args.repeat)
+
+    results: List[Dict[str, object]] = []
+    for name, texts in workloads.items():
+        identical = all(legacy_tokenize(text) == tokens.tokenize(text) for text in texts)
+        legacy = time_tokenizer(legacy_tokenize, texts, args.runs, lambda: None)
+        cold = time_tokenizer(tokens.tokenize, texts, args.runs, clear_caches)
+        warm = time_tokenizer(tokens.tokenize, texts, args.runs, lambda: None)
+        results.append(
+            {
+                "workload": name,
+                "texts": len(texts),
+                "chars": sum(len(text) for text in texts),
+                "outputs_identical": identical,
+                "legacy": legacy,
+                "shared_cold_cache": cold,
+                "shared_warm_cache": warm,
+                "speedup_cold": round(cold["tokens_per_sec"] / legacy["tokens_per_sec"], 2) if legacy["tokens_per_sec"] else 0.0,
+                "speedup_warm": round(warm["tokens_per_sec"] / legacy["tokens_per_sec"], 2) if legacy["tokens_per_sec"] else 0.0,
+            }
+        )
+
+    out = {
+        "benchmark": "tokenizer_v1",
+        "python": sys.version.split()[0],
+        "runs": args.runs,
+        "workloads": results,
+    }
+    out_text = json.dumps(out, ensure_ascii=False, indent=2) + "\n"
+    if str(args.out).strip() and str(args.out).strip() != "-":
+        out_path = pathlib.Path(args.out).resolve()
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        out_path.write_text(out_text, encoding="utf-8")
+    else:
+        sys.stdout.write(out_text)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
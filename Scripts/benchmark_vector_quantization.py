@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Benchmark repo_knowledge semantic scoring: exact float32 vs ternary-code prefilter + rerank.
+
+Builds a throwaway local index of the target repository, then for each query:
+- scores every chunk exactly against its float32 vector (baseline)
+- pre-ranks on 2-bit ternary codes and rescores only the top `rerank_k` with float32
+
+Reports recall@k of the semantic top-k and of the final hybrid top-k against the
+exact baseline, median scoring latency, and bytes read per chunk.
+Outputs are aggregate-only (no code snippets).
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import pathlib
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+SCRIPT_DIR = pathlib.Path(__file__).resolve().parent
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPT_DIR))
+
+import repo_knowledge
+
+DEFAULT_QUERIES = [
+    "entrypoint main startup bootstrap",
+    "sqlite schema migration persistence",
+    "embedding vector cosine similarity",
+    "prompt budget token estimate",
+    "privacy visibility redact private events",
+    "timeline session summary observation",
+    "http request retry backoff",
+    "module map onboarding facets",
+]
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Benchmark ternary-code prefilter + float32 rerank vs exact scoring.")
+    p.add_argument("--root", default=".")
+    p.add_argument("--top-k", type=int, default=10)
+    p.add_argument("--rerank-k", type=int, action="append", default=None, help="Repeatable (default: 256,128,64).")
+    p.add_argument("--vector-dim", type=int, default=repo_knowledge.DEFAULT_VECTOR_DIM)
+    p.add_argument("--runs", type=int, default=5)
+    p.add_argument("--out", default="-")
+    return p.parse_args()
+
+
+def recall(expected: List[int], got: List[int]) -> float:
+    if not expected:
+        return 1.0
+    return len(set(expected) & set(got)) / len(expected)
+
+
+def time_scoring(conn, ids: List[int], q_vec: List[float], dim: int, rerank_k: int, runs: int) -> float:
+    samples: List[float] = []
+    for _ in range(max(1, runs)):
+        start = time.perf_counter()
+        repo_knowledge.semantic_chunk_scores(conn, ids, q_vec, dim, rerank_k=rerank_k)
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return statistics.median(samples)
+
+
+def main() -> int:
+    args = parse_args()
+    root = pathlib.Path(args.root).resolve()
+    rerank_ks = sorted(set(args.rerank_k or [256, 128, 64]), reverse=True)
+    top_k = max(1, int(args.top_k))
+
+    with tempfile.TemporaryDirectory(prefix="rk_quant_bench_") as index_dir:
+        with contextlib.redirect_stdout(io.StringIO()):
+            code = repo_knowledge.main(
+                [
+                    "--root",
+                    str(root),
+                    "--index-dir",
+                    index_dir,
+                    "index",
+                    "--embedding-provider",
+                    "local",
+                    "--vector-dim",
+                    str(args.vector_dim),
+                ]
+            )
+        if code != 0:
+            raise RuntimeError(f"index build failed with exit code {code}")
+
+        conn = repo_knowledge.open_db(root, index_dir)
+        try:
+            meta = repo_knowledge.fetch_meta(conn)
+            dim = int(meta["vector_dim"])
+            ids = [int(row["id"]) for row in conn.execute("SELECT id FROM chunks ORDER BY id").fetchall()]
+            float_bytes = int(conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM chunks").fetchone()[0])
+            code_bytes = int(conn.execute("SELECT COALESCE(SUM(LENGTH(bits)), 0) FROM chunk_codes").fetchone()[0])
+
+            per_mode: Dict[int, Dict[str, List[float]]] = {
+                k: {"semantic_recall": [], "hybrid_recall": [], "time_ms": []} for k in [0, *rerank_ks]
+            }
+            for query in DEFAULT_QUERIES:
+                q_vec = repo_knowledge.build_query_vector(conn, query, meta, "local", dim)
+                exact = repo_knowledge.semantic_chunk_scores(conn, ids, q_vec, dim, rerank_k=0)
+                exact_top = sorted(exact, key=lambda cid: exact[cid], reverse=True)[:top_k]
+                exact_hybrid = [
+                    item.chunk_id
+                    for item in repo_knowledge.retrieve_chunks(
+                        conn, query, top_k, [], q_vec, dim, alpha=0.5, rerank_k=0
+                    )
+                ]
+                for rerank_k, bucket in per_mode.items():
+                    scores = repo_knowledge.semantic_chunk_scores(conn, ids, q_vec, dim, rerank_k=rerank_k)
+                    top = sorted(scores, key=lambda cid: scores[cid], reverse=True)[:top_k]
+                    hybrid = [
+                        item.chunk_id
+                        for item in repo_knowledge.retrieve_chunks(
+                            conn, query, top_k, [], q_vec, dim, alpha=0.5, rerank_k=rerank_k
+                        )
+                    ]
+                    bucket["semantic_recall"].append(recall(exact_top, top))
+                    bucket["hybrid_recall"].append(recall(exact_hybrid, hybrid))
+                    bucket["time_ms"].append(time_scoring(conn, ids, q_vec, dim, rerank_k, args.runs))
+        finally:
+            conn.close()
+
+    modes: List[Dict[str, Any]] = []
+    for rerank_k, bucket in per_mode.items():
+        rescored = len(ids) if rerank_k == 0 else min(rerank_k, len(ids))
+        modes.append(
+            {
+                "mode": "exact_float32" if rerank_k == 0 else "ternary_prefilter_rerank",
+                "rerank_k": rerank_k,
+                "semantic_recall_at_k_avg": round(statistics.mean(bucket["semantic_recall"]), 4),
+                "hybrid_recall_at_k_avg": round(statistics.mean(bucket["hybrid_recall"]), 4),
+                "scoring_time_ms_median": round(statistics.median(bucket["time_ms"]), 3),
+                "float32_bytes_read": rescored * dim * 4,
+                "code_bytes_read": 0 if rerank_k == 0 else code_bytes,
+            }
+        )
+
+    out = {
+        "benchmark": "vector_quantization_v1",
+        "chunk_count": len(ids),
+        "vector_dim": dim,
+        "top_k": top_k,
+        "query_count": len(DEFAULT_QUERIES),
+        "storage": {
+            "float32_bytes": float_bytes,
+            "ternary_code_bytes": code_bytes,
+            "code_to_float_ratio": round(code_bytes / float_bytes, 4) if float_bytes else 0.0,
+        },
+        "modes": modes,
+    }
+
+    out_text = json.dumps(out, ensure_ascii=False, indent=2) + "\n"
+    if str(args.out).strip() and str(args.out).strip() != "-":
+        out_path = pathlib.Path(args.out).resolve()
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        out_path.write_text(out_text, encoding="utf-8")
+    else:
+        sys.stdout.write(out_text)
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
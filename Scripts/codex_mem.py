@@ -19,16 +19,23 @@ import dataclasses
 import datetime as dt
 import hashlib
 import json
+import lzma
 import math
 import os
 import pathlib
 import re
+import queue
+import signal
+import socket
+import socketserver
 import sqlite3
 import struct
 import subprocess
 import sys
+import threading
 import time
-from typing import Dict, Iterable, List, Mapping, Sequence, Tuple
+import zlib
+from typing import Callable, Dict, Iterable, List, Mapping, Sequence, Tuple
 
 from prompt_budgeter import build_prompt_plan
 from prompt_mapper import map_prompt_to_profile
@@ -38,16 +45,58 @@ from memory_runtime.critic import evaluate_execution_result
 from memory_runtime.executors import run_executor
 from memory_runtime.planner import build_execution_plan, compile_task_spec, compute_coverage_report
 from memory_runtime.retrieval import build_evidence_items, hybrid_rank_chunks
+from memory_runtime.tokens import bucket_table, token_bucket, tokenize
 
 
 INDEX_VERSION = "1"
+# Stored in `PRAGMA user_version`; open_db skips init_schema when it matches.
+# Must equal the version of the last entry in MIGRATIONS.
+SCHEMA_VERSION = 6
+# Rows per resumable backfill batch. A writable open_db advances a pending
+# backfill by one small batch only, so hooks and searches stay fast; `migrate`
+# runs the rest, and `serve-hooks` runs full batches when idle.
+DEFAULT_BACKFILL_BATCH_ROWS = 500
+DEFAULT_BACKFILL_ROWS_PER_OPEN = 50
+# FTS5 prefix indexes (meta `fts_prefix`, change with `migrate --fts-prefix`).
+# build_fts_query only emits `tok*` for tokens at least as long as the shortest
+# indexed prefix; shorter tokens match exactly instead of scanning every term
+# that starts with them.
+DEFAULT_FTS_PREFIX = "2 3 4"
+FTS_PREFIX_MAX_CHARS = 8
+# Event content of at least this many UTF-8 bytes is stored compressed, with the
+# codec in `events.content_codec`. CODEX_MEM_CONTENT_CODEC picks zlib (default),
+# lzma or none; rows already stored keep their codec.
+CONTENT_CODEC_ENV = "CODEX_MEM_CONTENT_CODEC"
+DEFAULT_CONTENT_CODEC = "zlib"
+CONTENT_CODECS = ("zlib", "lzma")
+DEFAULT_CONTENT_COMPRESS_MIN_BYTES = 4096
+# Event content of at least this many bytes is deduplicated per (project,
+# visibility) through `content_blobs`: a repeat stores no text or vector and
+# points `events.content_ref` at the event that holds it.
+DEFAULT_DEDUP_MIN_BYTES = 256
 DEFAULT_INDEX_DIR = ".codex_mem"
 DEFAULT_DB_NAME = "codex_mem.sqlite3"
 DEFAULT_VECTOR_DIM = 256
 DEFAULT_PROJECT = "default"
 DEFAULT_SNIPPET_CHARS = 240
+# Directory of prebuilt repo_knowledge bundles (`repo_knowledge.py export-bundle`).
+REPO_KNOWLEDGE_BUNDLE_DIR_ENV = "CODEX_KNOWLEDGE_BUNDLE_DIR"
+# Indexer settings for the auto-refreshed index; bundle imports must match them.
+REPO_KNOWLEDGE_INDEX_ARGS = ("--all-files", "--embedding-provider", "local", "--ignore-dir", ".codex_mem")
 DEFAULT_TOOL_COMPACT_CHARS = 4000
 DEFAULT_CHANNEL = "stable"
+# `serve-hooks` daemon: socket file inside the index dir, and how long the writer
+# keeps a transaction open to group-commit hook writes that arrive together.
+DEFAULT_HOOK_SOCKET_NAME = "hooks.sock"
+DEFAULT_HOOK_COMMIT_INTERVAL_MS = 3
+DEFAULT_HOOK_CLIENT_TIMEOUT_SEC = 10.0
+# The daemon answers well inside the client timeout: a request still queued
+# after DEFAULT_HOOK_QUEUE_TIMEOUT_SEC is rejected unapplied, and its writer
+# waits at most DEFAULT_HOOK_BUSY_TIMEOUT_MS for the write lock.
+DEFAULT_HOOK_QUEUE_TIMEOUT_SEC = 5.0
+DEFAULT_HOOK_BUSY_TIMEOUT_MS = 2000
+# After this long without requests the writer runs one backfill batch.
+DEFAULT_HOOK_IDLE_BACKFILL_SEC = 1.0
 CHANNEL_CHOICES = {"stable", "beta"}
 
 PRIVACY_BLOCK_TAGS = {"no_mem", "block", "skip", "secret_block"}
@@ -74,9 +123,6 @@ DEFAULT_REDACTION_RULES = (
     ),
 )
 
-TOKEN_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]{0,}|[0-9]+|[\u4e00-\u9fff]+")
-IDENTIFIER_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
-CAMEL_BOUNDARY_RE = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
 
 
 @dataclasses.dataclass
@@ -92,6 +138,8 @@ class SearchResult:
     semantic: float
     score: float
     token_estimate: int
+    # Other matching events with the same content, collapsed into this one.
+    duplicates: int = 0
 
 
 def now_iso() -> str:
@@ -102,35 +150,13 @@ def estimate_tokens(text: str) -> int:
     return max(1, math.ceil(len(text) / 4))
 
 
-def tokenize(text: str) -> List[str]:
-    tokens: List[str] = []
-    for token in TOKEN_RE.findall(text):
-        if token.isdigit():
-            tokens.append(token)
-            continue
-        if IDENTIFIER_RE.match(token):
-            pieces = [p for p in re.split(r"[_\-]+", token) if p]
-            for piece in pieces:
-                camel_parts = [p for p in CAMEL_BOUNDARY_RE.split(piece) if p]
-                if not camel_parts:
-                    continue
-                lowered = [part.lower() for part in camel_parts]
-                tokens.extend(lowered)
-                if len(lowered) > 1:
-                    tokens.append("".join(lowered))
-            continue
-        tokens.append(token.lower())
-    return tokens
-
-
 def vectorize_text(text: str, dim: int) -> List[float]:
     tf = collections.Counter(tokenize(text))
     vec = [0.0] * dim
+    buckets = bucket_table(dim)
     for token, count in tf.items():
         base = 1.0 + math.log(count)
-        digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
-        idx = int.from_bytes(digest[:4], "big") % dim
-        sign = 1.0 if (digest[4] & 1) == 0 else -1.0
+        idx, sign = buckets.get(token) or token_bucket(token, dim)
         vec[idx] += sign * base
     norm = math.sqrt(sum(v * v for v in vec))
     if norm > 0:
@@ -168,8 +194,24 @@ def normalize_scores(raw: Mapping[str, float]) -> Dict[str, float]:
     return {k: (v - lo) / (hi - lo) for k, v in raw.items()}
 
 
-def open_db(root: pathlib.Path, index_dir: str) -> sqlite3.Connection:
+def open_db(root: pathlib.Path, index_dir: str, *, read_only: bool = False) -> sqlite3.Connection:
+    """
+    Open the memory DB, creating or upgrading the schema only when its
+    `user_version` is behind SCHEMA_VERSION. `read_only` connections are opened
+    with `mode=ro` and `query_only`, so they never take the write lock.
+    """
     base = root / index_dir
+    db_path = base / DEFAULT_DB_NAME
+    if read_only:
+        conn = _open_db_read_only(db_path)
+        if conn is not None:
+            return conn
+        open_db(root, index_dir).close()
+        conn = _open_db_read_only(db_path)
+        if conn is not None:
+            return conn
+        raise sqlite3.OperationalError(f"failed to open sqlite database read-only at {db_path}")
+
     if base.exists() and not base.is_dir():
         raise sqlite3.OperationalError(f"index dir is not a directory: {base}")
     try:
@@ -177,15 +219,17 @@ def open_db(root: pathlib.Path, index_dir: str) -> sqlite3.Connection:
     except OSError as exc:
         raise sqlite3.OperationalError(f"failed to prepare index dir {base}: {exc}") from exc
 
-    db_path = base / DEFAULT_DB_NAME
     last_exc: sqlite3.OperationalError | None = None
     for attempt in range(2):
         try:
             conn = sqlite3.connect(str(db_path), timeout=30)
             conn.row_factory = sqlite3.Row
-            conn.execute("PRAGMA journal_mode=WAL")
+            if int(conn.execute("PRAGMA user_version").fetchone()[0]) != SCHEMA_VERSION:
+                conn.execute("PRAGMA journal_mode=WAL")
+                init_schema(conn)
             conn.execute("PRAGMA synchronous=NORMAL")
-            init_schema(conn)
+            if pending_backfills(conn):
+                run_backfills(conn, batch_rows=DEFAULT_BACKFILL_ROWS_PER_OPEN, max_batches=1)
             return conn
         except sqlite3.OperationalError as exc:
             last_exc = exc
@@ -208,102 +252,915 @@ def open_db(root: pathlib.Path, index_dir: str) -> sqlite3.Connection:
     ) from last_exc
 
 
-def init_schema(conn: sqlite3.Connection) -> None:
-    conn.executescript(
+def _open_db_read_only(db_path: pathlib.Path) -> sqlite3.Connection | None:
+    """
+    Read-only connection to an existing DB whose schema is current, else None.
+    """
+    if not db_path.is_file():
+        return None
+    try:
+        conn = sqlite3.connect(f"{db_path.resolve().as_uri()}?mode=ro", uri=True, timeout=30)
+    except sqlite3.OperationalError:
+        return None
+    try:
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA query_only=ON")
+        if int(conn.execute("PRAGMA user_version").fetchone()[0]) == SCHEMA_VERSION:
+            return conn
+    except sqlite3.OperationalError:
+        pass
+    conn.close()
+    return None
+
+
+def content_codec_setting() -> str:
+    codec = os.environ.get(CONTENT_CODEC_ENV, DEFAULT_CONTENT_CODEC).strip().lower()
+    return codec if codec in CONTENT_CODECS else ""
+
+
+def encode_event_content(
+    content: str,
+    codec: str | None = None,
+    min_bytes: int = DEFAULT_CONTENT_COMPRESS_MIN_BYTES,
+) -> Tuple[str | bytes, str, int | None]:
+    """
+    Storage form of event text: `(value, codec, raw_bytes)`. Text below
+    `min_bytes`, or that does not shrink, is kept as-is with codec "".
+    """
+    codec = content_codec_setting() if codec is None else codec
+    raw = content.encode("utf-8")
+    if codec not in CONTENT_CODECS or len(raw) < min_bytes:
+        return content, "", None
+    packed = zlib.compress(raw, 6) if codec == "zlib" else lzma.compress(raw, preset=6)
+    if len(packed) >= len(raw):
+        return content, "", None
+    return packed, codec, len(raw)
+
+
+def decode_event_content(value: object, codec: str | None, max_chars: int | None = None) -> str:
+    """
+    Plain text of a stored `events.content` value. With `max_chars`, only the
+    leading part of a compressed value is inflated and at most that many
+    characters are returned.
+    """
+    if value is None:
+        return ""
+    if not codec:
+        return str(value) if max_chars is None else str(value)[:max_chars]
+    if codec == "zlib":
+        inflater = zlib.decompressobj()
+    elif codec == "lzma":
+        inflater = lzma.LZMADecompressor()
+    else:
+        raise ValueError(f"unknown content codec: {codec}")
+    if max_chars is None:
+        return inflater.decompress(bytes(value)).decode("utf-8")  # type: ignore[arg-type]
+    # A UTF-8 character is at most 4 bytes; a cut-off last one is dropped.
+    head = inflater.decompress(bytes(value), 4 * (max_chars + 1))  # type: ignore[arg-type]
+    return head.decode("utf-8", errors="ignore")[:max_chars]
+
+
+# `content, content_codec` select-list for an unaliased query over `events`;
+# repeated content is read from the event that holds it (`content_ref`).
+EVENT_CONTENT_COLUMNS = """
+    CASE WHEN content_ref IS NULL THEN content
+        ELSE (SELECT src.content FROM events src WHERE src.id = events.content_ref) END AS content,
+    CASE WHEN content_ref IS NULL THEN content_codec
+        ELSE (SELECT src.content_codec FROM events src WHERE src.id = events.content_ref) END AS content_codec
+"""
+
+
+def event_content(row: sqlite3.Row) -> str:
+    return decode_event_content(row["content"], row["content_codec"])
+
+
+def event_snippet(row: sqlite3.Row, limit: int) -> str:
+    """
+    `trim_snippet` of an event's text that only inflates the first `limit`
+    characters of compressed content (stored content is already stripped).
+    """
+    text = decode_event_content(row["content"], row["content_codec"], max_chars=limit + 1)
+    if len(text) <= limit:
+        return trim_snippet(text, limit)
+    return text[:limit].rstrip() + "...<trimmed>"
+
+
+def content_blob_hash(text: str) -> str | None:
+    raw = text.encode("utf-8")
+    if len(raw) < DEFAULT_DEDUP_MIN_BYTES:
+        return None
+    return hashlib.sha256(raw).hexdigest()
+
+
+def find_content_blob(conn: sqlite3.Connection, project: str, visibility: str, content_hash: str) -> int | None:
+    row = conn.execute(
+        "SELECT event_id FROM content_blobs WHERE project = ? AND visibility = ? AND content_hash = ?",
+        (project, visibility, content_hash),
+    ).fetchone()
+    return int(row[0]) if row else None
+
+
+def track_content_blob(
+    conn: sqlite3.Connection,
+    *,
+    project: str,
+    visibility: str,
+    content_hash: str,
+    text: str,
+    event_id: int,
+    owner_id: int | None,
+) -> None:
+    """
+    Register `event_id` as the holder of new content, or count one more
+    reference to `owner_id`'s and add what the repeat did not store to
+    `meta.dedup_bytes_saved` / `meta.dedup_tokens_saved`.
+    """
+    raw_bytes = len(text.encode("utf-8"))
+    tokens = estimate_tokens(text)
+    if owner_id is None:
+        conn.execute(
+            """
+            INSERT INTO content_blobs(project, visibility, content_hash, event_id, raw_bytes, token_estimate)
+            VALUES(?, ?, ?, ?, ?, ?)
+            """,
+            (project, visibility, content_hash, event_id, raw_bytes, tokens),
+        )
+        return
+    conn.execute(
+        "UPDATE content_blobs SET ref_count = ref_count + 1 WHERE project = ? AND visibility = ? AND content_hash = ?",
+        (project, visibility, content_hash),
+    )
+    for key, amount in (("dedup_bytes_saved", raw_bytes), ("dedup_tokens_saved", tokens)):
+        conn.execute("UPDATE meta SET value = CAST(value AS INTEGER) + ? WHERE key = ?", (amount, key))
+
+
+BASELINE_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    project TEXT NOT NULL,
+    title TEXT NOT NULL,
+    started_at TEXT NOT NULL,
+    ended_at TEXT,
+    status TEXT NOT NULL,
+    summary_json TEXT,
+    metadata_json TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    project TEXT NOT NULL,
+    event_kind TEXT NOT NULL,
+    role TEXT NOT NULL,
+    title TEXT NOT NULL,
+    content TEXT NOT NULL,
+    tool_name TEXT,
+    file_path TEXT,
+    tags_json TEXT NOT NULL,
+    metadata_json TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    vector BLOB,
+    FOREIGN KEY(session_id) REFERENCES sessions(session_id)
+);
+
+CREATE TABLE IF NOT EXISTS observations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    project TEXT NOT NULL,
+    observation_type TEXT NOT NULL,
+    title TEXT NOT NULL,
+    body TEXT NOT NULL,
+    source_event_ids_json TEXT NOT NULL,
+    metadata_json TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    vector BLOB,
+    FOREIGN KEY(session_id) REFERENCES sessions(session_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_events_session_time
+    ON events(session_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_events_project_time
+    ON events(project, created_at);
+CREATE INDEX IF NOT EXISTS idx_obs_session_time
+    ON observations(session_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_obs_project_time
+    ON observations(project, created_at);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS events_fts USING fts5(
+    title,
+    content,
+    tags,
+    tokenize='unicode61'
+);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS observations_fts USING fts5(
+    title,
+    body,
+    tags,
+    tokenize='unicode61'
+);
+
+CREATE TABLE IF NOT EXISTS graph_lite_edges (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    project TEXT NOT NULL,
+    path_a TEXT NOT NULL,
+    path_b TEXT NOT NULL,
+    edge_kind TEXT NOT NULL,
+    weight REAL NOT NULL,
+    last_seen_at TEXT NOT NULL,
+    UNIQUE(project, path_a, path_b, edge_kind)
+);
+
+CREATE INDEX IF NOT EXISTS idx_graph_lite_edges_project_a
+    ON graph_lite_edges(project, path_a);
+CREATE INDEX IF NOT EXISTS idx_graph_lite_edges_project_b
+    ON graph_lite_edges(project, path_b);
+"""
+
+
+@dataclasses.dataclass(frozen=True)
+class SchemaMigration:
+    """
+    One step of the memory DB schema. `apply` runs inside the exclusive
+    migration transaction and must be safe to re-run on a DB that already has
+    its changes. `backfill(conn, after_id, limit)` optionally rewrites existing
+    rows in id order after the schema change and returns the last id it
+    processed, or None once no rows are left.
+    """
+
+    version: int
+    name: str
+    apply: Callable[[sqlite3.Connection], None]
+    backfill: Callable[[sqlite3.Connection, int, int], int | None] | None = None
+
+
+def _split_sql(script: str) -> List[str]:
+    return [statement.strip() for statement in script.split(";") if statement.strip()]
+
+
+def _migrate_baseline(conn: sqlite3.Connection) -> None:
+    for statement in _split_sql(BASELINE_SCHEMA_SQL):
+        conn.execute(statement)
+    ensure_meta_default(conn, "index_version", INDEX_VERSION)
+    ensure_meta_default(conn, "vector_dim", str(DEFAULT_VECTOR_DIM))
+    ensure_meta_default(conn, "channel", DEFAULT_CHANNEL)
+    ensure_meta_default(conn, "viewer_refresh_sec", "3")
+    ensure_meta_default(conn, "beta_endless_mode", "0")
+
+
+def _table_columns(conn: sqlite3.Connection, table: str) -> set:
+    return {str(row[1]) for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def _migrate_visibility_column(conn: sqlite3.Connection) -> None:
+    # Private rows are few, so they are marked in place instead of through a
+    # batched backfill: the column must be right before any query filters on it.
+    for table in ("events", "observations"):
+        if "visibility" not in _table_columns(conn, table):
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN visibility TEXT NOT NULL DEFAULT 'public'")
+        conn.execute(
+            f"""
+            UPDATE {table} SET visibility = 'private'
+            WHERE lower(json_extract(metadata_json, '$.privacy.visibility')) = 'private'
+            """
+        )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_events_project_vis_time ON events(project, visibility, created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_obs_project_vis_time ON observations(project, visibility, created_at)")
+
+
+# `events_fts` is contentless (content=''): FTS5 keeps only the index, not a
+# second copy of every stored text, and SQL never has to decode compressed
+# rows. The triggers index rows stored as-is; `index_event_text` indexes
+# compressed rows from Python. The `{...}` parts are filled in by
+# `_create_events_fts_triggers`.
+EVENTS_FTS_TRIGGERS: Tuple[str, ...] = (
+    """
+    CREATE TRIGGER IF NOT EXISTS events_fts_ai AFTER INSERT ON events {new_plain}BEGIN
+        INSERT INTO events_fts(rowid, title, content, tags_json)
+        VALUES (new.id, new.title, new.content, new.tags_json);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS events_fts_ad AFTER DELETE ON events {delete_when}BEGIN
+        {delete_old}
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS events_fts_au AFTER UPDATE OF title, content, tags_json ON events {both_plain}BEGIN
+        {delete_old}
+        INSERT INTO events_fts(rowid, title, content, tags_json)
+        VALUES (new.id, new.title, new.content, new.tags_json);
+    END
+    """,
+)
+
+# Insert-only triggers that feed a second events index while it is built:
+# (trigger, index table, tags column).
+EVENTS_FTS_COPY_TRIGGERS: Tuple[Tuple[str, str, str], ...] = (
+    ("events_fts_ext_ai", "events_fts_ext", "tags_json"),
+    ("events_fts_legacy_ai", "events_fts", "tags"),
+    ("events_fts_next_ai", "events_fts_next", "tags_json"),
+)
+
+
+def _events_plain_sql(conn: sqlite3.Connection, row: str) -> str:
+    """
+    Condition that the row seen through `row` ("new." or "old.") stores its
+    content as-is.
+    """
+    if "content_codec" in _table_columns(conn, "events"):
+        return f"{row}content_codec = ''"
+    return "1"
+
+
+def _create_events_fts_triggers(conn: sqlite3.Connection) -> None:
+    new_plain = _events_plain_sql(conn, "new.")
+    old_plain = _events_plain_sql(conn, "old.")
+    if _has_contentless_delete(conn, "events_fts"):
+        delete_when = ""
+        delete_old = "DELETE FROM events_fts WHERE rowid = old.id;"
+    else:
+        delete_when = f"WHEN {old_plain} "
+        delete_old = (
+            "INSERT INTO events_fts(events_fts, rowid, title, content, tags_json)\n"
+            "        VALUES ('delete', old.id, old.title, old.content, old.tags_json);"
+        )
+    for statement in EVENTS_FTS_TRIGGERS:
+        conn.execute(
+            statement.format(
+                new_plain=f"WHEN {new_plain} ",
+                delete_when=delete_when,
+                both_plain=f"WHEN {old_plain} AND {new_plain} ",
+                delete_old=delete_old,
+            )
+        )
+
+
+def _create_events_fts_copy_trigger(conn: sqlite3.Connection, trigger: str, table: str, tags_column: str) -> None:
+    conn.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {trigger} AFTER INSERT ON events WHEN {_events_plain_sql(conn, 'new.')} BEGIN
+            INSERT INTO {table}(rowid, title, content, {tags_column})
+            VALUES (new.id, new.title, new.content, new.tags_json);
+        END
+        """
+    )
+
+
+def _index_events_range(conn: sqlite3.Connection, table: str, tags_column: str, after_id: int, last_id: int) -> None:
+    """
+    Index events with `after_id < id <= last_id` into `table`, decoding
+    compressed content in Python.
+    """
+    codec = "content_codec" if "content_codec" in _table_columns(conn, "events") else "''"
+    rows = conn.execute(
+        f"SELECT id, title, content, {codec}, tags_json FROM events WHERE id > ? AND id <= ?",
+        (after_id, last_id),
+    ).fetchall()
+    conn.executemany(
+        f"INSERT INTO {table}(rowid, title, content, {tags_column}) VALUES(?, ?, ?, ?)",
+        [(row[0], row[1], decode_event_content(row[2], row[3]), row[4]) for row in rows],
+    )
+
+
+def _events_fts_indexes(conn: sqlite3.Connection) -> List[Tuple[str, str, str]]:
+    """
+    Every events index that exists (the live `events_fts` and any a backfill is
+    building), with its tags column and definition.
+    """
+    rows = conn.execute(
         """
-        CREATE TABLE IF NOT EXISTS meta (
-            key TEXT PRIMARY KEY,
-            value TEXT NOT NULL
-        );
-
-        CREATE TABLE IF NOT EXISTS sessions (
-            session_id TEXT PRIMARY KEY,
-            project TEXT NOT NULL,
-            title TEXT NOT NULL,
-            started_at TEXT NOT NULL,
-            ended_at TEXT,
-            status TEXT NOT NULL,
-            summary_json TEXT,
-            metadata_json TEXT NOT NULL
-        );
-
-        CREATE TABLE IF NOT EXISTS events (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            session_id TEXT NOT NULL,
-            project TEXT NOT NULL,
-            event_kind TEXT NOT NULL,
-            role TEXT NOT NULL,
-            title TEXT NOT NULL,
-            content TEXT NOT NULL,
-            tool_name TEXT,
-            file_path TEXT,
-            tags_json TEXT NOT NULL,
-            metadata_json TEXT NOT NULL,
-            created_at TEXT NOT NULL,
-            vector BLOB,
-            FOREIGN KEY(session_id) REFERENCES sessions(session_id)
-        );
-
-        CREATE TABLE IF NOT EXISTS observations (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            session_id TEXT NOT NULL,
-            project TEXT NOT NULL,
-            observation_type TEXT NOT NULL,
-            title TEXT NOT NULL,
-            body TEXT NOT NULL,
-            source_event_ids_json TEXT NOT NULL,
-            metadata_json TEXT NOT NULL,
-            created_at TEXT NOT NULL,
-            vector BLOB,
-            FOREIGN KEY(session_id) REFERENCES sessions(session_id)
-        );
-
-        CREATE INDEX IF NOT EXISTS idx_events_session_time
-            ON events(session_id, created_at);
-        CREATE INDEX IF NOT EXISTS idx_events_project_time
-            ON events(project, created_at);
-        CREATE INDEX IF NOT EXISTS idx_obs_session_time
-            ON observations(session_id, created_at);
-        CREATE INDEX IF NOT EXISTS idx_obs_project_time
-            ON observations(project, created_at);
-
-        CREATE VIRTUAL TABLE IF NOT EXISTS events_fts USING fts5(
+        SELECT name, sql FROM sqlite_master
+        WHERE type = 'table' AND name IN ('events_fts', 'events_fts_ext', 'events_fts_next')
+        """
+    ).fetchall()
+    indexes: List[Tuple[str, str, str]] = []
+    for row in rows:
+        sql = str(row[1])
+        # Only the standalone index of schema v1/v2 keeps a `tags` column.
+        indexes.append((str(row[0]), "tags_json" if FTS_CONTENTLESS_RE.search(sql) else "tags", sql))
+    return indexes
+
+
+def index_event_text(conn: sqlite3.Connection, event_id: int, title: str, text: str, tags_json: str) -> None:
+    """
+    Index an event whose content is stored compressed into every events index;
+    their triggers only index rows stored as-is.
+    """
+    for table, tags_column, _sql in _events_fts_indexes(conn):
+        conn.execute(
+            f"INSERT INTO {table}(rowid, title, content, {tags_column}) VALUES(?, ?, ?, ?)",
+            (event_id, title, text, tags_json),
+        )
+
+
+def unindex_event_text(conn: sqlite3.Connection, event_id: int, title: str, text: str, tags_json: str) -> None:
+    """
+    Undo `index_event_text`. Without `contentless_delete`, FTS5 needs the
+    values that were indexed to remove them from a contentless index.
+    """
+    for table, tags_column, sql in _events_fts_indexes(conn):
+        if FTS_CONTENTLESS_RE.search(sql) and "contentless_delete" not in sql:
+            conn.execute(
+                f"INSERT INTO {table}({table}, rowid, title, content, {tags_column}) VALUES('delete', ?, ?, ?, ?)",
+                (event_id, title, text, tags_json),
+            )
+        else:
+            conn.execute(f"DELETE FROM {table} WHERE rowid = ?", (event_id,))
+
+OBSERVATIONS_FTS: Tuple[str, ...] = (
+    """
+    CREATE VIRTUAL TABLE observations_fts USING fts5(
+        title,
+        body,
+        observation_type,
+        project,
+        content='observations',
+        content_rowid='id',
+        tokenize='unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS observations_fts_ai AFTER INSERT ON observations BEGIN
+        INSERT INTO observations_fts(rowid, title, body, observation_type, project)
+        VALUES (new.id, new.title, new.body, new.observation_type, new.project);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS observations_fts_ad AFTER DELETE ON observations BEGIN
+        INSERT INTO observations_fts(observations_fts, rowid, title, body, observation_type, project)
+        VALUES ('delete', old.id, old.title, old.body, old.observation_type, old.project);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS observations_fts_au AFTER UPDATE OF title, body, observation_type, project ON observations BEGIN
+        INSERT INTO observations_fts(observations_fts, rowid, title, body, observation_type, project)
+        VALUES ('delete', old.id, old.title, old.body, old.observation_type, old.project);
+        INSERT INTO observations_fts(rowid, title, body, observation_type, project)
+        VALUES (new.id, new.title, new.body, new.observation_type, new.project);
+    END
+    """,
+)
+
+EVENTS_FTS_BACKFILL_BOUND_KEY = "events_fts_backfill_max_id"
+
+
+def _is_external_content_fts(conn: sqlite3.Connection, name: str) -> bool:
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone()
+    return bool(row) and "content_rowid" in str(row[0])
+
+
+FTS_CONTENTLESS_RE = re.compile(r"content\s*=\s*''")
+# FTS5 supports DELETE on contentless tables from SQLite 3.43.
+FTS_CONTENTLESS_DELETE = sqlite3.sqlite_version_info >= (3, 43, 0)
+
+
+def _is_contentless_fts(conn: sqlite3.Connection, name: str) -> bool:
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone()
+    return bool(row) and FTS_CONTENTLESS_RE.search(str(row[0])) is not None
+
+
+def _has_contentless_delete(conn: sqlite3.Connection, name: str) -> bool:
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone()
+    return bool(row) and "contentless_delete" in str(row[0])
+
+
+def _create_events_fts_index(conn: sqlite3.Connection, name: str, prefix: str) -> None:
+    conn.execute(
+        f"""
+        CREATE VIRTUAL TABLE {name} USING fts5(
             title,
             content,
-            tags,
-            tokenize='unicode61'
-        );
+            tags_json,
+            content=''{", contentless_delete=1" if FTS_CONTENTLESS_DELETE else ""},
+        {_fts_prefix_option(prefix)}    tokenize='unicode61'
+        )
+        """
+    )
+
+
+def _start_events_fts_build(conn: sqlite3.Connection, name: str, prefix: str, bound_key: str) -> None:
+    """
+    Create a fresh contentless events index `name` and a trigger that feeds it
+    new rows. Rows up to the current max id are left to a backfill, bounded by
+    `meta[bound_key]`.
+    """
+    conn.execute(f"DROP TRIGGER IF EXISTS {name}_ai")
+    conn.execute(f"DROP TABLE IF EXISTS {name}")
+    _create_events_fts_index(conn, name, prefix)
+    _create_events_fts_copy_trigger(conn, f"{name}_ai", name, "tags_json")
+    max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+    upsert_meta(conn, bound_key, str(int(max_id)))
+
+
+def _migrate_external_content_fts(conn: sqlite3.Connection) -> None:
+    """
+    Observations are few and get an external-content index, rebuilt in place.
+    Events get a contentless index instead, so that compressed content never
+    has to be decoded in SQL: `_backfill_events_fts` indexes existing rows into
+    `events_fts_ext` in batches. Until it finishes, searches keep using the old
+    standalone `events_fts`, which a temporary trigger keeps feeding, and new
+    rows reach both through triggers.
+    """
+    if not _is_external_content_fts(conn, "observations_fts"):
+        conn.execute("DROP TABLE IF EXISTS observations_fts")
+        for statement in OBSERVATIONS_FTS:
+            conn.execute(statement)
+        conn.execute("INSERT INTO observations_fts(observations_fts) VALUES('rebuild')")
+
+    if _is_contentless_fts(conn, "events_fts"):
+        _create_events_fts_triggers(conn)
+        return
+    _start_events_fts_build(conn, "events_fts_ext", "", EVENTS_FTS_BACKFILL_BOUND_KEY)
+    _create_events_fts_copy_trigger(conn, "events_fts_legacy_ai", "events_fts", "tags")
+
+
+def _backfill_events_fts(conn: sqlite3.Connection, after_id: int, limit: int) -> int | None:
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'events_fts_ext'").fetchone():
+        return None
+    bound_row = conn.execute("SELECT value FROM meta WHERE key = ?", (EVENTS_FTS_BACKFILL_BOUND_KEY,)).fetchone()
+    bound = int(bound_row[0]) if bound_row else 0
+    row = conn.execute(
+        "SELECT MAX(id) FROM (SELECT id FROM events WHERE id > ? AND id <= ? ORDER BY id LIMIT ?)",
+        (after_id, bound, limit),
+    ).fetchone()
+    if row[0] is not None:
+        last_id = int(row[0])
+        _index_events_range(conn, "events_fts_ext", "tags_json", after_id, last_id)
+        return last_id
+    # Every pre-existing row is indexed: swap the contentless index in.
+    conn.execute("DROP TRIGGER IF EXISTS events_fts_legacy_ai")
+    conn.execute("DROP TRIGGER IF EXISTS events_fts_ext_ai")
+    conn.execute("DROP TABLE IF EXISTS events_fts")
+    conn.execute("ALTER TABLE events_fts_ext RENAME TO events_fts")
+    _create_events_fts_triggers(conn)
+    conn.execute("DELETE FROM meta WHERE key = ?", (EVENTS_FTS_BACKFILL_BOUND_KEY,))
+    return None
+
+
+FTS_PREFIX_RE = re.compile(r"prefix\s*=\s*'([0-9 ]*)'")
+EVENTS_FTS_REBUILD_BOUND_KEY = "events_fts_rebuild_max_id"
+
+
+def parse_fts_prefix(value: str) -> str:
+    """
+    Normalize an FTS5 prefix setting ("2 3 4", "2,3") to sorted, space-separated
+    lengths. An empty value disables prefix indexes.
+    """
+    lengths = sorted({int(part) for part in re.split(r"[\s,]+", str(value).strip()) if part})
+    if any(length < 1 or length > FTS_PREFIX_MAX_CHARS for length in lengths):
+        raise ValueError(f"FTS prefix lengths must be between 1 and {FTS_PREFIX_MAX_CHARS}: {value!r}")
+    return " ".join(str(length) for length in lengths)
+
+
+def fts_table_prefix(conn: sqlite3.Connection, name: str) -> str:
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone()
+    match = FTS_PREFIX_RE.search(str(row[0])) if row else None
+    return parse_fts_prefix(match.group(1)) if match else ""
+
 
-        CREATE VIRTUAL TABLE IF NOT EXISTS observations_fts USING fts5(
+def _fts_prefix_option(prefix: str) -> str:
+    return f"    prefix='{prefix}',\n" if prefix else ""
+
+
+def _create_observations_fts(conn: sqlite3.Connection, prefix: str) -> None:
+    conn.execute("DROP TABLE IF EXISTS observations_fts")
+    conn.execute(
+        f"""
+        CREATE VIRTUAL TABLE observations_fts USING fts5(
             title,
             body,
-            tags,
-            tokenize='unicode61'
-        );
-
-        CREATE TABLE IF NOT EXISTS graph_lite_edges (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            project TEXT NOT NULL,
-            path_a TEXT NOT NULL,
-            path_b TEXT NOT NULL,
-            edge_kind TEXT NOT NULL,
-            weight REAL NOT NULL,
-            last_seen_at TEXT NOT NULL,
-            UNIQUE(project, path_a, path_b, edge_kind)
-        );
-
-        CREATE INDEX IF NOT EXISTS idx_graph_lite_edges_project_a
-            ON graph_lite_edges(project, path_a);
-        CREATE INDEX IF NOT EXISTS idx_graph_lite_edges_project_b
-            ON graph_lite_edges(project, path_b);
+            observation_type,
+            project,
+            content='observations',
+            content_rowid='id',
+        {_fts_prefix_option(prefix)}    tokenize='unicode61'
+        )
         """
     )
-    ensure_meta_default(conn, "index_version", INDEX_VERSION)
-    ensure_meta_default(conn, "vector_dim", str(DEFAULT_VECTOR_DIM))
-    ensure_meta_default(conn, "channel", DEFAULT_CHANNEL)
-    ensure_meta_default(conn, "viewer_refresh_sec", "3")
-    ensure_meta_default(conn, "beta_endless_mode", "0")
+    for statement in OBSERVATIONS_FTS[1:]:
+        conn.execute(statement)
+    conn.execute("INSERT INTO observations_fts(observations_fts) VALUES('rebuild')")
+
+
+def start_fts_prefix_rebuild(conn: sqlite3.Connection, prefix: str) -> bool:
+    """
+    Switch both FTS indexes to `prefix`. Observations are rebuilt in place;
+    events are indexed into a new `events_fts_next` by the `fts_prefix_index`
+    backfill while searches keep using the current `events_fts`. A pending
+    `external_content_fts` build is restarted with `prefix` instead, so that
+    no event is indexed twice. Returns whether an events rebuild was queued.
+    """
+    prefix = parse_fts_prefix(prefix)
+    upsert_meta(conn, "fts_prefix", prefix)
+    if fts_table_prefix(conn, "observations_fts") != prefix or not _is_external_content_fts(conn, "observations_fts"):
+        _create_observations_fts(conn, prefix)
+    conn.execute("DROP TRIGGER IF EXISTS events_fts_next_ai")
+    conn.execute("DROP TABLE IF EXISTS events_fts_next")
+    conn.execute("DELETE FROM meta WHERE key = ?", (EVENTS_FTS_REBUILD_BOUND_KEY,))
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'events_fts_ext'").fetchone():
+        _start_events_fts_build(conn, "events_fts_ext", prefix, EVENTS_FTS_BACKFILL_BOUND_KEY)
+        step = "external_content_fts"
+    elif _is_contentless_fts(conn, "events_fts") and fts_table_prefix(conn, "events_fts") == prefix:
+        return False
+    else:
+        _start_events_fts_build(conn, "events_fts_next", prefix, EVENTS_FTS_REBUILD_BOUND_KEY)
+        step = "fts_prefix_index"
+    migration = next(migration for migration in MIGRATIONS if migration.name == step)
+    upsert_meta(conn, _backfill_key(migration), "0")
+    return True
+
+
+def _migrate_fts_prefix_index(conn: sqlite3.Connection) -> None:
+    ensure_meta_default(conn, "fts_prefix", DEFAULT_FTS_PREFIX)
+    start_fts_prefix_rebuild(conn, fetch_meta(conn)["fts_prefix"])
+
+
+def _backfill_events_fts_rebuild(conn: sqlite3.Connection, after_id: int, limit: int) -> int | None:
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'events_fts_next'").fetchone():
+        return None
+    bound_row = conn.execute("SELECT value FROM meta WHERE key = ?", (EVENTS_FTS_REBUILD_BOUND_KEY,)).fetchone()
+    bound = int(bound_row[0]) if bound_row else 0
+    row = conn.execute(
+        "SELECT MAX(id) FROM (SELECT id FROM events WHERE id > ? AND id <= ? ORDER BY id LIMIT ?)",
+        (after_id, bound, limit),
+    ).fetchone()
+    if row[0] is not None:
+        last_id = int(row[0])
+        _index_events_range(conn, "events_fts_next", "tags_json", after_id, last_id)
+        return last_id
+    conn.execute("DROP TRIGGER IF EXISTS events_fts_next_ai")
+    for trigger in ("events_fts_ai", "events_fts_ad", "events_fts_au"):
+        conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    conn.execute("DROP TABLE events_fts")
+    conn.execute("ALTER TABLE events_fts_next RENAME TO events_fts")
+    _create_events_fts_triggers(conn)
+    conn.execute("DELETE FROM meta WHERE key = ?", (EVENTS_FTS_REBUILD_BOUND_KEY,))
+    return None
+
+
+# `meta.content_bytes_saved` is the running total of bytes compression saved
+# in `events.content`, so `db_counts` never has to scan the table.
+CONTENT_SAVED_TRIGGERS: Tuple[str, ...] = (
+    """
+    CREATE TRIGGER IF NOT EXISTS events_content_saved_ai AFTER INSERT ON events
+    WHEN new.content_codec != '' BEGIN
+        UPDATE meta SET value = CAST(value AS INTEGER) + new.content_raw_bytes - length(new.content)
+        WHERE key = 'content_bytes_saved';
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS events_content_saved_ad AFTER DELETE ON events
+    WHEN old.content_codec != '' BEGIN
+        UPDATE meta SET value = CAST(value AS INTEGER) - old.content_raw_bytes + length(old.content)
+        WHERE key = 'content_bytes_saved';
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS events_content_saved_au AFTER UPDATE OF content, content_codec ON events
+    WHEN old.content_codec != '' OR new.content_codec != '' BEGIN
+        UPDATE meta SET value = CAST(value AS INTEGER)
+            + (CASE WHEN new.content_codec != '' THEN new.content_raw_bytes - length(new.content) ELSE 0 END)
+            - (CASE WHEN old.content_codec != '' THEN old.content_raw_bytes - length(old.content) ELSE 0 END)
+        WHERE key = 'content_bytes_saved';
+    END
+    """,
+)
+
+
+def _migrate_content_codec(conn: sqlite3.Connection) -> None:
+    """
+    Add the codec columns and restrict the events FTS triggers to rows stored
+    as-is; codex_mem indexes compressed rows itself. Existing large rows are
+    compressed by `_backfill_compress_event_content`.
+    """
+    columns = _table_columns(conn, "events")
+    if "content_codec" not in columns:
+        conn.execute("ALTER TABLE events ADD COLUMN content_codec TEXT NOT NULL DEFAULT ''")
+    if "content_raw_bytes" not in columns:
+        conn.execute("ALTER TABLE events ADD COLUMN content_raw_bytes INTEGER")
+    ensure_meta_default(conn, "content_bytes_saved", "0")
+    for statement in CONTENT_SAVED_TRIGGERS:
+        conn.execute(statement)
+    for trigger in ("events_fts_ai", "events_fts_ad", "events_fts_au"):
+        conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    if _is_contentless_fts(conn, "events_fts"):
+        _create_events_fts_triggers(conn)
+    for trigger, table, tags_column in EVENTS_FTS_COPY_TRIGGERS:
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = ?", (trigger,)).fetchone():
+            conn.execute(f"DROP TRIGGER {trigger}")
+            _create_events_fts_copy_trigger(conn, trigger, table, tags_column)
+
+
+def _backfill_compress_event_content(conn: sqlite3.Connection, after_id: int, limit: int) -> int | None:
+    codec = content_codec_setting()
+    if not codec:
+        return None
+    rows = conn.execute(
+        "SELECT id, content FROM events WHERE id > ? AND content_codec = '' ORDER BY id LIMIT ?",
+        (after_id, limit),
+    ).fetchall()
+    if not rows:
+        return None
+    for row in rows:
+        value, row_codec, raw_bytes = encode_event_content(str(row[1] or ""), codec)
+        if row_codec:
+            conn.execute(
+                "UPDATE events SET content = ?, content_codec = ?, content_raw_bytes = ? WHERE id = ?",
+                (value, row_codec, raw_bytes, int(row[0])),
+            )
+    return int(rows[-1][0])
+
+
+CONTENT_BLOBS_SQL = """
+CREATE TABLE IF NOT EXISTS content_blobs (
+    project TEXT NOT NULL,
+    visibility TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    event_id INTEGER NOT NULL,
+    raw_bytes INTEGER NOT NULL,
+    token_estimate INTEGER NOT NULL,
+    ref_count INTEGER NOT NULL DEFAULT 1,
+    PRIMARY KEY(project, visibility, content_hash)
+) WITHOUT ROWID
+"""
+
+
+def _migrate_content_dedup(conn: sqlite3.Connection) -> None:
+    conn.execute(CONTENT_BLOBS_SQL)
+    if "content_ref" not in _table_columns(conn, "events"):
+        conn.execute("ALTER TABLE events ADD COLUMN content_ref INTEGER")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_events_content_ref ON events(content_ref) WHERE content_ref IS NOT NULL")
+    ensure_meta_default(conn, "dedup_bytes_saved", "0")
+    ensure_meta_default(conn, "dedup_tokens_saved", "0")
+
+
+def _backfill_dedup_event_content(conn: sqlite3.Connection, after_id: int, limit: int) -> int | None:
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name IN ('events_fts_ext', 'events_fts_next')").fetchone():
+        # Compressed rows are unindexed by hand, which needs every events
+        # index to hold them: wait for the pending rebuild to swap in.
+        return after_id
+    rows = conn.execute(
+        """
+        SELECT id, project, visibility, content, content_codec, title, tags_json FROM events
+        WHERE id > ? AND content_ref IS NULL
+        ORDER BY id
+        LIMIT ?
+        """,
+        (after_id, limit),
+    ).fetchall()
+    if not rows:
+        return None
+    for row in rows:
+        text = decode_event_content(row[3], row[4])
+        content_hash = content_blob_hash(text)
+        if content_hash is None:
+            continue
+        owner_id = find_content_blob(conn, str(row[1]), str(row[2]), content_hash)
+        if owner_id == int(row[0]):
+            # Written after the upgrade, so insert_event already tracked it.
+            continue
+        if owner_id is not None:
+            conn.execute(
+                """
+                UPDATE events SET content = '', content_codec = '', content_raw_bytes = NULL, vector = NULL, content_ref = ?
+                WHERE id = ?
+                """,
+                (owner_id, int(row[0])),
+            )
+            if row[4]:
+                unindex_event_text(conn, int(row[0]), str(row[5]), text, str(row[6]))
+                index_event_text(conn, int(row[0]), str(row[5]), "", str(row[6]))
+        track_content_blob(
+            conn,
+            project=str(row[1]),
+            visibility=str(row[2]),
+            content_hash=content_hash,
+            text=text,
+            event_id=int(row[0]),
+            owner_id=owner_id,
+        )
+    return int(rows[-1][0])
+
+
+# Ordered schema history. Append new steps with the next version and bump
+# SCHEMA_VERSION; never edit a step that has shipped.
+MIGRATIONS: List[SchemaMigration] = [
+    SchemaMigration(1, "baseline", _migrate_baseline),
+    SchemaMigration(2, "visibility_column", _migrate_visibility_column),
+    SchemaMigration(3, "external_content_fts", _migrate_external_content_fts, _backfill_events_fts),
+    SchemaMigration(4, "fts_prefix_index", _migrate_fts_prefix_index, _backfill_events_fts_rebuild),
+    SchemaMigration(5, "content_codec", _migrate_content_codec, _backfill_compress_event_content),
+    SchemaMigration(6, "content_dedup", _migrate_content_dedup, _backfill_dedup_event_content),
+]
+
+BACKFILL_META_PREFIX = "backfill:"
+
+
+def _backfill_key(migration: SchemaMigration) -> str:
+    return f"{BACKFILL_META_PREFIX}{migration.version}:{migration.name}"
+
+
+def migrate_schema(
+    conn: sqlite3.Connection,
+    migrations: Sequence[SchemaMigration] | None = None,
+) -> List[str]:
+    """
+    Apply every migration newer than the DB's `user_version`, in order, under
+    one exclusive transaction, so concurrent processes run them exactly once.
+    Migrations with a backfill are queued for `run_backfills`. Returns the
+    names of the applied migrations.
+    """
+    steps = list(MIGRATIONS if migrations is None else migrations)
+    target = steps[-1].version if steps else 0
     conn.commit()
+    conn.execute("BEGIN EXCLUSIVE")
+    try:
+        current = int(conn.execute("PRAGMA user_version").fetchone()[0])
+        if current > target:
+            raise sqlite3.OperationalError(
+                f"memory DB schema version {current} is newer than this codex_mem supports ({target})"
+            )
+        applied: List[str] = []
+        for migration in steps:
+            if migration.version <= current:
+                continue
+            migration.apply(conn)
+            if migration.backfill is not None:
+                upsert_meta(conn, _backfill_key(migration), "0")
+            conn.execute(f"PRAGMA user_version={int(migration.version)}")
+            applied.append(migration.name)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return applied
+
+
+def pending_backfills(conn: sqlite3.Connection) -> Dict[str, int]:
+    rows = conn.execute(
+        "SELECT key, value FROM meta WHERE key >= ? AND key < ? AND value != 'done'",
+        (BACKFILL_META_PREFIX, BACKFILL_META_PREFIX[:-1] + ";"),
+    ).fetchall()
+    return {str(row[0]): int(row[1]) for row in rows}
+
+
+def run_backfills(
+    conn: sqlite3.Connection,
+    *,
+    batch_rows: int = DEFAULT_BACKFILL_BATCH_ROWS,
+    max_batches: int | None = None,
+    migrations: Sequence[SchemaMigration] | None = None,
+) -> Dict[str, str]:
+    """
+    Advance queued backfills in batches of `batch_rows`. Each batch commits
+    together with its cursor in `meta`, so writers interleave between batches
+    and an interrupted backfill resumes where it stopped. Returns each queued
+    backfill's state: "done" or the last processed id.
+    """
+    pending = pending_backfills(conn)
+    by_key = {_backfill_key(migration): migration for migration in (MIGRATIONS if migrations is None else migrations)}
+    batches = 0
+    status: Dict[str, str] = {}
+    for key in sorted(pending, key=lambda item: int(item.split(":")[1])):
+        migration = by_key.get(key)
+        after_id = pending[key]
+        if migration is None or migration.backfill is None:
+            upsert_meta(conn, key, "done")
+            conn.commit()
+            status[key] = "done"
+            continue
+        finished = False
+        while max_batches is None or batches < max_batches:
+            conn.commit()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                last_id = migration.backfill(conn, after_id, max(1, int(batch_rows)))
+                upsert_meta(conn, key, "done" if last_id is None else str(int(last_id)))
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            if last_id is None:
+                # Finishing steps do not count against `max_batches`.
+                finished = True
+                break
+            if int(last_id) == after_id:
+                # Waiting on an earlier backfill; retry on a later run.
+                break
+            batches += 1
+            after_id = int(last_id)
+        status[key] = "done" if finished else str(after_id)
+    return status
+
+
+def init_schema(conn: sqlite3.Connection) -> None:
+    migrate_schema(conn)
 
 
 def upsert_meta(conn: sqlite3.Connection, key: str, value: str) -> None:
@@ -645,15 +1502,50 @@ def repo_knowledge_needs_refresh(root: pathlib.Path, db_path: pathlib.Path) -> T
     return False, "up_to_date", meta
 
 
-def ensure_repo_knowledge_index(*, root: pathlib.Path, script: pathlib.Path, index_dir: str) -> Dict[str, object]:
+def ensure_repo_knowledge_index(
+    *,
+    root: pathlib.Path,
+    script: pathlib.Path,
+    index_dir: str,
+    bundle_dir: pathlib.Path | None = None,
+) -> Dict[str, object]:
     """
     Best-effort index refresh to avoid stale cold-start grounding.
+
+    With `bundle_dir` (or $CODEX_KNOWLEDGE_BUNDLE_DIR), a prebuilt bundle for the
+    current HEAD is restored instead of re-indexing; a miss falls back to `index`.
     """
     db_path = (root / index_dir / "repo_knowledge.sqlite3").resolve()
     needs, reason, meta = repo_knowledge_needs_refresh(root, db_path)
     if not needs:
         return {"refreshed": False, "reason": reason, "meta": meta}
 
+    if bundle_dir is None and os.environ.get(REPO_KNOWLEDGE_BUNDLE_DIR_ENV, "").strip():
+        bundle_dir = pathlib.Path(os.environ[REPO_KNOWLEDGE_BUNDLE_DIR_ENV].strip())
+    start = time.perf_counter()
+    if bundle_dir is not None and pathlib.Path(bundle_dir).is_dir():
+        restore_cmd = [
+            sys.executable,
+            str(script),
+            "--root",
+            str(root),
+            "--index-dir",
+            index_dir,
+            "import-bundle",
+            str(pathlib.Path(bundle_dir).resolve()),
+            *REPO_KNOWLEDGE_INDEX_ARGS,
+        ]
+        proc = subprocess.run(restore_cmd, cwd=str(root), capture_output=True, text=True, check=False)
+        if proc.returncode == 0:
+            still_needs, _still_reason, _meta = repo_knowledge_needs_refresh(root, db_path)
+            if not still_needs:
+                return {
+                    "refreshed": True,
+                    "reason": reason,
+                    "restored_from_bundle": True,
+                    "index_time_ms": round((time.perf_counter() - start) * 1000.0, 3),
+                }
+
     cmd = [
         sys.executable,
         str(script),
@@ -662,13 +1554,8 @@ def ensure_repo_knowledge_index(*, root: pathlib.Path, script: pathlib.Path, ind
         "--index-dir",
         index_dir,
         "index",
-        "--all-files",
-        "--embedding-provider",
-        "local",
-        "--ignore-dir",
-        ".codex_mem",
+        *REPO_KNOWLEDGE_INDEX_ARGS,
     ]
-    start = time.perf_counter()
     proc = subprocess.run(cmd, cwd=str(root), capture_output=True, text=True, check=False)
     elapsed_ms = (time.perf_counter() - start) * 1000.0
 
@@ -681,11 +1568,44 @@ def ensure_repo_knowledge_index(*, root: pathlib.Path, script: pathlib.Path, ind
             "index_stderr": trim_snippet(proc.stderr, 600),
         }
 
-    return {
+    result: Dict[str, object] = {
         "refreshed": True,
         "reason": reason,
         "index_time_ms": round(elapsed_ms, 3),
     }
+    profile = store_index_build_profile(db_path, proc.stdout)
+    if profile:
+        result["index_profile"] = profile
+    return result
+
+
+def store_index_build_profile(db_path: pathlib.Path, index_stdout: str) -> Dict[str, object]:
+    """
+    Keep the profile from an `index` summary in the index meta as `last_build_profile`.
+    """
+    # Only this refresh path needs repo_knowledge; keep it off the hook startup path.
+    from repo_knowledge import parse_json_summary
+
+    try:
+        summary = parse_json_summary(index_stdout)
+    except json.JSONDecodeError:
+        return {}
+    profile = summary.get("profile") if isinstance(summary, dict) else None
+    if not isinstance(profile, dict):
+        return {}
+    try:
+        conn = sqlite3.connect(db_path)
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO meta(key, value) VALUES('last_build_profile', ?)",
+                    (json.dumps(profile, ensure_ascii=False, sort_keys=True),),
+                )
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return {}
+    return profile
 
 
 def iso_day_range(anchor: dt.datetime) -> Tuple[str, str]:
@@ -865,9 +1785,43 @@ def db_counts(conn: sqlite3.Connection) -> Dict[str, int]:
             out[table] = int(conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0])
         except Exception:
             out[table] = 0
+    saved = dict(
+        conn.execute(
+            "SELECT key, value FROM meta WHERE key IN ('content_bytes_saved', 'dedup_bytes_saved', 'dedup_tokens_saved')"
+        ).fetchall()
+    )
+    for key in ("content_bytes_saved", "dedup_bytes_saved", "dedup_tokens_saved"):
+        out[key] = int(saved.get(key, 0))
     return out
 
 
+def has_repeated_content(conn: sqlite3.Connection) -> bool:
+    try:
+        return conn.execute("SELECT 1 FROM events WHERE content_ref IS NOT NULL LIMIT 1").fetchone() is not None
+    except sqlite3.OperationalError:
+        # Schema before content dedup.
+        return False
+
+
+def db_has_memory(conn: sqlite3.Connection) -> bool:
+    row = conn.execute(
+        "SELECT EXISTS(SELECT 1 FROM events) OR EXISTS(SELECT 1 FROM observations)"
+    ).fetchone()
+    return bool(row[0])
+
+
+def open_db_for_search(root: pathlib.Path, index_dir: str) -> sqlite3.Connection:
+    """
+    Search commands only write when `seed_repo_baseline` has to seed an empty
+    DB, so open read-only unless that is about to happen.
+    """
+    conn = open_db(root, index_dir, read_only=True)
+    if db_has_memory(conn):
+        return conn
+    conn.close()
+    return open_db(root, index_dir)
+
+
 def read_file_snippet(path: pathlib.Path, *, max_bytes: int = 64 * 1024) -> str:
     """
     Read a privacy-safer snippet for seeding.
@@ -956,8 +1910,7 @@ def seed_repo_baseline(conn: sqlite3.Connection, root: pathlib.Path, project: st
     When the DB is empty, seed a minimal baseline so Stage-1 search can return IDs.
     This avoids dead-ends where search/timeline/get cannot proceed.
     """
-    counts = db_counts(conn)
-    if counts.get("events", 0) > 0 or counts.get("observations", 0) > 0:
+    if db_has_memory(conn):
         return False
 
     seed_session_id = f"seed-{dt.datetime.now().strftime('%Y%m%d-%H%M%S')}"
@@ -1077,6 +2030,15 @@ def ensure_session(
     )
 
 
+def metadata_visibility(metadata: Mapping[str, object] | None) -> str:
+    """
+    Value of the indexed `visibility` column: "private" or "public".
+    """
+    privacy = (metadata or {}).get("privacy") or {}
+    visibility = privacy.get("visibility", "public") if isinstance(privacy, Mapping) else "public"
+    return "private" if str(visibility).lower() == "private" else "public"
+
+
 def insert_event(
     conn: sqlite3.Connection,
     *,
@@ -1091,50 +2053,75 @@ def insert_event(
     tags: Sequence[str],
     metadata: Mapping[str, object] | None,
     created_at: str | None = None,
+    vector_dim: int | None = None,
 ) -> int:
-    meta = fetch_meta(conn)
-    dim = int(meta.get("vector_dim", str(DEFAULT_VECTOR_DIM)))
-    vector_text = " ".join(
-        [
-            title or "",
-            content or "",
-            " ".join(tags),
-            tool_name or "",
-            file_path or "",
-            event_kind or "",
-        ]
-    )
-    vector_blob = pack_vector(vectorize_text(vector_text, dim))
+    text = content.strip()
+    visibility = metadata_visibility(metadata)
+    # Repeated content is neither stored, indexed nor embedded again.
+    content_hash = content_blob_hash(text)
+    owner_id = find_content_blob(conn, project, visibility, content_hash) if content_hash else None
+    vector_blob: bytes | None = None
+    if owner_id is None:
+        dim = vector_dim or int(fetch_meta(conn).get("vector_dim", str(DEFAULT_VECTOR_DIM)))
+        vector_text = " ".join(
+            [
+                title or "",
+                content or "",
+                " ".join(tags),
+                tool_name or "",
+                file_path or "",
+                event_kind or "",
+            ]
+        )
+        vector_blob = pack_vector(vectorize_text(vector_text, dim))
+        stored_content, content_codec, content_raw_bytes = encode_event_content(text)
+    else:
+        stored_content, content_codec, content_raw_bytes = "", "", None
     ts = created_at or now_iso()
     tags_clean = [t.strip().lower() for t in tags if t and t.strip()]
+    stored_title = title.strip() or event_kind
+    tags_json = json.dumps(tags_clean, ensure_ascii=False)
     row = conn.execute(
         """
         INSERT INTO events(
             session_id, project, event_kind, role, title, content,
-            tool_name, file_path, tags_json, metadata_json, created_at, vector
+            tool_name, file_path, tags_json, metadata_json, created_at, vector, visibility,
+            content_codec, content_raw_bytes, content_ref
         )
-        VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         """,
         (
             session_id,
             project,
             event_kind,
             role,
-            title.strip() or event_kind,
-            content.strip(),
+            stored_title,
+            stored_content,
             tool_name,
             file_path,
-            json.dumps(tags_clean, ensure_ascii=False),
+            tags_json,
             json.dumps(metadata or {}, ensure_ascii=False),
             ts,
             vector_blob,
+            visibility,
+            content_codec,
+            content_raw_bytes,
+            owner_id,
         ),
     )
     event_id = int(row.lastrowid)
-    conn.execute(
-        "INSERT INTO events_fts(rowid, title, content, tags) VALUES(?, ?, ?, ?)",
-        (event_id, title.strip() or event_kind, content.strip(), " ".join(tags_clean)),
-    )
+    if content_codec:
+        index_event_text(conn, event_id, stored_title, text, tags_json)
+    if content_hash:
+        track_content_blob(
+            conn,
+            project=project,
+            visibility=visibility,
+            content_hash=content_hash,
+            text=text,
+            event_id=event_id,
+            owner_id=owner_id,
+        )
     return event_id
 
 
@@ -1159,9 +2146,9 @@ def insert_observation(
         """
         INSERT INTO observations(
             session_id, project, observation_type, title, body,
-            source_event_ids_json, metadata_json, created_at, vector
+            source_event_ids_json, metadata_json, created_at, vector, visibility
         )
-        VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?)
+        VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         """,
         (
             session_id,
@@ -1173,18 +2160,17 @@ def insert_observation(
             json.dumps(metadata or {}, ensure_ascii=False),
             ts,
             vector_blob,
+            metadata_visibility(metadata),
         ),
     )
-    obs_id = int(row.lastrowid)
-    tags = [observation_type, project]
-    conn.execute(
-        "INSERT INTO observations_fts(rowid, title, body, tags) VALUES(?, ?, ?, ?)",
-        (obs_id, title.strip() or observation_type, body.strip(), " ".join(tags)),
-    )
-    return obs_id
+    return int(row.lastrowid)
 
 
-def build_fts_query(query: str) -> str:
+def build_fts_query(query: str, min_prefix_chars: int = 1) -> str:
+    """
+    OR of up to 12 distinct query tokens. Tokens of at least `min_prefix_chars`
+    characters become `tok*` prefix terms; shorter ones must match exactly.
+    """
     toks = [tok for tok in tokenize(query) if tok]
     if not toks:
         return ""
@@ -1197,10 +2183,21 @@ def build_fts_query(query: str) -> str:
         uniq.append(tok)
     if not uniq:
         return ""
-    fragments = [f"{tok}*" for tok in uniq[:12]]
+    fragments = [f"{tok}*" if len(tok) >= min_prefix_chars else tok for tok in uniq[:12]]
     return " OR ".join(fragments)
 
 
+def fts_min_prefix_chars(conn: sqlite3.Connection, table: str) -> int:
+    """
+    Shortest prefix query `table` can answer from a prefix index. Without one,
+    only tokens longer than the default shortest prefix are expanded.
+    """
+    lengths = fts_table_prefix(conn, table).split()
+    if lengths:
+        return int(lengths[0])
+    return int(DEFAULT_FTS_PREFIX.split()[0]) + 1
+
+
 def db_supports_fts5(conn: sqlite3.Connection) -> bool:
     row = conn.execute(
         "SELECT name FROM sqlite_master WHERE type='table' AND name='events_fts'"
@@ -1221,27 +2218,70 @@ def search_events(
 ) -> List[sqlite3.Row]:
     if not db_supports_fts5(conn):
         return []
-    match_query = build_fts_query(query)
+    match_query = build_fts_query(query, fts_min_prefix_chars(conn, "events_fts"))
     if not match_query:
         return []
-    clauses = ["events_fts MATCH ?"]
-    params: List[object] = [match_query]
+    # Filters on the events table, written for an `{alias}` of it.
+    filters: List[str] = []
+    params: List[object] = []
     if project:
-        clauses.append("e.project = ?")
+        filters.append("{alias}.project = ?")
         params.append(project)
     if session_id:
-        clauses.append("e.session_id = ?")
+        filters.append("{alias}.session_id = ?")
         params.append(session_id)
     if since:
-        clauses.append("e.created_at >= ?")
+        filters.append("{alias}.created_at >= ?")
         params.append(since)
     if until:
-        clauses.append("e.created_at <= ?")
+        filters.append("{alias}.created_at <= ?")
         params.append(until)
     if not include_private:
-        clauses.append("COALESCE(json_extract(e.metadata_json, '$.privacy.visibility'), 'public') != 'private'")
-    where_sql = " AND ".join(clauses)
+        filters.append("{alias}.visibility = 'public'")
+
+    def filters_on(alias: str) -> str:
+        return " AND ".join(clause.format(alias=alias) for clause in filters) or "1"
+
+    if not has_repeated_content(conn):
+        sql = f"""
+            SELECT
+                e.id,
+                e.project,
+                e.session_id,
+                e.event_kind,
+                e.title,
+                e.created_at,
+                e.vector,
+                e.id AS content_id,
+                bm25(events_fts) AS bm25
+            FROM events_fts
+            JOIN events e ON e.id = events_fts.rowid
+            WHERE events_fts MATCH ? AND {filters_on("e")}
+            ORDER BY bm25(events_fts)
+            LIMIT ?
+        """
+        return conn.execute(sql, [match_query, *params, limit]).fetchall()
+
+    # Repeats store no text, so a content hit on the event holding it stands
+    # for every event that repeats it too; `content_id` lets callers collapse
+    # them. Every kept hit yields at least one row (itself or a repeat that
+    # passes the filters) and repeats rank with their hit, so the best `limit`
+    # hits hold the best `limit` rows.
     sql = f"""
+        WITH hits AS MATERIALIZED (
+            SELECT e.id AS id, bm25(events_fts) AS bm25
+            FROM events_fts
+            JOIN events e ON e.id = events_fts.rowid
+            WHERE events_fts MATCH ? AND (
+                ({filters_on("e")})
+                OR EXISTS (
+                    SELECT 1 FROM events r INDEXED BY idx_events_content_ref
+                    WHERE r.content_ref = e.id AND {filters_on("r")}
+                )
+            )
+            ORDER BY bm25(events_fts)
+            LIMIT ?
+        )
         SELECT
             e.id,
             e.project,
@@ -1249,16 +2289,33 @@ def search_events(
             e.event_kind,
             e.title,
             e.created_at,
-            e.vector,
-            bm25(events_fts) AS bm25
-        FROM events_fts
-        JOIN events e ON e.id = events_fts.rowid
-        WHERE {where_sql}
-        ORDER BY bm25(events_fts)
+            COALESCE(e.vector, (SELECT src.vector FROM events src WHERE src.id = e.content_ref)) AS vector,
+            COALESCE(e.content_ref, e.id) AS content_id,
+            hits.bm25 AS bm25
+        FROM hits
+        JOIN events e ON e.id = hits.id
+        WHERE {filters_on("e")}
+        UNION ALL
+        SELECT
+            e.id,
+            e.project,
+            e.session_id,
+            e.event_kind,
+            e.title,
+            e.created_at,
+            hit.vector,
+            hit.id AS content_id,
+            hits.bm25 AS bm25
+        FROM hits
+        JOIN events hit ON hit.id = hits.id
+        JOIN events e INDEXED BY idx_events_content_ref ON e.content_ref = hit.id
+        WHERE {filters_on("e")} AND e.id NOT IN (SELECT id FROM hits)
+        ORDER BY bm25, created_at DESC
         LIMIT ?
     """
-    params.append(limit)
-    return conn.execute(sql, params).fetchall()
+    # A repeat whose own title or tags match is already a hit: the second
+    # branch skips it so it is returned once.
+    return conn.execute(sql, [match_query, *params, *params, limit, *params, *params, limit]).fetchall()
 
 
 def search_observations(
@@ -1274,7 +2331,7 @@ def search_observations(
 ) -> List[sqlite3.Row]:
     if not db_supports_fts5(conn):
         return []
-    match_query = build_fts_query(query)
+    match_query = build_fts_query(query, fts_min_prefix_chars(conn, "observations_fts"))
     if not match_query:
         return []
     clauses = ["observations_fts MATCH ?"]
@@ -1292,7 +2349,7 @@ def search_observations(
         clauses.append("o.created_at <= ?")
         params.append(until)
     if not include_private:
-        clauses.append("COALESCE(json_extract(o.metadata_json, '$.privacy.visibility'), 'public') != 'private'")
+        clauses.append("o.visibility = 'public'")
     where_sql = " AND ".join(clauses)
     sql = f"""
         SELECT
@@ -1353,7 +2410,13 @@ def blended_search(
     raw_semantic: Dict[str, float] = {}
     stash: Dict[str, SearchResult] = {}
 
+    by_content: Dict[int, SearchResult] = {}
     for row in event_rows:
+        # Rows come best-first, newest first among repeats of the same content.
+        kept = by_content.get(int(row["content_id"]))
+        if kept is not None:
+            kept.duplicates += 1
+            continue
         key = f"E{int(row['id'])}"
         bm = float(row["bm25"]) if row["bm25"] is not None else 0.0
         lexical = 1.0 / (1.0 + abs(bm))
@@ -1375,6 +2438,7 @@ def blended_search(
             token_estimate=estimate_tokens(f"{key} {title} {row['event_kind']}"),
         )
         stash[key] = item
+        by_content[int(row["content_id"])] = item
 
     for row in obs_rows:
         key = f"O{int(row['id'])}"
@@ -1520,8 +2584,9 @@ def timeline_for_event(
     include_private: bool = False,
 ) -> Dict[str, object]:
     anchor = conn.execute(
-        """
-        SELECT id, session_id, project, event_kind, title, content, tool_name, file_path, created_at, metadata_json
+        f"""
+        SELECT id, session_id, project, event_kind, title, {EVENT_CONTENT_COLUMNS}, tool_name, file_path,
+               created_at, metadata_json
         FROM events WHERE id = ?
         """,
         (event_id,),
@@ -1539,10 +2604,10 @@ def timeline_for_event(
     created_at = str(anchor["created_at"])
     private_clause = ""
     if not include_private:
-        private_clause = " AND COALESCE(json_extract(metadata_json, '$.privacy.visibility'), 'public') != 'private'"
+        private_clause = " AND visibility = 'public'"
     before_rows = conn.execute(
-        """
-        SELECT id, event_kind, title, content, created_at
+        f"""
+        SELECT id, event_kind, title, {EVENT_CONTENT_COLUMNS}, created_at
         FROM events
         WHERE session_id = ? AND created_at < ?""" + private_clause + """
         ORDER BY created_at DESC
@@ -1551,8 +2616,8 @@ def timeline_for_event(
         (session_id, created_at, max(0, before)),
     ).fetchall()
     after_rows = conn.execute(
-        """
-        SELECT id, event_kind, title, content, created_at
+        f"""
+        SELECT id, event_kind, title, {EVENT_CONTENT_COLUMNS}, created_at
         FROM events
         WHERE session_id = ? AND created_at > ?""" + private_clause + """
         ORDER BY created_at ASC
@@ -1567,7 +2632,7 @@ def timeline_for_event(
             "project": str(anchor["project"]),
             "kind": str(anchor["event_kind"]),
             "title": str(anchor["title"]),
-            "content": str(anchor["content"]),
+            "content": event_content(anchor),
             "tool_name": anchor["tool_name"],
             "file_path": anchor["file_path"],
             "created_at": created_at,
@@ -1577,11 +2642,9 @@ def timeline_for_event(
                 "id": f"E{int(row['id'])}",
                 "kind": str(row["event_kind"]),
                 "title": str(row["title"]),
-                "snippet": trim_snippet(str(row["content"]), snippet_chars),
+                "snippet": event_snippet(row, snippet_chars),
                 "created_at": str(row["created_at"]),
-                "token_estimate": estimate_tokens(
-                    f"{row['title']} {trim_snippet(str(row['content']), snippet_chars)}"
-                ),
+                "token_estimate": estimate_tokens(f"{row['title']} {event_snippet(row, snippet_chars)}"),
             }
             for row in before_rows
         ],
@@ -1590,11 +2653,9 @@ def timeline_for_event(
                 "id": f"E{int(row['id'])}",
                 "kind": str(row["event_kind"]),
                 "title": str(row["title"]),
-                "snippet": trim_snippet(str(row["content"]), snippet_chars),
+                "snippet": event_snippet(row, snippet_chars),
                 "created_at": str(row["created_at"]),
-                "token_estimate": estimate_tokens(
-                    f"{row['title']} {trim_snippet(str(row['content']), snippet_chars)}"
-                ),
+                "token_estimate": estimate_tokens(f"{row['title']} {event_snippet(row, snippet_chars)}"),
             }
             for row in after_rows
         ],
@@ -1667,8 +2728,8 @@ def get_item_detail(
 ) -> Dict[str, object]:
     if item_type == "event":
         row = conn.execute(
-            """
-            SELECT id, session_id, project, event_kind, role, title, content, tool_name, file_path,
+            f"""
+            SELECT id, session_id, project, event_kind, role, title, {EVENT_CONTENT_COLUMNS}, tool_name, file_path,
                    tags_json, metadata_json, created_at
             FROM events WHERE id = ?
             """,
@@ -1682,7 +2743,7 @@ def get_item_detail(
         visibility = str(((metadata.get("privacy") or {}).get("visibility", "public"))).lower()
         if visibility == "private" and not include_private:
             raise ValueError(f"event is private: E{item_id}")
-        content = str(row["content"])
+        content = event_content(row)
         return {
             "id": f"E{int(row['id'])}",
             "item_type": "event",
@@ -1737,8 +2798,8 @@ def get_item_detail(
 
 def summarize_session(conn: sqlite3.Connection, session_id: str) -> Dict[str, object]:
     rows = conn.execute(
-        """
-        SELECT id, event_kind, role, title, content, tool_name, created_at, metadata_json
+        f"""
+        SELECT id, event_kind, role, title, {EVENT_CONTENT_COLUMNS}, tool_name, created_at, metadata_json
         FROM events
         WHERE session_id = ?
         ORDER BY created_at ASC, id ASC
@@ -1766,10 +2827,11 @@ def summarize_session(conn: sqlite3.Connection, session_id: str) -> Dict[str, ob
         visible_rows.append(row)
 
     source_ids = [int(row["id"]) for row in visible_rows]
+    contents = [event_content(row) for row in visible_rows]
 
-    for row in visible_rows:
+    for row, content in zip(visible_rows, contents):
         title = str(row["title"] or "").strip()
-        content = str(row["content"] or "").strip()
+        content = content.strip()
         kind = str(row["event_kind"])
         tool = str(row["tool_name"] or "").strip().lower()
         joined = f"{title}\n{content}".lower()
@@ -1788,9 +2850,7 @@ def summarize_session(conn: sqlite3.Connection, session_id: str) -> Dict[str, ob
     if not investigation and visible_rows:
         investigation = [str(row["title"]) for row in visible_rows if str(row["title"]).strip()][:5]
     if not learnings:
-        learnings = [
-            trim_snippet(str(row["content"]), 120) for row in visible_rows if str(row["content"]).strip()
-        ][:3]
+        learnings = [trim_snippet(content, 120) for content in contents if content.strip()][:3]
     if not completed:
         completed = [item for item in investigation[:3]]
     if not next_steps:
@@ -1838,7 +2898,6 @@ def summarize_session(conn: sqlite3.Connection, session_id: str) -> Dict[str, ob
     stale_ids = [int(row["id"]) for row in stale_rows]
     if stale_ids:
         conn.executemany("DELETE FROM observations WHERE id = ?", [(oid,) for oid in stale_ids])
-        conn.executemany("DELETE FROM observations_fts WHERE rowid = ?", [(oid,) for oid in stale_ids])
 
     for obs_type, key in (
         ("investigation", "investigation"),
@@ -1938,9 +2997,40 @@ def cmd_init(args: argparse.Namespace) -> int:
     return 0
 
 
-def cmd_session_start(args: argparse.Namespace) -> int:
+def cmd_migrate(args: argparse.Namespace) -> int:
     root = pathlib.Path(args.root).resolve()
     conn = open_db(root, args.index_dir)
+    try:
+        if args.fts_prefix is not None:
+            try:
+                prefix = parse_fts_prefix(args.fts_prefix)
+            except ValueError as exc:
+                print(json.dumps({"ok": False, "error": str(exc)}, ensure_ascii=False, indent=2))
+                return 2
+            conn.execute("BEGIN IMMEDIATE")
+            start_fts_prefix_rebuild(conn, prefix)
+            conn.commit()
+        backfills = run_backfills(
+            conn,
+            batch_rows=args.batch_rows,
+            max_batches=args.max_batches if args.max_batches > 0 else None,
+        )
+        payload = {
+            "ok": True,
+            "db": str(root / args.index_dir / DEFAULT_DB_NAME),
+            "schema_version": int(conn.execute("PRAGMA user_version").fetchone()[0]),
+            "migrations": [f"{migration.version}:{migration.name}" for migration in MIGRATIONS],
+            "backfills": backfills,
+            "pending_backfills": sorted(pending_backfills(conn)),
+            "fts_prefix": {table: fts_table_prefix(conn, table) for table in ("events_fts", "observations_fts")},
+        }
+    finally:
+        conn.close()
+    print(json.dumps(payload, ensure_ascii=False, indent=2))
+    return 0
+
+
+def apply_session_start(conn: sqlite3.Connection, args: argparse.Namespace) -> Dict[str, object]:
     ensure_session(
         conn,
         session_id=args.session_id,
@@ -1961,14 +3051,10 @@ def cmd_session_start(args: argparse.Namespace) -> int:
         tags=["session", "start"],
         metadata={"hook": "SessionStart"},
     )
-    conn.commit()
-    print(json.dumps({"ok": True, "session_id": args.session_id, "hook": "SessionStart"}, ensure_ascii=False))
-    return 0
+    return {"ok": True, "session_id": args.session_id, "hook": "SessionStart"}
 
 
-def cmd_user_prompt_submit(args: argparse.Namespace) -> int:
-    root = pathlib.Path(args.root).resolve()
-    conn = open_db(root, args.index_dir)
+def apply_user_prompt_submit(conn: sqlite3.Connection, args: argparse.Namespace) -> Dict[str, object]:
     ensure_session(conn, args.session_id, args.project)
     event_id = insert_event(
         conn,
@@ -1983,42 +3069,48 @@ def cmd_user_prompt_submit(args: argparse.Namespace) -> int:
         tags=["prompt", "user"],
         metadata={"hook": "UserPromptSubmit"},
     )
-    conn.commit()
-    print(json.dumps({"ok": True, "event_id": f"E{event_id}", "hook": "UserPromptSubmit"}, ensure_ascii=False))
-    return 0
+    return {"ok": True, "event_id": f"E{event_id}", "hook": "UserPromptSubmit"}
 
 
-def cmd_post_tool_use(args: argparse.Namespace) -> int:
-    root = pathlib.Path(args.root).resolve()
-    conn = open_db(root, args.index_dir)
-    ensure_session(conn, args.session_id, args.project)
-    runtime_cfg = get_runtime_config(conn)
-    semantic_tags = ["tool", args.tool_name.strip().lower()]
-    if args.tag:
-        semantic_tags.extend(args.tag)
+def record_tool_use(
+    conn: sqlite3.Connection,
+    runtime_cfg: Mapping[str, object],
+    *,
+    session_id: str,
+    project: str,
+    tool_name: str,
+    content: str,
+    title: str | None = None,
+    file_path: str | None = None,
+    exit_code: int = 0,
+    tags: Sequence[str] = (),
+    privacy_tags: Sequence[str] = (),
+    compact: bool = False,
+    compact_chars: int = DEFAULT_TOOL_COMPACT_CHARS,
+    vector_dim: int | None = None,
+) -> Dict[str, object]:
+    """
+    Apply PostToolUse privacy, compaction and tagging to one tool event and insert
+    it. Does not commit. Returns the hook payload (`skipped` for blocked events).
+    """
+    semantic_tags = ["tool", tool_name.strip().lower()]
+    semantic_tags.extend(tags)
     semantic_tags_clean = [t.strip().lower() for t in semantic_tags if t and t.strip()]
 
-    privacy_tags = [t.strip().lower() for t in (args.privacy_tag or []) if t and t.strip()]
+    privacy_tags = [t.strip().lower() for t in privacy_tags if t and t.strip()]
     if any(tag in PRIVACY_BLOCK_TAGS for tag in privacy_tags):
-        print(
-            json.dumps(
-                {
-                    "ok": True,
-                    "hook": "PostToolUse",
-                    "skipped": True,
-                    "reason": "blocked_by_privacy_tag",
-                    "blocked_tags": [t for t in privacy_tags if t in PRIVACY_BLOCK_TAGS],
-                },
-                ensure_ascii=False,
-            )
-        )
-        return 0
+        return {
+            "ok": True,
+            "hook": "PostToolUse",
+            "skipped": True,
+            "reason": "blocked_by_privacy_tag",
+            "blocked_tags": [t for t in privacy_tags if t in PRIVACY_BLOCK_TAGS],
+        }
 
-    content = args.content
     compact_meta: Dict[str, int] = {"raw_chars": len(content), "final_chars": len(content), "compacted": 0}
     auto_compact = bool(runtime_cfg.get("channel") == "beta" and runtime_cfg.get("beta_endless_mode"))
-    compact_enabled = bool(args.compact or auto_compact)
-    compact_chars = args.compact_chars if args.compact else min(args.compact_chars, 2000)
+    compact_enabled = bool(compact or auto_compact)
+    compact_chars = compact_chars if compact else min(compact_chars, 2000)
     if compact_enabled:
         content, compact_meta = compact_tool_output(content, compact_chars)
 
@@ -2036,40 +3128,171 @@ def cmd_post_tool_use(args: argparse.Namespace) -> int:
 
     meta: Dict[str, object] = {
         "hook": "PostToolUse",
-        "exit_code": args.exit_code,
+        "exit_code": exit_code,
         "compaction": compact_meta,
-        "auto_compaction": bool(auto_compact and not args.compact),
+        "auto_compaction": bool(auto_compact and not compact),
         "privacy": privacy_meta,
     }
     event_id = insert_event(
         conn,
-        session_id=args.session_id,
-        project=args.project,
+        session_id=session_id,
+        project=project,
         event_kind="post_tool_use",
         role="tool",
-        title=args.title or f"Tool {args.tool_name}",
+        title=title or f"Tool {tool_name}",
         content=content,
-        tool_name=args.tool_name,
-        file_path=args.file_path,
+        tool_name=tool_name,
+        file_path=file_path,
         tags=semantic_tags_clean,
         metadata=meta,
+        vector_dim=vector_dim,
     )
-    conn.commit()
-    payload = {
+    return {
         "ok": True,
         "event_id": f"E{event_id}",
         "hook": "PostToolUse",
         "compaction": compact_meta,
-        "auto_compaction": bool(auto_compact and not args.compact),
+        "auto_compaction": bool(auto_compact and not compact),
         "privacy": privacy_meta,
     }
-    print(json.dumps(payload, ensure_ascii=False))
-    return 0
 
 
-def cmd_stop(args: argparse.Namespace) -> int:
+def _batch_str(record: Mapping[str, object], key: str, default: str | None = None) -> str | None:
+    value = record.get(key, default)
+    if value is None:
+        return None
+    if not isinstance(value, (str, int, float)):
+        raise ValueError(f"`{key}` must be a string")
+    return str(value)
+
+
+def _batch_int(record: Mapping[str, object], key: str, default: int) -> int:
+    value = record.get(key, default)
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str) and re.fullmatch(r"\s*[+-]?\d+\s*", value):
+        return int(value)
+    raise ValueError(f"`{key}` must be an integer")
+
+
+def _batch_bool(record: Mapping[str, object], key: str, default: bool) -> bool:
+    value = record.get(key, default)
+    if not isinstance(value, bool):
+        raise ValueError(f"`{key}` must be true or false")
+    return value
+
+
+def _batch_list(record: Mapping[str, object], key: str) -> List[str]:
+    value = record.get(key) or []
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, list):
+        raise ValueError(f"`{key}` must be a list of strings")
+    return [str(item) for item in value]
+
+
+def read_tool_use_batch(lines: Iterable[str], args: argparse.Namespace) -> List[Dict[str, object]]:
+    """
+    Parse PostToolUse JSONL records. Fields mirror the CLI flags (`session_id`,
+    `tool_name`, `content`, `title`, `file_path`, `exit_code`, `tags`,
+    `privacy_tags`, `compact`, `compact_chars`, `project`); missing ones fall back
+    to the command line. `compact` must be a JSON boolean; `exit_code` and
+    `compact_chars` take integers or digit strings. Raises ValueError naming
+    the first bad line.
+    """
+    events: List[Dict[str, object]] = []
+    for line_no, raw in enumerate(lines, start=1):
+        if not raw.strip():
+            continue
+        try:
+            record = json.loads(raw)
+            if not isinstance(record, dict):
+                raise ValueError("expected a JSON object")
+            event = {
+                "session_id": _batch_str(record, "session_id", args.session_id),
+                "project": _batch_str(record, "project", args.project),
+                "tool_name": _batch_str(record, "tool_name", args.tool_name),
+                "content": _batch_str(record, "content", "") or "",
+                "title": _batch_str(record, "title", args.title),
+                "file_path": _batch_str(record, "file_path", args.file_path),
+                "exit_code": _batch_int(record, "exit_code", args.exit_code),
+                "tags": list(args.tag or []) + _batch_list(record, "tags"),
+                "privacy_tags": list(args.privacy_tag or []) + _batch_list(record, "privacy_tags"),
+                "compact": _batch_bool(record, "compact", bool(args.compact)),
+                "compact_chars": _batch_int(record, "compact_chars", args.compact_chars),
+            }
+        except (ValueError, TypeError) as exc:
+            raise ValueError(f"line {line_no}: {exc}") from exc
+        if not event["session_id"] or not event["tool_name"]:
+            raise ValueError(f"line {line_no}: `session_id` and `tool_name` are required")
+        events.append(event)
+    return events
+
+
+def cmd_post_tool_use_batch(args: argparse.Namespace) -> int:
+    try:
+        if args.batch == "-":
+            events = read_tool_use_batch(sys.stdin, args)
+        else:
+            with open(args.batch, encoding="utf-8") as fh:
+                events = read_tool_use_batch(fh, args)
+    except (OSError, ValueError) as exc:
+        print(json.dumps({"ok": False, "hook": "PostToolUse", "batch": True, "error": str(exc)}, ensure_ascii=False))
+        return 2
+
     root = pathlib.Path(args.root).resolve()
     conn = open_db(root, args.index_dir)
+    runtime_cfg = get_runtime_config(conn)
+    dim = int(fetch_meta(conn).get("vector_dim", str(DEFAULT_VECTOR_DIM)))
+    event_ids: List[str | None] = []
+    sessions: set[str] = set()
+    try:
+        for event in events:
+            session_id = str(event["session_id"])
+            if session_id not in sessions:
+                ensure_session(conn, session_id, str(event["project"]))
+                sessions.add(session_id)
+            result = record_tool_use(conn, runtime_cfg, vector_dim=dim, **event)
+            event_ids.append(None if result.get("skipped") else str(result["event_id"]))
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    payload = {
+        "ok": True,
+        "hook": "PostToolUse",
+        "batch": True,
+        "count": len(events),
+        "inserted": sum(1 for event_id in event_ids if event_id),
+        "skipped": sum(1 for event_id in event_ids if not event_id),
+        "event_ids": event_ids,
+    }
+    print(json.dumps(payload, ensure_ascii=False))
+    return 0
+
+
+def apply_post_tool_use(conn: sqlite3.Connection, args: argparse.Namespace) -> Dict[str, object]:
+    ensure_session(conn, args.session_id, args.project)
+    return record_tool_use(
+        conn,
+        get_runtime_config(conn),
+        session_id=args.session_id,
+        project=args.project,
+        tool_name=args.tool_name,
+        content=args.content,
+        title=args.title,
+        file_path=args.file_path,
+        exit_code=args.exit_code,
+        tags=args.tag or [],
+        privacy_tags=args.privacy_tag or [],
+        compact=args.compact,
+        compact_chars=args.compact_chars,
+    )
+
+
+def apply_stop(conn: sqlite3.Connection, args: argparse.Namespace) -> Dict[str, object]:
     ensure_session(conn, args.session_id, args.project)
     event_id = insert_event(
         conn,
@@ -2084,14 +3307,10 @@ def cmd_stop(args: argparse.Namespace) -> int:
         tags=["stop"],
         metadata={"hook": "Stop"},
     )
-    conn.commit()
-    print(json.dumps({"ok": True, "event_id": f"E{event_id}", "hook": "Stop"}, ensure_ascii=False))
-    return 0
+    return {"ok": True, "event_id": f"E{event_id}", "hook": "Stop"}
 
 
-def cmd_session_end(args: argparse.Namespace) -> int:
-    root = pathlib.Path(args.root).resolve()
-    conn = open_db(root, args.index_dir)
+def apply_session_end(conn: sqlite3.Connection, args: argparse.Namespace) -> Dict[str, object]:
     ensure_session(conn, args.session_id, args.project)
     insert_event(
         conn,
@@ -2113,11 +3332,400 @@ def cmd_session_end(args: argparse.Namespace) -> int:
     summary = None
     if not args.skip_summary:
         summary = summarize_session(conn, args.session_id)
-    conn.commit()
     payload: Dict[str, object] = {"ok": True, "session_id": args.session_id, "hook": "SessionEnd"}
     if summary:
         payload["summary"] = summary
-    print(json.dumps(payload, ensure_ascii=False, indent=2))
+    return payload
+
+
+# Hook subcommands: how to apply each one to an open connection, and the
+# `indent` its JSON payload is printed with.
+HOOK_APPLIERS: Dict[str, Tuple[Callable[[sqlite3.Connection, argparse.Namespace], Dict[str, object]], int | None]] = {
+    "session-start": (apply_session_start, None),
+    "user-prompt-submit": (apply_user_prompt_submit, None),
+    "post-tool-use": (apply_post_tool_use, None),
+    "stop": (apply_stop, None),
+    "session-end": (apply_session_end, 2),
+}
+
+
+def hook_socket_path(root: pathlib.Path, index_dir: str) -> pathlib.Path:
+    return root / index_dir / DEFAULT_HOOK_SOCKET_NAME
+
+
+def _hook_request_args(args: argparse.Namespace) -> Dict[str, object]:
+    return {key: value for key, value in vars(args).items() if key != "func"}
+
+
+def forward_hook_to_daemon(args: argparse.Namespace) -> int | None:
+    """
+    Send a hook to a running `serve-hooks` daemon for this root/index dir and
+    print its payload. Returns None (run locally) when no daemon listens, or
+    when it fails or does not answer: a failed daemon request has written
+    nothing, so the local write is the only copy.
+    """
+    if getattr(args, "no_daemon", False) or not hasattr(socket, "AF_UNIX"):
+        return None
+    path = hook_socket_path(pathlib.Path(args.root).resolve(), args.index_dir)
+    if not path.exists():
+        return None
+    request = json.dumps({"op": "hook", "args": _hook_request_args(args)}, ensure_ascii=False) + "\n"
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(DEFAULT_HOOK_CLIENT_TIMEOUT_SEC)
+        try:
+            sock.connect(str(path))
+        except OSError:
+            # Stale socket file from a daemon that is gone.
+            return None
+        try:
+            sock.sendall(request.encode("utf-8"))
+            with sock.makefile("r", encoding="utf-8") as reader:
+                line = reader.readline()
+            response = json.loads(line) if line else {}
+        except (OSError, ValueError) as exc:
+            response = {"ok": False, "error": f"hook daemon did not answer: {exc}"}
+    finally:
+        sock.close()
+    if not response.get("ok"):
+        print(f"hook daemon failed ({response.get('error', 'unknown error')}); writing directly.", file=sys.stderr)
+        return None
+    print(json.dumps(response.get("payload", {}), ensure_ascii=False, indent=response.get("indent")))
+    return 0
+
+
+def run_hook_command(args: argparse.Namespace) -> int:
+    forwarded = forward_hook_to_daemon(args)
+    if forwarded is not None:
+        return forwarded
+    apply, indent = HOOK_APPLIERS[args.command]
+    root = pathlib.Path(args.root).resolve()
+    conn = open_db(root, args.index_dir)
+    payload = apply(conn, args)
+    if not payload.get("skipped"):
+        conn.commit()
+    print(json.dumps(payload, ensure_ascii=False, indent=indent))
+    return 0
+
+
+def cmd_session_start(args: argparse.Namespace) -> int:
+    return run_hook_command(args)
+
+
+def cmd_user_prompt_submit(args: argparse.Namespace) -> int:
+    return run_hook_command(args)
+
+
+def cmd_post_tool_use(args: argparse.Namespace) -> int:
+    if args.batch:
+        return cmd_post_tool_use_batch(args)
+    if not args.session_id or not args.tool_name or args.content is None:
+        print("post-tool-use needs session_id, tool_name and content (or --batch FILE).", file=sys.stderr)
+        return 2
+    return run_hook_command(args)
+
+
+def cmd_stop(args: argparse.Namespace) -> int:
+    return run_hook_command(args)
+
+
+def cmd_session_end(args: argparse.Namespace) -> int:
+    return run_hook_command(args)
+
+
+class _PendingHook:
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.args = args
+        self.done = threading.Event()
+        self.response: Dict[str, object] = {}
+        self._lock = threading.Lock()
+        self._state = "queued"
+
+    def claim(self) -> bool:
+        """
+        Writer side: take the request unless its client stopped waiting.
+        """
+        with self._lock:
+            if self._state != "queued":
+                return False
+            self._state = "claimed"
+            return True
+
+    def cancel(self) -> bool:
+        """
+        Client side: withdraw the request if the writer has not taken it yet.
+        """
+        with self._lock:
+            if self._state != "queued":
+                return False
+            self._state = "cancelled"
+            return True
+
+
+class HookDaemon:
+    """
+    Applies hook requests from `serve-hooks` clients on one long-lived SQLite
+    connection. A single writer thread applies each request inside a savepoint
+    and commits once `commit_interval_sec` after the first uncommitted write (or
+    when idle), answering every request in the group only after its commit.
+    While a schema backfill is pending, idle periods advance it a batch at a time.
+    """
+
+    def __init__(
+        self,
+        root: pathlib.Path,
+        index_dir: str,
+        *,
+        socket_path: pathlib.Path | None = None,
+        commit_interval_sec: float = DEFAULT_HOOK_COMMIT_INTERVAL_MS / 1000.0,
+        queue_timeout_sec: float = DEFAULT_HOOK_QUEUE_TIMEOUT_SEC,
+    ) -> None:
+        self.root = root
+        self.index_dir = index_dir
+        self.socket_path = socket_path or hook_socket_path(root, index_dir)
+        self.commit_interval_sec = max(0.0, commit_interval_sec)
+        self.queue_timeout_sec = max(0.0, queue_timeout_sec)
+        self.requests: "queue.Queue[_PendingHook | None]" = queue.Queue()
+        self.stats = {"requests": 0, "errors": 0, "commits": 0, "max_group": 0}
+        self.server: socketserver.ThreadingUnixStreamServer | None = None
+        self.writer: threading.Thread | None = None
+        self.ready = threading.Event()
+        self.stopped = threading.Event()
+        self.open_error: BaseException | None = None
+
+    def start(self) -> None:
+        self.writer = threading.Thread(target=self._write_loop, name="codex-mem-hook-writer", daemon=True)
+        self.writer.start()
+        self.ready.wait()
+        if self.open_error is not None:
+            raise self.open_error
+        if self.socket_path.exists():
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(str(self.socket_path))
+            except OSError:
+                self.socket_path.unlink()
+            else:
+                self.close()
+                raise RuntimeError(f"a hook daemon is already listening on {self.socket_path}")
+            finally:
+                probe.close()
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self) -> None:
+                for raw in self.rfile:
+                    response = daemon.handle_line(raw.decode("utf-8", errors="replace"))
+                    self.wfile.write((json.dumps(response, ensure_ascii=False) + "\n").encode("utf-8"))
+                    self.wfile.flush()
+
+        self.server = socketserver.ThreadingUnixStreamServer(str(self.socket_path), Handler)
+        self.server.daemon_threads = True
+
+    def serve_forever(self) -> None:
+        if self.server is not None:
+            self.server.serve_forever(poll_interval=0.2)
+
+    def shutdown(self) -> None:
+        """
+        Stop `serve_forever` from another thread (signal handlers use this).
+        """
+        if self.server is not None:
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+
+    def close(self) -> None:
+        if self.server is not None:
+            self.server.server_close()
+            self.server = None
+            try:
+                self.socket_path.unlink()
+            except OSError:
+                pass
+        if self.writer is not None:
+            self.requests.put(None)
+            self.writer.join()
+            self.writer = None
+
+    def handle_line(self, raw: str) -> Dict[str, object]:
+        try:
+            request = json.loads(raw)
+        except ValueError as exc:
+            return {"ok": False, "error": f"bad request: {exc}"}
+        op = request.get("op") if isinstance(request, dict) else None
+        if op == "stats":
+            return {"ok": True, "stats": dict(self.stats)}
+        if op != "hook" or not isinstance(request.get("args"), dict):
+            return {"ok": False, "error": "expected {\"op\": \"hook\", \"args\": {...}}"}
+        args = argparse.Namespace(**request["args"])
+        if getattr(args, "command", None) not in HOOK_APPLIERS or getattr(args, "batch", None):
+            return {"ok": False, "error": f"not a hook command: {getattr(args, 'command', None)}"}
+        if self.stopped.is_set():
+            return {"ok": False, "error": "hook writer is not running"}
+        pending = _PendingHook(args)
+        self.requests.put(pending)
+        deadline = time.monotonic() + self.queue_timeout_sec
+        while not pending.done.wait(0.05):
+            if self.stopped.is_set():
+                pending.cancel()
+                return {"ok": False, "error": "hook writer stopped before answering"}
+            if time.monotonic() >= deadline and pending.cancel():
+                return {"ok": False, "error": "hook writer is busy; request was not applied"}
+        return pending.response
+
+    def _write_loop(self) -> None:
+        try:
+            conn = open_db(self.root, self.index_dir)
+            conn.execute(f"PRAGMA busy_timeout={int(DEFAULT_HOOK_BUSY_TIMEOUT_MS)}")
+        except BaseException as exc:
+            self.open_error = exc
+            self.stopped.set()
+            self.ready.set()
+            return
+        self.ready.set()
+        group: List[_PendingHook] = []
+        deadline = 0.0
+        backfilling = bool(pending_backfills(conn))
+        try:
+            while True:
+                if group:
+                    try:
+                        item = self.requests.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        self._commit(conn, group)
+                        group = []
+                        continue
+                elif backfilling:
+                    try:
+                        item = self.requests.get(timeout=DEFAULT_HOOK_IDLE_BACKFILL_SEC)
+                    except queue.Empty:
+                        backfilling = self._backfill(conn)
+                        continue
+                else:
+                    item = self.requests.get()
+                if item is None:
+                    break
+                if not item.claim():
+                    continue
+                if not self._apply(conn, item):
+                    # The transaction itself failed: nothing in the group is kept.
+                    self._abort(conn, group, str(item.response.get("error")))
+                    item.done.set()
+                    group = []
+                    continue
+                if not group:
+                    deadline = time.monotonic() + self.commit_interval_sec
+                group.append(item)
+                if time.monotonic() >= deadline:
+                    self._commit(conn, group)
+                    group = []
+        finally:
+            self.stopped.set()
+            if group:
+                self._commit(conn, group)
+            while True:
+                try:
+                    item = self.requests.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not None and item.claim():
+                    item.response = {"ok": False, "error": "hook writer stopped before answering"}
+                    item.done.set()
+            conn.close()
+
+    def _backfill(self, conn: sqlite3.Connection) -> bool:
+        """
+        Run one batch of the pending backfills. Returns whether any is left;
+        a batch that cannot take the write lock is retried on the next idle.
+        """
+        try:
+            status = run_backfills(conn, max_batches=1)
+        except sqlite3.Error:
+            return True
+        return any(state != "done" for state in status.values())
+
+    def _apply(self, conn: sqlite3.Connection, pending: _PendingHook) -> bool:
+        """
+        Apply one request inside its own savepoint of the group's transaction.
+        Returns False when the transaction itself failed (e.g. the write lock
+        timed out); the caller then rolls back the whole group.
+        """
+        apply, indent = HOOK_APPLIERS[pending.args.command]
+        self.stats["requests"] += 1
+        try:
+            # sqlite3 does not open a transaction for SAVEPOINT, and releasing an
+            # outermost savepoint commits; keep the group in one open transaction.
+            if not conn.in_transaction:
+                conn.execute("BEGIN IMMEDIATE")
+            conn.execute("SAVEPOINT hook_request")
+            try:
+                payload = apply(conn, pending.args)
+            except Exception as exc:
+                conn.execute("ROLLBACK TO hook_request")
+                conn.execute("RELEASE hook_request")
+                self.stats["errors"] += 1
+                pending.response = {"ok": False, "error": f"{type(exc).__name__}: {exc}"}
+                return True
+            if payload.get("skipped"):
+                conn.execute("ROLLBACK TO hook_request")
+            conn.execute("RELEASE hook_request")
+        except sqlite3.Error as exc:
+            self.stats["errors"] += 1
+            pending.response = {"ok": False, "error": f"{type(exc).__name__}: {exc}"}
+            return False
+        pending.response = {"ok": True, "payload": payload, "indent": indent}
+        return True
+
+    def _abort(self, conn: sqlite3.Connection, group: Sequence[_PendingHook], error: str) -> None:
+        try:
+            conn.rollback()
+        except sqlite3.Error:
+            pass
+        for pending in group:
+            pending.response = {"ok": False, "error": f"rolled back with its commit group: {error}"}
+            pending.done.set()
+
+    def _commit(self, conn: sqlite3.Connection, group: Sequence[_PendingHook]) -> None:
+        try:
+            conn.commit()
+            self.stats["commits"] += 1
+            self.stats["max_group"] = max(self.stats["max_group"], len(group))
+        except sqlite3.Error as exc:
+            conn.rollback()
+            for pending in group:
+                pending.response = {"ok": False, "error": f"commit failed: {exc}"}
+        for pending in group:
+            pending.done.set()
+
+
+def cmd_serve_hooks(args: argparse.Namespace) -> int:
+    if not hasattr(socket, "AF_UNIX"):
+        print("serve-hooks needs Unix domain sockets.", file=sys.stderr)
+        return 2
+    root = pathlib.Path(args.root).resolve()
+    daemon = HookDaemon(
+        root,
+        args.index_dir,
+        socket_path=pathlib.Path(args.socket).resolve() if args.socket else None,
+        commit_interval_sec=max(0, args.commit_interval_ms) / 1000.0,
+    )
+    try:
+        daemon.start()
+    except RuntimeError as exc:
+        print(str(exc), file=sys.stderr)
+        return 1
+
+    def stop(_signum: int, _frame: object) -> None:
+        daemon.shutdown()
+
+    signal.signal(signal.SIGTERM, stop)
+    print(json.dumps({"ok": True, "socket": str(daemon.socket_path), "pid": os.getpid()}, ensure_ascii=False), flush=True)
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.close()
+    print(json.dumps({"ok": True, "stopped": True, "stats": daemon.stats}, ensure_ascii=False), flush=True)
     return 0
 
 
@@ -2157,7 +3765,7 @@ def cmd_summarize_session(args: argparse.Namespace) -> int:
 
 def cmd_config_get(args: argparse.Namespace) -> int:
     root = pathlib.Path(args.root).resolve()
-    conn = open_db(root, args.index_dir)
+    conn = open_db(root, args.index_dir, read_only=True)
     payload = {
         "ok": True,
         "config": get_runtime_config(conn),
@@ -2184,7 +3792,7 @@ def cmd_config_set(args: argparse.Namespace) -> int:
 
 def cmd_search(args: argparse.Namespace) -> int:
     root = pathlib.Path(args.root).resolve()
-    conn = open_db(root, args.index_dir)
+    conn = open_db_for_search(root, args.index_dir)
     meta = fetch_meta(conn)
     vector_dim = int(meta.get("vector_dim", str(DEFAULT_VECTOR_DIM)))
     since = args.since
@@ -2231,6 +3839,7 @@ def cmd_search(args: argparse.Namespace) -> int:
                 "lexical": round(item.lexical, 4),
                 "semantic": round(item.semantic, 4),
                 "token_estimate": item.token_estimate,
+                "duplicates": item.duplicates,
             }
             for item in results
         ],
@@ -2242,7 +3851,7 @@ def cmd_search(args: argparse.Namespace) -> int:
 
 def cmd_nl_search(args: argparse.Namespace) -> int:
     root = pathlib.Path(args.root).resolve()
-    conn = open_db(root, args.index_dir)
+    conn = open_db_for_search(root, args.index_dir)
     meta = fetch_meta(conn)
     vector_dim = int(meta.get("vector_dim", str(DEFAULT_VECTOR_DIM)))
     auto_seeded = seed_repo_baseline(conn, root, args.project, trigger_query=args.query)
@@ -2303,6 +3912,7 @@ def cmd_nl_search(args: argparse.Namespace) -> int:
                 "lexical": round(item.lexical, 4),
                 "semantic": round(item.semantic, 4),
                 "token_estimate": item.token_estimate,
+                "duplicates": item.duplicates,
             }
             for item in results
         ],
@@ -2314,7 +3924,7 @@ def cmd_nl_search(args: argparse.Namespace) -> int:
 
 def cmd_timeline(args: argparse.Namespace) -> int:
     root = pathlib.Path(args.root).resolve()
-    conn = open_db(root, args.index_dir)
+    conn = open_db(root, args.index_dir, read_only=True)
     item_type, item_id = parse_item_id(args.id)
     try:
         if item_type == "event":
@@ -2348,7 +3958,7 @@ def cmd_timeline(args: argparse.Namespace) -> int:
 
 def cmd_get_observations(args: argparse.Namespace) -> int:
     root = pathlib.Path(args.root).resolve()
-    conn = open_db(root, args.index_dir)
+    conn = open_db(root, args.index_dir, read_only=True)
     details: List[Dict[str, object]] = []
     skipped_ids: List[str] = []
     for token in args.ids:
@@ -3338,7 +4948,7 @@ def cmd_ask(args: argparse.Namespace) -> int:
 
 def cmd_export_session(args: argparse.Namespace) -> int:
     root = pathlib.Path(args.root).resolve()
-    conn = open_db(root, args.index_dir)
+    conn = open_db(root, args.index_dir, read_only=True)
     session_id = str(args.session_id).strip()
     if not session_id:
         raise ValueError("session_id is required")
@@ -3363,12 +4973,13 @@ def cmd_export_session(args: argparse.Namespace) -> int:
     event_private_clause = ""
     obs_private_clause = ""
     if not include_private:
-        event_private_clause = " AND COALESCE(json_extract(metadata_json, '$.privacy.visibility'), 'public') != 'private'"
-        obs_private_clause = " AND COALESCE(json_extract(metadata_json, '$.privacy.visibility'), 'public') != 'private'"
+        event_private_clause = " AND visibility = 'public'"
+        obs_private_clause = " AND visibility = 'public'"
 
     events = conn.execute(
-        """
-        SELECT id, event_kind, role, title, content, tool_name, file_path, tags_json, metadata_json, created_at
+        f"""
+        SELECT id, event_kind, role, title, {EVENT_CONTENT_COLUMNS}, tool_name, file_path, tags_json, metadata_json,
+               created_at
         FROM events
         WHERE session_id = ?""" + event_private_clause + """
         ORDER BY created_at ASC, id ASC
@@ -3400,7 +5011,7 @@ def cmd_export_session(args: argparse.Namespace) -> int:
         tags = json.loads(row["tags_json"]) if row["tags_json"] else []
         metadata = json.loads(row["metadata_json"]) if row["metadata_json"] else {}
         title = str(row["title"] or "")
-        content = str(row["content"] or "")
+        content = event_content(row)
         file_path = str(row["file_path"] or "") if row["file_path"] else None
         if anonymize:
             title = anonymize_text_for_share(title)
@@ -3513,6 +5124,11 @@ def build_parser() -> argparse.ArgumentParser:
     )
     parser.add_argument("--root", default=".", help="Repository root path.")
     parser.add_argument("--index-dir", default=DEFAULT_INDEX_DIR, help=f"Index dir (default: {DEFAULT_INDEX_DIR}).")
+    parser.add_argument(
+        "--no-daemon",
+        action="store_true",
+        help="Write lifecycle hooks directly even if a `serve-hooks` daemon is running.",
+    )
 
     sub = parser.add_subparsers(dest="command", required=True)
 
@@ -3523,6 +5139,24 @@ def build_parser() -> argparse.ArgumentParser:
     add_project_arg(p_init)
     p_init.set_defaults(func=cmd_init)
 
+    p_migrate = sub.add_parser(
+        "migrate",
+        help="Apply pending schema migrations and run their row backfills to completion.",
+    )
+    p_migrate.add_argument(
+        "--batch-rows",
+        type=int,
+        default=DEFAULT_BACKFILL_BATCH_ROWS,
+        help=f"Rows per backfill transaction (default: {DEFAULT_BACKFILL_BATCH_ROWS}).",
+    )
+    p_migrate.add_argument("--max-batches", type=int, default=0, help="Stop after this many batches (0 = run to completion).")
+    p_migrate.add_argument(
+        "--fts-prefix",
+        default=None,
+        help=f"Rebuild the FTS indexes with these prefix lengths, e.g. '2 3 4' (default setting: '{DEFAULT_FTS_PREFIX}'; '' disables).",
+    )
+    p_migrate.set_defaults(func=cmd_migrate)
+
     p_start = sub.add_parser("session-start", help="Lifecycle hook: SessionStart.")
     add_project_arg(p_start)
     p_start.add_argument("session_id")
@@ -3539,9 +5173,18 @@ def build_parser() -> argparse.ArgumentParser:
 
     p_tool = sub.add_parser("post-tool-use", help="Lifecycle hook: PostToolUse.")
     add_project_arg(p_tool)
-    p_tool.add_argument("session_id")
-    p_tool.add_argument("tool_name")
-    p_tool.add_argument("content")
+    p_tool.add_argument("session_id", nargs="?")
+    p_tool.add_argument("tool_name", nargs="?")
+    p_tool.add_argument("content", nargs="?")
+    p_tool.add_argument(
+        "--batch",
+        metavar="JSONL",
+        default=None,
+        help=(
+            "Ingest many PostToolUse events from a JSONL file ('-' for stdin) in one transaction; "
+            "per-line fields override the positional arguments and flags."
+        ),
+    )
     p_tool.add_argument("--title", default=None)
     p_tool.add_argument("--file-path", default=None)
     p_tool.add_argument("--exit-code", type=int, default=0)
@@ -3576,6 +5219,23 @@ def build_parser() -> argparse.ArgumentParser:
     p_end.add_argument("--skip-summary", action="store_true")
     p_end.set_defaults(func=cmd_session_end)
 
+    p_serve = sub.add_parser(
+        "serve-hooks",
+        help="Run a hook daemon on a local Unix socket; lifecycle hook commands forward to it when it is up.",
+    )
+    p_serve.add_argument(
+        "--socket",
+        default=None,
+        help=f"Socket path (default: <index-dir>/{DEFAULT_HOOK_SOCKET_NAME}; hooks only look there).",
+    )
+    p_serve.add_argument(
+        "--commit-interval-ms",
+        type=float,
+        default=DEFAULT_HOOK_COMMIT_INTERVAL_MS,
+        help=f"Group-commit window for hook writes (default: {DEFAULT_HOOK_COMMIT_INTERVAL_MS}).",
+    )
+    p_serve.set_defaults(func=cmd_serve_hooks)
+
     p_log = sub.add_parser("log", help="Generic event logging.")
     add_project_arg(p_log)
     p_log.add_argument("session_id")
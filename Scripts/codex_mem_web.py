@@ -26,12 +26,15 @@ if str(SCRIPT_DIR) not in sys.path:
 from codex_mem import (  # noqa: E402
     DEFAULT_SNIPPET_CHARS,
     DEFAULT_VECTOR_DIM,
+    EVENT_CONTENT_COLUMNS,
     blended_search,
     db_counts,
+    decode_event_content,
     fetch_meta,
     filter_results_by_intent,
     get_runtime_config,
     open_db,
+    open_db_for_search,
     parse_natural_query,
     seed_repo_baseline,
     set_runtime_config,
@@ -451,7 +454,7 @@ class ViewerHandler(BaseHTTPRequestHandler):
                 self._json({"ok": True, "service": "lakeside-mem-viewer"})
                 return
             if path == "/api/config":
-                conn = self.server.open_conn()
+                conn = self.server.open_conn(read_only=True)
                 try:
                     cfg = get_runtime_config(conn)
                 finally:
@@ -525,18 +528,18 @@ class ViewerServer(ThreadingHTTPServer):
         self.index_dir = index_dir
         self.project_default = project_default
 
-    def open_conn(self):
-        return open_db(self.root, self.index_dir)
+    def open_conn(self, *, read_only: bool = False):
+        return open_db(self.root, self.index_dir, read_only=read_only)
 
     def list_stream(self, project: str, limit: int, include_private: bool) -> List[Dict[str, Any]]:
-        conn = self.open_conn()
+        conn = self.open_conn(read_only=True)
         try:
             where = ["project = ?"]
             params: List[Any] = [project]
             if not include_private:
-                where.append("COALESCE(json_extract(metadata_json, '$.privacy.visibility'), 'public') != 'private'")
+                where.append("visibility = 'public'")
             sql = (
-                "SELECT id, session_id, event_kind, title, content, metadata_json, created_at "
+                f"SELECT id, session_id, event_kind, title, {EVENT_CONTENT_COLUMNS}, visibility, created_at "
                 "FROM events WHERE "
                 + " AND ".join(where)
                 + " ORDER BY created_at DESC, id DESC LIMIT ?"
@@ -545,16 +548,14 @@ class ViewerServer(ThreadingHTTPServer):
             rows = conn.execute(sql, params).fetchall()
             out: List[Dict[str, Any]] = []
             for row in rows:
-                meta = json.loads(row["metadata_json"]) if row["metadata_json"] else {}
-                privacy = meta.get("privacy") or {}
                 out.append(
                     {
                         "id": int(row["id"]),
                         "session_id": str(row["session_id"]),
                         "event_kind": str(row["event_kind"]),
                         "title": str(row["title"]),
-                        "snippet": str(row["content"])[:220],
-                        "visibility": str(privacy.get("visibility", "public")),
+                        "snippet": decode_event_content(row["content"], row["content_codec"], max_chars=220),
+                        "visibility": str(row["visibility"]),
                         "created_at": str(row["created_at"]),
                     }
                 )
@@ -563,7 +564,7 @@ class ViewerServer(ThreadingHTTPServer):
             conn.close()
 
     def list_sessions(self, project: str, limit: int) -> List[Dict[str, Any]]:
-        conn = self.open_conn()
+        conn = self.open_conn(read_only=True)
         try:
             rows = conn.execute(
                 """
@@ -594,7 +595,7 @@ class ViewerServer(ThreadingHTTPServer):
             conn.close()
 
     def nl_search(self, *, project: str, query: str, limit: int, include_private: bool) -> Dict[str, Any]:
-        conn = self.open_conn()
+        conn = open_db_for_search(self.root, self.index_dir)
         try:
             auto_seeded = seed_repo_baseline(conn, self.root, project, trigger_query=query)
             meta = fetch_meta(conn)
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Small keep-alive HTTP client shared by the OpenAI call sites.
+
+`urllib.request.urlopen` opens a fresh socket (and TLS handshake) per request.
+This module keeps a handful of idle `http.client` connections per
+(scheme, host, port, proxy) and hands them back out, so repeated embedding
+batches or router calls against the same API host reuse one warm connection.
+Proxies come from the same environment urllib honors (`HTTPS_PROXY`,
+`HTTP_PROXY`, `NO_PROXY`): HTTPS goes through a CONNECT tunnel, plain HTTP
+sends absolute-form request targets to the proxy.
+"""
+
+from __future__ import annotations
+
+import base64
+import http.client
+import select
+import ssl
+import threading
+import urllib.parse
+import urllib.request
+from typing import Dict, List, Mapping, Tuple
+
+DEFAULT_MAX_IDLE_PER_HOST = 8
+
+# Errors that mean a reused keep-alive socket was closed by the peer. The peer
+# may still have received the request, so only idempotent methods are resent.
+_STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.BadStatusLine,
+    BrokenPipeError,
+    ConnectionResetError,
+    ConnectionAbortedError,
+)
+_IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE", "TRACE"}
+
+# (scheme, host, port, proxy URL or "").
+HostKey = Tuple[str, str, int, str]
+
+
+class PooledResponse:
+    def __init__(self, status: int, reason: str, headers: http.client.HTTPMessage, body: bytes) -> None:
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+
+    def text(self) -> str:
+        return self.body.decode("utf-8", errors="replace")
+
+
+class ConnectionPool:
+    """
+    Per-host pool of idle keep-alive connections.
+
+    Connections are checked out for the duration of one request, so the pool is
+    safe to share across threads; concurrent requests to one host simply open
+    extra connections, and at most `max_idle_per_host` are kept afterwards.
+    """
+
+    def __init__(self, max_idle_per_host: int = DEFAULT_MAX_IDLE_PER_HOST) -> None:
+        self.max_idle_per_host = max(0, int(max_idle_per_host))
+        self._idle: Dict[HostKey, List[http.client.HTTPConnection]] = {}
+        self._lock = threading.Lock()
+        self._ssl_context: ssl.SSLContext | None = None
+        self.connections_opened = 0
+
+    def _host_key(self, url: str) -> Tuple[HostKey, str]:
+        parts = urllib.parse.urlsplit(url)
+        scheme = parts.scheme.lower()
+        if scheme not in {"http", "https"}:
+            raise ValueError(f"Unsupported URL scheme for pooled request: {url}")
+        host = parts.hostname or ""
+        if not host:
+            raise ValueError(f"URL has no host: {url}")
+        port = parts.port or (443 if scheme == "https" else 80)
+        target = parts.path or "/"
+        if parts.query:
+            target = f"{target}?{parts.query}"
+        proxy = proxy_for(scheme, host)
+        if proxy and scheme == "http":
+            target = urllib.parse.urlunsplit((scheme, f"{host}:{port}", target, "", ""))
+        return (scheme, host, port, proxy), target
+
+    def _connect(self, key: HostKey, timeout_sec: float) -> http.client.HTTPConnection:
+        scheme, host, port, proxy = key
+        with self._lock:
+            self.connections_opened += 1
+            if scheme == "https" and self._ssl_context is None:
+                self._ssl_context = ssl.create_default_context()
+            context = self._ssl_context
+        connect_host, connect_port = host, port
+        if proxy:
+            proxy_parts = urllib.parse.urlsplit(proxy)
+            connect_host = proxy_parts.hostname or ""
+            connect_port = proxy_parts.port or (443 if proxy_parts.scheme == "https" else 80)
+        if scheme == "https":
+            conn: http.client.HTTPConnection = http.client.HTTPSConnection(
+                connect_host, connect_port, timeout=timeout_sec, context=context
+            )
+            if proxy:
+                conn.set_tunnel(host, port, headers=proxy_auth_headers(proxy))
+            return conn
+        return http.client.HTTPConnection(connect_host, connect_port, timeout=timeout_sec)
+
+    def _checkout(self, key: HostKey) -> http.client.HTTPConnection | None:
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                if not idle:
+                    return None
+                conn = idle.pop()
+            # Drop sockets the peer has closed (or sent stray bytes on) while idle.
+            if _is_reusable(conn):
+                return conn
+            conn.close()
+
+    def _checkin(self, key: HostKey, conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        *,
+        body: bytes | None = None,
+        headers: Mapping[str, str] | None = None,
+        timeout_sec: float = 30.0,
+    ) -> PooledResponse:
+        key, target = self._host_key(url)
+        send_headers = dict(headers or {})
+        send_headers.setdefault("Connection", "keep-alive")
+        if key[3] and key[0] == "http":
+            send_headers.update(proxy_auth_headers(key[3]))
+
+        conn = self._checkout(key)
+        reused = conn is not None
+        while True:
+            if conn is None:
+                conn = self._connect(key, timeout_sec)
+            else:
+                conn.timeout = timeout_sec
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout_sec)
+            try:
+                conn.request(method, target, body=body, headers=send_headers)
+                resp = conn.getresponse()
+                payload = resp.read()
+            except _STALE_CONNECTION_ERRORS:
+                conn.close()
+                if not reused or method.upper() not in _IDEMPOTENT_METHODS:
+                    raise
+                conn = None
+                reused = False
+                continue
+            except BaseException:
+                conn.close()
+                raise
+            break
+
+        if resp.will_close:
+            conn.close()
+        else:
+            self._checkin(key, conn)
+        return PooledResponse(
+            status=int(resp.status),
+            reason=str(resp.reason or ""),
+            headers=resp.msg,
+            body=payload,
+        )
+
+    def post_json(
+        self,
+        url: str,
+        body: bytes,
+        *,
+        headers: Mapping[str, str] | None = None,
+        timeout_sec: float = 30.0,
+    ) -> PooledResponse:
+        send_headers = {"Content-Type": "application/json"}
+        send_headers.update(headers or {})
+        return self.request("POST", url, body=body, headers=send_headers, timeout_sec=timeout_sec)
+
+    def close(self) -> None:
+        with self._lock:
+            idle = [conn for conns in self._idle.values() for conn in conns]
+            self._idle.clear()
+        for conn in idle:
+            conn.close()
+
+
+def proxy_for(scheme: str, host: str) -> str:
+    """
+    Proxy URL urllib would use for `scheme://host`, or "" for a direct connection.
+    """
+    proxy = urllib.request.getproxies().get(scheme, "")
+    if not proxy or urllib.request.proxy_bypass(host):
+        return ""
+    return proxy if "://" in proxy else f"http://{proxy}"
+
+
+def proxy_auth_headers(proxy: str) -> Dict[str, str]:
+    parts = urllib.parse.urlsplit(proxy)
+    if parts.username is None:
+        return {}
+    user = urllib.parse.unquote(parts.username)
+    password = urllib.parse.unquote(parts.password or "")
+    token = base64.b64encode(f"{user}:{password}".encode("utf-8")).decode("ascii")
+    return {"Proxy-Authorization": f"Basic {token}"}
+
+
+def _is_reusable(conn: http.client.HTTPConnection) -> bool:
+    # An idle keep-alive socket has nothing to read; readable means EOF or junk.
+    if conn.sock is None:
+        return False
+    try:
+        readable, _, _ = select.select([conn.sock], [], [], 0)
+    except (OSError, ValueError):
+        return False
+    return not readable
+
+
+_SHARED_POOL = ConnectionPool()
+
+
+def shared_pool() -> ConnectionPool:
+    return _SHARED_POOL
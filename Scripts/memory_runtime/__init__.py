@@ -3,6 +3,7 @@ from .critic import evaluate_execution_result
 from .executors import run_executor
 from .planner import REQUIRED_SECTIONS, build_execution_plan, compile_task_spec, compute_coverage_report
 from .retrieval import build_evidence_items, hybrid_rank_chunks
+from .tokens import split_terms, tokenize
 
 __all__ = [
     "TaskSpec",
@@ -18,4 +19,6 @@ __all__ = [
     "build_evidence_items",
     "run_executor",
     "evaluate_execution_result",
+    "tokenize",
+    "split_terms",
 ]
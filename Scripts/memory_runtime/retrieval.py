@@ -1,12 +1,9 @@
 from __future__ import annotations
 
-import re
 from typing import Dict, List, Mapping, Sequence
 
 from .contracts import EvidenceItem
-
-TOKEN_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]{1,}|[0-9]+|[\u4e00-\u9fff]+")
-SPLIT_RE = re.compile(r"[/_.:+\-]")
+from .tokens import split_terms
 
 
 def hybrid_rank_chunks(
@@ -171,13 +168,7 @@ def _graph_lite_boost(chunks: Sequence[Mapping[str, object]]) -> Dict[int, float
 
 
 def _tokenize(text: str) -> List[str]:
-    values: List[str] = []
-    for token in TOKEN_RE.findall(str(text or "").lower()):
-        if "/" in token or "_" in token or "-" in token:
-            values.extend([v for v in SPLIT_RE.split(token) if v])
-        else:
-            values.append(token)
-    return [v for v in values if v]
+    return split_terms(str(text or ""))
 
 
 def _overlap_ratio(a: Sequence[str], b: Sequence[str]) -> float:
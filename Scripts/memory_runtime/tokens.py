@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import array
+import functools
+import hashlib
+import os
+import pathlib
+import re
+import struct
+import sys
+from typing import Dict, Iterable, List, Tuple
+
+TOKEN_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]{0,}|[0-9]+|[\u4e00-\u9fff]+")
+CAMEL_BOUNDARY_RE = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
+TERM_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]{1,}|[0-9]+|[\u4e00-\u9fff]+")
+TERM_SPLIT_RE = re.compile(r"[/_.:+\-]")
+
+# Paths, symbol hints, facet queries and module summaries are tokenized over and
+# over; strings up to this length are memoized whole. Longer text (chunk bodies)
+# still benefits from the per-identifier memo below.
+TOKENIZE_CACHE_MAX_CHARS = 256
+TOKENIZE_CACHE_SIZE = 16_384
+IDENTIFIER_CACHE_SIZE = 65_536
+
+_intern = sys.intern
+
+
+@functools.lru_cache(maxsize=IDENTIFIER_CACHE_SIZE)
+def _identifier_parts(token: str) -> Tuple[str, ...]:
+    parts: List[str] = []
+    for piece in token.split("_"):
+        if not piece:
+            continue
+        lowered = [part.lower() for part in CAMEL_BOUNDARY_RE.split(piece) if part]
+        parts.extend(lowered)
+        if len(lowered) > 1:
+            parts.append("".join(lowered))
+    return tuple(_intern(part) for part in parts)
+
+
+def _tokenize_text(text: str) -> List[str]:
+    tokens: List[str] = []
+    append = tokens.append
+    for token in TOKEN_RE.findall(text):
+        # Fast path: plain lowercase words and numbers need no splitting.
+        if token.isdigit() or (token.islower() and token.isascii() and "_" not in token):
+            append(_intern(token))
+        elif not token.isascii():
+            append(_intern(token.lower()))
+        else:
+            tokens.extend(_identifier_parts(token))
+    return tokens
+
+
+@functools.lru_cache(maxsize=TOKENIZE_CACHE_SIZE)
+def _tokenize_short(text: str) -> Tuple[str, ...]:
+    return tuple(_tokenize_text(text))
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased word tokens. Identifiers are split on underscores and camelCase
+    boundaries, and a split identifier also yields its joined form
+    (`getUserName` -> get, user, name, getusername). Tokens are interned.
+    """
+    if len(text) <= TOKENIZE_CACHE_MAX_CHARS:
+        return list(_tokenize_short(text))
+    return _tokenize_text(text)
+
+
+@functools.lru_cache(maxsize=TOKENIZE_CACHE_SIZE)
+def _split_terms_short(text: str) -> Tuple[str, ...]:
+    return tuple(_split_terms_text(text))
+
+
+def _split_terms_text(text: str) -> List[str]:
+    values: List[str] = []
+    for token in TERM_RE.findall(text.lower()):
+        if "_" in token:
+            values.extend(_intern(part) for part in TERM_SPLIT_RE.split(token) if part)
+        else:
+            values.append(_intern(token))
+    return values
+
+
+def split_terms(text: str) -> List[str]:
+    """
+    Coarser lowercase terms for evidence ranking: words of two or more
+    characters and numbers, split on underscores but not on camelCase.
+    """
+    if len(text) <= TOKENIZE_CACHE_MAX_CHARS:
+        return list(_split_terms_short(text))
+    return _split_terms_text(text)
+
+
+def tokenizer_cache_info() -> Dict[str, Dict[str, int]]:
+    return {
+        "short_strings": _tokenize_short.cache_info()._asdict(),
+        "identifiers": _identifier_parts.cache_info()._asdict(),
+        "terms": _split_terms_short.cache_info()._asdict(),
+        "token_hashes": {"currsize": len(_TOKEN_HASHES), "maxsize": TOKEN_BUCKET_TABLE_MAX},
+    }
+
+
+# Feature hashing (vectorize_text / vectorize_tf) maps each token to a bucket and
+# a sign through blake2b. The digest is memoized per token as (hash32 << 1) | sign
+# bit, independent of the vector size, and each vector size gets its own
+# token -> (bucket, sign) table on top. Both stop growing at TOKEN_BUCKET_TABLE_MAX.
+TOKEN_BUCKET_TABLE_MAX = 131_072
+TOKEN_VOCAB_MAGIC = b"RKVOCAB1"
+
+_TOKEN_HASHES: Dict[str, int] = {}
+_BUCKET_TABLES: Dict[int, Dict[str, Tuple[int, float]]] = {}
+
+
+def token_hash(token: str) -> int:
+    packed = _TOKEN_HASHES.get(token)
+    if packed is None:
+        digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+        packed = (int.from_bytes(digest[:4], "big") << 1) | (digest[4] & 1)
+        if len(_TOKEN_HASHES) < TOKEN_BUCKET_TABLE_MAX:
+            _TOKEN_HASHES[token] = packed
+    return packed
+
+
+def bucket_table(dim: int) -> Dict[str, Tuple[int, float]]:
+    table = _BUCKET_TABLES.get(dim)
+    if table is None:
+        table = _BUCKET_TABLES[dim] = {}
+    return table
+
+
+def token_bucket(token: str, dim: int) -> Tuple[int, float]:
+    """
+    (bucket, sign) of `token` in a `dim`-sized hashed vector. Hot loops should
+    try `bucket_table(dim).get(token)` first and only fall back to this.
+    """
+    table = bucket_table(dim)
+    entry = table.get(token)
+    if entry is None:
+        packed = token_hash(token)
+        entry = ((packed >> 1) % dim, -1.0 if packed & 1 else 1.0)
+        if len(table) < TOKEN_BUCKET_TABLE_MAX:
+            table[token] = entry
+    return entry
+
+
+def save_token_vocab(path: pathlib.Path, vocab: Iterable[str]) -> int:
+    """
+    Write token hashes for `vocab` so a later process can `load_token_vocab`
+    instead of re-hashing. Returns the number of tokens written.
+    """
+    words = [token for token in vocab if token and "\n" not in token]
+    hashes = array.array("Q", (token_hash(token) for token in words))
+    if sys.byteorder != "little":
+        hashes.byteswap()
+    names = "\n".join(words).encode("utf-8")
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("wb") as fh:
+        fh.write(TOKEN_VOCAB_MAGIC)
+        fh.write(struct.pack("<II", len(words), len(names)))
+        fh.write(hashes.tobytes())
+        fh.write(names)
+    os.replace(tmp, path)
+    return len(words)
+
+
+def load_token_vocab(path: pathlib.Path) -> int:
+    """
+    Seed the token hash memo from a file written by `save_token_vocab`.
+    Missing or malformed files are ignored. Returns the number of tokens loaded.
+    """
+    try:
+        raw = path.read_bytes()
+    except OSError:
+        return 0
+    header = len(TOKEN_VOCAB_MAGIC) + 8
+    if len(raw) < header or not raw.startswith(TOKEN_VOCAB_MAGIC):
+        return 0
+    count, names_len = struct.unpack_from("<II", raw, len(TOKEN_VOCAB_MAGIC))
+    if len(raw) != header + count * 8 + names_len:
+        return 0
+    hashes = array.array("Q")
+    hashes.frombytes(raw[header : header + count * 8])
+    if sys.byteorder != "little":
+        hashes.byteswap()
+    words = raw[header + count * 8 :].decode("utf-8", errors="replace").split("\n") if count else []
+    if len(words) != count:
+        return 0
+    room = max(0, TOKEN_BUCKET_TABLE_MAX - len(_TOKEN_HASHES))
+    loaded = 0
+    for word, packed in zip(words, hashes):
+        if loaded >= room:
+            break
+        if word not in _TOKEN_HASHES:
+            _TOKEN_HASHES[_intern(word)] = packed
+            loaded += 1
+    return loaded
@@ -1,16 +1,17 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
+import http.client
 import json
 import os
 import re
-import urllib.error
-import urllib.request
 from typing import Dict, List, Mapping, Sequence, Tuple
 
+from http_pool import shared_pool
 from prompt_profiles import list_profiles
 
 LOW_CONFIDENCE_THRESHOLD = 0.55
+DEFAULT_OPENAI_BASE_URL = "https://api.openai.com/v1"
 
 _RULE_KEYWORDS: Dict[str, Sequence[str]] = {
     "onboarding": (
@@ -260,20 +261,19 @@ def _call_openai_router(
             {"role": "user", "content": user},
         ],
     }
-    req = urllib.request.Request(
-        "https://api.openai.com/v1/chat/completions",
-        method="POST",
-        data=json.dumps(payload).encode("utf-8"),
-        headers={
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json",
-        },
-    )
+    base_url = (os.environ.get("OPENAI_BASE_URL", "").strip() or DEFAULT_OPENAI_BASE_URL).rstrip("/")
     try:
-        with urllib.request.urlopen(req, timeout=timeout_sec) as resp:
-            raw = resp.read().decode("utf-8", errors="replace")
-    except (urllib.error.HTTPError, urllib.error.URLError, TimeoutError):
+        resp = shared_pool().post_json(
+            f"{base_url}/chat/completions",
+            json.dumps(payload).encode("utf-8"),
+            headers={"Authorization": f"Bearer {api_key}"},
+            timeout_sec=timeout_sec,
+        )
+    except (OSError, http.client.HTTPException, ValueError):
+        return None
+    if resp.status >= 400:
         return None
+    raw = resp.text()
 
     try:
         data = json.loads(raw)
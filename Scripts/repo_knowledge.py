@@ -11,22 +11,37 @@ Design goals:
 from __future__ import annotations
 
 import argparse
+import ast
+import codecs
 import collections
+import concurrent.futures
+import contextlib
 import dataclasses
 import datetime as dt
 import hashlib
+import http.client
 import json
 import math
+import mmap
 import os
 import pathlib
+import random
 import re
+import shutil
 import sqlite3
 import struct
 import subprocess
 import sys
-import urllib.error
-import urllib.request
-from typing import Dict, List, Mapping, Sequence, Tuple
+import tarfile
+import tempfile
+import threading
+import time
+import tracemalloc
+from stat import S_ISREG
+from typing import Callable, Dict, Iterator, List, Mapping, Sequence, Tuple
+
+from http_pool import shared_pool
+from memory_runtime.tokens import bucket_table, load_token_vocab, save_token_vocab, token_bucket, tokenize
 
 
 INDEX_VERSION = "1"
@@ -34,8 +49,21 @@ DEFAULT_INDEX_DIR = ".codex_knowledge"
 DEFAULT_DB_NAME = "repo_knowledge.sqlite3"
 
 DEFAULT_MAX_FILE_BYTES = 300_000
+# Files between --max-file-bytes and this cap form the large-file tier: they are
+# streamed through mmap and cut into LARGE_FILE_CHUNK_SCALE x larger chunks without
+# overlap, so raising the cap does not load whole files (or their line lists) at once.
+DEFAULT_MAX_LARGE_FILE_BYTES = 8_000_000
+LARGE_FILE_CHUNK_SCALE = 4
+LARGE_FILE_HEAD_CHARS = 65_536
+MMAP_DECODE_BLOCK = 1 << 20
 DEFAULT_CHUNK_CHARS = 1_800
+DEFAULT_DISCOVER_WORKERS = 4
 DEFAULT_CHUNK_OVERLAP_LINES = 8
+CHUNKERS = {"structure", "lines"}
+# Max SimHash Hamming distance for near-duplicate chunk collapsing; 4 x 16-bit bands
+# guarantee every pair within this distance shares a band.
+MAX_NEAR_DUP_DISTANCE = 3
+DEFAULT_CHUNKER = "structure"
 DEFAULT_VECTOR_DIM = 256
 DEFAULT_MODULE_DEPTH = 3
 
@@ -44,6 +72,48 @@ EMBEDDING_PROVIDERS = {"local", "openai"}
 DEFAULT_OPENAI_EMBEDDING_MODEL = "text-embedding-3-small"
 DEFAULT_OPENAI_BATCH_SIZE = 64
 DEFAULT_OPENAI_TIMEOUT_SEC = 60
+DEFAULT_OPENAI_BASE_URL = "https://api.openai.com/v1"
+DEFAULT_OPENAI_CONCURRENCY = 4
+DEFAULT_OPENAI_REQUESTS_PER_MIN = 3000
+DEFAULT_OPENAI_MAX_RETRIES = 6
+DEFAULT_OPENAI_BACKOFF_BASE_SEC = 1.0
+DEFAULT_OPENAI_BACKOFF_MAX_SEC = 60.0
+
+DEFAULT_EMBEDDING_CACHE_NAME = "embedding_cache.sqlite3"
+DEFAULT_EMBEDDING_CACHE_MAX_MB = 512
+# Chunks past this many semantic candidates are pre-ranked on 2-bit ternary codes and
+# only the best `DEFAULT_SEMANTIC_RERANK` are rescored against their float32 vectors.
+DEFAULT_SEMANTIC_RERANK = 256
+VECTOR_CODES_TERNARY = "ternary2"
+DEFAULT_QUERY_CACHE_NAME = "query_embedding_cache.sqlite3"
+DEFAULT_QUERY_CACHE_TTL_HOURS = 168.0
+DEFAULT_QUERY_CACHE_MAX_ENTRIES = 4096
+
+INDEX_LAYOUT_SINGLE = "single"
+INDEX_LAYOUT_SHARDED = "sharded"
+INDEX_LAYOUTS = {INDEX_LAYOUT_SINGLE, INDEX_LAYOUT_SHARDED}
+DEFAULT_SHARD_DIR = "shards"
+# Shard for files that sit directly in the repository root.
+ROOT_SHARD_NAME = "_root"
+# Chunk ids of shard N start at N * SHARD_ID_STRIDE, so ids stay unique across shards.
+SHARD_ID_STRIDE = 1 << 32
+MAX_MOUNTED_SHARDS = 10
+SHARD_TABLES = ("files", "chunks", "chunk_codes", "postings", "chunk_aliases")
+
+DEFAULT_CHECKPOINT_NAME = "build_checkpoint.sqlite3"
+DEFAULT_CHECKPOINT_EMBEDDINGS_NAME = "build_checkpoint_embeddings.sqlite3"
+DEFAULT_CHECKPOINT_EVERY = 200
+# Most frequent corpus tokens whose feature-hash buckets are saved after a build and
+# preloaded by the next one, so vectorizing starts without re-hashing them.
+DEFAULT_TOKEN_VOCAB_NAME = "token_vocab.bin"
+TOKEN_VOCAB_MAX_TOKENS = 65_536
+PROFILE_PROGRESS_INTERVAL_SEC = 2.0
+
+BUNDLE_PREFIX = "repo_knowledge-"
+BUNDLE_MANIFEST_NAME = "bundle.json"
+BUNDLE_FORMAT = "1"
+# `import-bundle` exit code when a bundle directory has nothing for this HEAD/config.
+BUNDLE_MISS_EXIT_CODE = 3
 
 DEFAULT_IGNORED_DIRS = {
     ".git",
@@ -106,9 +176,6 @@ EXTENSION_TO_LANG = {
     ".entitlements": "xml",
 }
 
-TOKEN_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]{0,}|[0-9]+|[\u4e00-\u9fff]+")
-IDENTIFIER_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
-CAMEL_BOUNDARY_RE = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
 CJK_RE = re.compile(r"[\u4e00-\u9fff]")
 ASCII_WORD_RE = re.compile(r"[A-Za-z][A-Za-z0-9_]{1,}")
 
@@ -214,6 +281,44 @@ class QueryResult:
     semantic: float
     score: float
     symbol_hint: str
+    alias_paths: List[str] = dataclasses.field(default_factory=list)
+
+
+@dataclasses.dataclass
+class ChunkCandidate:
+    result: QueryResult
+    bm25_raw: float | None
+    semantic_raw: float | None
+    coverage: float
+    structural: float
+
+
+@dataclasses.dataclass
+class CorpusStats:
+    num_chunks: int
+    avg_chunk_tokens: float
+    token_df: Dict[str, int]
+
+
+@dataclasses.dataclass
+class ChunkAliasDraft:
+    canonical: int
+    path: str
+    start_line: int
+    end_line: int
+    kind: str
+
+
+@dataclasses.dataclass
+class IndexDraft:
+    files: List[FileDraft] = dataclasses.field(default_factory=list)
+    chunks: List[ChunkDraft] = dataclasses.field(default_factory=list)
+    aliases: List[ChunkAliasDraft] = dataclasses.field(default_factory=list)
+    modules: Dict[str, ModuleDraft] = dataclasses.field(default_factory=dict)
+    token_df: collections.Counter[str] = dataclasses.field(default_factory=collections.Counter)
+    skipped: List[str] = dataclasses.field(default_factory=list)
+    large_files: List[str] = dataclasses.field(default_factory=list)
+    deduped_chars: int = 0
 
 
 @dataclasses.dataclass
@@ -224,27 +329,10 @@ class EmbeddingConfig:
     openai_batch_size: int = DEFAULT_OPENAI_BATCH_SIZE
     openai_timeout_sec: int = DEFAULT_OPENAI_TIMEOUT_SEC
     openai_dimensions: int | None = None
-
-
-def tokenize(text: str) -> List[str]:
-    tokens: List[str] = []
-    for token in TOKEN_RE.findall(text):
-        if token.isdigit():
-            tokens.append(token)
-            continue
-        if IDENTIFIER_RE.match(token):
-            pieces = [p for p in re.split(r"[_\-]+", token) if p]
-            for piece in pieces:
-                camel_parts = [p for p in CAMEL_BOUNDARY_RE.split(piece) if p]
-                if not camel_parts:
-                    continue
-                lowered = [part.lower() for part in camel_parts]
-                tokens.extend(lowered)
-                if len(lowered) > 1:
-                    tokens.append("".join(lowered))
-            continue
-        tokens.append(token.lower())
-    return tokens
+    openai_base_url: str = ""
+    openai_concurrency: int = DEFAULT_OPENAI_CONCURRENCY
+    openai_requests_per_min: int = DEFAULT_OPENAI_REQUESTS_PER_MIN
+    openai_max_retries: int = DEFAULT_OPENAI_MAX_RETRIES
 
 
 def contains_cjk(text: str) -> bool:
@@ -329,6 +417,23 @@ def retrieval_hints(query: str) -> List[str]:
     return _ordered_unique(hints)
 
 
+ONBOARDING_FACET_ENTRYPOINT = "entrypoint main startup bootstrap swiftui @main App AppDelegate SceneDelegate"
+ONBOARDING_FACET_PERSISTENCE_FOCUSED = (
+    "persistence database storage sqlite swiftdata coredata modelcontext save migration bootstrapper"
+)
+ONBOARDING_FACET_PERSISTENCE_PROBE = "database persistence storage modelcontext save bootstrapper"
+ONBOARDING_FACET_AI = "ai service model generation note generation prism generation organize streaming delta"
+ONBOARDING_FACET_BACKEND = "backend api routes server index.ts api.ts"
+# Every string `onboarding_facet_queries` can emit; pre-embedded after an OpenAI index build.
+ONBOARDING_FACET_VOCABULARY = (
+    ONBOARDING_FACET_ENTRYPOINT,
+    ONBOARDING_FACET_PERSISTENCE_FOCUSED,
+    ONBOARDING_FACET_PERSISTENCE_PROBE,
+    ONBOARDING_FACET_AI,
+    ONBOARDING_FACET_BACKEND,
+)
+
+
 def onboarding_facet_queries(root: pathlib.Path, question: str) -> List[str]:
     """
     On cold start, a single broad query tends to overfit to docs or one module.
@@ -342,22 +447,22 @@ def onboarding_facet_queries(root: pathlib.Path, question: str) -> List[str]:
     facets: List[str] = []
 
     # 1) Entrypoint / startup
-    facets.append("entrypoint main startup bootstrap swiftui @main App AppDelegate SceneDelegate")
+    facets.append(ONBOARDING_FACET_ENTRYPOINT)
 
     # 2) Persistence / storage
     if any(term in raw for term in ("落库", "持久化", "数据库")) or any(term in raw.lower() for term in ("persistence", "database", "storage")):
-        facets.append("persistence database storage sqlite swiftdata coredata modelcontext save migration bootstrapper")
+        facets.append(ONBOARDING_FACET_PERSISTENCE_FOCUSED)
     else:
         # Still include a lightweight persistence probe for cold-start architecture mapping.
-        facets.append("database persistence storage modelcontext save bootstrapper")
+        facets.append(ONBOARDING_FACET_PERSISTENCE_PROBE)
 
     # 3) AI / generation flows
-    facets.append("ai service model generation note generation prism generation organize streaming delta")
+    facets.append(ONBOARDING_FACET_AI)
 
     # 4) Backend/API surface (only if repo looks like it has one)
     has_backend = (root / "Backend").exists() or (root / "backend").exists() or (root / "api").exists()
     if has_backend or any(term in raw.lower() for term in ("backend", "api", "route", "server")) or any(term in raw for term in ("后端", "接口", "路由")):
-        facets.append("backend api routes server index.ts api.ts")
+        facets.append(ONBOARDING_FACET_BACKEND)
 
     return _ordered_unique(facets)
 
@@ -439,16 +544,20 @@ def retrieve_onboarding_chunks(
         nonlocal selected
         if any(pattern.strip("%").lower() in (item.path or "").lower() for item in selected):
             return
-        row = conn.execute(
-            """
-            SELECT id, path, start_line, end_line, text, token_count, vector, symbol_hint
-            FROM chunks
-            WHERE path LIKE ?
-            ORDER BY start_line ASC
-            LIMIT 1
-            """,
-            (pattern,),
-        ).fetchone()
+        row = None
+        for _mounted in iter_mounted_shards(conn, shard_names_for_modules(conn, []) if index_is_sharded(conn) else None):
+            row = conn.execute(
+                """
+                SELECT id, path, start_line, end_line, text, token_count, vector, symbol_hint
+                FROM chunks
+                WHERE path LIKE ?
+                ORDER BY start_line ASC
+                LIMIT 1
+                """,
+                (pattern,),
+            ).fetchone()
+            if row:
+                break
         if not row:
             return
         forced = QueryResult(
@@ -675,18 +784,52 @@ def unpack_vector(blob: bytes, dim: int) -> List[float]:
     return list(struct.unpack(f"<{dim}f", blob))
 
 
+def ternary_code(vec: Sequence[float]) -> bytes:
+    """
+    Pack each dimension into {-1, 0, +1}: a positive-bit mask followed by a negative-bit mask.
+
+    Plain sign bits collapse zeros into the negative side, which ruins the estimate for
+    the sparse hashed TF vectors of the local provider; keeping zeros costs one extra bit
+    per dimension and is still 1/16 the size of float32.
+    """
+    pos = 0
+    neg = 0
+    for idx, value in enumerate(vec):
+        if value > 0:
+            pos |= 1 << idx
+        elif value < 0:
+            neg |= 1 << idx
+    width = (len(vec) + 7) // 8
+    return pos.to_bytes(width, "little") + neg.to_bytes(width, "little")
+
+
+def _split_code(code: bytes) -> Tuple[int, int]:
+    half = len(code) // 2
+    return int.from_bytes(code[:half], "little"), int.from_bytes(code[half:], "little")
+
+
+def ternary_code_cosine(query: Tuple[int, int], code: bytes) -> float:
+    q_pos, q_neg = query
+    c_pos, c_neg = _split_code(code)
+    agree = (q_pos & c_pos).bit_count() + (q_neg & c_neg).bit_count()
+    disagree = (q_pos & c_neg).bit_count() + (q_neg & c_pos).bit_count()
+    norm = math.sqrt((q_pos | q_neg).bit_count() * (c_pos | c_neg).bit_count())
+    if norm == 0:
+        return 0.0
+    return (agree - disagree) / norm
+
+
 def vectorize_tf(
     tf: Mapping[str, int],
     idf: Mapping[str, float],
     dim: int,
 ) -> List[float]:
     vec = [0.0] * dim
+    buckets = bucket_table(dim)
     for token, count in tf.items():
         base = 1.0 + math.log(count)
         weight = base * idf.get(token, 1.0)
-        digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
-        idx = int.from_bytes(digest[:4], "big") % dim
-        sign = 1.0 if (digest[4] & 1) == 0 else -1.0
+        idx, sign = buckets.get(token) or token_bucket(token, dim)
         vec[idx] += sign * weight
     return norm_vector(vec)
 
@@ -700,6 +843,95 @@ def chunked(values: Sequence[str], size: int) -> List[List[str]]:
     return out
 
 
+def resolve_openai_base_url(base_url: str | None = None) -> str:
+    """
+    Explicit value > `OPENAI_BASE_URL` env > public API.
+
+    Pointing this at a local stand-in server keeps the OpenAI path testable offline.
+    """
+    raw = (base_url or os.environ.get("OPENAI_BASE_URL", "") or DEFAULT_OPENAI_BASE_URL).strip()
+    return raw.rstrip("/")
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate_per_sec` refill, bursts up to `capacity`.
+    A non-positive rate disables limiting.
+    """
+
+    def __init__(self, rate_per_sec: float, capacity: float | None = None) -> None:
+        self.rate = float(rate_per_sec)
+        self.capacity = max(1.0, float(capacity if capacity is not None else rate_per_sec))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return
+                wait = (1.0 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class RetryableEmbeddingError(RuntimeError):
+    def __init__(self, message: str, retry_after: float | None = None) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+RETRYABLE_HTTP_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+
+def _parse_retry_after(value: str | None) -> float | None:
+    try:
+        return max(0.0, float(value)) if value else None
+    except ValueError:
+        return None
+
+
+def _post_embeddings_batch(
+    url: str,
+    payload: Mapping[str, object],
+    api_key: str,
+    timeout_sec: int,
+) -> List[List[float]]:
+    try:
+        resp = shared_pool().post_json(
+            url,
+            json.dumps(payload).encode("utf-8"),
+            headers={"Authorization": f"Bearer {api_key}"},
+            timeout_sec=timeout_sec,
+        )
+    except (OSError, http.client.HTTPException) as exc:
+        raise RetryableEmbeddingError(f"OpenAI embeddings request failed: {exc}") from exc
+    raw = resp.text()
+    if resp.status >= 400:
+        message = f"OpenAI embeddings HTTP {resp.status}: {raw}"
+        if resp.status in RETRYABLE_HTTP_STATUSES:
+            raise RetryableEmbeddingError(message, _parse_retry_after(resp.headers.get("Retry-After")))
+        raise RuntimeError(message)
+
+    data = json.loads(raw)
+    rows = data.get("data")
+    if not isinstance(rows, list):
+        raise RuntimeError(f"Unexpected OpenAI embeddings response: {raw[:300]}")
+    vectors: List[List[float]] = []
+    for row in sorted(rows, key=lambda item: int(item.get("index", 0))):
+        embedding = row.get("embedding")
+        if not isinstance(embedding, list):
+            raise RuntimeError("OpenAI embeddings response missing `embedding` array.")
+        vectors.append(norm_vector([float(v) for v in embedding]))
+    return vectors
+
+
 def openai_embed_texts(
     texts: Sequence[str],
     model: str,
@@ -707,54 +939,88 @@ def openai_embed_texts(
     timeout_sec: int,
     batch_size: int,
     dimensions: int | None,
+    base_url: str | None = None,
+    *,
+    concurrency: int = 1,
+    max_retries: int = DEFAULT_OPENAI_MAX_RETRIES,
+    requests_per_min: int = 0,
+    on_batch: Callable[[int, List[str], List[List[float]]], None] | None = None,
 ) -> List[List[float]]:
+    """
+    Embed `texts` with up to `concurrency` batches in flight.
+
+    Requests pass through a token bucket (`requests_per_min`, 0 = unlimited) and
+    429/5xx/network failures are retried with exponential backoff (honouring
+    `Retry-After`). `on_batch(batch_index, batch_texts, vectors)` fires as each batch
+    lands so callers can persist progress; a later run then only pays for what is left.
+    """
     if not texts:
         return []
     if not api_key:
         raise ValueError("OPENAI_API_KEY is required for OpenAI embeddings.")
 
-    url = "https://api.openai.com/v1/embeddings"
-    vectors: List[List[float]] = []
+    url = resolve_openai_base_url(base_url) + "/embeddings"
     batches = chunked(list(texts), batch_size)
     total = len(batches)
-    for idx, batch in enumerate(batches, start=1):
+    bucket = TokenBucket(requests_per_min / 60.0, capacity=max(1, concurrency)) if requests_per_min > 0 else None
+    backoff_base = DEFAULT_OPENAI_BACKOFF_BASE_SEC
+    progress_lock = threading.Lock()
+    done = 0
+
+    def run_batch(idx: int) -> List[List[float]]:
+        nonlocal done
+        batch = batches[idx]
         payload: Dict[str, object] = {
             "model": model,
             "input": batch,
         }
         if dimensions is not None:
             payload["dimensions"] = dimensions
-        req = urllib.request.Request(
-            url,
-            method="POST",
-            data=json.dumps(payload).encode("utf-8"),
-            headers={
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json",
-            },
-        )
-        try:
-            with urllib.request.urlopen(req, timeout=timeout_sec) as resp:
-                raw = resp.read().decode("utf-8")
-        except urllib.error.HTTPError as exc:
-            body = exc.read().decode("utf-8", errors="replace")
-            raise RuntimeError(f"OpenAI embeddings HTTP {exc.code}: {body}") from exc
-        except urllib.error.URLError as exc:
-            raise RuntimeError(f"OpenAI embeddings request failed: {exc}") from exc
-
-        data = json.loads(raw)
-        rows = data.get("data")
-        if not isinstance(rows, list):
-            raise RuntimeError(f"Unexpected OpenAI embeddings response: {raw[:300]}")
-        rows_sorted = sorted(rows, key=lambda item: int(item.get("index", 0)))
-        for row in rows_sorted:
-            embedding = row.get("embedding")
-            if not isinstance(embedding, list):
-                raise RuntimeError("OpenAI embeddings response missing `embedding` array.")
-            vec = [float(v) for v in embedding]
-            vectors.append(norm_vector(vec))
-        print(f"Embedding batch {idx}/{total} ({len(batch)} texts)")
-
+        attempt = 0
+        while True:
+            if bucket is not None:
+                bucket.acquire()
+            try:
+                vectors = _post_embeddings_batch(url, payload, api_key, timeout_sec)
+                break
+            except RetryableEmbeddingError as exc:
+                attempt += 1
+                if attempt > max(0, max_retries):
+                    raise RuntimeError(f"{exc} (gave up after {attempt} attempts)") from exc
+                delay = exc.retry_after
+                if delay is None:
+                    delay = min(DEFAULT_OPENAI_BACKOFF_MAX_SEC, backoff_base * (2 ** (attempt - 1)))
+                    delay *= 0.5 + random.random() / 2.0
+                print(f"Embedding batch {idx + 1}/{total} retry {attempt} in {delay:.2f}s: {exc}", file=sys.stderr)
+                time.sleep(delay)
+        if len(vectors) != len(batch):
+            raise RuntimeError(
+                f"OpenAI embedding count mismatch in batch {idx + 1}: expected={len(batch)} got={len(vectors)}"
+            )
+        with progress_lock:
+            if on_batch is not None:
+                on_batch(idx, batch, vectors)
+            done += 1
+            print(f"Embedding batch {done}/{total} ({len(batch)} texts)")
+        return vectors
+
+    results: List[List[List[float]]] = [[] for _ in batches]
+    workers = max(1, min(int(concurrency), total))
+    if workers == 1:
+        for idx in range(total):
+            results[idx] = run_batch(idx)
+    else:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(run_batch, idx): idx for idx in range(total)}
+            try:
+                for future in concurrent.futures.as_completed(futures):
+                    results[futures[future]] = future.result()
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+
+    vectors = [vec for batch_vectors in results for vec in batch_vectors]
     if len(vectors) != len(texts):
         raise RuntimeError(
             f"OpenAI embedding count mismatch: expected={len(texts)} got={len(vectors)}"
@@ -762,6 +1028,170 @@ def openai_embed_texts(
     return vectors
 
 
+def embedding_text_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Persistent content-addressed store of provider embeddings.
+
+    Rows are keyed by (model, dimensions, blake2b(text)) so a rebuild only pays for
+    chunks whose text actually changed. The file lives next to the index DB and is
+    never cleared by `clear_index`; size is bounded by evicting least-recently-used rows.
+    """
+
+    def __init__(self, path: pathlib.Path, max_bytes: int) -> None:
+        self.path = path
+        self.max_bytes = max(0, int(max_bytes))
+        # Dispatcher workers persist finished batches through `on_batch`, which
+        # openai_embed_texts serializes under its progress lock.
+        self.conn = sqlite3.connect(str(path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                dimensions INTEGER NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                byte_size INTEGER NOT NULL,
+                last_used_at REAL NOT NULL,
+                PRIMARY KEY(model, dimensions, text_hash)
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used_at);
+            """
+        )
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def get_many(self, model: str, dimensions: int | None, text_hashes: Sequence[str]) -> Dict[str, List[float]]:
+        dims = int(dimensions or 0)
+        uniq = sorted(set(text_hashes))
+        found: Dict[str, List[float]] = {}
+        # Stay well under SQLITE_MAX_VARIABLE_NUMBER on older builds.
+        for batch in chunked(uniq, 500) if uniq else []:
+            placeholders = ",".join("?" for _ in batch)
+            rows = self.conn.execute(
+                f"""
+                SELECT text_hash, vector FROM embeddings
+                WHERE model = ? AND dimensions = ? AND text_hash IN ({placeholders})
+                """,
+                [model, dims, *batch],
+            ).fetchall()
+            for text_hash, blob in rows:
+                dim = len(blob) // struct.calcsize("<f")
+                found[str(text_hash)] = unpack_vector(blob, dim)
+        if found:
+            now = time.time()
+            with self.conn:
+                self.conn.executemany(
+                    "UPDATE embeddings SET last_used_at = ? WHERE model = ? AND dimensions = ? AND text_hash = ?",
+                    [(now, model, dims, text_hash) for text_hash in found],
+                )
+        return found
+
+    def put_many(self, model: str, dimensions: int | None, items: Mapping[str, Sequence[float]]) -> None:
+        if not items:
+            return
+        dims = int(dimensions or 0)
+        now = time.time()
+        rows = []
+        for text_hash, vec in items.items():
+            blob = pack_vector(vec)
+            rows.append((model, dims, text_hash, blob, len(blob), now))
+        with self.conn:
+            self.conn.executemany(
+                """
+                INSERT INTO embeddings(model, dimensions, text_hash, vector, byte_size, last_used_at)
+                VALUES(?, ?, ?, ?, ?, ?)
+                ON CONFLICT(model, dimensions, text_hash)
+                DO UPDATE SET vector=excluded.vector, byte_size=excluded.byte_size, last_used_at=excluded.last_used_at
+                """,
+                rows,
+            )
+
+    def total_bytes(self) -> int:
+        return int(self.conn.execute("SELECT COALESCE(SUM(byte_size), 0) FROM embeddings").fetchone()[0])
+
+    def evict(self) -> int:
+        total = self.total_bytes()
+        if total <= self.max_bytes:
+            return 0
+        excess = total - self.max_bytes
+        doomed: List[Tuple[str, int, str]] = []
+        freed = 0
+        for model, dims, text_hash, size in self.conn.execute(
+            "SELECT model, dimensions, text_hash, byte_size FROM embeddings ORDER BY last_used_at ASC"
+        ):
+            if freed >= excess:
+                break
+            doomed.append((model, dims, text_hash))
+            freed += int(size)
+        with self.conn:
+            self.conn.executemany(
+                "DELETE FROM embeddings WHERE model = ? AND dimensions = ? AND text_hash = ?",
+                doomed,
+            )
+        return len(doomed)
+
+
+def cached_openai_embed_texts(
+    texts: Sequence[str],
+    *,
+    cfg: EmbeddingConfig,
+    api_key: str,
+    cache: EmbeddingCache | None,
+    stats: Dict[str, int] | None = None,
+) -> List[List[float]]:
+    """
+    Embed `texts`, requesting only cache misses from the provider.
+
+    Identical texts inside one call are sent once, so duplicated chunks cost nothing extra.
+    """
+    hashes = [embedding_text_hash(text) for text in texts]
+    found = cache.get_many(cfg.openai_model, cfg.openai_dimensions, hashes) if cache is not None else {}
+
+    miss_texts: Dict[str, str] = {}
+    for text_hash, text in zip(hashes, texts):
+        if text_hash not in found and text_hash not in miss_texts:
+            miss_texts[text_hash] = text
+
+    if miss_texts:
+        miss_hashes = list(miss_texts.keys())
+
+        def persist_batch(batch_idx: int, batch: List[str], vectors: List[List[float]]) -> None:
+            # Persist per batch so an interrupted build resumes from the cache instead of from zero.
+            offset = batch_idx * cfg.openai_batch_size
+            landed = dict(zip(miss_hashes[offset : offset + len(batch)], vectors))
+            found.update(landed)
+            if cache is not None:
+                cache.put_many(cfg.openai_model, cfg.openai_dimensions, landed)
+
+        openai_embed_texts(
+            texts=list(miss_texts.values()),
+            model=cfg.openai_model,
+            api_key=api_key,
+            timeout_sec=cfg.openai_timeout_sec,
+            batch_size=cfg.openai_batch_size,
+            dimensions=cfg.openai_dimensions,
+            base_url=cfg.openai_base_url,
+            concurrency=cfg.openai_concurrency,
+            max_retries=cfg.openai_max_retries,
+            requests_per_min=cfg.openai_requests_per_min,
+            on_batch=persist_batch,
+        )
+
+    if stats is not None:
+        stats["requested"] = stats.get("requested", 0) + len(texts)
+        stats["hits"] = stats.get("hits", 0) + sum(1 for h in hashes if h not in miss_texts)
+        stats["misses"] = stats.get("misses", 0) + len(miss_texts)
+    return [found[text_hash] for text_hash in hashes]
+
+
 def build_local_query_vector(
     conn: sqlite3.Connection,
     query: str,
@@ -774,6 +1204,162 @@ def build_local_query_vector(
     return vectorize_tf(collections.Counter(q_tokens), q_idf, vector_dim) if q_tokens else []
 
 
+def normalize_query_key(query: str) -> str:
+    return " ".join((query or "").lower().split())
+
+
+class QueryVectorCache:
+    """
+    On-disk LRU of query embeddings keyed by (model, dimensions, normalized query).
+
+    Onboarding facets, coverage probes and recovery passes re-ask the same strings,
+    so one `ask` would otherwise pay for several identical embedding calls. Rows
+    older than `ttl_sec` are treated as misses and dropped.
+    """
+
+    def __init__(self, path: pathlib.Path, ttl_sec: float, max_entries: int = DEFAULT_QUERY_CACHE_MAX_ENTRIES) -> None:
+        self.path = path
+        self.ttl_sec = max(0.0, float(ttl_sec))
+        self.max_entries = max(1, int(max_entries))
+        self.conn = sqlite3.connect(str(path))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS query_vectors (
+                model TEXT NOT NULL,
+                dimensions INTEGER NOT NULL,
+                query_key TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL,
+                PRIMARY KEY(model, dimensions, query_key)
+            );
+            CREATE INDEX IF NOT EXISTS idx_query_vectors_last_used ON query_vectors(last_used_at);
+            """
+        )
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def get(self, model: str, dimensions: int | None, query: str) -> List[float] | None:
+        key = (model, int(dimensions or 0), normalize_query_key(query))
+        row = self.conn.execute(
+            "SELECT vector, created_at FROM query_vectors WHERE model = ? AND dimensions = ? AND query_key = ?",
+            key,
+        ).fetchone()
+        if row is None:
+            return None
+        blob, created_at = row
+        now = time.time()
+        with self.conn:
+            if now - float(created_at) > self.ttl_sec:
+                self.conn.execute(
+                    "DELETE FROM query_vectors WHERE model = ? AND dimensions = ? AND query_key = ?",
+                    key,
+                )
+                return None
+            self.conn.execute(
+                "UPDATE query_vectors SET last_used_at = ? WHERE model = ? AND dimensions = ? AND query_key = ?",
+                (now, *key),
+            )
+        return unpack_vector(blob, len(blob) // struct.calcsize("<f"))
+
+    def put_many(self, model: str, dimensions: int | None, items: Mapping[str, Sequence[float]]) -> None:
+        if not items:
+            return
+        dims = int(dimensions or 0)
+        now = time.time()
+        rows = [(model, dims, normalize_query_key(query), pack_vector(vec), now, now) for query, vec in items.items()]
+        with self.conn:
+            self.conn.executemany(
+                """
+                INSERT INTO query_vectors(model, dimensions, query_key, vector, created_at, last_used_at)
+                VALUES(?, ?, ?, ?, ?, ?)
+                ON CONFLICT(model, dimensions, query_key)
+                DO UPDATE SET vector=excluded.vector, created_at=excluded.created_at, last_used_at=excluded.last_used_at
+                """,
+                rows,
+            )
+            self.conn.execute("DELETE FROM query_vectors WHERE created_at < ?", (now - self.ttl_sec,))
+            self.conn.execute(
+                """
+                DELETE FROM query_vectors WHERE rowid IN (
+                    SELECT rowid FROM query_vectors ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,),
+            )
+
+    def fresh_keys(self, model: str, dimensions: int | None, queries: Sequence[str]) -> set[str]:
+        cutoff = time.time() - self.ttl_sec
+        keys = {normalize_query_key(q) for q in queries}
+        fresh: set[str] = set()
+        for key in keys:
+            row = self.conn.execute(
+                """
+                SELECT 1 FROM query_vectors
+                WHERE model = ? AND dimensions = ? AND query_key = ? AND created_at >= ?
+                """,
+                (model, int(dimensions or 0), key, cutoff),
+            ).fetchone()
+            if row is not None:
+                fresh.add(key)
+        return fresh
+
+
+def open_query_cache(index_dir: pathlib.Path, meta: Mapping[str, str]) -> QueryVectorCache | None:
+    try:
+        ttl_hours = float(meta.get("query_cache_ttl_hours", "") or DEFAULT_QUERY_CACHE_TTL_HOURS)
+    except ValueError:
+        ttl_hours = DEFAULT_QUERY_CACHE_TTL_HOURS
+    if ttl_hours <= 0 or not index_dir.is_dir():
+        return None
+    try:
+        return QueryVectorCache(index_dir / DEFAULT_QUERY_CACHE_NAME, ttl_sec=ttl_hours * 3600.0)
+    except sqlite3.Error:
+        return None
+
+
+def _conn_index_dir(conn: sqlite3.Connection) -> pathlib.Path | None:
+    for row in conn.execute("PRAGMA database_list").fetchall():
+        if row[1] == "main" and row[2]:
+            return pathlib.Path(row[2]).parent
+    return None
+
+
+def prewarm_query_cache(
+    index_dir: pathlib.Path,
+    *,
+    cfg: EmbeddingConfig,
+    api_key: str,
+    ttl_hours: float,
+    queries: Sequence[str] = ONBOARDING_FACET_VOCABULARY,
+) -> int:
+    cache = open_query_cache(index_dir, {"query_cache_ttl_hours": str(ttl_hours)})
+    if cache is None:
+        return 0
+    try:
+        fresh = cache.fresh_keys(cfg.openai_model, cfg.openai_dimensions, queries)
+        pending = [q for q in _ordered_unique(list(queries)) if normalize_query_key(q) not in fresh]
+        if not pending:
+            return 0
+        vectors = openai_embed_texts(
+            pending,
+            model=cfg.openai_model,
+            api_key=api_key,
+            timeout_sec=cfg.openai_timeout_sec,
+            batch_size=max(1, cfg.openai_batch_size),
+            dimensions=cfg.openai_dimensions,
+            base_url=cfg.openai_base_url or None,
+            max_retries=cfg.openai_max_retries,
+        )
+        cache.put_many(cfg.openai_model, cfg.openai_dimensions, dict(zip(pending, vectors)))
+        return len(pending)
+    finally:
+        cache.close()
+
+
 def build_query_vector(
     conn: sqlite3.Connection,
     query: str,
@@ -795,15 +1381,23 @@ def build_query_vector(
         batch_size = int(meta.get("openai_batch_size", str(DEFAULT_OPENAI_BATCH_SIZE)))
         requested_dims = meta.get("openai_dimensions", "")
         dimensions = int(requested_dims) if requested_dims else None
+        index_dir = _conn_index_dir(conn)
+        cache = open_query_cache(index_dir, meta) if index_dir is not None else None
         try:
-            vec = openai_embed_texts(
-                [query],
-                model=model,
-                api_key=api_key,
-                timeout_sec=timeout_sec,
-                batch_size=max(1, batch_size),
-                dimensions=dimensions,
-            )[0]
+            vec = cache.get(model, dimensions, query) if cache is not None else None
+            if vec is None:
+                vec = openai_embed_texts(
+                    [query],
+                    model=model,
+                    api_key=api_key,
+                    timeout_sec=timeout_sec,
+                    batch_size=max(1, batch_size),
+                    dimensions=dimensions,
+                    base_url=meta.get("openai_base_url", "") or None,
+                    max_retries=1,
+                )[0]
+                if cache is not None:
+                    cache.put_many(model, dimensions, {query: vec})
             if len(vec) != vector_dim:
                 print(
                     f"Warning: query embedding dim={len(vec)} but index dim={vector_dim}; "
@@ -819,6 +1413,9 @@ def build_query_vector(
                 file=sys.stderr,
             )
             return []
+        finally:
+            if cache is not None:
+                cache.close()
 
     return build_local_query_vector(conn, query, vector_dim)
 
@@ -884,6 +1481,65 @@ def read_text_file(path: pathlib.Path) -> str:
     return path.read_text(encoding="utf-8", errors="replace")
 
 
+def iter_text_lines(path: pathlib.Path, block_size: int = MMAP_DECODE_BLOCK):
+    """
+    Yield the lines of `path` (with line endings) by decoding an mmap of the file
+    block by block, so memory stays bounded by `block_size` plus the longest line.
+    Decoding matches `read_text_file` followed by `splitlines(keepends=True)`.
+    """
+    with path.open("rb") as fh:
+        if os.fstat(fh.fileno()).st_size == 0:
+            return
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            pending = ""
+            size = len(mapped)
+            for offset in range(0, size, block_size):
+                final = offset + block_size >= size
+                buffer = pending + decoder.decode(mapped[offset : offset + block_size], final=final)
+                lines = buffer.splitlines(keepends=True)
+                pending = ""
+                # Hold back an unterminated tail (or a bare "\r" that may be half of "\r\n").
+                if lines and not final and (buffer.endswith("\r") or lines[-1] == lines[-1].rstrip("\r\n")):
+                    pending = lines.pop()
+                for line in lines:
+                    # Universal newlines, as in `read_text_file`.
+                    if line.endswith("\r\n"):
+                        line = line[:-2] + "\n"
+                    elif line.endswith("\r"):
+                        line = line[:-1] + "\n"
+                    yield line
+            if pending:
+                yield pending
+
+
+def stream_chunk_lines(lines, max_chars: int):
+    """
+    Streaming counterpart of `chunk_lines` for the large-file tier: consecutive,
+    non-overlapping chunks of about `max_chars`, cut at the first blank line once
+    the target is reached (or at the target itself).
+    """
+    buffer: List[str] = []
+    char_count = 0
+    start_line = 1
+    line_no = 0
+    for line in lines:
+        line_no += 1
+        buffer.append(line)
+        char_count += len(line)
+        if char_count >= max_chars and (not line.strip() or char_count >= 2 * max_chars):
+            body = "".join(buffer).strip()
+            if body:
+                yield start_line, line_no, body
+            buffer = []
+            char_count = 0
+            start_line = line_no + 1
+    if buffer:
+        body = "".join(buffer).strip()
+        if body:
+            yield start_line, line_no, body
+
+
 def git_tracked_paths(root: pathlib.Path) -> List[pathlib.Path] | None:
     try:
         proc = subprocess.run(
@@ -905,52 +1561,224 @@ def git_tracked_paths(root: pathlib.Path) -> List[pathlib.Path] | None:
     return paths
 
 
+def _gitignore_regex(pattern: str) -> str:
+    out: List[str] = []
+    idx = 0
+    while idx < len(pattern):
+        char = pattern[idx]
+        if pattern.startswith("**/", idx):
+            out.append("(?:.*/)?")
+            idx += 3
+            continue
+        if pattern.startswith("**", idx):
+            out.append(".*")
+            idx += 2
+            continue
+        if char == "*":
+            out.append("[^/]*")
+        elif char == "?":
+            out.append("[^/]")
+        elif char == "[":
+            close = pattern.find("]", idx + 1)
+            if close < 0:
+                out.append(re.escape(char))
+            else:
+                body = pattern[idx + 1 : close]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                out.append(f"[{body}]")
+                idx = close
+        elif char == "\\" and idx + 1 < len(pattern):
+            idx += 1
+            out.append(re.escape(pattern[idx]))
+        else:
+            out.append(re.escape(char))
+        idx += 1
+    return "".join(out)
+
+
+@dataclasses.dataclass(frozen=True)
+class GitignoreRule:
+    base: str
+    regex: re.Pattern[str]
+    negate: bool
+    dir_only: bool
+    anchored: bool
+
+
+def parse_gitignore(text: str, base: str) -> List[GitignoreRule]:
+    """
+    Rules from one .gitignore (or info/exclude) whose directory is `base`,
+    relative to the root ("" for the root itself).
+    """
+    rules: List[GitignoreRule] = []
+    for raw in text.splitlines():
+        line = raw.rstrip()
+        if not line or line.startswith("#"):
+            continue
+        negate = line.startswith("!")
+        if negate:
+            line = line[1:]
+        elif line.startswith("\\"):
+            line = line[1:]
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        if not line:
+            continue
+        anchored = "/" in line
+        line = line.lstrip("/")
+        try:
+            regex = re.compile(_gitignore_regex(line))
+        except re.error:
+            continue
+        rules.append(GitignoreRule(base, regex, negate, dir_only, anchored))
+    return rules
+
+
+def gitignore_matches(rules: Sequence[GitignoreRule], rel_path: str, is_dir: bool) -> bool:
+    """
+    Last matching rule wins, as in git. `rel_path` is posix and relative to the root.
+    """
+    ignored = False
+    name = rel_path.rsplit("/", 1)[-1]
+    for rule in rules:
+        if rule.dir_only and not is_dir:
+            continue
+        if rule.anchored:
+            if rule.base and not rel_path.startswith(rule.base + "/"):
+                continue
+            target = rel_path[len(rule.base) + 1 :] if rule.base else rel_path
+        else:
+            target = name
+        if rule.regex.fullmatch(target):
+            ignored = not rule.negate
+    return ignored
+
+
+def _read_gitignore(path: pathlib.Path, base: str) -> List[GitignoreRule]:
+    try:
+        return parse_gitignore(path.read_text(encoding="utf-8", errors="replace"), base)
+    except OSError:
+        return []
+
+
+def _scan_tree(
+    root: pathlib.Path,
+    rel_dir: str,
+    rules: List[GitignoreRule],
+    ignored_dirs: set[str],
+    max_file_bytes: int,
+    honor_gitignore: bool,
+    subdirs: List[Tuple[str, List[GitignoreRule]]] | None = None,
+) -> List[Tuple[str, os.stat_result]]:
+    """
+    Depth-first scandir walk below `rel_dir`. Directories that are ignored are
+    never opened, and each accepted file is stat'ed exactly once. With `subdirs`,
+    only `rel_dir` itself is scanned and its child directories are handed back.
+    """
+    found: List[Tuple[str, os.stat_result]] = []
+    stack = [(rel_dir, rules)]
+    while stack:
+        current, current_rules = stack.pop()
+        abs_dir = root / current if current else root
+        if honor_gitignore:
+            local = _read_gitignore(abs_dir / ".gitignore", current)
+            if local:
+                current_rules = current_rules + local
+        try:
+            entries = list(os.scandir(abs_dir))
+        except OSError:
+            continue
+        for entry in entries:
+            name = entry.name
+            if name in ignored_dirs:
+                continue
+            rel = f"{current}/{name}" if current else name
+            try:
+                if entry.is_dir():
+                    if entry.is_symlink():
+                        continue
+                    if honor_gitignore and gitignore_matches(current_rules, rel, True):
+                        continue
+                    if subdirs is not None:
+                        subdirs.append((rel, current_rules))
+                    else:
+                        stack.append((rel, current_rules))
+                    continue
+                if not entry.is_file():
+                    continue
+            except OSError:
+                continue
+            rel_path = pathlib.Path(rel)
+            if is_noise_file(rel_path) or not looks_textual(rel_path):
+                continue
+            if honor_gitignore and gitignore_matches(current_rules, rel, False):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            if stat.st_size > max_file_bytes:
+                continue
+            found.append((rel, stat))
+    return found
+
+
 def discover_files(
     root: pathlib.Path,
     use_git_tracked: bool,
     max_file_bytes: int,
     ignored_dirs: set[str],
+    max_large_file_bytes: int = 0,
+    *,
+    stats: Dict[str, os.stat_result] | None = None,
+    honor_gitignore: bool = True,
+    workers: int = 1,
 ) -> List[pathlib.Path]:
-    candidates: List[pathlib.Path] = []
+    """
+    Indexable files under `root`, sorted. `git ls-files` is used when possible;
+    otherwise a scandir walk that honors .gitignore, fanned out over the top-level
+    directories with `workers` threads. Each kept file's stat lands in `stats`.
+    """
+    max_file_bytes = max(max_file_bytes, max_large_file_bytes)
+    found: List[Tuple[str, os.stat_result]] = []
 
     tracked = git_tracked_paths(root) if use_git_tracked else None
     if tracked is not None:
         for rel in tracked:
             if path_is_ignored(rel, ignored_dirs):
                 continue
-            abs_path = root / rel
-            if not abs_path.exists() or not abs_path.is_file():
-                continue
-            if abs_path.stat().st_size > max_file_bytes:
+            if is_noise_file(rel) or not looks_textual(rel):
                 continue
-            if is_noise_file(rel):
+            try:
+                stat = os.stat(root / rel)
+            except OSError:
                 continue
-            if not looks_textual(rel):
+            if not S_ISREG(stat.st_mode) or stat.st_size > max_file_bytes:
                 continue
-            candidates.append(rel)
-        return sorted(candidates)
-
-    for dirpath, dirnames, filenames in os.walk(root):
-        rel_dir = pathlib.Path(dirpath).relative_to(root)
-        dirnames[:] = [d for d in dirnames if d not in ignored_dirs]
-        if path_is_ignored(rel_dir, ignored_dirs):
-            continue
-        for filename in filenames:
-            rel_path = rel_dir / filename
-            if path_is_ignored(rel_path, ignored_dirs):
-                continue
-            abs_path = root / rel_path
-            if not abs_path.is_file():
-                continue
-            if abs_path.stat().st_size > max_file_bytes:
-                continue
-            if is_noise_file(rel_path):
-                continue
-            if not looks_textual(rel_path):
-                continue
-            candidates.append(rel_path)
+            found.append((rel.as_posix(), stat))
+    else:
+        rules: List[GitignoreRule] = []
+        if honor_gitignore:
+            rules = _read_gitignore(root / ".git" / "info" / "exclude", "")
+        subdirs: List[Tuple[str, List[GitignoreRule]]] = []
+        found = _scan_tree(root, "", rules, ignored_dirs, max_file_bytes, honor_gitignore, subdirs)
+        if workers > 1 and len(subdirs) > 1:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = [
+                    pool.submit(_scan_tree, root, rel, sub_rules, ignored_dirs, max_file_bytes, honor_gitignore)
+                    for rel, sub_rules in subdirs
+                ]
+                for future in futures:
+                    found.extend(future.result())
+        else:
+            for rel, sub_rules in subdirs:
+                found.extend(_scan_tree(root, rel, sub_rules, ignored_dirs, max_file_bytes, honor_gitignore))
 
-    return sorted(candidates)
+    paths = sorted(((pathlib.Path(rel), stat) for rel, stat in found), key=lambda item: item[0])
+    if stats is not None:
+        stats.update((str(rel_path), stat) for rel_path, stat in paths)
+    return [rel_path for rel_path, _stat in paths]
 
 
 def extract_symbols(lang: str, text: str, limit: int = 30) -> List[str]:
@@ -1056,39 +1884,265 @@ def chunk_lines(
     return chunks
 
 
-def ensure_schema(conn: sqlite3.Connection) -> None:
-    conn.execute("PRAGMA journal_mode=WAL")
-    conn.execute("PRAGMA synchronous=NORMAL")
-    conn.execute("PRAGMA foreign_keys=ON")
-    conn.executescript(
-        """
-        CREATE TABLE IF NOT EXISTS files (
-            path TEXT PRIMARY KEY,
-            lang TEXT NOT NULL,
-            module_key TEXT NOT NULL,
-            byte_size INTEGER NOT NULL,
-            line_count INTEGER NOT NULL,
-            content_hash TEXT NOT NULL,
-            summary TEXT NOT NULL,
-            symbols_json TEXT NOT NULL
-        );
-
-        CREATE TABLE IF NOT EXISTS chunks (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            path TEXT NOT NULL,
-            lang TEXT NOT NULL,
-            start_line INTEGER NOT NULL,
-            end_line INTEGER NOT NULL,
-            token_count INTEGER NOT NULL,
-            text TEXT NOT NULL,
-            vector BLOB NOT NULL,
-            symbol_hint TEXT NOT NULL,
-            FOREIGN KEY(path) REFERENCES files(path) ON DELETE CASCADE
-        );
+_BRACKET_OPEN = "{(["
+_BRACKET_CLOSE = "})]"
+_LEADING_ATTACH_PREFIXES = ("#", "//", "/*", "*", "@")
+_STRING_LITERAL_RE = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|`(?:\\.|[^`\\])*`')
 
-        CREATE INDEX IF NOT EXISTS idx_chunks_path ON chunks(path);
 
-        CREATE TABLE IF NOT EXISTS postings (
+def _brace_levels(lines: Sequence[str]) -> List[int | None]:
+    """
+    Bracket depth at the start of each line (None for blank lines), ignoring
+    single-line string literals and comments. Good enough to find declaration
+    boundaries in swift/typescript/javascript/go without a real parser.
+    """
+    levels: List[int | None] = []
+    depth = 0
+    in_block_comment = False
+    for line in lines:
+        stripped = line.strip()
+        levels.append(depth if stripped else None)
+        text = _STRING_LITERAL_RE.sub("", line)
+        idx = 0
+        while idx < len(text):
+            if in_block_comment:
+                close = text.find("*/", idx)
+                if close < 0:
+                    break
+                in_block_comment = False
+                idx = close + 2
+                continue
+            if text.startswith("//", idx):
+                break
+            if text.startswith("/*", idx):
+                in_block_comment = True
+                idx += 2
+                continue
+            ch = text[idx]
+            if ch in _BRACKET_OPEN:
+                depth += 1
+            elif ch in _BRACKET_CLOSE:
+                depth = max(0, depth - 1)
+            idx += 1
+    return levels
+
+
+def _indent_levels(lines: Sequence[str]) -> List[int | None]:
+    return [len(line) - len(line.lstrip()) if line.strip() else None for line in lines]
+
+
+def _level_boundaries(lines: Sequence[str], levels: Sequence[int | None], start: int, end: int) -> List[int]:
+    interior = [levels[idx] for idx in range(start + 1, end) if levels[idx] is not None]
+    if not interior:
+        return []
+    level = min(interior)
+    out: List[int] = []
+    for idx in range(start + 1, end):
+        if levels[idx] != level:
+            continue
+        stripped = lines[idx].lstrip()
+        if stripped[:1] in _BRACKET_CLOSE or stripped.startswith(_LEADING_ATTACH_PREFIXES):
+            continue
+        out.append(idx)
+    return out
+
+
+def _python_child_starts(text: str) -> Dict[int, List[int]] | None:
+    """
+    Map each compound statement's start line (0-based, decorators included) to the start
+    lines of the statements nested directly inside it; key -1 holds module-level statements.
+    """
+    try:
+        tree = ast.parse(text)
+    except (SyntaxError, ValueError):
+        return None
+
+    def starts(body: Sequence[ast.stmt]) -> List[int]:
+        out: List[int] = []
+        for node in body:
+            decorators = getattr(node, "decorator_list", [])
+            out.append(min([node.lineno] + [d.lineno for d in decorators]) - 1)
+        return out
+
+    children: Dict[int, List[int]] = {-1: starts(tree.body)}
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.stmt):
+            continue
+        nested: List[ast.stmt] = []
+        for field in ("body", "orelse", "finalbody"):
+            value = getattr(node, field, None)
+            if isinstance(value, list):
+                nested.extend(item for item in value if isinstance(item, ast.stmt))
+        for handler in getattr(node, "handlers", []) or []:
+            nested.extend(handler.body)
+        for case in getattr(node, "cases", []) or []:
+            nested.extend(case.body)
+        if nested:
+            # Outer statements win when several start on one line (e.g. `if x: return`).
+            children.setdefault(starts([node])[0], sorted(starts(nested)))
+    return children
+
+
+def _attach_leading_lines(lines: Sequence[str], boundary: int, floor: int) -> int:
+    # Keep comments, doc-comments and decorators/attributes with the definition below them.
+    while boundary - 1 > floor:
+        stripped = lines[boundary - 1].strip()
+        if not stripped or not stripped.startswith(_LEADING_ATTACH_PREFIXES):
+            break
+        boundary -= 1
+    return boundary
+
+
+def chunk_structured(
+    lines: Sequence[str],
+    lang: str,
+    max_chars: int,
+) -> List[Tuple[int, int, str]] | None:
+    """
+    Chunk source along definition boundaries instead of fixed windows.
+
+    A definition larger than `max_chars` is split on its own members (methods, nested
+    blocks) and only an oversized leaf falls back to `chunk_lines` without overlap; the
+    resulting pieces are then packed greedily up to `max_chars` in file order. Returns None for
+    languages without structural support so callers can use the line chunker.
+    """
+    if lang not in LANG_SYMBOL_PATTERNS:
+        return None
+    if not lines:
+        return []
+
+    offsets = [0]
+    for line in lines:
+        offsets.append(offsets[-1] + len(line))
+
+    def size(start: int, end: int) -> int:
+        return offsets[end] - offsets[start]
+
+    child_starts: Callable[[int, int], List[int]]
+    py_children = _python_child_starts("".join(lines)) if lang == "python" else None
+    if py_children is not None:
+
+        def child_starts(start: int, end: int) -> List[int]:
+            if start == 0 and end == len(lines):
+                module_level = [b for b in py_children[-1] if start < b < end]
+                if module_level:
+                    return module_level
+            keys = [key for key in py_children if key >= 0 and start <= key < end]
+            return py_children[min(keys)] if keys else []
+
+    else:
+        levels = _indent_levels(lines) if lang == "python" else _brace_levels(lines)
+
+        def child_starts(start: int, end: int) -> List[int]:
+            return _level_boundaries(lines, levels, start, end)
+
+    def split(start: int, end: int, depth: int) -> List[Tuple[int, int]]:
+        if size(start, end) <= max_chars:
+            return [(start, end)]
+        starts = sorted({b for b in child_starts(start, end) if start < b < end})
+        if not starts or depth >= 8:
+            return [
+                (start + s_line - 1, start + e_line)
+                for s_line, e_line, _body in chunk_lines(lines[start:end], max_chars, 0)
+            ]
+        bounds: List[int] = []
+        floor = start
+        for boundary in starts:
+            boundary = _attach_leading_lines(lines, boundary, floor)
+            if boundary > floor:
+                bounds.append(boundary)
+                floor = boundary
+        atoms: List[Tuple[int, int]] = []
+        for unit_start, unit_end in zip([start] + bounds, bounds + [end]):
+            atoms.extend(split(unit_start, unit_end, depth + 1))
+        return atoms
+
+    # Pack consecutive atoms (whole definitions, or pieces of an oversized one) so the
+    # tail of a split class/function shares a chunk with the small definitions after it.
+    spans: List[Tuple[int, int]] = []
+    for atom_start, atom_end in split(0, len(lines), 0):
+        if spans and size(spans[-1][0], atom_end) <= max_chars:
+            spans[-1] = (spans[-1][0], atom_end)
+        else:
+            spans.append((atom_start, atom_end))
+
+    chunks: List[Tuple[int, int, str]] = []
+    for start, end in spans:
+        body = "".join(lines[start:end]).strip()
+        if body:
+            chunks.append((start + 1, end, body))
+    return chunks
+
+
+def chunk_simhash(tf: Mapping[str, int]) -> int:
+    weights = [0] * 64
+    for token, count in tf.items():
+        bits = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+        for idx in range(64):
+            weights[idx] += count if (bits >> idx) & 1 else -count
+    out = 0
+    for idx, weight in enumerate(weights):
+        if weight > 0:
+            out |= 1 << idx
+    return out
+
+
+def _simhash_bands(value: int) -> List[Tuple[int, int]]:
+    return [(band, (value >> (band * 16)) & 0xFFFF) for band in range(4)]
+
+
+def ensure_schema(conn: sqlite3.Connection) -> None:
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    conn.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS files (
+            path TEXT PRIMARY KEY,
+            lang TEXT NOT NULL,
+            module_key TEXT NOT NULL,
+            byte_size INTEGER NOT NULL,
+            line_count INTEGER NOT NULL,
+            content_hash TEXT NOT NULL,
+            summary TEXT NOT NULL,
+            symbols_json TEXT NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS chunks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            path TEXT NOT NULL,
+            lang TEXT NOT NULL,
+            start_line INTEGER NOT NULL,
+            end_line INTEGER NOT NULL,
+            token_count INTEGER NOT NULL,
+            text TEXT NOT NULL,
+            vector BLOB NOT NULL,
+            symbol_hint TEXT NOT NULL,
+            FOREIGN KEY(path) REFERENCES files(path) ON DELETE CASCADE
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_chunks_path ON chunks(path);
+
+        CREATE TABLE IF NOT EXISTS chunk_aliases (
+            chunk_id INTEGER NOT NULL,
+            path TEXT NOT NULL,
+            start_line INTEGER NOT NULL,
+            end_line INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            PRIMARY KEY(path, start_line),
+            FOREIGN KEY(chunk_id) REFERENCES chunks(id) ON DELETE CASCADE,
+            FOREIGN KEY(path) REFERENCES files(path) ON DELETE CASCADE
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_chunk_aliases_chunk ON chunk_aliases(chunk_id);
+
+        CREATE TABLE IF NOT EXISTS chunk_codes (
+            chunk_id INTEGER PRIMARY KEY,
+            bits BLOB NOT NULL,
+            FOREIGN KEY(chunk_id) REFERENCES chunks(id) ON DELETE CASCADE
+        );
+
+        CREATE TABLE IF NOT EXISTS postings (
             token TEXT NOT NULL,
             chunk_id INTEGER NOT NULL,
             tf INTEGER NOT NULL,
@@ -1117,6 +2171,18 @@ def ensure_schema(conn: sqlite3.Connection) -> None:
             key TEXT PRIMARY KEY,
             value TEXT NOT NULL
         );
+
+        CREATE TABLE IF NOT EXISTS shards (
+            name TEXT PRIMARY KEY,
+            shard_no INTEGER NOT NULL,
+            file_name TEXT NOT NULL,
+            digest TEXT NOT NULL,
+            file_count INTEGER NOT NULL,
+            chunk_count INTEGER NOT NULL,
+            token_total INTEGER NOT NULL,
+            alias_count INTEGER NOT NULL,
+            vector_dim INTEGER NOT NULL
+        );
         """
     )
 
@@ -1125,11 +2191,14 @@ def clear_index(conn: sqlite3.Connection) -> None:
     conn.executescript(
         """
         DELETE FROM postings;
+        DELETE FROM chunk_aliases;
+        DELETE FROM chunk_codes;
         DELETE FROM chunks;
         DELETE FROM files;
         DELETE FROM token_df;
         DELETE FROM modules;
         DELETE FROM meta;
+        DELETE FROM shards;
         """
     )
 
@@ -1162,69 +2231,342 @@ def normalize_scores(scores: Mapping[int, float]) -> Dict[int, float]:
     return {key: (value - low) / (high - low) for key, value in scores.items()}
 
 
-def build_index(args: argparse.Namespace) -> int:
-    root = pathlib.Path(args.root).resolve()
-    index_dir = (root / args.index_dir).resolve()
-    index_dir.mkdir(parents=True, exist_ok=True)
-    db_path = index_dir / DEFAULT_DB_NAME
+class IndexBuildError(RuntimeError):
+    pass
 
-    ignored_dirs = set(DEFAULT_IGNORED_DIRS)
-    ignored_dirs.update(args.ignore_dir or [])
 
-    rel_paths = discover_files(
-        root=root,
-        use_git_tracked=not args.all_files,
-        max_file_bytes=args.max_file_bytes,
-        ignored_dirs=ignored_dirs,
-    )
-    if not rel_paths:
-        print("No indexable files found.")
-        return 1
+ModulePayload = Tuple[str, str, int, int, List[str], List[str]]
 
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    ensure_schema(conn)
 
-    file_rows: List[FileDraft] = []
-    chunk_rows: List[ChunkDraft] = []
-    token_df: collections.Counter[str] = collections.Counter()
-    module_drafts: Dict[str, ModuleDraft] = {}
-    skipped: List[str] = []
+class BuildProfiler:
+    """
+    Wall and CPU time per build phase plus throughput counters.
 
-    for rel_path in rel_paths:
-        abs_path = root / rel_path
+    Hot loops use `mark()`/`lap()` (two clock reads per step) rather than a context
+    manager. With `progress`, phase ends and periodic file counts go to stderr.
+    With `trace_memory`, tracemalloc runs for the whole build; it slows allocation-heavy
+    phases noticeably, so it is opt-in.
+    """
+
+    def __init__(self, *, progress: bool = False, trace_memory: bool = False) -> None:
+        self.progress = progress
+        self.trace_memory = trace_memory
+        self.phases: Dict[str, List[float]] = {}
+        self.files = 0
+        self.chunks = 0
+        self.bytes_read = 0
+        self.started = self.mark()
+        self._last_progress = self.started[0]
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @staticmethod
+    def mark() -> Tuple[float, float]:
+        return time.perf_counter(), time.process_time()
+
+    def lap(self, phase: str, since: Tuple[float, float]) -> Tuple[float, float]:
+        now = self.mark()
+        totals = self.phases.setdefault(phase, [0.0, 0.0])
+        totals[0] += now[0] - since[0]
+        totals[1] += now[1] - since[1]
+        return now
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        start = self.mark()
         try:
-            text = read_text_file(abs_path)
-        except Exception:
-            skipped.append(str(rel_path))
-            continue
+            yield
+        finally:
+            self.lap(name, start)
+            if self.progress:
+                print(f"[index] {name}: {self.phases[name][0]:.3f}s", file=sys.stderr)
+
+    def file_done(self, done: int, total: int) -> None:
+        self.files += 1
+        if not self.progress:
+            return
+        now = time.perf_counter()
+        if now - self._last_progress >= PROFILE_PROGRESS_INTERVAL_SEC or done == total:
+            self._last_progress = now
+            rate = self.files / max(1e-9, now - self.started[0])
+            print(f"[index] drafted {done}/{total} files ({rate:.0f} files/s)", file=sys.stderr)
+
+    def report(self) -> Dict[str, object]:
+        wall = time.perf_counter() - self.started[0]
+        cpu = time.process_time() - self.started[1]
+        out: Dict[str, object] = {
+            "wall_sec": round(wall, 4),
+            "cpu_sec": round(cpu, 4),
+            "phases": {
+                name: {"wall_sec": round(values[0], 4), "cpu_sec": round(values[1], 4)}
+                for name, values in sorted(self.phases.items(), key=lambda item: item[1][0], reverse=True)
+            },
+            "files": self.files,
+            "chunks": self.chunks,
+            "bytes_read": self.bytes_read,
+            "files_per_sec": round(self.files / wall, 2) if wall > 0 else 0.0,
+            "chunks_per_sec": round(self.chunks / wall, 2) if wall > 0 else 0.0,
+        }
+        max_rss_kb = _max_rss_kb()
+        if max_rss_kb:
+            out["max_rss_kb"] = max_rss_kb
+        if self.trace_memory and tracemalloc.is_tracing():
+            out["tracemalloc_peak_bytes"] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        return out
+
+
+def _max_rss_kb() -> int:
+    try:
+        import resource
+    except ImportError:
+        return 0
+    rss = int(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+    # macOS reports bytes, Linux kilobytes.
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+class BuildCheckpoint:
+    """
+    Spill file for an in-progress build: each file's draft row and raw chunks are
+    written every `every` files, keyed by path plus (size, mtime). A later
+    `index --resume` with the same settings and file list replays those files
+    instead of reading and chunking them again. When the persistent embedding cache
+    is disabled, received embeddings are kept in a sidecar next to it.
+    The files are removed once a build commits.
+    """
+
+    def __init__(self, index_dir: pathlib.Path, fingerprint: str, *, resume: bool, every: int) -> None:
+        self.path = index_dir / DEFAULT_CHECKPOINT_NAME
+        self.embeddings_path = index_dir / DEFAULT_CHECKPOINT_EMBEDDINGS_NAME
+        self.every = max(1, int(every))
+        self.pending: List[Tuple[str, int, int, str]] = []
+        self.replayed = 0
+        self.conn = sqlite3.connect(self.path)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS checkpoint_meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS checkpoint_files (
+                path TEXT PRIMARY KEY,
+                byte_size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                payload TEXT NOT NULL
+            );
+            """
+        )
+        row = self.conn.execute("SELECT value FROM checkpoint_meta WHERE key = 'fingerprint'").fetchone()
+        stored = str(row[0]) if row else ""
+        self.resumable = bool(resume and stored == fingerprint)
+        if resume and stored and not self.resumable:
+            print("Checkpoint was taken with different settings or files; starting over.", file=sys.stderr)
+        if not self.resumable:
+            with self.conn:
+                self.conn.execute("DELETE FROM checkpoint_files")
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO checkpoint_meta(key, value) VALUES('fingerprint', ?)",
+                    (fingerprint,),
+                )
+            self.embeddings_path.unlink(missing_ok=True)
+        self.stored_files = int(self.conn.execute("SELECT COUNT(*) FROM checkpoint_files").fetchone()[0])
+
+    def lookup(self, rel_path: str, stat: os.stat_result) -> Tuple[FileDraft, List[Tuple[int, int, str]]] | None:
+        if not self.resumable:
+            return None
+        row = self.conn.execute(
+            "SELECT payload FROM checkpoint_files WHERE path = ? AND byte_size = ? AND mtime_ns = ?",
+            (rel_path, int(stat.st_size), int(stat.st_mtime_ns)),
+        ).fetchone()
+        if row is None:
+            return None
+        payload = json.loads(row[0])
+        self.replayed += 1
+        chunks = [(int(start), int(end), str(body)) for start, end, body in payload["chunks"]]
+        return FileDraft(**payload["file"]), chunks
+
+    def record(
+        self,
+        file_draft: FileDraft,
+        stat: os.stat_result,
+        chunks: Sequence[Tuple[int, int, str]],
+    ) -> None:
+        payload = json.dumps({"file": dataclasses.asdict(file_draft), "chunks": list(chunks)}, ensure_ascii=False)
+        self.pending.append((file_draft.path, int(stat.st_size), int(stat.st_mtime_ns), payload))
+        if len(self.pending) >= self.every:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.pending:
+            return
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO checkpoint_files(path, byte_size, mtime_ns, payload) VALUES(?, ?, ?, ?)",
+                self.pending,
+            )
+        self.pending = []
+
+    def close(self) -> None:
+        self.flush()
+        self.conn.close()
 
-        lines = text.splitlines(keepends=True)
-        lang = detect_lang(rel_path)
-        symbols = extract_symbols(lang, text)
-        module_key = module_key_for_path(rel_path, args.module_depth)
-        summary = summarize_file(str(rel_path), lang, lines, symbols)
-        content_hash = hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+    def discard(self) -> None:
+        self.conn.close()
+        for path in (self.path, self.embeddings_path):
+            for suffix in ("", "-wal", "-shm", "-journal"):
+                path.with_name(path.name + suffix).unlink(missing_ok=True)
 
-        file_rows.append(
-            FileDraft(
+
+def build_fingerprint(args: argparse.Namespace, cfg: EmbeddingConfig, rel_paths: Sequence[pathlib.Path]) -> str:
+    digest = hashlib.blake2b(shard_config_fingerprint(args, cfg).encode("utf-8"), digest_size=16)
+    digest.update(str(getattr(args, "layout", INDEX_LAYOUT_SINGLE)).encode("utf-8"))
+    for rel_path in sorted(str(path) for path in rel_paths):
+        digest.update(rel_path.encode("utf-8") + b"\0")
+    return digest.hexdigest()
+
+
+def draft_large_file(
+    root: pathlib.Path,
+    rel_path: pathlib.Path,
+    stat: os.stat_result,
+    args: argparse.Namespace,
+    chunk_chars: int,
+) -> Tuple[FileDraft, List[Tuple[int, int, str]]]:
+    """
+    Draft one large-tier file in a single streaming pass: hash, line count and
+    sparse chunks come from `iter_text_lines`; summary and symbols only look at
+    the first LARGE_FILE_HEAD_CHARS characters.
+    """
+    lang = detect_lang(rel_path)
+    hasher = hashlib.blake2b(digest_size=16)
+    head: List[str] = []
+    head_chars = 0
+    line_count = 0
+
+    def observed(lines):
+        nonlocal head_chars, line_count
+        for line in lines:
+            line_count += 1
+            hasher.update(line.encode("utf-8"))
+            if head_chars < LARGE_FILE_HEAD_CHARS:
+                head.append(line)
+                head_chars += len(line)
+            yield line
+
+    chunks = list(stream_chunk_lines(observed(iter_text_lines(root / rel_path)), chunk_chars))
+    symbols = extract_symbols(lang, "".join(head))
+    summary = summarize_file(str(rel_path), lang, head, symbols)
+    if line_count > len(head):
+        summary = f"{summary} (large file, {line_count} lines)"
+    file_draft = FileDraft(
+        path=str(rel_path),
+        lang=lang,
+        module_key=module_key_for_path(rel_path, args.module_depth),
+        byte_size=stat.st_size,
+        line_count=line_count,
+        content_hash=hasher.hexdigest(),
+        summary=summary,
+        symbols=symbols,
+    )
+    return file_draft, chunks
+
+
+def draft_index_files(
+    root: pathlib.Path,
+    rel_paths: Sequence[pathlib.Path],
+    args: argparse.Namespace,
+    checkpoint: BuildCheckpoint | None = None,
+    profiler: BuildProfiler | None = None,
+    stats: Mapping[str, os.stat_result] | None = None,
+) -> IndexDraft:
+    """
+    Read, chunk and deduplicate `rel_paths` into in-memory rows. Exact (and, with
+    `--near-dup-distance`, near) duplicate chunks become aliases of the first copy.
+    Files already spilled to `checkpoint` are replayed instead of re-read, and
+    stats gathered by `discover_files` are reused rather than taken again.
+    """
+    profiler = profiler or BuildProfiler()
+    draft = IndexDraft()
+    chunker = getattr(args, "chunker", DEFAULT_CHUNKER)
+    large_file_chars = args.chunk_chars * LARGE_FILE_CHUNK_SCALE
+    near_dup_distance = max(0, min(MAX_NEAR_DUP_DISTANCE, int(getattr(args, "near_dup_distance", 0))))
+    canonical_by_hash: Dict[str, Tuple[int, str]] = {}
+    simhash_by_row: Dict[int, int] = {}
+    simhash_bands: Dict[Tuple[int, int], List[int]] = collections.defaultdict(list)
+
+    for rel_path in rel_paths:
+        abs_path = root / rel_path
+        lap = profiler.mark()
+        stat = stats.get(str(rel_path)) if stats else None
+        if stat is None:
+            try:
+                stat = abs_path.stat()
+            except OSError:
+                draft.skipped.append(str(rel_path))
+                continue
+        replayed = checkpoint.lookup(str(rel_path), stat) if checkpoint is not None else None
+        if replayed is not None:
+            file_draft, chunks = replayed
+            lap = profiler.lap("checkpoint", lap)
+        elif stat.st_size > getattr(args, "max_file_bytes", DEFAULT_MAX_FILE_BYTES):
+            try:
+                file_draft, chunks = draft_large_file(root, rel_path, stat, args, large_file_chars)
+            except Exception:
+                draft.skipped.append(str(rel_path))
+                continue
+            draft.large_files.append(str(rel_path))
+            profiler.bytes_read += stat.st_size
+            lap = profiler.lap("stream", lap)
+            if checkpoint is not None:
+                checkpoint.record(file_draft, stat, chunks)
+                lap = profiler.lap("checkpoint", lap)
+        else:
+            try:
+                text = read_text_file(abs_path)
+            except Exception:
+                draft.skipped.append(str(rel_path))
+                continue
+            profiler.bytes_read += stat.st_size
+            lap = profiler.lap("read", lap)
+
+            lines = text.splitlines(keepends=True)
+            lang = detect_lang(rel_path)
+            symbols = extract_symbols(lang, text)
+            summary = summarize_file(str(rel_path), lang, lines, symbols)
+            lap = profiler.lap("parse", lap)
+            content_hash = hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+            lap = profiler.lap("hash", lap)
+            file_draft = FileDraft(
                 path=str(rel_path),
                 lang=lang,
-                module_key=module_key,
-                byte_size=abs_path.stat().st_size,
+                module_key=module_key_for_path(rel_path, args.module_depth),
+                byte_size=stat.st_size,
                 line_count=len(lines),
                 content_hash=content_hash,
                 summary=summary,
                 symbols=symbols,
             )
-        )
 
-        chunks = chunk_lines(
-            lines=lines,
-            max_chars=args.chunk_chars,
-            overlap_lines=args.chunk_overlap_lines,
-        )
-        module_state = module_drafts.setdefault(module_key, ModuleDraft())
+            chunks = None
+            if chunker == "structure":
+                chunks = chunk_structured(lines, lang, args.chunk_chars)
+            if chunks is None:
+                chunks = chunk_lines(
+                    lines=lines,
+                    max_chars=args.chunk_chars,
+                    overlap_lines=args.chunk_overlap_lines,
+                )
+            lap = profiler.lap("chunk", lap)
+            if checkpoint is not None:
+                checkpoint.record(file_draft, stat, chunks)
+                lap = profiler.lap("checkpoint", lap)
+
+        draft.files.append(file_draft)
+        lang = file_draft.lang
+        symbols = file_draft.symbols
+        module_key = file_draft.module_key
+        module_state = draft.modules.setdefault(module_key, ModuleDraft())
         module_state.file_count += 1
         module_state.langs[lang] += 1
         module_state.paths.append(str(rel_path))
@@ -1232,13 +2574,41 @@ def build_index(args: argparse.Namespace) -> int:
             module_state.symbols[symbol] += 1
 
         for start_line, end_line, body in chunks:
+            body_hash = hashlib.blake2b(body.encode("utf-8"), digest_size=16).hexdigest()
+            known = canonical_by_hash.get(body_hash)
+            if known is not None:
+                # Vendored/generated copies point at the first chunk with the same body.
+                draft.aliases.append(ChunkAliasDraft(known[0], str(rel_path), start_line, end_line, known[1]))
+                draft.deduped_chars += len(body)
+                module_state.chunk_count += 1
+                continue
             tokens = tokenize(body)
             if not tokens:
                 continue
             tf = collections.Counter(tokens)
+            if near_dup_distance:
+                fingerprint = chunk_simhash(tf)
+                near = None
+                for band_key in _simhash_bands(fingerprint):
+                    for candidate in simhash_bands.get(band_key, ()):
+                        if (simhash_by_row[candidate] ^ fingerprint).bit_count() <= near_dup_distance:
+                            near = candidate
+                            break
+                    if near is not None:
+                        break
+                if near is not None:
+                    canonical_by_hash[body_hash] = (near, "near")
+                    draft.aliases.append(ChunkAliasDraft(near, str(rel_path), start_line, end_line, "near"))
+                    draft.deduped_chars += len(body)
+                    module_state.chunk_count += 1
+                    continue
+                simhash_by_row[len(draft.chunks)] = fingerprint
+                for band_key in _simhash_bands(fingerprint):
+                    simhash_bands[band_key].append(len(draft.chunks))
+            canonical_by_hash[body_hash] = (len(draft.chunks), "exact")
             for token in tf:
-                token_df[token] += 1
-            chunk_rows.append(
+                draft.token_df[token] += 1
+            draft.chunks.append(
                 ChunkDraft(
                     path=str(rel_path),
                     lang=lang,
@@ -1251,37 +2621,25 @@ def build_index(args: argparse.Namespace) -> int:
                 )
             )
             module_state.chunk_count += 1
+        profiler.lap("tokenize", lap)
+        profiler.file_done(len(draft.files), len(rel_paths))
+
+    if checkpoint is not None:
+        checkpoint.flush()
+    profiler.chunks += len(draft.chunks)
+    return draft
 
-    if not file_rows or not chunk_rows:
-        print("No textual content available after filtering.")
-        return 1
 
-    num_chunks = len(chunk_rows)
-    avg_chunk_tokens = sum(c.token_count for c in chunk_rows) / num_chunks
-    idf = {
+def draft_idf(draft: IndexDraft) -> Dict[str, float]:
+    num_chunks = len(draft.chunks)
+    return {
         token: math.log((num_chunks + 1.0) / (df + 0.5)) + 1.0
-        for token, df in token_df.items()
+        for token, df in draft.token_df.items()
     }
 
-    embedding_provider = str(args.embedding_provider).strip().lower()
-    if embedding_provider not in EMBEDDING_PROVIDERS:
-        print(
-            f"Unsupported embedding provider `{embedding_provider}`. "
-            f"Choose one of: {', '.join(sorted(EMBEDDING_PROVIDERS))}.",
-            file=sys.stderr,
-        )
-        return 2
 
-    embedding_cfg = EmbeddingConfig(
-        provider=embedding_provider,
-        vector_dim=args.vector_dim,
-        openai_model=args.openai_model,
-        openai_batch_size=max(1, args.openai_batch_size),
-        openai_timeout_sec=max(1, args.openai_timeout_sec),
-        openai_dimensions=args.openai_dimensions,
-    )
-
-    module_payloads: List[Tuple[str, str, int, int, List[str], List[str]]] = []
+def module_payloads_for(module_drafts: Mapping[str, ModuleDraft]) -> List[ModulePayload]:
+    module_payloads: List[ModulePayload] = []
     for module_key, state in module_drafts.items():
         top_symbols = [name for name, _ in state.symbols.most_common(10)]
         top_paths = sorted(state.paths)[:6]
@@ -1301,216 +2659,873 @@ def build_index(args: argparse.Namespace) -> int:
                 top_paths,
             )
         )
+    return module_payloads
 
-    chunk_vectors: List[List[float]] = []
-    module_vectors: List[List[float]] = []
-    actual_vector_dim = embedding_cfg.vector_dim
 
-    if embedding_cfg.provider == "openai":
-        api_key = os.environ.get("OPENAI_API_KEY", "")
-        if not api_key:
-            print(
-                "OPENAI_API_KEY is required when using --embedding-provider openai.",
-                file=sys.stderr,
-            )
-            return 2
+def embedding_config_from_args(args: argparse.Namespace) -> EmbeddingConfig:
+    embedding_provider = str(args.embedding_provider).strip().lower()
+    if embedding_provider not in EMBEDDING_PROVIDERS:
+        raise IndexBuildError(
+            f"Unsupported embedding provider `{embedding_provider}`. "
+            f"Choose one of: {', '.join(sorted(EMBEDDING_PROVIDERS))}."
+        )
+    return EmbeddingConfig(
+        provider=embedding_provider,
+        vector_dim=args.vector_dim,
+        openai_model=args.openai_model,
+        openai_batch_size=max(1, args.openai_batch_size),
+        openai_timeout_sec=max(1, args.openai_timeout_sec),
+        openai_dimensions=args.openai_dimensions,
+        openai_base_url=resolve_openai_base_url(args.openai_base_url),
+        openai_concurrency=max(1, args.openai_concurrency),
+        openai_requests_per_min=max(0, args.openai_rpm),
+        openai_max_retries=max(0, args.openai_max_retries),
+    )
 
+
+def embed_index_draft(
+    draft: IndexDraft,
+    module_payloads: Sequence[ModulePayload],
+    *,
+    cfg: EmbeddingConfig,
+    index_dir: pathlib.Path,
+    args: argparse.Namespace,
+    cache_stats: Dict[str, int],
+    checkpoint: BuildCheckpoint | None = None,
+) -> Tuple[List[List[float]], List[List[float]], int]:
+    """
+    Chunk and module vectors for a draft. Local vectors are weighted with the draft's
+    own idf, so a draft (or shard) can be vectorized without looking at the rest of
+    the repository.
+    """
+    if cfg.provider != "openai":
+        idf = draft_idf(draft)
+        chunk_vectors = [vectorize_tf(chunk.tf, idf, cfg.vector_dim) for chunk in draft.chunks]
+        module_vectors: List[List[float]] = []
+        for _module_key, summary, _file_count, _chunk_count, top_symbols, _top_paths in module_payloads:
+            module_tf = collections.Counter(tokenize(summary + " " + " ".join(top_symbols)))
+            module_vectors.append(vectorize_tf(module_tf, idf, cfg.vector_dim))
+        return chunk_vectors, module_vectors, cfg.vector_dim
+
+    api_key = os.environ.get("OPENAI_API_KEY", "")
+    if not api_key:
+        raise IndexBuildError("OPENAI_API_KEY is required when using --embedding-provider openai.")
+
+    embedding_cache: EmbeddingCache | None = None
+    evict = True
+    if not getattr(args, "no_embedding_cache", False):
+        cache_max_mb = getattr(args, "embedding_cache_max_mb", DEFAULT_EMBEDDING_CACHE_MAX_MB)
+        embedding_cache = EmbeddingCache(
+            index_dir / DEFAULT_EMBEDDING_CACHE_NAME,
+            max_bytes=max(0, int(cache_max_mb)) * 1024 * 1024,
+        )
+    elif checkpoint is not None:
+        # Without the persistent cache, batches still land in the checkpoint sidecar
+        # so a resumed build does not pay for them twice.
+        embedding_cache = EmbeddingCache(checkpoint.embeddings_path, max_bytes=0)
+        evict = False
+
+    try:
         print("Generating OpenAI embeddings for chunks...")
-        chunk_vectors = openai_embed_texts(
-            texts=[chunk.text for chunk in chunk_rows],
-            model=embedding_cfg.openai_model,
+        chunk_vectors = cached_openai_embed_texts(
+            [chunk.text for chunk in draft.chunks],
+            cfg=cfg,
             api_key=api_key,
-            timeout_sec=embedding_cfg.openai_timeout_sec,
-            batch_size=embedding_cfg.openai_batch_size,
-            dimensions=embedding_cfg.openai_dimensions,
+            cache=embedding_cache,
+            stats=cache_stats,
         )
-        if not chunk_vectors:
-            print("OpenAI embedding returned no vectors for chunks.", file=sys.stderr)
-            return 2
-        actual_vector_dim = len(chunk_vectors[0])
-        if any(len(vec) != actual_vector_dim for vec in chunk_vectors):
-            print("Inconsistent chunk embedding dimensions from OpenAI.", file=sys.stderr)
-            return 2
-
         print("Generating OpenAI embeddings for modules...")
-        module_vectors = openai_embed_texts(
-            texts=[item[1] for item in module_payloads],
-            model=embedding_cfg.openai_model,
+        module_vectors = cached_openai_embed_texts(
+            [item[1] for item in module_payloads],
+            cfg=cfg,
             api_key=api_key,
-            timeout_sec=embedding_cfg.openai_timeout_sec,
-            batch_size=embedding_cfg.openai_batch_size,
-            dimensions=embedding_cfg.openai_dimensions,
+            cache=embedding_cache,
+            stats=cache_stats,
         )
-        if len(module_vectors) != len(module_payloads):
-            print("OpenAI embedding returned invalid module vector count.", file=sys.stderr)
-            return 2
-        if any(len(vec) != actual_vector_dim for vec in module_vectors):
-            print("Inconsistent module embedding dimensions from OpenAI.", file=sys.stderr)
-            return 2
-    else:
-        actual_vector_dim = embedding_cfg.vector_dim
-        chunk_vectors = [vectorize_tf(chunk.tf, idf, actual_vector_dim) for chunk in chunk_rows]
-        for module_key, summary, _file_count, _chunk_count, top_symbols, _top_paths in module_payloads:
-            module_tf = collections.Counter(tokenize(summary + " " + " ".join(top_symbols)))
-            module_vectors.append(vectorize_tf(module_tf, idf, actual_vector_dim))
+        if embedding_cache is not None and evict:
+            cache_stats["evicted"] = cache_stats.get("evicted", 0) + embedding_cache.evict()
+            cache_stats["cache_bytes"] = embedding_cache.total_bytes()
+    finally:
+        if embedding_cache is not None:
+            embedding_cache.close()
+
+    if not chunk_vectors:
+        raise IndexBuildError("OpenAI embedding returned no vectors for chunks.")
+    actual_vector_dim = len(chunk_vectors[0])
+    if any(len(vec) != actual_vector_dim for vec in chunk_vectors):
+        raise IndexBuildError("Inconsistent chunk embedding dimensions from OpenAI.")
+    if len(module_vectors) != len(module_payloads):
+        raise IndexBuildError("OpenAI embedding returned invalid module vector count.")
+    if any(len(vec) != actual_vector_dim for vec in module_vectors):
+        raise IndexBuildError("Inconsistent module embedding dimensions from OpenAI.")
+    return chunk_vectors, module_vectors, actual_vector_dim
+
+
+def write_chunk_rows(
+    conn: sqlite3.Connection,
+    draft: IndexDraft,
+    chunk_vectors: Sequence[Sequence[float]],
+    id_base: int = 0,
+) -> None:
+    """
+    Insert files, chunks (with codes and postings), aliases and token_df. With a
+    non-zero `id_base`, chunk ids are `id_base + 1, id_base + 2, ...` so rows from
+    different shards never collide once mounted side by side.
+    """
+    conn.executemany(
+        """
+        INSERT INTO files(path, lang, module_key, byte_size, line_count, content_hash, summary, symbols_json)
+        VALUES(?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        [
+            (
+                f.path,
+                f.lang,
+                f.module_key,
+                f.byte_size,
+                f.line_count,
+                f.content_hash,
+                f.summary,
+                json.dumps(f.symbols, ensure_ascii=False),
+            )
+            for f in draft.files
+        ],
+    )
 
-    with conn:
-        clear_index(conn)
-        conn.executemany(
+    chunk_ids: List[int] = []
+    for position, (chunk, vec) in enumerate(zip(draft.chunks, chunk_vectors), start=1):
+        cursor = conn.execute(
             """
-            INSERT INTO files(path, lang, module_key, byte_size, line_count, content_hash, summary, symbols_json)
-            VALUES(?, ?, ?, ?, ?, ?, ?, ?)
+            INSERT INTO chunks(id, path, lang, start_line, end_line, token_count, text, vector, symbol_hint)
+            VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?)
             """,
-            [
-                (
-                    f.path,
-                    f.lang,
-                    f.module_key,
-                    f.byte_size,
-                    f.line_count,
-                    f.content_hash,
-                    f.summary,
-                    json.dumps(f.symbols, ensure_ascii=False),
-                )
-                for f in file_rows
-            ],
+            (
+                id_base + position if id_base else None,
+                chunk.path,
+                chunk.lang,
+                chunk.start_line,
+                chunk.end_line,
+                chunk.token_count,
+                chunk.text,
+                pack_vector(vec),
+                chunk.symbol_hint,
+            ),
+        )
+        chunk_id = int(cursor.lastrowid)
+        chunk_ids.append(chunk_id)
+        conn.execute("INSERT INTO chunk_codes(chunk_id, bits) VALUES(?, ?)", (chunk_id, ternary_code(vec)))
+        conn.executemany(
+            "INSERT INTO postings(token, chunk_id, tf) VALUES(?, ?, ?)",
+            [(token, chunk_id, tf) for token, tf in chunk.tf.items()],
         )
 
-        for chunk, vec in zip(chunk_rows, chunk_vectors):
-            cursor = conn.execute(
-                """
-                INSERT INTO chunks(path, lang, start_line, end_line, token_count, text, vector, symbol_hint)
-                VALUES(?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    chunk.path,
-                    chunk.lang,
-                    chunk.start_line,
-                    chunk.end_line,
-                    chunk.token_count,
-                    chunk.text,
-                    pack_vector(vec),
-                    chunk.symbol_hint,
-                ),
-            )
-            chunk_id = int(cursor.lastrowid)
-            conn.executemany(
-                "INSERT INTO postings(token, chunk_id, tf) VALUES(?, ?, ?)",
-                [(token, chunk_id, tf) for token, tf in chunk.tf.items()],
-            )
+    conn.executemany(
+        "INSERT INTO chunk_aliases(chunk_id, path, start_line, end_line, kind) VALUES(?, ?, ?, ?, ?)",
+        [
+            (chunk_ids[alias.canonical], alias.path, alias.start_line, alias.end_line, alias.kind)
+            for alias in draft.aliases
+        ],
+    )
 
-        conn.executemany(
-            "INSERT INTO token_df(token, df) VALUES(?, ?)",
-            [(token, df) for token, df in token_df.items()],
+    conn.executemany(
+        "INSERT INTO token_df(token, df) VALUES(?, ?)",
+        [(token, df) for token, df in draft.token_df.items()],
+    )
+
+
+def write_module_rows(
+    conn: sqlite3.Connection,
+    module_payloads: Sequence[ModulePayload],
+    module_vectors: Sequence[Sequence[float]],
+) -> None:
+    for (module_key, summary, file_count, chunk_count, top_symbols, top_paths), module_vec in zip(
+        module_payloads,
+        module_vectors,
+    ):
+        conn.execute(
+            """
+            INSERT INTO modules(module_key, summary, file_count, chunk_count, top_symbols, top_paths, vector)
+            VALUES(?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                module_key,
+                summary,
+                file_count,
+                chunk_count,
+                json.dumps(top_symbols, ensure_ascii=False),
+                json.dumps(top_paths, ensure_ascii=False),
+                pack_vector(module_vec),
+            ),
         )
 
-        for (module_key, summary, file_count, chunk_count, top_symbols, top_paths), module_vec in zip(
-            module_payloads,
-            module_vectors,
-        ):
-            conn.execute(
-                """
-                INSERT INTO modules(module_key, summary, file_count, chunk_count, top_symbols, top_paths, vector)
-                VALUES(?, ?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    module_key,
-                    summary,
-                    file_count,
-                    chunk_count,
-                    json.dumps(top_symbols, ensure_ascii=False),
-                    json.dumps(top_paths, ensure_ascii=False),
-                    pack_vector(module_vec),
-                ),
-            )
 
+def collect_git_meta(root: pathlib.Path) -> Dict[str, str]:
+    git_head = ""
+    git_head_committed_at = ""
+    try:
+        proc = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=root,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        git_head = proc.stdout.strip()
+    except Exception:
         git_head = ""
+    try:
+        proc = subprocess.run(
+            ["git", "show", "-s", "--format=%cI", "HEAD"],
+            cwd=root,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        git_head_committed_at = proc.stdout.strip()
+    except Exception:
         git_head_committed_at = ""
-        try:
-            proc = subprocess.run(
-                ["git", "rev-parse", "HEAD"],
-                cwd=root,
-                capture_output=True,
-                text=True,
-                check=True,
-            )
-            git_head = proc.stdout.strip()
-        except Exception:
-            git_head = ""
-        try:
-            proc = subprocess.run(
-                ["git", "show", "-s", "--format=%cI", "HEAD"],
-                cwd=root,
-                capture_output=True,
-                text=True,
-                check=True,
-            )
-            git_head_committed_at = proc.stdout.strip()
-        except Exception:
-            git_head_committed_at = ""
 
+    git_status = ""
+    git_dirty = "0"
+    git_status_hash = ""
+    try:
+        proc = subprocess.run(
+            ["git", "status", "--porcelain"],
+            cwd=root,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        git_status = filter_git_status_porcelain(proc.stdout or "")
+    except Exception:
         git_status = ""
-        git_dirty = "0"
-        git_status_hash = ""
-        try:
-            proc = subprocess.run(
-                ["git", "status", "--porcelain"],
-                cwd=root,
-                capture_output=True,
-                text=True,
-                check=True,
-            )
-            git_status = filter_git_status_porcelain(proc.stdout or "")
-        except Exception:
-            git_status = ""
-        if git_status.strip():
-            git_dirty = "1"
-        git_status_hash = hashlib.blake2b(git_status.encode("utf-8"), digest_size=16).hexdigest()
-
-        meta_rows = {
-            "index_version": INDEX_VERSION,
-            "created_at_utc": dt.datetime.now(dt.timezone.utc).replace(microsecond=0).isoformat(),
-            "root": str(root),
-            "git_head": git_head,
-            "git_head_committed_at": git_head_committed_at,
-            "git_dirty": git_dirty,
-            "git_status_hash": git_status_hash,
-            "file_count": str(len(file_rows)),
-            "chunk_count": str(num_chunks),
+    if git_status.strip():
+        git_dirty = "1"
+    git_status_hash = hashlib.blake2b(git_status.encode("utf-8"), digest_size=16).hexdigest()
+    return {
+        "git_head": git_head,
+        "git_head_committed_at": git_head_committed_at,
+        "git_dirty": git_dirty,
+        "git_status_hash": git_status_hash,
+    }
+
+
+def index_content_settings(args: argparse.Namespace) -> Dict[str, str]:
+    """
+    Indexer settings, beyond chunker and embeddings, that change which files are
+    indexed or how they are chunked. Written to meta and part of the bundle key.
+    """
+    return {
+        "chunk_chars": str(getattr(args, "chunk_chars", DEFAULT_CHUNK_CHARS)),
+        "chunk_overlap_lines": str(getattr(args, "chunk_overlap_lines", DEFAULT_CHUNK_OVERLAP_LINES)),
+        "module_depth": str(getattr(args, "module_depth", DEFAULT_MODULE_DEPTH)),
+        "max_file_bytes": str(getattr(args, "max_file_bytes", DEFAULT_MAX_FILE_BYTES)),
+        "max_large_file_bytes": str(getattr(args, "max_large_file_bytes", DEFAULT_MAX_LARGE_FILE_BYTES)),
+        "near_dup_distance": str(int(getattr(args, "near_dup_distance", 0))),
+        "ignore_dirs": ",".join(sorted(set(getattr(args, "ignore_dir", None) or []))),
+        "honor_gitignore": "0" if getattr(args, "no_gitignore", False) else "1",
+    }
+
+
+def index_meta_rows(
+    root: pathlib.Path,
+    args: argparse.Namespace,
+    cfg: EmbeddingConfig,
+    *,
+    file_count: int,
+    chunk_count: int,
+    avg_chunk_tokens: float,
+    vector_dim: int,
+    module_count: int,
+    alias_count: int,
+) -> Dict[str, str]:
+    query_cache_ttl_hours = max(0.0, float(getattr(args, "query_cache_ttl_hours", DEFAULT_QUERY_CACHE_TTL_HOURS)))
+    meta_rows = {
+        "index_version": INDEX_VERSION,
+        "created_at_utc": dt.datetime.now(dt.timezone.utc).replace(microsecond=0).isoformat(),
+        "root": str(root),
+    }
+    meta_rows.update(collect_git_meta(root))
+    meta_rows.update(
+        {
+            "file_count": str(file_count),
+            "chunk_count": str(chunk_count),
             "avg_chunk_tokens": f"{avg_chunk_tokens:.3f}",
-            "vector_dim": str(actual_vector_dim),
-            "module_count": str(len(module_drafts)),
+            "vector_dim": str(vector_dim),
+            "module_count": str(module_count),
             "use_git_tracked": "0" if args.all_files else "1",
-            "embedding_provider": embedding_cfg.provider,
-            "embedding_model": embedding_cfg.openai_model if embedding_cfg.provider == "openai" else "",
-            "openai_batch_size": str(embedding_cfg.openai_batch_size),
-            "openai_timeout_sec": str(embedding_cfg.openai_timeout_sec),
-            "openai_dimensions": str(embedding_cfg.openai_dimensions or ""),
+            "embedding_provider": cfg.provider,
+            "embedding_model": cfg.openai_model if cfg.provider == "openai" else "",
+            "openai_batch_size": str(cfg.openai_batch_size),
+            "openai_timeout_sec": str(cfg.openai_timeout_sec),
+            "openai_dimensions": str(cfg.openai_dimensions or ""),
+            "openai_base_url": cfg.openai_base_url if cfg.provider == "openai" else "",
+            "query_cache_ttl_hours": f"{query_cache_ttl_hours:g}",
+            "vector_codes": VECTOR_CODES_TERNARY,
+            "chunker": getattr(args, "chunker", DEFAULT_CHUNKER),
+            "alias_count": str(alias_count),
         }
-        conn.executemany(
-            "INSERT INTO meta(key, value) VALUES(?, ?)",
-            list(meta_rows.items()),
+    )
+    meta_rows.update(index_content_settings(args))
+    return meta_rows
+
+
+def prewarm_after_build(index_dir: pathlib.Path, cfg: EmbeddingConfig, args: argparse.Namespace) -> int:
+    if cfg.provider != "openai":
+        return 0
+    try:
+        return prewarm_query_cache(
+            index_dir,
+            cfg=cfg,
+            api_key=os.environ.get("OPENAI_API_KEY", ""),
+            ttl_hours=max(0.0, float(getattr(args, "query_cache_ttl_hours", DEFAULT_QUERY_CACHE_TTL_HOURS))),
+        )
+    except Exception as exc:
+        print(f"Warning: failed to pre-warm query embedding cache ({exc}).", file=sys.stderr)
+        return 0
+
+
+def dedup_summary(aliases: Sequence[ChunkAliasDraft], deduped_chars: int) -> Dict[str, int]:
+    return {
+        "exact_aliases": sum(1 for alias in aliases if alias.kind == "exact"),
+        "near_aliases": sum(1 for alias in aliases if alias.kind == "near"),
+        "deduped_chars": deduped_chars,
+    }
+
+
+def shard_name_for_path(rel_path: pathlib.Path) -> str:
+    parts = rel_path.parts
+    return parts[0] if len(parts) > 1 else ROOT_SHARD_NAME
+
+
+def shard_name_for_module(module_key: str) -> str:
+    if not module_key or module_key == ".":
+        return ROOT_SHARD_NAME
+    return module_key.split("/", 1)[0]
+
+
+def shard_file_name(name: str) -> str:
+    safe = re.sub(r"[^A-Za-z0-9_.-]", "_", name).strip(".") or "shard"
+    suffix = hashlib.blake2b(name.encode("utf-8"), digest_size=4).hexdigest()
+    return f"{safe[:48]}-{suffix}.sqlite3"
+
+
+def shard_config_fingerprint(args: argparse.Namespace, cfg: EmbeddingConfig) -> str:
+    """
+    Settings that change chunk rows or vectors. A shard whose files are unchanged is
+    only reused if it was built under the same fingerprint.
+    """
+    payload = {
+        "index_version": INDEX_VERSION,
+        "chunker": getattr(args, "chunker", DEFAULT_CHUNKER),
+        "chunk_chars": args.chunk_chars,
+        "chunk_overlap_lines": args.chunk_overlap_lines,
+        "max_file_bytes": getattr(args, "max_file_bytes", DEFAULT_MAX_FILE_BYTES),
+        "near_dup_distance": int(getattr(args, "near_dup_distance", 0)),
+        "module_depth": args.module_depth,
+        "provider": cfg.provider,
+        "vector_dim": cfg.vector_dim if cfg.provider != "openai" else 0,
+        "openai_model": cfg.openai_model if cfg.provider == "openai" else "",
+        "openai_dimensions": cfg.openai_dimensions if cfg.provider == "openai" else None,
+    }
+    raw = json.dumps(payload, sort_keys=True).encode("utf-8")
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+
+def shard_digest(root: pathlib.Path, rel_paths: Sequence[pathlib.Path], fingerprint: str) -> str:
+    digest = hashlib.blake2b(fingerprint.encode("utf-8"), digest_size=16)
+    for rel_path in sorted(rel_paths, key=str):
+        digest.update(str(rel_path).encode("utf-8") + b"\0")
+        try:
+            digest.update(hashlib.blake2b((root / rel_path).read_bytes(), digest_size=16).digest())
+        except OSError:
+            digest.update(b"<unreadable>")
+    return digest.hexdigest()
+
+
+def remove_shard_files(shard_dir: pathlib.Path) -> None:
+    if shard_dir.is_dir():
+        shutil.rmtree(shard_dir, ignore_errors=True)
+
+
+def write_token_vocab(index_dir: pathlib.Path, token_df: Mapping[str, int]) -> int:
+    vocab = sorted(token_df, key=lambda token: token_df[token], reverse=True)[:TOKEN_VOCAB_MAX_TOKENS]
+    try:
+        return save_token_vocab(index_dir / DEFAULT_TOKEN_VOCAB_NAME, vocab)
+    except OSError as exc:
+        print(f"Could not write {DEFAULT_TOKEN_VOCAB_NAME}: {exc}", file=sys.stderr)
+        return 0
+
+
+def build_index(args: argparse.Namespace) -> int:
+    root = pathlib.Path(args.root).resolve()
+    index_dir = (root / args.index_dir).resolve()
+    index_dir.mkdir(parents=True, exist_ok=True)
+
+    ignored_dirs = set(DEFAULT_IGNORED_DIRS)
+    ignored_dirs.update(args.ignore_dir or [])
+
+    profiler = BuildProfiler(
+        progress=bool(getattr(args, "progress", False)),
+        trace_memory=bool(getattr(args, "trace_memory", False)),
+    )
+    stats: Dict[str, os.stat_result] = {}
+    with profiler.phase("discover"):
+        rel_paths = discover_files(
+            root=root,
+            use_git_tracked=not args.all_files,
+            max_file_bytes=args.max_file_bytes,
+            ignored_dirs=ignored_dirs,
+            max_large_file_bytes=getattr(args, "max_large_file_bytes", 0),
+            stats=stats,
+            honor_gitignore=not getattr(args, "no_gitignore", False),
+            workers=max(1, int(getattr(args, "discover_workers", DEFAULT_DISCOVER_WORKERS))),
+        )
+    if not rel_paths:
+        print("No indexable files found.")
+        return 1
+    with profiler.phase("vocab"):
+        load_token_vocab(index_dir / DEFAULT_TOKEN_VOCAB_NAME)
+
+    try:
+        embedding_cfg = embedding_config_from_args(args)
+    except IndexBuildError as exc:
+        print(str(exc), file=sys.stderr)
+        return 2
+
+    checkpoint: BuildCheckpoint | None = None
+    checkpoint_every = int(getattr(args, "checkpoint_every", DEFAULT_CHECKPOINT_EVERY))
+    if checkpoint_every > 0:
+        checkpoint = BuildCheckpoint(
+            index_dir,
+            build_fingerprint(args, embedding_cfg, rel_paths),
+            resume=bool(getattr(args, "resume", False)),
+            every=checkpoint_every,
         )
+    elif getattr(args, "resume", False):
+        print("--resume has no effect with --checkpoint-every 0.", file=sys.stderr)
+
+    code = 2
+    try:
+        if getattr(args, "layout", INDEX_LAYOUT_SINGLE) == INDEX_LAYOUT_SHARDED:
+            code = build_sharded_index(args, root, index_dir, rel_paths, embedding_cfg, checkpoint, profiler, stats)
+        else:
+            code = build_single_index(args, root, index_dir, rel_paths, embedding_cfg, checkpoint, profiler, stats)
+        return code
+    except IndexBuildError as exc:
+        print(str(exc), file=sys.stderr)
+        return 2
+    finally:
+        if profiler.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        if checkpoint is not None:
+            if code == 0:
+                checkpoint.discard()
+            else:
+                checkpoint.close()
+
+
+def build_single_index(
+    args: argparse.Namespace,
+    root: pathlib.Path,
+    index_dir: pathlib.Path,
+    rel_paths: Sequence[pathlib.Path],
+    embedding_cfg: EmbeddingConfig,
+    checkpoint: BuildCheckpoint | None = None,
+    profiler: BuildProfiler | None = None,
+    stats: Mapping[str, os.stat_result] | None = None,
+) -> int:
+    profiler = profiler or BuildProfiler()
+    db_path = index_dir / DEFAULT_DB_NAME
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        ensure_schema(conn)
+
+        draft = draft_index_files(root, rel_paths, args, checkpoint, profiler, stats)
+        if not draft.files or not draft.chunks:
+            print("No textual content available after filtering.")
+            return 1
+
+        num_chunks = len(draft.chunks)
+        avg_chunk_tokens = sum(c.token_count for c in draft.chunks) / num_chunks
+        module_payloads = module_payloads_for(draft.modules)
+        cache_stats: Dict[str, int] = {}
+        with profiler.phase("vectorize"):
+            chunk_vectors, module_vectors, actual_vector_dim = embed_index_draft(
+                draft,
+                module_payloads,
+                cfg=embedding_cfg,
+                index_dir=index_dir,
+                args=args,
+                cache_stats=cache_stats,
+                checkpoint=checkpoint,
+            )
+        with profiler.phase("prewarm"):
+            prewarmed = prewarm_after_build(index_dir, embedding_cfg, args)
+
+        with profiler.phase("git_meta"):
+            meta_rows = index_meta_rows(
+                root,
+                args,
+                embedding_cfg,
+                file_count=len(draft.files),
+                chunk_count=num_chunks,
+                avg_chunk_tokens=avg_chunk_tokens,
+                vector_dim=actual_vector_dim,
+                module_count=len(draft.modules),
+                alias_count=len(draft.aliases),
+            )
+        with profiler.phase("write"), conn:
+            clear_index(conn)
+            write_chunk_rows(conn, draft, chunk_vectors)
+            write_module_rows(conn, module_payloads, module_vectors)
+            conn.executemany(
+                "INSERT INTO meta(key, value) VALUES(?, ?)",
+                list(meta_rows.items()),
+            )
+    finally:
+        conn.close()
+    with profiler.phase("vocab"):
+        vocab_size = write_token_vocab(index_dir, draft.token_df)
+    remove_shard_files(index_dir / DEFAULT_SHARD_DIR)
 
     summary_payload = {
         "db_path": str(db_path),
-        "file_count": len(file_rows),
+        "file_count": len(draft.files),
         "chunk_count": num_chunks,
-        "module_count": len(module_drafts),
+        "module_count": len(draft.modules),
         "avg_chunk_tokens": round(avg_chunk_tokens, 3),
         "embedding_provider": embedding_cfg.provider,
         "vector_dim": actual_vector_dim,
+        "chunker": getattr(args, "chunker", DEFAULT_CHUNKER),
+        "skipped_files": draft.skipped[:20],
+    }
+    if draft.large_files:
+        summary_payload["large_files"] = draft.large_files[:20]
+    if draft.aliases:
+        summary_payload["dedup"] = dedup_summary(draft.aliases, draft.deduped_chars)
+    if checkpoint is not None and checkpoint.replayed:
+        summary_payload["resumed_files"] = checkpoint.replayed
+    summary_payload["token_vocab"] = vocab_size
+    summary_payload["profile"] = profiler.report()
+    if cache_stats:
+        summary_payload["embedding_cache"] = cache_stats
+    if prewarmed:
+        summary_payload["query_cache_prewarmed"] = prewarmed
+    print(json.dumps(summary_payload, ensure_ascii=False, indent=2))
+    return 0
+
+
+def build_sharded_index(
+    args: argparse.Namespace,
+    root: pathlib.Path,
+    index_dir: pathlib.Path,
+    rel_paths: Sequence[pathlib.Path],
+    embedding_cfg: EmbeddingConfig,
+    checkpoint: BuildCheckpoint | None = None,
+    profiler: BuildProfiler | None = None,
+    stats: Mapping[str, os.stat_result] | None = None,
+) -> int:
+    """
+    One DB per top-level directory under `shards/`, plus a small catalog
+    (modules, summed token_df, meta, shards) in the usual index DB.
+
+    A shard is rebuilt only when the digest of its files' paths and contents (and
+    the indexer settings) changes; untouched shards are neither re-chunked nor
+    rewritten, and their module rows stay in the catalog as they were.
+    """
+    profiler = profiler or BuildProfiler()
+    db_path = index_dir / DEFAULT_DB_NAME
+    shard_dir = index_dir / DEFAULT_SHARD_DIR
+    shard_dir.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        ensure_schema(conn)
+
+        fingerprint = shard_config_fingerprint(args, embedding_cfg)
+        meta = fetch_meta(conn)
+        previous: Dict[str, sqlite3.Row] = {}
+        if meta.get("index_layout") == INDEX_LAYOUT_SHARDED and meta.get("shard_config") == fingerprint:
+            previous = {str(row["name"]): row for row in conn.execute("SELECT * FROM shards").fetchall()}
+        next_shard_no = max((int(row["shard_no"]) for row in previous.values()), default=0) + 1
+
+        groups: Dict[str, List[pathlib.Path]] = collections.defaultdict(list)
+        for rel_path in rel_paths:
+            groups[shard_name_for_path(rel_path)].append(rel_path)
+
+        shard_rows: Dict[str, Tuple[object, ...]] = {}
+        rebuilt: List[str] = []
+        reused: List[str] = []
+        module_rows: List[Tuple[List[ModulePayload], List[List[float]]]] = []
+        skipped: List[str] = []
+        large_files: List[str] = []
+        cache_stats: Dict[str, int] = {}
+        aliases: List[ChunkAliasDraft] = []
+        deduped_chars = 0
+        vector_dim = 0
+
+        for name in sorted(groups):
+            lap = profiler.mark()
+            digest = shard_digest(root, groups[name], fingerprint)
+            profiler.lap("hash", lap)
+            prev = previous.get(name)
+            if prev is not None and prev["digest"] == digest and (shard_dir / str(prev["file_name"])).exists():
+                reused.append(name)
+                shard_rows[name] = tuple(prev)
+                vector_dim = vector_dim or int(prev["vector_dim"])
+                continue
+
+            draft = draft_index_files(root, groups[name], args, checkpoint, profiler, stats)
+            skipped.extend(draft.skipped)
+            large_files.extend(draft.large_files)
+            if not draft.files or not draft.chunks:
+                continue
+            shard_no = int(prev["shard_no"]) if prev is not None else next_shard_no
+            if prev is None:
+                next_shard_no += 1
+            module_payloads = module_payloads_for(draft.modules)
+            with profiler.phase("vectorize"):
+                chunk_vectors, module_vectors, shard_dim = embed_index_draft(
+                    draft,
+                    module_payloads,
+                    cfg=embedding_cfg,
+                    index_dir=index_dir,
+                    args=args,
+                    cache_stats=cache_stats,
+                    checkpoint=checkpoint,
+                )
+            vector_dim = vector_dim or shard_dim
+
+            file_name = shard_file_name(name)
+            tmp_path = shard_dir / f"{file_name}.tmp"
+            tmp_path.unlink(missing_ok=True)
+            with profiler.phase("write"):
+                shard_conn = sqlite3.connect(tmp_path)
+                try:
+                    ensure_schema(shard_conn)
+                    with shard_conn:
+                        write_chunk_rows(shard_conn, draft, chunk_vectors, id_base=shard_no * SHARD_ID_STRIDE)
+                finally:
+                    shard_conn.close()
+                os.replace(tmp_path, shard_dir / file_name)
+
+            token_total = sum(chunk.token_count for chunk in draft.chunks)
+            shard_rows[name] = (
+                name,
+                shard_no,
+                file_name,
+                digest,
+                len(draft.files),
+                len(draft.chunks),
+                token_total,
+                len(draft.aliases),
+                shard_dim,
+            )
+            module_rows.append((module_payloads, module_vectors))
+            aliases.extend(draft.aliases)
+            deduped_chars += draft.deduped_chars
+            rebuilt.append(name)
+
+        if not shard_rows:
+            print("No textual content available after filtering.")
+            return 1
+
+        removed = sorted(set(previous) - set(reused) - set(rebuilt))
+        for name in removed:
+            (shard_dir / str(previous[name]["file_name"])).unlink(missing_ok=True)
+        live_files = {str(row[2]) for row in shard_rows.values()}
+        for stray in shard_dir.glob("*.sqlite3"):
+            if stray.name not in live_files:
+                stray.unlink(missing_ok=True)
+
+        # Global document frequencies for BM25: sum of every shard's own token_df.
+        token_df: collections.Counter[str] = collections.Counter()
+        with profiler.phase("merge_df"):
+            for row in shard_rows.values():
+                shard_conn = sqlite3.connect(shard_dir / str(row[2]))
+                try:
+                    for token, df in shard_conn.execute("SELECT token, df FROM token_df"):
+                        token_df[token] += int(df)
+                finally:
+                    shard_conn.close()
+
+        file_count = sum(int(row[4]) for row in shard_rows.values())
+        chunk_count = sum(int(row[5]) for row in shard_rows.values())
+        token_total = sum(int(row[6]) for row in shard_rows.values())
+        alias_count = sum(int(row[7]) for row in shard_rows.values())
+        with profiler.phase("prewarm"):
+            prewarmed = prewarm_after_build(index_dir, embedding_cfg, args) if rebuilt else 0
+
+        with profiler.phase("write"), conn:
+            if not previous:
+                clear_index(conn)
+            else:
+                stale = set(rebuilt) | set(removed)
+                keys = [str(row[0]) for row in conn.execute("SELECT module_key FROM modules").fetchall()]
+                conn.executemany(
+                    "DELETE FROM modules WHERE module_key = ?",
+                    [(key,) for key in keys if shard_name_for_module(key) in stale],
+                )
+                conn.execute("DELETE FROM shards")
+                conn.execute("DELETE FROM token_df")
+                conn.execute("DELETE FROM meta")
+            for module_payloads, module_vectors in module_rows:
+                write_module_rows(conn, module_payloads, module_vectors)
+            conn.executemany(
+                """
+                INSERT INTO shards(name, shard_no, file_name, digest, file_count, chunk_count, token_total, alias_count, vector_dim)
+                VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                list(shard_rows.values()),
+            )
+            conn.executemany("INSERT INTO token_df(token, df) VALUES(?, ?)", list(token_df.items()))
+            module_count = int(conn.execute("SELECT COUNT(*) FROM modules").fetchone()[0])
+            meta_rows = index_meta_rows(
+                root,
+                args,
+                embedding_cfg,
+                file_count=file_count,
+                chunk_count=chunk_count,
+                avg_chunk_tokens=token_total / chunk_count if chunk_count else 0.0,
+                vector_dim=vector_dim,
+                module_count=module_count,
+                alias_count=alias_count,
+            )
+            meta_rows["index_layout"] = INDEX_LAYOUT_SHARDED
+            meta_rows["shard_config"] = fingerprint
+            meta_rows["shard_count"] = str(len(shard_rows))
+            conn.executemany("INSERT INTO meta(key, value) VALUES(?, ?)", list(meta_rows.items()))
+    finally:
+        conn.close()
+    with profiler.phase("vocab"):
+        vocab_size = write_token_vocab(index_dir, token_df)
+
+    summary_payload = {
+        "db_path": str(db_path),
+        "layout": INDEX_LAYOUT_SHARDED,
+        "file_count": file_count,
+        "chunk_count": chunk_count,
+        "module_count": module_count,
+        "avg_chunk_tokens": round(token_total / chunk_count, 3) if chunk_count else 0.0,
+        "embedding_provider": embedding_cfg.provider,
+        "vector_dim": vector_dim,
+        "chunker": getattr(args, "chunker", DEFAULT_CHUNKER),
+        "shards": {
+            "total": len(shard_rows),
+            "rebuilt": rebuilt,
+            "reused": len(reused),
+            "removed": removed,
+        },
         "skipped_files": skipped[:20],
     }
+    if large_files:
+        summary_payload["large_files"] = large_files[:20]
+    if aliases:
+        summary_payload["dedup"] = dedup_summary(aliases, deduped_chars)
+    if checkpoint is not None and checkpoint.replayed:
+        summary_payload["resumed_files"] = checkpoint.replayed
+    summary_payload["token_vocab"] = vocab_size
+    summary_payload["profile"] = profiler.report()
+    if cache_stats:
+        summary_payload["embedding_cache"] = cache_stats
+    if prewarmed:
+        summary_payload["query_cache_prewarmed"] = prewarmed
     print(json.dumps(summary_payload, ensure_ascii=False, indent=2))
     return 0
 
 
-def open_db(root: pathlib.Path, index_dir: str) -> sqlite3.Connection:
+def index_is_sharded(conn: sqlite3.Connection) -> bool:
+    row = conn.execute("SELECT value FROM meta WHERE key = 'index_layout'").fetchone()
+    return bool(row) and str(row[0]) == INDEX_LAYOUT_SHARDED
+
+
+def shard_names_for_modules(conn: sqlite3.Connection, module_keys: Sequence[str]) -> List[str]:
+    """
+    Shards that hold `module_keys`, or every shard (largest first) when no module
+    filter applies.
+    """
+    names = [str(row[0]) for row in conn.execute("SELECT name FROM shards ORDER BY chunk_count DESC").fetchall()]
+    known = set(names)
+    wanted: List[str] = []
+    for key in module_keys:
+        if not key or key == ".":
+            continue
+        name = shard_name_for_module(key)
+        if name in known and name not in wanted:
+            wanted.append(name)
+    return wanted or names
+
+
+def shard_names_for_chunks(conn: sqlite3.Connection, chunk_ids: Sequence[int]) -> List[str]:
+    shard_nos = sorted({int(chunk_id) // SHARD_ID_STRIDE for chunk_id in chunk_ids})
+    if not shard_nos:
+        return []
+    placeholders = ",".join("?" for _ in shard_nos)
+    rows = conn.execute(
+        f"SELECT name FROM shards WHERE shard_no IN ({placeholders}) ORDER BY shard_no", shard_nos
+    ).fetchall()
+    return [str(row[0]) for row in rows]
+
+
+def iter_mounted_shards(conn: sqlite3.Connection, names: Sequence[str] | None) -> Iterator[List[str]]:
+    """
+    Mount `names` at most MAX_MOUNTED_SHARDS at a time and yield after each batch,
+    so callers run their SQL once per batch and merge the results. `None` stands
+    for a single-file index: yields once with nothing to mount.
+    """
+    if names is None:
+        yield []
+        return
+    for batch in chunked(list(names), MAX_MOUNTED_SHARDS):
+        yield mount_shards(conn, batch)
+
+
+def mount_shards(conn: sqlite3.Connection, names: Sequence[str]) -> List[str]:
+    """
+    Attach exactly the shards `names` and expose them through TEMP views named like
+    the per-chunk tables. Temp objects shadow `main`, so retrieval SQL runs unchanged
+    over the mounted set. SQLite's default build caps ATTACH at 10, so callers with
+    more shards go through `iter_mounted_shards`.
+    """
+    if len(names) > MAX_MOUNTED_SHARDS:
+        raise ValueError(f"cannot mount {len(names)} shards at once (limit {MAX_MOUNTED_SHARDS})")
+    rows = conn.execute("SELECT name, shard_no, file_name FROM shards").fetchall()
+    by_name = {str(row["name"]): row for row in rows}
+    wanted = [name for name in names if name in by_name]
+    aliases = {f"shard_{int(by_name[name]['shard_no'])}": name for name in wanted}
+
+    attached = {
+        str(row[1]) for row in conn.execute("PRAGMA database_list").fetchall() if str(row[1]).startswith("shard_")
+    }
+    has_views = conn.execute(
+        "SELECT COUNT(*) FROM sqlite_temp_master WHERE type = 'view' AND name = 'chunks'"
+    ).fetchone()[0]
+    if attached == set(aliases) and has_views:
+        return wanted
+
+    for table in SHARD_TABLES:
+        conn.execute(f"DROP VIEW IF EXISTS temp.{table}")
+    for alias in attached - set(aliases):
+        conn.execute(f"DETACH DATABASE {alias}")
+    if not aliases:
+        return []
+    shard_dir = (_conn_index_dir(conn) or pathlib.Path(".")) / DEFAULT_SHARD_DIR
+    for alias, name in aliases.items():
+        if alias not in attached:
+            conn.execute(f"ATTACH DATABASE ? AS {alias}", (str(shard_dir / str(by_name[name]["file_name"])),))
+    for table in SHARD_TABLES:
+        union = " UNION ALL ".join(f"SELECT * FROM {alias}.{table}" for alias in aliases)
+        conn.execute(f"CREATE TEMP VIEW {table} AS {union}")
+    return wanted
+
+
+def open_db(root: pathlib.Path, index_dir: str, *, check_same_thread: bool = True) -> sqlite3.Connection:
     db_path = (root / index_dir / DEFAULT_DB_NAME).resolve()
     if not db_path.exists():
         raise FileNotFoundError(f"Index not found: {db_path}. Run `index` first.")
-    conn = sqlite3.connect(db_path)
+    conn = sqlite3.connect(db_path, check_same_thread=check_same_thread)
     conn.row_factory = sqlite3.Row
     return conn
 
@@ -1616,40 +3631,173 @@ def choose_modules(
     return selected[:limit]
 
 
-def make_module_filter_sql(module_keys: Sequence[str]) -> Tuple[str, List[str]]:
+def make_module_filter_sql(module_keys: Sequence[str], column: str = "path") -> Tuple[str, List[str]]:
     keys = [k for k in module_keys if k and k != "."]
     if not keys:
         return "", []
     clauses = []
     params: List[str] = []
     for key in keys:
-        clauses.append("path LIKE ?")
+        clauses.append(f"{column} LIKE ?")
         params.append(f"{key}%")
     return "(" + " OR ".join(clauses) + ")", params
 
 
-def retrieve_chunks(
+def make_chunk_filter_sql(module_keys: Sequence[str], table: str = "") -> Tuple[str, List[str]]:
+    """
+    Module filter over chunks that also matches chunks reached only through an alias
+    path, so a module made of deduplicated copies still has candidates.
+    """
+    prefix = f"{table}." if table else ""
+    chunk_sql, chunk_params = make_module_filter_sql(module_keys, column=f"{prefix}path")
+    if not chunk_sql:
+        return "", []
+    alias_sql, alias_params = make_module_filter_sql(module_keys, column="a.path")
+    return (
+        f"({chunk_sql} OR {prefix}id IN (SELECT a.chunk_id FROM chunk_aliases a WHERE {alias_sql}))",
+        chunk_params + alias_params,
+    )
+
+
+def fetch_alias_paths(conn: sqlite3.Connection, chunk_ids: Sequence[int]) -> Dict[int, List[str]]:
+    out: Dict[int, List[str]] = collections.defaultdict(list)
+    names = shard_names_for_chunks(conn, chunk_ids) if index_is_sharded(conn) else None
+    for _mounted in iter_mounted_shards(conn, names):
+        for batch in chunked(list(chunk_ids), 500):
+            placeholders = ",".join("?" for _ in batch)
+            rows = conn.execute(
+                f"SELECT chunk_id, path, start_line, end_line FROM chunk_aliases WHERE chunk_id IN ({placeholders}) "
+                "ORDER BY path, start_line",
+                batch,
+            ).fetchall()
+            for row in rows:
+                out[int(row[0])].append(f"{row[1]}:{row[2]}-{row[3]}")
+    return out
+
+
+def _fetch_blobs(conn: sqlite3.Connection, sql: str, ids: Sequence[int]) -> Dict[int, bytes]:
+    out: Dict[int, bytes] = {}
+    for batch in chunked(list(ids), 500):
+        placeholders = ",".join("?" for _ in batch)
+        for row in conn.execute(sql.format(placeholders=placeholders), batch).fetchall():
+            out[int(row[0])] = row[1]
+    return out
+
+
+def semantic_chunk_scores(
+    conn: sqlite3.Connection,
+    candidate_ids: Sequence[int],
+    query_vec: Sequence[float],
+    vector_dim: int,
+    rerank_k: int = DEFAULT_SEMANTIC_RERANK,
+) -> Dict[int, float]:
+    """
+    Cosine similarity of each candidate chunk to the query.
+
+    With `rerank_k > 0` and more candidates than that, candidates are first ranked on
+    their ternary codes; only the top `rerank_k` have float32 vectors loaded and scored
+    exactly. The rest keep the code estimate, capped below the weakest exact score so
+    the prefilter can never outrank a rescored chunk.
+    """
+    scores: Dict[int, float] = {}
+    exact_ids: Sequence[int] = candidate_ids
+    approx: Dict[int, float] = {}
+    if 0 < rerank_k < len(candidate_ids):
+        codes = _fetch_blobs(conn, "SELECT chunk_id, bits FROM chunk_codes WHERE chunk_id IN ({placeholders})", candidate_ids)
+        if len(codes) == len(candidate_ids):
+            query_code = _split_code(ternary_code(query_vec))
+            approx = {chunk_id: ternary_code_cosine(query_code, code) for chunk_id, code in codes.items()}
+            exact_ids = sorted(approx, key=lambda chunk_id: approx[chunk_id], reverse=True)[:rerank_k]
+    vectors = _fetch_blobs(conn, "SELECT id, vector FROM chunks WHERE id IN ({placeholders})", exact_ids)
+    for chunk_id, blob in vectors.items():
+        scores[chunk_id] = max(0.0, cosine_sim(query_vec, unpack_vector(blob, vector_dim)))
+    if approx:
+        floor = min(scores.values()) if scores else 0.0
+        for chunk_id, value in approx.items():
+            if chunk_id not in scores:
+                scores[chunk_id] = max(0.0, min(value, floor))
+    return scores
+
+
+def corpus_stats(conn: sqlite3.Connection, tokens: Sequence[str]) -> CorpusStats:
+    meta = fetch_meta(conn)
+    uniq_tokens = sorted(set(tokens))
+    token_df: Dict[str, int] = {}
+    if uniq_tokens:
+        token_placeholders = ",".join("?" for _ in uniq_tokens)
+        df_rows = conn.execute(
+            f"SELECT token, df FROM token_df WHERE token IN ({token_placeholders})",
+            uniq_tokens,
+        ).fetchall()
+        token_df = {row["token"]: int(row["df"]) for row in df_rows}
+    return CorpusStats(
+        num_chunks=int(meta.get("chunk_count", "1")),
+        avg_chunk_tokens=float(meta.get("avg_chunk_tokens", "200.0")),
+        token_df=token_df,
+    )
+
+
+def merge_corpus_stats(parts: Sequence[CorpusStats]) -> CorpusStats:
+    """
+    Pool several indexes' statistics so BM25 idf and length normalization mean the
+    same thing for every root of a federated query.
+    """
+    num_chunks = sum(part.num_chunks for part in parts)
+    token_total = sum(part.num_chunks * part.avg_chunk_tokens for part in parts)
+    token_df: collections.Counter[str] = collections.Counter()
+    for part in parts:
+        token_df.update(part.token_df)
+    return CorpusStats(
+        num_chunks=max(1, num_chunks),
+        avg_chunk_tokens=(token_total / num_chunks) if num_chunks else 200.0,
+        token_df=dict(token_df),
+    )
+
+
+def score_chunk_candidates(
     conn: sqlite3.Connection,
     query: str,
-    top_k: int,
     module_keys: Sequence[str],
     query_vec: Sequence[float],
     vector_dim: int,
-    alpha: float,
-) -> List[QueryResult]:
+    rerank_k: int = DEFAULT_SEMANTIC_RERANK,
+    stats: CorpusStats | None = None,
+) -> List[ChunkCandidate]:
+    """
+    Raw (unnormalized) BM25, semantic, coverage and structural signals for every
+    chunk in `module_keys`. `stats` overrides this index's own corpus statistics.
+    """
+    meta = fetch_meta(conn)
     tokens = tokenize(query)
     uniq_tokens = sorted(set(tokens))
-    meta = fetch_meta(conn)
-    num_chunks = int(meta.get("chunk_count", "1"))
-    avg_chunk_tokens = float(meta.get("avg_chunk_tokens", "200.0"))
-    q_vec = list(query_vec)
+    if stats is None:
+        stats = corpus_stats(conn, uniq_tokens)
+    names = shard_names_for_modules(conn, module_keys) if meta.get("index_layout") == INDEX_LAYOUT_SHARDED else None
+    candidates: List[ChunkCandidate] = []
+    for _mounted in iter_mounted_shards(conn, names):
+        candidates.extend(
+            _score_mounted_chunks(conn, tokens, module_keys, list(query_vec), vector_dim, rerank_k, stats, meta)
+        )
+    return candidates
+
 
-    module_sql, module_params = make_module_filter_sql(module_keys)
+def _score_mounted_chunks(
+    conn: sqlite3.Connection,
+    tokens: Sequence[str],
+    module_keys: Sequence[str],
+    q_vec: Sequence[float],
+    vector_dim: int,
+    rerank_k: int,
+    stats: CorpusStats,
+    meta: Mapping[str, str],
+) -> List[ChunkCandidate]:
+    uniq_tokens = sorted(set(tokens))
+    module_sql, module_params = make_chunk_filter_sql(module_keys)
     where_clause = f"WHERE {module_sql}" if module_sql else ""
 
     chunk_rows = conn.execute(
         f"""
-        SELECT id, path, start_line, end_line, text, token_count, vector, symbol_hint
+        SELECT id, path, start_line, end_line, text, token_count, symbol_hint
         FROM chunks
         {where_clause}
         """,
@@ -1660,7 +3808,6 @@ def retrieve_chunks(
 
     candidate_ids = [int(row["id"]) for row in chunk_rows]
     candidate_id_set = set(candidate_ids)
-    chunk_by_id = {int(row["id"]): row for row in chunk_rows}
 
     bm25_scores: Dict[int, float] = collections.defaultdict(float)
     coverage_scores: Dict[int, float] = {}
@@ -1674,15 +3821,11 @@ def retrieve_chunks(
         )
         params: List[object] = list(uniq_tokens)
         if module_sql:
-            sql += f" AND {module_sql}"
-            params.extend(module_params)
+            posting_module_sql, posting_module_params = make_chunk_filter_sql(module_keys, table="c")
+            sql += f" AND {posting_module_sql}"
+            params.extend(posting_module_params)
         posting_rows = conn.execute(sql, params).fetchall()
 
-        df_rows = conn.execute(
-            f"SELECT token, df FROM token_df WHERE token IN ({token_placeholders})",
-            uniq_tokens,
-        ).fetchall()
-        token_df = {row["token"]: int(row["df"]) for row in df_rows}
         for row in posting_rows:
             chunk_id = int(row["chunk_id"])
             if chunk_id not in candidate_id_set:
@@ -1691,13 +3834,13 @@ def retrieve_chunks(
             doc_len = int(row["token_count"])
             token = row["token"]
             matched_terms[chunk_id].add(token)
-            df = token_df.get(token, 1)
+            df = stats.token_df.get(token, 1)
             bm25_scores[chunk_id] += bm25(
                 tf=tf,
                 doc_len=doc_len,
-                avg_len=avg_chunk_tokens,
+                avg_len=stats.avg_chunk_tokens,
                 df=df,
-                num_docs=num_chunks,
+                num_docs=stats.num_chunks,
             )
         if uniq_tokens:
             denom = float(len(uniq_tokens))
@@ -1706,22 +3849,18 @@ def retrieve_chunks(
 
     semantic_scores: Dict[int, float] = {}
     if q_vec:
-        for chunk_id in candidate_ids:
-            row = chunk_by_id[chunk_id]
-            vec = unpack_vector(row["vector"], vector_dim)
-            semantic_scores[chunk_id] = max(0.0, cosine_sim(q_vec, vec))
-
-    bm25_norm = normalize_scores(bm25_scores)
-    semantic_norm = normalize_scores(semantic_scores)
-    coverage_norm = coverage_scores
+        semantic_scores = semantic_chunk_scores(
+            conn,
+            candidate_ids,
+            q_vec,
+            vector_dim,
+            rerank_k=rerank_k if meta.get("vector_codes") == VECTOR_CODES_TERNARY else 0,
+        )
 
-    all_ids = set(candidate_ids)
-    ranked: List[QueryResult] = []
+    candidates: List[ChunkCandidate] = []
     q_token_set = set(uniq_tokens)
-    for chunk_id in all_ids:
-        bm = bm25_norm.get(chunk_id, 0.0)
-        sm = semantic_norm.get(chunk_id, 0.0)
-        row = chunk_by_id[chunk_id]
+    for row in chunk_rows:
+        chunk_id = int(row["id"])
         path_tokens = set(tokenize(str(row["path"])))
         symbol_tokens = set(tokenize(str(row["symbol_hint"])))
         if q_token_set:
@@ -1730,27 +3869,68 @@ def retrieve_chunks(
             structural = 0.6 * path_overlap + 0.4 * symbol_overlap
         else:
             structural = 0.0
-        coverage = coverage_norm.get(chunk_id, 0.0)
-        lexical_semantic = alpha * bm + (1.0 - alpha) * sm
-        score = 0.75 * lexical_semantic + 0.15 * coverage + 0.10 * structural
-        ranked.append(
-            QueryResult(
-                chunk_id=chunk_id,
-                path=row["path"],
-                start_line=int(row["start_line"]),
-                end_line=int(row["end_line"]),
-                text=row["text"],
-                bm25=bm,
-                semantic=sm,
-                score=score,
-                symbol_hint=row["symbol_hint"],
+        candidates.append(
+            ChunkCandidate(
+                result=QueryResult(
+                    chunk_id=chunk_id,
+                    path=row["path"],
+                    start_line=int(row["start_line"]),
+                    end_line=int(row["end_line"]),
+                    text=row["text"],
+                    bm25=0.0,
+                    semantic=0.0,
+                    score=0.0,
+                    symbol_hint=row["symbol_hint"],
+                ),
+                bm25_raw=bm25_scores.get(chunk_id),
+                semantic_raw=semantic_scores.get(chunk_id),
+                coverage=coverage_scores.get(chunk_id, 0.0),
+                structural=structural,
             )
         )
+    return candidates
 
-    ranked.sort(key=lambda item: item.score, reverse=True)
+
+def rank_candidates(candidates: Sequence[ChunkCandidate], top_k: int, alpha: float) -> List[ChunkCandidate]:
+    """
+    Min-max normalize BM25 and semantic scores across all `candidates` (which may
+    come from several indexes) and return the best `top_k` by blended score.
+    """
+    bm25_norm = normalize_scores(
+        {idx: item.bm25_raw for idx, item in enumerate(candidates) if item.bm25_raw is not None}
+    )
+    semantic_norm = normalize_scores(
+        {idx: item.semantic_raw for idx, item in enumerate(candidates) if item.semantic_raw is not None}
+    )
+    for idx, item in enumerate(candidates):
+        bm = bm25_norm.get(idx, 0.0)
+        sm = semantic_norm.get(idx, 0.0)
+        lexical_semantic = alpha * bm + (1.0 - alpha) * sm
+        item.result.bm25 = bm
+        item.result.semantic = sm
+        item.result.score = 0.75 * lexical_semantic + 0.15 * item.coverage + 0.10 * item.structural
+    ranked = sorted(candidates, key=lambda item: item.result.score, reverse=True)
     return ranked[:top_k]
 
 
+def retrieve_chunks(
+    conn: sqlite3.Connection,
+    query: str,
+    top_k: int,
+    module_keys: Sequence[str],
+    query_vec: Sequence[float],
+    vector_dim: int,
+    alpha: float,
+    rerank_k: int = DEFAULT_SEMANTIC_RERANK,
+) -> List[QueryResult]:
+    candidates = score_chunk_candidates(conn, query, module_keys, query_vec, vector_dim, rerank_k=rerank_k)
+    top = [item.result for item in rank_candidates(candidates, top_k, alpha)]
+    aliases = fetch_alias_paths(conn, [item.chunk_id for item in top])
+    for item in top:
+        item.alias_paths = aliases.get(item.chunk_id, [])
+    return top
+
+
 def trim_snippet(text: str, limit: int) -> str:
     if len(text) <= limit:
         return text
@@ -1859,6 +4039,7 @@ def cmd_query(args: argparse.Namespace) -> int:
                     "bm25": round(item.bm25, 4),
                     "semantic": round(item.semantic, 4),
                     "symbol_hint": item.symbol_hint,
+                    "also_at": item.alias_paths,
                     "snippet": trim_snippet(item.text, args.snippet_chars),
                 }
                 for item in chunks
@@ -1884,6 +4065,8 @@ def cmd_query(args: argparse.Namespace) -> int:
         )
         if item.symbol_hint:
             print(f"   symbols: {item.symbol_hint}")
+        if item.alias_paths:
+            print(f"   also at: {', '.join(item.alias_paths[:5])}")
         snippet = trim_snippet(item.text, args.snippet_chars).replace("\n", "\n   ")
         print(f"   {snippet}")
         print()
@@ -1957,11 +4140,537 @@ def cmd_prompt(args: argparse.Namespace) -> int:
     print("Contexts:")
     for idx, item in enumerate(chunks, start=1):
         print(f"[{idx}] {item.path}:{item.start_line}-{item.end_line}")
+        if item.alias_paths:
+            print(f"(identical or near-identical copies: {', '.join(item.alias_paths[:5])})")
         print(trim_snippet(item.text, args.snippet_chars))
         print()
     return 0
 
 
+def index_config_fields_from_meta(meta: Mapping[str, str]) -> Dict[str, str]:
+    provider = meta.get("embedding_provider", DEFAULT_EMBEDDING_PROVIDER)
+    return {
+        "index_version": meta.get("index_version", ""),
+        "layout": meta.get("index_layout", INDEX_LAYOUT_SINGLE),
+        "chunker": meta.get("chunker", DEFAULT_CHUNKER),
+        "use_git_tracked": meta.get("use_git_tracked", "1"),
+        "embedding_provider": provider,
+        "embedding_model": meta.get("embedding_model", "") if provider == "openai" else "",
+        "openai_dimensions": meta.get("openai_dimensions", "") if provider == "openai" else "",
+        "vector_dim": meta.get("vector_dim", "") if provider != "openai" else "",
+        # Indexes built before these were recorded get a key no import can ask for.
+        **{key: meta.get(key, "") for key in index_content_settings(argparse.Namespace())},
+    }
+
+
+def index_config_fields_from_args(args: argparse.Namespace) -> Dict[str, str]:
+    provider = str(args.embedding_provider).strip().lower()
+    return {
+        "index_version": INDEX_VERSION,
+        "layout": args.layout,
+        "chunker": args.chunker,
+        "use_git_tracked": "0" if args.all_files else "1",
+        "embedding_provider": provider,
+        "embedding_model": args.openai_model if provider == "openai" else "",
+        "openai_dimensions": str(args.openai_dimensions or "") if provider == "openai" else "",
+        "vector_dim": str(args.vector_dim) if provider != "openai" else "",
+        **index_content_settings(args),
+    }
+
+
+def index_config_key(fields: Mapping[str, str]) -> str:
+    raw = json.dumps(dict(fields), sort_keys=True).encode("utf-8")
+    return hashlib.blake2b(raw, digest_size=8).hexdigest()
+
+
+def bundle_file_name(git_head: str, config_key: str) -> str:
+    return f"{BUNDLE_PREFIX}{git_head}-{config_key}.tar.gz"
+
+
+def _sha256_file(path: pathlib.Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _snapshot_db(src: pathlib.Path, dest: pathlib.Path) -> None:
+    # The online backup API copies a consistent image even with a WAL in flight.
+    source = sqlite3.connect(src)
+    target = sqlite3.connect(dest)
+    try:
+        source.backup(target)
+        target.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        target.close()
+        source.close()
+
+
+def cmd_export_bundle(args: argparse.Namespace) -> int:
+    root = pathlib.Path(args.root).resolve()
+    index_dir = (root / args.index_dir).resolve()
+    conn = open_db(root, args.index_dir)
+    try:
+        meta = fetch_meta(conn)
+        shard_files = [str(row[0]) for row in conn.execute("SELECT file_name FROM shards ORDER BY shard_no").fetchall()]
+    finally:
+        conn.close()
+
+    git_head = meta.get("git_head", "")
+    if not git_head:
+        print("Index has no git_head; bundles are keyed by commit, so export needs a git checkout.", file=sys.stderr)
+        return 2
+    if meta.get("git_dirty") == "1" and not args.allow_dirty:
+        print(
+            "Index was built from a dirty working tree and would not match a clean checkout of "
+            f"{git_head[:12]}. Commit first or pass --allow-dirty.",
+            file=sys.stderr,
+        )
+        return 2
+
+    config_fields = index_config_fields_from_meta(meta)
+    config_key = index_config_key(config_fields)
+    out_dir = pathlib.Path(args.out_dir).resolve()
+    out_dir.mkdir(parents=True, exist_ok=True)
+    bundle_path = out_dir / bundle_file_name(git_head, config_key)
+
+    with tempfile.TemporaryDirectory(prefix="rk_bundle_", dir=out_dir) as tmp:
+        staging = pathlib.Path(tmp)
+        members = [DEFAULT_DB_NAME] + [f"{DEFAULT_SHARD_DIR}/{name}" for name in shard_files]
+        for member in members:
+            (staging / member).parent.mkdir(parents=True, exist_ok=True)
+            _snapshot_db(index_dir / member, staging / member)
+        manifest = {
+            "format": BUNDLE_FORMAT,
+            "git_head": git_head,
+            "config_key": config_key,
+            "config": config_fields,
+            "created_at_utc": dt.datetime.now(dt.timezone.utc).replace(microsecond=0).isoformat(),
+            "files": {member: _sha256_file(staging / member) for member in members},
+        }
+        (staging / BUNDLE_MANIFEST_NAME).write_text(json.dumps(manifest, indent=2, sort_keys=True), encoding="utf-8")
+
+        partial = staging / "bundle.partial"
+        with tarfile.open(partial, "w:gz", compresslevel=6) as tar:
+            for member in [BUNDLE_MANIFEST_NAME, *members]:
+                tar.add(staging / member, arcname=member, recursive=False)
+        archive_sha = _sha256_file(partial)
+        os.replace(partial, bundle_path)
+    bundle_path.with_name(bundle_path.name + ".sha256").write_text(f"{archive_sha}  {bundle_path.name}\n", encoding="utf-8")
+
+    raw_bytes = sum((index_dir / member).stat().st_size for member in members)
+    print(
+        json.dumps(
+            {
+                "bundle": str(bundle_path),
+                "git_head": git_head,
+                "config_key": config_key,
+                "files": len(members),
+                "raw_bytes": raw_bytes,
+                "bundle_bytes": bundle_path.stat().st_size,
+                "sha256": archive_sha,
+            },
+            ensure_ascii=False,
+            indent=2,
+        )
+    )
+    return 0
+
+
+def _safe_bundle_member(name: str) -> bool:
+    if name in {BUNDLE_MANIFEST_NAME, DEFAULT_DB_NAME}:
+        return True
+    prefix = f"{DEFAULT_SHARD_DIR}/"
+    rest = name[len(prefix) :] if name.startswith(prefix) else ""
+    return bool(rest) and "/" not in rest and not rest.startswith(".") and rest.endswith(".sqlite3")
+
+
+def restore_bundle(bundle_path: pathlib.Path, index_dir: pathlib.Path, root: pathlib.Path) -> Dict[str, object]:
+    """
+    Verify and unpack a bundle into `index_dir`, replacing the current index.
+    Raises ValueError if the archive or any member fails its checksum.
+    """
+    sidecar = bundle_path.with_name(bundle_path.name + ".sha256")
+    if sidecar.exists():
+        expected = sidecar.read_text(encoding="utf-8").split()[0].strip()
+        if expected != _sha256_file(bundle_path):
+            raise ValueError(f"Bundle checksum mismatch: {bundle_path}")
+
+    index_dir.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix="rk_restore_", dir=index_dir) as tmp:
+        staging = pathlib.Path(tmp)
+        try:
+            with tarfile.open(bundle_path, "r:gz") as tar:
+                members = tar.getmembers()
+                for member in members:
+                    if not member.isfile() or not _safe_bundle_member(member.name):
+                        raise ValueError(f"Unexpected bundle member: {member.name}")
+                    target = staging / member.name
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    source = tar.extractfile(member)
+                    if source is None:
+                        raise ValueError(f"Unreadable bundle member: {member.name}")
+                    with source, target.open("wb") as fh:
+                        shutil.copyfileobj(source, fh)
+        except (tarfile.TarError, OSError, EOFError) as exc:
+            raise ValueError(f"Cannot read bundle {bundle_path}: {exc}") from exc
+
+        manifest_path = staging / BUNDLE_MANIFEST_NAME
+        if not manifest_path.exists():
+            raise ValueError(f"Bundle has no {BUNDLE_MANIFEST_NAME}: {bundle_path}")
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        files = dict(manifest.get("files") or {})
+        if DEFAULT_DB_NAME not in files:
+            raise ValueError(f"Bundle has no {DEFAULT_DB_NAME}: {bundle_path}")
+        for member, digest in files.items():
+            path = staging / member
+            if not _safe_bundle_member(member) or not path.exists() or _sha256_file(path) != digest:
+                raise ValueError(f"Bundle member failed verification: {member}")
+
+        # Meta keeps the exporter's absolute root; point it at this checkout.
+        restored = sqlite3.connect(staging / DEFAULT_DB_NAME)
+        try:
+            with restored:
+                restored.execute("UPDATE meta SET value = ? WHERE key = 'root'", (str(root),))
+        finally:
+            restored.close()
+
+        db_path = index_dir / DEFAULT_DB_NAME
+        for suffix in ("-wal", "-shm"):
+            db_path.with_name(db_path.name + suffix).unlink(missing_ok=True)
+        remove_shard_files(index_dir / DEFAULT_SHARD_DIR)
+        if (staging / DEFAULT_SHARD_DIR).is_dir():
+            os.replace(staging / DEFAULT_SHARD_DIR, index_dir / DEFAULT_SHARD_DIR)
+        os.replace(staging / DEFAULT_DB_NAME, db_path)
+    return manifest
+
+
+def find_bundle(source_dir: pathlib.Path, git_head: str, config_key: str) -> pathlib.Path | None:
+    path = source_dir / bundle_file_name(git_head, config_key)
+    return path if path.is_file() else None
+
+
+def cmd_import_bundle(args: argparse.Namespace) -> int:
+    root = pathlib.Path(args.root).resolve()
+    index_dir = (root / args.index_dir).resolve()
+    source = pathlib.Path(args.source).resolve()
+    if source.is_dir():
+        git_head = collect_git_meta(root)["git_head"]
+        if not git_head:
+            print("Cannot pick a bundle without a git HEAD; pass a bundle file instead.", file=sys.stderr)
+            return 2
+        config_key = index_config_key(index_config_fields_from_args(args))
+        bundle_path = find_bundle(source, git_head, config_key)
+        if bundle_path is None:
+            print(
+                f"No bundle for HEAD {git_head[:12]} and config {config_key} in {source}.",
+                file=sys.stderr,
+            )
+            return BUNDLE_MISS_EXIT_CODE
+    elif source.is_file():
+        bundle_path = source
+    else:
+        print(f"Bundle source not found: {source}", file=sys.stderr)
+        return 2
+
+    start = time.perf_counter()
+    try:
+        manifest = restore_bundle(bundle_path, index_dir, root)
+    except ValueError as exc:
+        print(str(exc), file=sys.stderr)
+        return 2
+    print(
+        json.dumps(
+            {
+                "restored_from": str(bundle_path),
+                "git_head": manifest.get("git_head", ""),
+                "config_key": manifest.get("config_key", ""),
+                "files": len(manifest.get("files") or {}),
+                "restore_time_ms": round((time.perf_counter() - start) * 1000.0, 3),
+            },
+            ensure_ascii=False,
+            indent=2,
+        )
+    )
+    return 0
+
+
+def parse_json_summary(stdout: str) -> object:
+    """
+    The JSON summary a command prints last. Output before it may contain braces,
+    so the summary starts at the last line that opens with `{`. Raises
+    `json.JSONDecodeError` when there is none.
+    """
+    stdout = stdout.strip()
+    summary_start = stdout.rfind("\n{")
+    return json.loads(stdout[summary_start + 1 :] if summary_start >= 0 else stdout)
+
+
+@dataclasses.dataclass
+class WorkspaceRoot:
+    name: str
+    root: pathlib.Path
+    index_dir: str
+
+
+def load_workspace_manifest(path: pathlib.Path, default_index_dir: str) -> List[WorkspaceRoot]:
+    """
+    Read a workspace manifest:
+
+        {"roots": [{"name": "service", "path": "../service"},
+                   {"name": "libs", "path": "/src/libs", "index_dir": ".codex_knowledge"},
+                   "../infra"]}
+
+    Relative paths resolve against the manifest's directory; a bare string uses the
+    directory name as the root name.
+    """
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError) as exc:
+        raise ValueError(f"Cannot read workspace manifest {path}: {exc}") from exc
+    entries = data.get("roots") if isinstance(data, dict) else data
+    if not isinstance(entries, list) or not entries:
+        raise ValueError(f"Workspace manifest {path} must list at least one root under `roots`.")
+
+    roots: List[WorkspaceRoot] = []
+    seen: set[str] = set()
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {"path": entry}
+        if not isinstance(entry, dict) or not str(entry.get("path", "")).strip():
+            raise ValueError(f"Workspace root entries need a `path`: {entry!r}")
+        root = (path.parent / str(entry["path"])).resolve()
+        name = str(entry.get("name") or root.name).strip().strip("/")
+        if not name or name in seen:
+            raise ValueError(f"Workspace root names must be unique and non-empty: {name!r}")
+        if not root.is_dir():
+            raise ValueError(f"Workspace root `{name}` does not exist: {root}")
+        seen.add(name)
+        roots.append(WorkspaceRoot(name=name, root=root, index_dir=str(entry.get("index_dir") or default_index_dir)))
+    return roots
+
+
+def _subcommand_argv(argv: Sequence[str], command: str) -> List[str]:
+    global_value_flags = {"--root", "--index-dir", "--workspace"}
+    idx = 0
+    while idx < len(argv):
+        token = argv[idx]
+        if token == command:
+            return list(argv[idx + 1 :])
+        idx += 2 if token in global_value_flags else 1
+    return []
+
+
+def workspace_index(roots: Sequence[WorkspaceRoot], index_argv: Sequence[str]) -> int:
+    """
+    Refresh every root's index in parallel, one `index` subprocess per root so
+    chunking and vectorizing run on separate cores.
+    """
+
+    def run(ws_root: WorkspaceRoot) -> Dict[str, object]:
+        cmd = [
+            sys.executable,
+            str(pathlib.Path(__file__).resolve()),
+            "--root",
+            str(ws_root.root),
+            "--index-dir",
+            ws_root.index_dir,
+            "index",
+            *index_argv,
+        ]
+        start = time.perf_counter()
+        proc = subprocess.run(cmd, cwd=str(ws_root.root), capture_output=True, text=True, check=False)
+        item: Dict[str, object] = {
+            "name": ws_root.name,
+            "root": str(ws_root.root),
+            "exit_code": proc.returncode,
+            "elapsed_ms": round((time.perf_counter() - start) * 1000.0, 3),
+        }
+        try:
+            item["summary"] = parse_json_summary(proc.stdout)
+        except json.JSONDecodeError:
+            item["stdout"] = proc.stdout.strip()[-600:]
+        if proc.returncode != 0:
+            item["stderr"] = proc.stderr.strip()[-600:]
+        return item
+
+    workers = max(1, min(len(roots), os.cpu_count() or 1))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(run, roots))
+    print(json.dumps({"roots": results}, ensure_ascii=False, indent=2))
+    return max(int(item["exit_code"]) for item in results)
+
+
+def federated_retrieve(
+    roots: Sequence[WorkspaceRoot],
+    *,
+    query: str,
+    top_k: int,
+    module_limit: int,
+    alpha: float,
+) -> Tuple[List[Tuple[str, str, float, str]], List[QueryResult], List[Dict[str, object]]]:
+    """
+    Query several indexes as one corpus. BM25 statistics are pooled across roots,
+    each root scores its own candidates in a worker thread, and the union is
+    normalized and ranked together, so a strong hit in one repo outranks a weak one
+    in another. Result paths are prefixed with the root name.
+    """
+    tokens = tokenize(query)
+    opened: List[Tuple[WorkspaceRoot, sqlite3.Connection]] = []
+    statuses: List[Dict[str, object]] = []
+    for ws_root in roots:
+        try:
+            conn = open_db(ws_root.root, ws_root.index_dir, check_same_thread=False)
+        except FileNotFoundError as exc:
+            statuses.append({"name": ws_root.name, "status": "missing_index", "detail": str(exc)})
+            continue
+        opened.append((ws_root, conn))
+        statuses.append({"name": ws_root.name, "status": "ok"})
+
+    try:
+        stats = merge_corpus_stats([corpus_stats(conn, tokens) for _ws_root, conn in opened])
+
+        def run(item: Tuple[WorkspaceRoot, sqlite3.Connection]) -> Tuple[List[Tuple[str, float, str]], List[ChunkCandidate]]:
+            _ws_root, conn = item
+            meta = fetch_meta(conn)
+            vector_dim = int(meta.get("vector_dim", str(DEFAULT_VECTOR_DIM)))
+            q_vec = build_query_vector(
+                conn=conn,
+                query=query,
+                meta=meta,
+                embedding_provider=meta.get("embedding_provider", DEFAULT_EMBEDDING_PROVIDER),
+                vector_dim=vector_dim,
+            )
+            modules = choose_modules(conn=conn, query=query, query_vec=q_vec, limit=module_limit, vector_dim=vector_dim)
+            candidates = score_chunk_candidates(
+                conn, query, [key for key, _score, _summary in modules], q_vec, vector_dim, stats=stats
+            )
+            return modules, candidates
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, len(opened))) as pool:
+            per_root = list(pool.map(run, opened))
+
+        modules_out: List[Tuple[str, str, float, str]] = []
+        pooled: List[ChunkCandidate] = []
+        owner: Dict[int, Tuple[WorkspaceRoot, sqlite3.Connection]] = {}
+        for item, (modules, candidates) in zip(opened, per_root):
+            modules_out.extend((item[0].name, key, score, summary) for key, score, summary in modules)
+            for candidate in candidates:
+                owner[id(candidate)] = item
+            pooled.extend(candidates)
+        modules_out.sort(key=lambda row: row[2], reverse=True)
+
+        top = rank_candidates(pooled, top_k, alpha)
+        results: List[QueryResult] = []
+        for candidate in top:
+            ws_root, conn = owner[id(candidate)]
+            result = candidate.result
+            aliases = fetch_alias_paths(conn, [result.chunk_id]).get(result.chunk_id, [])
+            result.alias_paths = [f"{ws_root.name}/{alias}" for alias in aliases]
+            result.path = f"{ws_root.name}/{result.path}"
+            results.append(result)
+        return modules_out, results, statuses
+    finally:
+        for _ws_root, conn in opened:
+            conn.close()
+
+
+def cmd_workspace(args: argparse.Namespace, argv: Sequence[str]) -> int:
+    manifest = pathlib.Path(args.workspace).resolve()
+    try:
+        roots = load_workspace_manifest(manifest, args.index_dir)
+    except ValueError as exc:
+        print(str(exc), file=sys.stderr)
+        return 2
+
+    if args.command == "index":
+        return workspace_index(roots, _subcommand_argv(argv, "index"))
+    if args.command not in {"query", "prompt"}:
+        print(f"`{args.command}` does not support --workspace; run it per root.", file=sys.stderr)
+        return 2
+
+    effective_query, expansion = effective_query_for_retrieval(args.question)
+    modules, chunks, statuses = federated_retrieve(
+        roots,
+        query=effective_query,
+        top_k=int(args.top_k),
+        module_limit=int(args.module_limit),
+        alpha=args.alpha,
+    )
+
+    if args.command == "prompt":
+        print("System: You are assisting with these repositories. Use only the provided contexts.")
+        print("If you are uncertain, explicitly say what is missing.")
+        print()
+        print(f"Question: {args.question}")
+        print(f"(workspace: {', '.join(item.name for item in roots)})")
+        print()
+        print("Contexts:")
+        for idx, item in enumerate(chunks, start=1):
+            print(f"[{idx}] {item.path}:{item.start_line}-{item.end_line}")
+            if item.alias_paths:
+                print(f"(identical or near-identical copies: {', '.join(item.alias_paths[:5])})")
+            print(trim_snippet(item.text, args.snippet_chars))
+            print()
+        return 0
+
+    if args.json:
+        payload = {
+            "question": args.question,
+            "effective_query": effective_query if expansion.get("expanded") else args.question,
+            "query_expansion": expansion,
+            "workspace": str(manifest),
+            "roots": statuses,
+            "modules": [
+                {"root": root_name, "module": module, "score": round(score, 4), "summary": summary}
+                for root_name, module, score, summary in modules
+            ],
+            "chunks": [
+                {
+                    "path": item.path,
+                    "start_line": item.start_line,
+                    "end_line": item.end_line,
+                    "score": round(item.score, 4),
+                    "bm25": round(item.bm25, 4),
+                    "semantic": round(item.semantic, 4),
+                    "symbol_hint": item.symbol_hint,
+                    "also_at": item.alias_paths,
+                    "snippet": trim_snippet(item.text, args.snippet_chars),
+                }
+                for item in chunks
+            ],
+        }
+        print(json.dumps(payload, ensure_ascii=False, indent=2))
+        return 0
+
+    print(f"Question: {args.question}")
+    print()
+    print("Module recall:")
+    for root_name, module, score, _summary in modules:
+        print(f"- {root_name}:{module} (score={score:.3f})")
+    for status in statuses:
+        if status["status"] != "ok":
+            print(f"- {status['name']}: <{status['status']}>")
+    print()
+    print("Top chunks:")
+    for idx, item in enumerate(chunks, start=1):
+        print(
+            f"{idx}. {item.path}:{item.start_line}-{item.end_line} "
+            f"(score={item.score:.3f}, bm25={item.bm25:.3f}, semantic={item.semantic:.3f})"
+        )
+        if item.symbol_hint:
+            print(f"   symbols: {item.symbol_hint}")
+        if item.alias_paths:
+            print(f"   also at: {', '.join(item.alias_paths[:5])}")
+        snippet = trim_snippet(item.text, args.snippet_chars).replace("\n", "\n   ")
+        print(f"   {snippet}")
+        print()
+    if not chunks:
+        print("No matching chunks. Try a broader question.")
+    return 0
+
+
 def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(
         description="Build/query a local hybrid index for large codebase learning."
@@ -1976,6 +4685,15 @@ def build_parser() -> argparse.ArgumentParser:
         default=DEFAULT_INDEX_DIR,
         help=f"Index directory under root (default: {DEFAULT_INDEX_DIR}).",
     )
+    parser.add_argument(
+        "--workspace",
+        default=None,
+        help=(
+            "Workspace manifest (JSON) listing several roots, each with its own index. "
+            "`index` refreshes all roots in parallel; `query`/`prompt` fan out and merge "
+            "results with root-prefixed paths."
+        ),
+    )
 
     sub = parser.add_subparsers(dest="command", required=True)
 
@@ -1989,7 +4707,30 @@ def build_parser() -> argparse.ArgumentParser:
         "--max-file-bytes",
         type=int,
         default=DEFAULT_MAX_FILE_BYTES,
-        help=f"Skip files larger than this size (default: {DEFAULT_MAX_FILE_BYTES}).",
+        help=(
+            f"Files up to this size are read whole and chunked normally; larger ones go to the "
+            f"large-file tier (default: {DEFAULT_MAX_FILE_BYTES})."
+        ),
+    )
+    p_index.add_argument(
+        "--no-gitignore",
+        action="store_true",
+        help="With --all-files, also index paths matched by .gitignore / .git/info/exclude.",
+    )
+    p_index.add_argument(
+        "--discover-workers",
+        type=int,
+        default=DEFAULT_DISCOVER_WORKERS,
+        help=f"Threads for the --all-files walk, one top-level directory each (default: {DEFAULT_DISCOVER_WORKERS}).",
+    )
+    p_index.add_argument(
+        "--max-large-file-bytes",
+        type=int,
+        default=DEFAULT_MAX_LARGE_FILE_BYTES,
+        help=(
+            "Stream files up to this size through mmap with sparser chunks; larger files are skipped, "
+            f"0 disables the tier (default: {DEFAULT_MAX_LARGE_FILE_BYTES})."
+        ),
     )
     p_index.add_argument(
         "--chunk-chars",
@@ -2001,7 +4742,26 @@ def build_parser() -> argparse.ArgumentParser:
         "--chunk-overlap-lines",
         type=int,
         default=DEFAULT_CHUNK_OVERLAP_LINES,
-        help=f"Chunk overlap in lines (default: {DEFAULT_CHUNK_OVERLAP_LINES}).",
+        help=f"Chunk overlap in lines for the line chunker (default: {DEFAULT_CHUNK_OVERLAP_LINES}).",
+    )
+    p_index.add_argument(
+        "--near-dup-distance",
+        type=int,
+        default=0,
+        help=(
+            "Also collapse near-duplicate chunks whose 64-bit SimHash differs in at most this many bits "
+            f"(0-{MAX_NEAR_DUP_DISTANCE}; default 0 keeps exact-duplicate collapsing only)."
+        ),
+    )
+    p_index.add_argument(
+        "--chunker",
+        choices=sorted(CHUNKERS),
+        default=DEFAULT_CHUNKER,
+        help=(
+            "structure: split source on definitions (python ast, bracket depth for swift/ts/js/go) "
+            "with no overlap; lines: fixed-size windows. Other file types always use lines "
+            f"(default: {DEFAULT_CHUNKER})."
+        ),
     )
     p_index.add_argument(
         "--embedding-provider",
@@ -2038,6 +4798,83 @@ def build_parser() -> argparse.ArgumentParser:
         default=None,
         help="Optional OpenAI embedding dimensions (supported by text-embedding-3* models).",
     )
+    p_index.add_argument(
+        "--openai-base-url",
+        default=None,
+        help=f"OpenAI-compatible API base URL (default: $OPENAI_BASE_URL or {DEFAULT_OPENAI_BASE_URL}).",
+    )
+    p_index.add_argument(
+        "--openai-concurrency",
+        type=int,
+        default=DEFAULT_OPENAI_CONCURRENCY,
+        help=f"Embedding batches in flight at once (default: {DEFAULT_OPENAI_CONCURRENCY}).",
+    )
+    p_index.add_argument(
+        "--openai-rpm",
+        type=int,
+        default=DEFAULT_OPENAI_REQUESTS_PER_MIN,
+        help=f"Embedding request rate limit per minute, 0 disables (default: {DEFAULT_OPENAI_REQUESTS_PER_MIN}).",
+    )
+    p_index.add_argument(
+        "--openai-max-retries",
+        type=int,
+        default=DEFAULT_OPENAI_MAX_RETRIES,
+        help=f"Retries per batch on 429/5xx/network errors (default: {DEFAULT_OPENAI_MAX_RETRIES}).",
+    )
+    p_index.add_argument(
+        "--no-embedding-cache",
+        action="store_true",
+        help=f"Disable the persistent OpenAI embedding cache ({DEFAULT_EMBEDDING_CACHE_NAME}).",
+    )
+    p_index.add_argument(
+        "--embedding-cache-max-mb",
+        type=int,
+        default=DEFAULT_EMBEDDING_CACHE_MAX_MB,
+        help=f"Evict least-recently-used cached embeddings beyond this size (default: {DEFAULT_EMBEDDING_CACHE_MAX_MB}).",
+    )
+    p_index.add_argument(
+        "--query-cache-ttl-hours",
+        type=float,
+        default=DEFAULT_QUERY_CACHE_TTL_HOURS,
+        help=(
+            f"Keep cached OpenAI query embeddings ({DEFAULT_QUERY_CACHE_NAME}) this long; "
+            f"0 disables the cache (default: {DEFAULT_QUERY_CACHE_TTL_HOURS:g})."
+        ),
+    )
+    p_index.add_argument(
+        "--layout",
+        choices=sorted(INDEX_LAYOUTS),
+        default=INDEX_LAYOUT_SINGLE,
+        help=(
+            "single: one DB. sharded: one DB per top-level directory plus a small catalog; "
+            "refreshes rewrite only shards whose files changed and queries open only the "
+            f"shards of recalled modules (default: {INDEX_LAYOUT_SINGLE})."
+        ),
+    )
+    p_index.add_argument(
+        "--checkpoint-every",
+        type=int,
+        default=DEFAULT_CHECKPOINT_EVERY,
+        help=(
+            f"Spill drafted files to {DEFAULT_CHECKPOINT_NAME} every N files so an interrupted build "
+            f"can `--resume`; 0 disables (default: {DEFAULT_CHECKPOINT_EVERY})."
+        ),
+    )
+    p_index.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue from the last checkpoint when settings and the file list are unchanged.",
+    )
+    p_index.add_argument(
+        "--progress",
+        action="store_true",
+        help="Stream per-phase timings and files/s to stderr while building.",
+    )
+    p_index.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="Record the tracemalloc peak in the profile (slows the build noticeably).",
+    )
     p_index.add_argument(
         "--module-depth",
         type=int,
@@ -2092,12 +4929,61 @@ def build_parser() -> argparse.ArgumentParser:
     )
     p_prompt.set_defaults(handler=cmd_prompt)
 
+    p_export = sub.add_parser(
+        "export-bundle",
+        help="Pack the index (DB plus shard sidecars) into a checksummed .tar.gz keyed by git HEAD and indexer config.",
+    )
+    p_export.add_argument("out_dir", help="Directory to write the bundle (and its .sha256) into.")
+    p_export.add_argument(
+        "--allow-dirty",
+        action="store_true",
+        help="Export even if the index was built from uncommitted changes.",
+    )
+    p_export.set_defaults(handler=cmd_export_bundle)
+
+    p_import = sub.add_parser(
+        "import-bundle",
+        help="Restore the index from a bundle file, or from a bundle directory when one matches HEAD and config.",
+    )
+    p_import.add_argument("source", help="Bundle file, or directory of bundles.")
+    p_import.add_argument(
+        "--all-files",
+        action="store_true",
+        help="Match bundles indexed with `index --all-files`.",
+    )
+    p_import.add_argument("--layout", choices=sorted(INDEX_LAYOUTS), default=INDEX_LAYOUT_SINGLE)
+    p_import.add_argument("--chunker", choices=sorted(CHUNKERS), default=DEFAULT_CHUNKER)
+    p_import.add_argument(
+        "--embedding-provider",
+        choices=sorted(EMBEDDING_PROVIDERS),
+        default=DEFAULT_EMBEDDING_PROVIDER,
+    )
+    p_import.add_argument("--vector-dim", type=int, default=DEFAULT_VECTOR_DIM)
+    p_import.add_argument("--openai-model", default=DEFAULT_OPENAI_EMBEDDING_MODEL)
+    p_import.add_argument("--openai-dimensions", type=int, default=None)
+    p_import.add_argument("--chunk-chars", type=int, default=DEFAULT_CHUNK_CHARS)
+    p_import.add_argument("--chunk-overlap-lines", type=int, default=DEFAULT_CHUNK_OVERLAP_LINES)
+    p_import.add_argument("--module-depth", type=int, default=DEFAULT_MODULE_DEPTH)
+    p_import.add_argument("--max-file-bytes", type=int, default=DEFAULT_MAX_FILE_BYTES)
+    p_import.add_argument("--max-large-file-bytes", type=int, default=DEFAULT_MAX_LARGE_FILE_BYTES)
+    p_import.add_argument("--near-dup-distance", type=int, default=0)
+    p_import.add_argument("--ignore-dir", action="append", help="Match bundles indexed with these --ignore-dir values.")
+    p_import.add_argument(
+        "--no-gitignore",
+        action="store_true",
+        help="Match bundles indexed with `index --no-gitignore`.",
+    )
+    p_import.set_defaults(handler=cmd_import_bundle)
+
     return parser
 
 
 def main(argv: Sequence[str] | None = None) -> int:
     parser = build_parser()
-    args = parser.parse_args(argv)
+    raw_argv = list(sys.argv[1:] if argv is None else argv)
+    args = parser.parse_args(raw_argv)
+    if args.workspace:
+        return cmd_workspace(args, raw_argv)
     handler = getattr(args, "handler", None)
     if handler is None:
         parser.print_help()
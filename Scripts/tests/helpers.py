@@ -0,0 +1,111 @@
+"""
+Fixtures shared by the test modules: events and searches over a memory DB, and
+`repo_knowledge` runs over a throwaway repository.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import io
+import json
+import pathlib
+import sqlite3
+import sys
+from typing import Dict, List, Mapping, Sequence, Tuple
+
+SCRIPT_DIR = pathlib.Path(__file__).resolve().parents[1]
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPT_DIR))
+
+import codex_mem
+import repo_knowledge
+
+
+def add_event(
+    conn: sqlite3.Connection,
+    title: str,
+    content: str,
+    *,
+    session_id: str = "s1",
+    tags: Sequence[str] = (),
+    private: bool = False,
+) -> int:
+    """
+    Insert a `demo` tool event. `created_at` follows insertion order.
+    """
+    count = conn.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+    return codex_mem.insert_event(
+        conn,
+        session_id=session_id,
+        project="demo",
+        event_kind="tool_use",
+        role="tool",
+        title=title,
+        content=content,
+        tool_name="shell",
+        file_path=None,
+        tags=list(tags),
+        metadata={"privacy": {"visibility": "private"}} if private else {},
+        created_at=f"2026-01-01T00:00:{count:02d}",
+    )
+
+
+def search_ids(
+    conn: sqlite3.Connection,
+    query: str,
+    *,
+    session_id: str | None = None,
+    include_private: bool = False,
+    limit: int = 50,
+) -> List[int]:
+    """
+    Sorted ids of the `demo` events `search_events` returns.
+    """
+    rows = codex_mem.search_events(
+        conn,
+        query=query,
+        project="demo",
+        session_id=session_id,
+        since=None,
+        until=None,
+        include_private=include_private,
+        limit=limit,
+    )
+    return sorted(int(row["id"]) for row in rows)
+
+
+def write_repo(root: pathlib.Path, files: Mapping[str, str]) -> pathlib.Path:
+    for rel, text in files.items():
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text, encoding="utf-8")
+    return root
+
+
+def run_repo_knowledge(root: pathlib.Path, *argv: str) -> Tuple[int, str, str]:
+    """
+    `repo_knowledge.main` on `root`: exit code, stdout and stderr.
+    """
+    out = io.StringIO()
+    err = io.StringIO()
+    with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+        code = repo_knowledge.main(["--root", str(root), *argv])
+    return code, out.getvalue(), err.getvalue()
+
+
+def run_json(root: pathlib.Path, *argv: str) -> Tuple[int, Dict[str, object], str]:
+    """
+    Like `run_repo_knowledge`, with stdout parsed as JSON when the command succeeds.
+    """
+    code, out, err = run_repo_knowledge(root, *argv)
+    return code, (json.loads(out) if code == 0 else {}), err
+
+
+def repo_output(root: pathlib.Path, *argv: str) -> str:
+    code, out, err = run_repo_knowledge(root, *argv)
+    assert code == 0, out + err
+    return out
+
+
+def index_repo(root: pathlib.Path, *extra: str) -> Dict[str, object]:
+    return json.loads(repo_output(root, "index", "--all-files", *extra))
@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import contextlib
+import io
+import json
+import os
+import pathlib
+import sqlite3
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+SCRIPT_DIR = pathlib.Path(__file__).resolve().parents[1]
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPT_DIR))
+
+import codex_mem
+from tests.helpers import add_event, search_ids
+
+BIG_LOG = "\n".join(f"step {idx}: webpack compiled module chunk-{idx % 7} in {idx} ms" for idx in range(600))
+
+
+def _saved(conn: sqlite3.Connection) -> int:
+    row = conn.execute("SELECT COALESCE(SUM(content_raw_bytes - length(content)), 0) FROM events WHERE content_codec != ''")
+    return int(row.fetchone()[0])
+
+
+class ContentCompressionTests(unittest.TestCase):
+    def test_large_content_is_compressed_and_read_back_transparently(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="codex_mem_codec_") as tmp:
+            root = pathlib.Path(tmp)
+            conn = codex_mem.open_db(root, ".codex_mem")
+            codex_mem.ensure_session(conn, "s1", "demo")
+            small = add_event(conn, "ls", "webpack.config.js")
+            big = add_event(conn, "build", BIG_LOG)
+            conn.commit()
+
+            codecs = dict(conn.execute("SELECT id, content_codec FROM events").fetchall())
+            self.assertEqual(codecs, {small: "", big: "zlib"})
+            stored = conn.execute("SELECT length(content) FROM events WHERE id = ?", (big,)).fetchone()[0]
+            self.assertLess(stored * 5, len(BIG_LOG))
+            self.assertEqual(search_ids(conn, "webpack"), [small, big])
+            self.assertEqual(search_ids(conn, "chunk"), [big])
+
+            counts = codex_mem.db_counts(conn)
+            self.assertEqual(counts["content_bytes_saved"], len(BIG_LOG) - stored)
+            detail = codex_mem.get_item_detail(conn, "event", big, snippet_chars=80)
+            self.assertEqual(detail["content"], BIG_LOG)
+            self.assertEqual(detail["snippet"], codex_mem.trim_snippet(BIG_LOG, 80))
+            timeline = codex_mem.timeline_for_event(
+                conn, event_id=small, project="demo", before=0, after=1, snippet_chars=50
+            )
+            self.assertEqual(timeline["after"][0]["snippet"], codex_mem.trim_snippet(BIG_LOG, 50))
+            conn.close()
+
+            out = io.StringIO()
+            with contextlib.redirect_stdout(out):
+                codex_mem.main(["--root", str(root), "export-session", "s1", "--anonymize", "off"])
+            exported = json.loads(out.getvalue())
+            self.assertEqual([event["content"] for event in exported["events"]], ["webpack.config.js", BIG_LOG])
+
+    def test_codec_setting_and_deletes(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="codex_mem_codec_") as tmp:
+            conn = codex_mem.open_db(pathlib.Path(tmp), ".codex_mem")
+            try:
+                codex_mem.ensure_session(conn, "s1", "demo")
+                with mock.patch.dict(os.environ, {codex_mem.CONTENT_CODEC_ENV: "lzma"}):
+                    packed = add_event(conn, "build", BIG_LOG)
+                with mock.patch.dict(os.environ, {codex_mem.CONTENT_CODEC_ENV: "none"}):
+                    plain = add_event(conn, "build again", BIG_LOG + "\ndone")
+                codecs = dict(conn.execute("SELECT id, content_codec FROM events").fetchall())
+                self.assertEqual(codecs, {packed: "lzma", plain: ""})
+                self.assertEqual(codex_mem.get_item_detail(conn, "event", packed, snippet_chars=10)["content"], BIG_LOG)
+                self.assertEqual(codex_mem.db_counts(conn)["content_bytes_saved"], _saved(conn))
+
+                conn.execute("DELETE FROM events WHERE id = ?", (packed,))
+                self.assertEqual(search_ids(conn, "webpack"), [plain])
+                self.assertEqual(codex_mem.db_counts(conn)["content_bytes_saved"], 0)
+            finally:
+                conn.close()
+
+    def test_partial_decode_returns_prefix(self) -> None:
+        text = "é" * 50 + " tail"
+        for codec in codex_mem.CONTENT_CODECS:
+            value, used, _ = codex_mem.encode_event_content(text, codec, min_bytes=1)
+            self.assertEqual(used, codec)
+            self.assertEqual(codex_mem.decode_event_content(value, codec, max_chars=20), text[:20])
+            self.assertEqual(codex_mem.decode_event_content(value, codec), text)
+        self.assertEqual(codex_mem.encode_event_content("short", "zlib"), ("short", "", None))
+
+    def test_v4_database_is_compressed_by_backfill(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="codex_mem_codec_") as tmp:
+            root = pathlib.Path(tmp)
+            with mock.patch.object(codex_mem, "MIGRATIONS", codex_mem.MIGRATIONS[:4]), mock.patch.object(
+                codex_mem, "SCHEMA_VERSION", 4
+            ):
+                conn = codex_mem.open_db(root, ".codex_mem")
+                codex_mem.ensure_session(conn, "s1", "demo")
+                for idx in range(4):
+                    conn.execute(
+                        """
+                        INSERT INTO events(session_id, project, event_kind, role, title, content, tags_json, metadata_json, created_at)
+                        VALUES('s1', 'demo', 'tool_use', 'tool', ?, ?, '[]', '{}', ?)
+                        """,
+                        (f"build {idx}", f"{BIG_LOG}\nrun {idx}" if idx % 2 else "webpack ok", f"2026-01-01T00:00:0{idx}"),
+                    )
+                conn.commit()
+                conn.close()
+
+            conn = sqlite3.connect(root / ".codex_mem" / codex_mem.DEFAULT_DB_NAME)
+            conn.row_factory = sqlite3.Row
+            try:
+                codex_mem.migrate_schema(conn)
+                self.assertEqual(codex_mem.run_backfills(conn, batch_rows=3)["backfill:5:content_codec"], "done")
+                codecs = [str(row[0]) for row in conn.execute("SELECT content_codec FROM events ORDER BY id")]
+                self.assertEqual(codecs, ["", "zlib", "", "zlib"])
+                self.assertEqual(search_ids(conn, "webpack"), [1, 2, 3, 4])
+                self.assertEqual(search_ids(conn, "chunk"), [2, 4])
+                self.assertGreater(_saved(conn), 0)
+                self.assertEqual(codex_mem.db_counts(conn)["content_bytes_saved"], _saved(conn))
+            finally:
+                conn.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
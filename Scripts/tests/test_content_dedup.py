@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import contextlib
+import io
+import json
+import pathlib
+import sqlite3
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+SCRIPT_DIR = pathlib.Path(__file__).resolve().parents[1]
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPT_DIR))
+
+import codex_mem
+from tests.helpers import add_event, search_ids
+
+STACK = "\n".join(f"  at resolver.load (node_modules/loader/index.js:{idx}:7)" for idx in range(40))
+TRACE = f"TypeError: cannot read properties of undefined\n{STACK}"
+
+
+class ContentDedupTests(unittest.TestCase):
+    def test_repeated_content_is_stored_once(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="codex_mem_dedup_") as tmp:
+            root = pathlib.Path(tmp)
+            conn = codex_mem.open_db(root, ".codex_mem")
+            codex_mem.ensure_session(conn, "s1", "demo")
+            codex_mem.ensure_session(conn, "s2", "demo")
+            first = add_event(conn, "npm test", TRACE, session_id="s1")
+            repeat = add_event(conn, "npm test again", TRACE + "\n", session_id="s2")
+            hidden = add_event(conn, "npm test private", TRACE, session_id="s2", private=True)
+            short = add_event(conn, "ok", "done", session_id="s2")
+            add_event(conn, "ok again", "done", session_id="s2")
+            conn.commit()
+
+            row = conn.execute("SELECT content, vector, content_ref FROM events WHERE id = ?", (repeat,)).fetchone()
+            self.assertEqual((row["content"], row["vector"], row["content_ref"]), ("", None, first))
+            refs = dict(conn.execute("SELECT id, content_ref FROM events WHERE id IN (?, ?)", (hidden, short)).fetchall())
+            self.assertEqual(refs, {hidden: None, short: None})
+            blobs = conn.execute("SELECT visibility, event_id, ref_count FROM content_blobs ORDER BY visibility").fetchall()
+            self.assertEqual([tuple(blob) for blob in blobs], [("private", hidden, 1), ("public", first, 2)])
+            counts = codex_mem.db_counts(conn)
+            self.assertEqual(counts["dedup_bytes_saved"], len(TRACE.encode("utf-8")))
+            self.assertEqual(counts["dedup_tokens_saved"], codex_mem.estimate_tokens(TRACE))
+
+            self.assertEqual(search_ids(conn, "resolver", include_private=True), [first, repeat, hidden])
+            self.assertEqual(search_ids(conn, "resolver", session_id="s2", include_private=True), [repeat, hidden])
+            results = codex_mem.blended_search(
+                conn,
+                query="resolver loader",
+                project="demo",
+                session_id=None,
+                since=None,
+                until=None,
+                include_private=False,
+                limit=10,
+                vector_dim=codex_mem.DEFAULT_VECTOR_DIM,
+                alpha=0.7,
+            )
+            events = [result for result in results if result.item_type == "event"]
+            self.assertEqual([result.duplicates for result in events], [1])
+
+            self.assertEqual(codex_mem.get_item_detail(conn, "event", repeat, snippet_chars=40)["content"], TRACE)
+            timeline = codex_mem.timeline_for_event(
+                conn, event_id=short, project="demo", before=1, after=0, snippet_chars=30
+            )
+            self.assertEqual(timeline["before"][0]["snippet"], codex_mem.trim_snippet(TRACE, 30))
+            conn.close()
+
+            out = io.StringIO()
+            with contextlib.redirect_stdout(out):
+                codex_mem.main(["--root", str(root), "export-session", "s2", "--anonymize", "off"])
+            exported = json.loads(out.getvalue())
+            self.assertEqual([event["content"] for event in exported["events"]], [TRACE, "done", "done"])
+
+    def test_repeat_matching_on_its_own_title_is_returned_once(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="codex_mem_dedup_") as tmp:
+            conn = codex_mem.open_db(pathlib.Path(tmp), ".codex_mem")
+            codex_mem.ensure_session(conn, "s1", "demo")
+            first = add_event(conn, "webpack build", TRACE)
+            repeat = add_event(conn, "webpack build", TRACE)
+            for idx in range(5):
+                add_event(conn, f"rollup note {idx}", f"chunk {idx} emitted")
+            conn.commit()
+
+            self.assertEqual(search_ids(conn, "webpack"), [first, repeat])
+            self.assertEqual(len(search_ids(conn, "webpack resolver rollup", limit=3)), 3)
+            results = codex_mem.blended_search(
+                conn,
+                query="webpack",
+                project="demo",
+                session_id=None,
+                since=None,
+                until=None,
+                include_private=False,
+                limit=10,
+                vector_dim=codex_mem.DEFAULT_VECTOR_DIM,
+                alpha=0.7,
+            )
+            events = [result for result in results if result.item_type == "event"]
+            self.assertEqual([result.duplicates for result in events], [1])
+            conn.close()
+
+    def test_v5_database_is_deduplicated_by_backfill(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="codex_mem_dedup_") as tmp:
+            root = pathlib.Path(tmp)
+            with mock.patch.object(codex_mem, "MIGRATIONS", codex_mem.MIGRATIONS[:5]), mock.patch.object(
+                codex_mem, "SCHEMA_VERSION", 5
+            ):
+                conn = codex_mem.open_db(root, ".codex_mem")
+                codex_mem.ensure_session(conn, "s1", "demo")
+                for idx in range(5):
+                    conn.execute(
+                        """
+                        INSERT INTO events(session_id, project, event_kind, role, title, content, tags_json, metadata_json, created_at)
+                        VALUES('s1', 'demo', 'tool_use', 'tool', ?, ?, '[]', '{}', ?)
+                        """,
+                        (f"run {idx}", TRACE if idx % 2 == 0 else f"pass {idx}", f"2026-01-01T00:00:0{idx}"),
+                    )
+                conn.commit()
+                conn.close()
+
+            conn = sqlite3.connect(root / ".codex_mem" / codex_mem.DEFAULT_DB_NAME)
+            conn.row_factory = sqlite3.Row
+            try:
+                codex_mem.migrate_schema(conn)
+                # Written after the upgrade: already tracked, so the backfill leaves it alone.
+                late = add_event(conn, "webpack", " ".join(f"webpack chunk {idx}" for idx in range(40)))
+                self.assertEqual(codex_mem.run_backfills(conn, batch_rows=2)["backfill:6:content_dedup"], "done")
+                refs = [row[0] for row in conn.execute("SELECT content_ref FROM events ORDER BY id")]
+                self.assertEqual(refs, [None, None, 1, None, 1, None])
+                self.assertEqual(search_ids(conn, "resolver", include_private=True), [1, 3, 5])
+                self.assertEqual(search_ids(conn, "webpack"), [late])
+                self.assertEqual(codex_mem.get_item_detail(conn, "event", 5, snippet_chars=10)["content"], TRACE)
+                self.assertEqual(codex_mem.db_counts(conn)["dedup_bytes_saved"], 2 * len(TRACE.encode("utf-8")))
+            finally:
+                conn.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import pathlib
+import sqlite3
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+SCRIPT_DIR = pathlib.Path(__file__).resolve().parents[1]
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPT_DIR))
+
+import codex_mem
+from tests.helpers import add_event, search_ids
+
+
+def _fts_integrity_ok(conn: sqlite3.Connection, table: str) -> None:
+    conn.execute(f"INSERT INTO {table}({table}, rank) VALUES('integrity-check', 1)")
+
+
+class ExternalContentFtsTests(unittest.TestCase):
+    def make_v2_db(self, root: pathlib.Path) -> None:
+        """
+        A DB written by the previous schema: standalone FTS tables fed by the app.
+        """
+        with mock.patch.object(codex_mem, "MIGRATIONS", codex_mem.MIGRATIONS[:2]), mock.patch.object(
+            codex_mem, "SCHEMA_VERSION", 2
+        ):
+            conn = codex_mem.open_db(root, ".codex_mem")
+            codex_mem.ensure_session(conn, "s1", "demo")
+            for idx in range(5):
+                conn.execute(
+                    """
+                    INSERT INTO events(session_id, project, event_kind, role, title, content, tags_json, metadata_json, created_at)
+                    VALUES('s1', 'demo', 'tool_use', 'tool', ?, ?, '["build"]', '{}', ?)
+                    """,
+                    (f"compile step {idx}", f"gradle compile output {idx}", f"2026-01-01T00:00:0{idx}"),
+                )
+            codex_mem.insert_observation(
+                conn,
+                session_id="s1",
+                project="demo",
+                observation_type="learning",
+                title="compile cache",
+                body="gradle cache speeds compile",
+                source_event_ids=[1],
+            )
+            conn.execute("INSERT INTO events_fts(rowid, title, content, tags) SELECT id, title, content, tags_json FROM events")
+            conn.execute(
+                "INSERT INTO observations_fts(rowid, title, body, tags) "
+                "SELECT id, title, body, observation_type || ' ' || project FROM observations"
+            )
+            conn.commit()
+            conn.close()
+
+    def test_online_migration_keeps_search_complete_and_drops_duplicate_text(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="codex_mem_fts_") as tmp:
+            root = pathlib.Path(tmp)
+            self.make_v2_db(root)
+            conn = sqlite3.connect(root / ".codex_mem" / codex_mem.DEFAULT_DB_NAME)
+            conn.row_factory = sqlite3.Row
+            try:
+                codex_mem.migrate_schema(conn)
+                self.assertEqual(search_ids(conn, "gradle"), [1, 2, 3, 4, 5])
+                # The prefix step restarts the pending build instead of queueing a second one.
+                self.assertEqual(codex_mem.fts_table_prefix(conn, "events_fts_ext"), codex_mem.DEFAULT_FTS_PREFIX)
+                self.assertIsNone(conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'events_fts_next'").fetchone())
+
+                codex_mem.run_backfills(conn, batch_rows=2, max_batches=1)
+                new_id = add_event(conn, "compile step late", "gradle compile late")
+                log = "\n".join(f"gradle task {idx} finished in {idx * 3} ms" for idx in range(300))
+                packed = add_event(conn, "compile log", log)
+                conn.commit()
+                self.assertFalse(codex_mem._is_contentless_fts(conn, "events_fts"))
+                self.assertEqual(search_ids(conn, "gradle"), [1, 2, 3, 4, 5, new_id, packed])
+
+                status = codex_mem.run_backfills(conn, batch_rows=2)
+                self.assertEqual(status["backfill:3:external_content_fts"], "done")
+                self.assertEqual(status["backfill:4:fts_prefix_index"], "done")
+                self.assertTrue(codex_mem._is_contentless_fts(conn, "events_fts"))
+                self.assertEqual(search_ids(conn, "gradle"), [1, 2, 3, 4, 5, new_id, packed])
+                _fts_integrity_ok(conn, "events_fts")
+                _fts_integrity_ok(conn, "observations_fts")
+                shadow = {str(row[0]) for row in conn.execute("SELECT name FROM sqlite_master WHERE name LIKE '%fts_content'")}
+                self.assertEqual(shadow, set())
+
+                hits = codex_mem.search_observations(
+                    conn,
+                    query="learning cache",
+                    project="demo",
+                    session_id=None,
+                    since=None,
+                    until=None,
+                    include_private=False,
+                    limit=5,
+                )
+                self.assertEqual([int(row["id"]) for row in hits], [1])
+            finally:
+                conn.close()
+
+    def test_triggers_track_inserts_and_deletes(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="codex_mem_fts_") as tmp:
+            root = pathlib.Path(tmp)
+            conn = codex_mem.open_db(root, ".codex_mem")
+            try:
+                self.assertTrue(codex_mem._is_contentless_fts(conn, "events_fts"))
+                codex_mem.ensure_session(conn, "s1", "demo")
+                first = add_event(conn, "lint", "eslint warnings in parser")
+                second = add_event(conn, "lint again", "eslint clean")
+                self.assertEqual(search_ids(conn, "eslint"), [first, second])
+                conn.execute("UPDATE events SET content = 'prettier clean' WHERE id = ?", (second,))
+                self.assertEqual(search_ids(conn, "eslint"), [first])
+                conn.execute("DELETE FROM events WHERE id = ?", (first,))
+                self.assertEqual(search_ids(conn, "eslint"), [])
+                self.assertEqual(search_ids(conn, "prettier"), [second])
+                _fts_integrity_ok(conn, "events_fts")
+            finally:
+                conn.close()
+
+    def test_connections_without_sql_functions_can_write_events(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="codex_mem_fts_") as tmp:
+            root = pathlib.Path(tmp)
+            conn = codex_mem.open_db(root, ".codex_mem")
+            codex_mem.ensure_session(conn, "s1", "demo")
+            log = "\n".join(f"webpack chunk {idx} emitted in {idx * 7} ms" for idx in range(300))
+            packed = add_event(conn, "bundle", log)
+            conn.commit()
+            conn.close()
+
+            raw = sqlite3.connect(root / ".codex_mem" / codex_mem.DEFAULT_DB_NAME)
+            try:
+                self.assertEqual(raw.execute("SELECT content_codec FROM events WHERE id = ?", (packed,)).fetchone()[0], "zlib")
+                raw.execute(
+                    """
+                    INSERT INTO events(session_id, project, event_kind, role, title, content, tags_json, metadata_json, created_at)
+                    VALUES('s1', 'demo', 'tool_use', 'tool', 'lint', 'eslint warnings', '[]', '{}', '2026-01-01T00:00:00')
+                    """
+                )
+                raw.execute("UPDATE events SET content = 'eslint webpack warnings' WHERE title = 'lint'")
+                raw.execute("DELETE FROM events WHERE id = ?", (packed,))
+                raw.commit()
+                _fts_integrity_ok(raw, "events_fts")
+            finally:
+                raw.close()
+
+            conn = codex_mem.open_db(root, ".codex_mem")
+            try:
+                self.assertEqual(search_ids(conn, "webpack"), [packed + 1])
+                self.assertEqual(search_ids(conn, "warnings"), [packed + 1])
+            finally:
+                conn.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
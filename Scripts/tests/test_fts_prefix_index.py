@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import contextlib
+import io
+import json
+import pathlib
+import sys
+import tempfile
+import unittest
+
+SCRIPT_DIR = pathlib.Path(__file__).resolve().parents[1]
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPT_DIR))
+
+import codex_mem
+from tests.helpers import search_ids
+
+
+class FtsPrefixIndexTests(unittest.TestCase):
+    def test_short_tokens_match_exactly(self) -> None:
+        self.assertEqual(codex_mem.build_fts_query("a getUser db", 2), "a OR get* OR user* OR getuser* OR db*")
+        self.assertEqual(codex_mem.build_fts_query("a getUser db", 3), "a OR get* OR user* OR getuser* OR db")
+        self.assertEqual(codex_mem.parse_fts_prefix("4, 2 3 3"), "2 3 4")
+        with self.assertRaises(ValueError):
+            codex_mem.parse_fts_prefix("0 2")
+
+    def test_new_database_gets_default_prefix_indexes(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="codex_mem_prefix_") as tmp:
+            conn = codex_mem.open_db(pathlib.Path(tmp), ".codex_mem")
+            try:
+                for table in ("events_fts", "observations_fts"):
+                    self.assertEqual(codex_mem.fts_table_prefix(conn, table), codex_mem.DEFAULT_FTS_PREFIX)
+                self.assertEqual(codex_mem.fts_min_prefix_chars(conn, "events_fts"), 2)
+                self.assertEqual(codex_mem.pending_backfills(conn), {})
+            finally:
+                conn.close()
+
+    def test_prefix_change_rebuilds_online(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="codex_mem_prefix_") as tmp:
+            root = pathlib.Path(tmp)
+            conn = codex_mem.open_db(root, ".codex_mem")
+            codex_mem.ensure_session(conn, "s1", "demo")
+            ids = [
+                codex_mem.insert_event(
+                    conn,
+                    session_id="s1",
+                    project="demo",
+                    event_kind="tool_use",
+                    role="tool",
+                    title=f"step {idx}",
+                    content=f"configuration reload {idx}",
+                    tool_name="shell",
+                    file_path=None,
+                    tags=[],
+                    metadata={},
+                )
+                for idx in range(5)
+            ]
+            conn.commit()
+
+            conn.execute("BEGIN IMMEDIATE")
+            self.assertTrue(codex_mem.start_fts_prefix_rebuild(conn, "3 5"))
+            conn.commit()
+            codex_mem.run_backfills(conn, batch_rows=2, max_batches=1)
+            self.assertEqual(codex_mem.fts_table_prefix(conn, "events_fts"), codex_mem.DEFAULT_FTS_PREFIX)
+            self.assertEqual(codex_mem.fts_table_prefix(conn, "observations_fts"), "3 5")
+            self.assertEqual(search_ids(conn, "config"), ids)
+            conn.close()
+
+            out = io.StringIO()
+            with contextlib.redirect_stdout(out):
+                self.assertEqual(codex_mem.main(["--root", str(root), "migrate"]), 0)
+            payload = json.loads(out.getvalue())
+            self.assertEqual(payload["fts_prefix"], {"events_fts": "3 5", "observations_fts": "3 5"})
+            self.assertEqual(payload["pending_backfills"], [])
+
+            conn = codex_mem.open_db(root, ".codex_mem", read_only=True)
+            try:
+                self.assertEqual(search_ids(conn, "conf"), ids)
+                self.assertEqual(codex_mem.fts_min_prefix_chars(conn, "events_fts"), 3)
+            finally:
+                conn.close()
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                self.assertEqual(codex_mem.main(["--root", str(root), "migrate", "--fts-prefix", "99"]), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
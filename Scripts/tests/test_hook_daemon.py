@@ -0,0 +1,243 @@
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import pathlib
+import socket
+import sqlite3
+import sys
+import tempfile
+import threading
+import unittest
+from typing import Dict, List
+from unittest import mock
+
+SCRIPT_DIR = pathlib.Path(__file__).resolve().parents[1]
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPT_DIR))
+
+import codex_mem
+
+
+def _run(root: pathlib.Path, *argv: str) -> tuple[int, Dict[str, object]]:
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out), contextlib.redirect_stderr(io.StringIO()):
+        code = codex_mem.main(["--root", str(root), *argv])
+    return code, json.loads(out.getvalue())
+
+
+def _request(path: pathlib.Path, request: Dict[str, object]) -> Dict[str, object]:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(str(path))
+        sock.sendall((json.dumps(request) + "\n").encode("utf-8"))
+        with sock.makefile("r", encoding="utf-8") as reader:
+            return json.loads(reader.readline())
+
+
+def _hook_request(root: pathlib.Path, *argv: str) -> Dict[str, object]:
+    args = codex_mem.build_parser().parse_args(["--root", str(root), *argv])
+    return {"op": "hook", "args": codex_mem._hook_request_args(args)}
+
+
+def _event_count(root: pathlib.Path) -> int:
+    conn = codex_mem.open_db(root, codex_mem.DEFAULT_INDEX_DIR)
+    try:
+        return int(conn.execute("SELECT COUNT(*) FROM events").fetchone()[0])
+    finally:
+        conn.close()
+
+
+@unittest.skipUnless(hasattr(socket, "AF_UNIX"), "needs Unix domain sockets")
+class HookDaemonTests(unittest.TestCase):
+    def start_daemon(self, root: pathlib.Path, interval_sec: float, **kwargs: float) -> codex_mem.HookDaemon:
+        daemon = codex_mem.HookDaemon(root, codex_mem.DEFAULT_INDEX_DIR, commit_interval_sec=interval_sec, **kwargs)
+        daemon.start()
+        thread = threading.Thread(target=daemon.serve_forever, daemon=True)
+        thread.start()
+
+        def stop() -> None:
+            daemon.server.shutdown()
+            thread.join()
+            daemon.close()
+
+        self.addCleanup(stop)
+        return daemon
+
+    def test_cli_hooks_forward_to_running_daemon(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="codex_mem_daemon_") as tmp:
+            root = pathlib.Path(tmp)
+            daemon = self.start_daemon(root, 0.002)
+            self.assertEqual(_run(root, "session-start", "s1", "--title", "t")[0], 0)
+            code, payload = _run(root, "post-tool-use", "s1", "shell", "ls -la")
+            self.assertEqual(code, 0)
+            self.assertTrue(str(payload["event_id"]).startswith("E"))
+            code, payload = _run(root, "post-tool-use", "s1", "shell", "cat .env", "--privacy-tag", "block")
+            self.assertEqual(code, 0)
+            self.assertTrue(payload["skipped"])
+            code, payload = _run(root, "session-end", "s1")
+            self.assertEqual((code, payload["hook"]), (0, "SessionEnd"))
+
+            stats = _request(daemon.socket_path, {"op": "stats"})["stats"]
+            self.assertEqual(stats["requests"], 4)
+            self.assertEqual(stats["errors"], 0)
+            self.assertEqual(_event_count(root), 3)
+
+            _run(root, "--no-daemon", "stop", "s1")
+            self.assertEqual(_request(daemon.socket_path, {"op": "stats"})["stats"]["requests"], 4)
+            self.assertEqual(_event_count(root), 4)
+
+    def test_concurrent_hooks_share_a_commit(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="codex_mem_daemon_") as tmp:
+            root = pathlib.Path(tmp)
+            daemon = self.start_daemon(root, 0.2)
+            args = codex_mem.build_parser().parse_args(["--root", str(root), "user-prompt-submit", "s1", "hello"])
+            request = {"op": "hook", "args": codex_mem._hook_request_args(args)}
+            responses: List[Dict[str, object]] = []
+            threads = [threading.Thread(target=lambda: responses.append(_request(daemon.socket_path, request))) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(len(responses), 8)
+            self.assertTrue(all(response["ok"] for response in responses))
+            self.assertEqual(len({response["payload"]["event_id"] for response in responses}), 8)
+            self.assertLess(daemon.stats["commits"], 8)
+            self.assertGreater(daemon.stats["max_group"], 1)
+            self.assertEqual(_event_count(root), 8)
+
+    def test_grouped_hooks_are_invisible_until_commit(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="codex_mem_daemon_") as tmp:
+            root = pathlib.Path(tmp)
+            daemon = codex_mem.HookDaemon(root, codex_mem.DEFAULT_INDEX_DIR)
+            writer = codex_mem.open_db(root, codex_mem.DEFAULT_INDEX_DIR)
+            reader = codex_mem.open_db(root, codex_mem.DEFAULT_INDEX_DIR, read_only=True)
+            try:
+                group = []
+                for text in ("first", "second"):
+                    args = codex_mem.build_parser().parse_args(["--root", str(root), "user-prompt-submit", "s1", text])
+                    pending = codex_mem._PendingHook(argparse.Namespace(**codex_mem._hook_request_args(args)))
+                    daemon._apply(writer, pending)
+                    self.assertTrue(pending.response["ok"])
+                    group.append(pending)
+                self.assertTrue(writer.in_transaction)
+                self.assertEqual(reader.execute("SELECT COUNT(*) FROM events").fetchone()[0], 0)
+                daemon._commit(writer, group)
+                self.assertEqual(reader.execute("SELECT COUNT(*) FROM events").fetchone()[0], 2)
+                self.assertTrue(all(pending.done.is_set() for pending in group))
+            finally:
+                reader.close()
+                writer.close()
+
+    def test_failed_hook_is_rolled_back_alone(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="codex_mem_daemon_") as tmp:
+            root = pathlib.Path(tmp)
+            daemon = self.start_daemon(root, 0.002)
+            response = _request(daemon.socket_path, {"op": "hook", "args": {"command": "stop", "session_id": "s1"}})
+            self.assertFalse(response["ok"])
+            self.assertFalse(_request(daemon.socket_path, {"op": "hook", "args": {"command": "init"}})["ok"])
+            self.assertEqual(_run(root, "stop", "s1")[0], 0)
+            self.assertEqual(daemon.stats["errors"], 1)
+            self.assertEqual(_event_count(root), 1)
+
+    def test_write_lock_timeout_fails_the_request_and_keeps_the_writer(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="codex_mem_daemon_") as tmp:
+            root = pathlib.Path(tmp)
+            with mock.patch.object(codex_mem, "DEFAULT_HOOK_BUSY_TIMEOUT_MS", 50):
+                daemon = self.start_daemon(root, 0.002)
+            request = _hook_request(root, "stop", "s1")
+            blocker = sqlite3.connect(root / codex_mem.DEFAULT_INDEX_DIR / codex_mem.DEFAULT_DB_NAME)
+            try:
+                blocker.execute("BEGIN IMMEDIATE")
+                response = _request(daemon.socket_path, request)
+                self.assertFalse(response["ok"])
+                self.assertIn("locked", response["error"])
+            finally:
+                blocker.rollback()
+                blocker.close()
+            self.assertTrue(_request(daemon.socket_path, request)["ok"])
+            self.assertEqual(_event_count(root), 1)
+
+    def test_requests_are_answered_when_the_writer_is_busy_or_gone(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="codex_mem_daemon_") as tmp:
+            root = pathlib.Path(tmp)
+            daemon = self.start_daemon(root, 0.002, queue_timeout_sec=0.1)
+            release = threading.Event()
+            apply_stop = codex_mem.HOOK_APPLIERS["stop"][0]
+
+            def slow_stop(conn: sqlite3.Connection, args: argparse.Namespace) -> Dict[str, object]:
+                release.wait(5)
+                return apply_stop(conn, args)
+
+            request = _hook_request(root, "stop", "s1")
+            responses: List[Dict[str, object]] = []
+            with mock.patch.dict(codex_mem.HOOK_APPLIERS, {"stop": (slow_stop, None)}):
+                first = threading.Thread(target=lambda: responses.append(_request(daemon.socket_path, request)))
+                first.start()
+                while daemon.stats["requests"] == 0:
+                    threading.Event().wait(0.01)
+                rejected = _request(daemon.socket_path, request)
+                release.set()
+                first.join()
+            self.assertFalse(rejected["ok"])
+            self.assertIn("not applied", rejected["error"])
+            self.assertTrue(responses[0]["ok"])
+            self.assertEqual(daemon.stats["requests"], 1)
+            self.assertEqual(_event_count(root), 1)
+
+            daemon.requests.put(None)
+            daemon.writer.join()
+            gone = daemon.handle_line(json.dumps(request))
+            self.assertFalse(gone["ok"])
+            self.assertIn("not running", gone["error"])
+
+    def test_failed_or_silent_daemon_falls_back_to_local_write(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="codex_mem_daemon_") as tmp:
+            root = pathlib.Path(tmp)
+            path = codex_mem.hook_socket_path(root, codex_mem.DEFAULT_INDEX_DIR)
+            path.parent.mkdir(parents=True)
+            for reply in (b'{"ok": false, "error": "hook writer is busy"}\n', b""):
+                with self.subTest(reply=reply):
+                    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                    server.bind(str(path))
+                    server.listen(1)
+
+                    def answer() -> None:
+                        conn, _ = server.accept()
+                        with conn, conn.makefile("rb") as reader:
+                            reader.readline()
+                            conn.sendall(reply)
+
+                    thread = threading.Thread(target=answer, daemon=True)
+                    thread.start()
+                    before = _event_count(root)
+                    code, payload = _run(root, "user-prompt-submit", "s1", "hello")
+                    thread.join()
+                    server.close()
+                    path.unlink()
+                    self.assertEqual((code, payload["ok"]), (0, True))
+                    self.assertEqual(_event_count(root), before + 1)
+
+    def test_stale_socket_falls_back_to_local_write(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="codex_mem_daemon_") as tmp:
+            root = pathlib.Path(tmp)
+            path = codex_mem.hook_socket_path(root, codex_mem.DEFAULT_INDEX_DIR)
+            path.parent.mkdir(parents=True)
+            stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            stale.bind(str(path))
+            stale.close()
+            code, payload = _run(root, "user-prompt-submit", "s1", "hello")
+            self.assertEqual(code, 0)
+            self.assertTrue(payload["ok"])
+            self.assertEqual(_event_count(root), 1)
+
+            daemon = self.start_daemon(root, 0.002)
+            self.assertEqual(_run(root, "stop", "s1")[0], 0)
+            self.assertEqual(daemon.stats["requests"], 1)
+            with self.assertRaises(RuntimeError):
+                codex_mem.HookDaemon(root, codex_mem.DEFAULT_INDEX_DIR).start()
+
+
+if __name__ == "__main__":
+    unittest.main()
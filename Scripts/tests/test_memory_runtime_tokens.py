@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import io
+import json
+import pathlib
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+SCRIPT_DIR = pathlib.Path(__file__).resolve().parents[1]
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPT_DIR))
+
+import codex_mem
+import repo_knowledge
+from memory_runtime import tokens
+from memory_runtime.tokens import TOKENIZE_CACHE_MAX_CHARS, split_terms, tokenize
+
+
+class SharedTokenizerTests(unittest.TestCase):
+    def test_identifier_splitting(self) -> None:
+        cases = {
+            "getUserName": ["get", "user", "name", "getusername"],
+            "HTTPServer_v2": ["httpserver", "v2"],
+            "snake_case_name": ["snake", "case", "name"],
+            "plain words 42": ["plain", "words", "42"],
+            "__init__": ["init"],
+            "_": [],
+            "解析日志 parseLog": ["解析日志", "parse", "log", "parselog"],
+        }
+        for text, expected in cases.items():
+            with self.subTest(text=text):
+                self.assertEqual(tokenize(text), expected)
+
+    def test_long_text_matches_short_path_and_results_are_copies(self) -> None:
+        line = "def loadConfig(path_name):\n    return read_file(path_name)\n"
+        long_text = line * (TOKENIZE_CACHE_MAX_CHARS // len(line) + 2)
+        self.assertEqual(tokenize(long_text), tokenize(line) * (TOKENIZE_CACHE_MAX_CHARS // len(line) + 2))
+        first = tokenize(line)
+        first.append("mutated")
+        self.assertNotIn("mutated", tokenize(line))
+
+    def test_tokens_are_interned(self) -> None:
+        left = tokenize("".join(["fetch", "Remote", "Index"]))
+        right = tokenize("fetch_remote_index " + "x" * TOKENIZE_CACHE_MAX_CHARS)
+        self.assertIs(left[0], right[0])
+
+    def test_split_terms_keeps_camel_case_and_drops_single_letters(self) -> None:
+        self.assertEqual(split_terms("Scripts/repo_knowledge.py getUserName a 7"), ["scripts", "repo", "knowledge", "py", "getusername", "7"])
+
+    def test_every_subsystem_uses_the_shared_tokenizer(self) -> None:
+        self.assertIs(codex_mem.tokenize, tokenize)
+        self.assertIs(repo_knowledge.tokenize, tokenize)
+
+
+class TokenBucketTests(unittest.TestCase):
+    def setUp(self) -> None:
+        patches = [
+            mock.patch.dict(tokens._TOKEN_HASHES, clear=True),
+            mock.patch.dict(tokens._BUCKET_TABLES, clear=True),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_bucket_matches_blake2b_feature_hash(self) -> None:
+        for token in ("config", "getusername", "解析", "42"):
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            for dim in (64, 256, 1000):
+                with self.subTest(token=token, dim=dim):
+                    expected = (int.from_bytes(digest[:4], "big") % dim, 1.0 if (digest[4] & 1) == 0 else -1.0)
+                    self.assertEqual(tokens.token_bucket(token, dim), expected)
+                    self.assertEqual(tokens.bucket_table(dim)[token], expected)
+
+    def test_saved_vocab_lets_a_fresh_process_skip_hashing(self) -> None:
+        vocab = ["alpha", "beta", "getusername", "解析"]
+        expected = {token: tokens.token_bucket(token, 256) for token in vocab}
+        with tempfile.TemporaryDirectory(prefix="rk_vocab_") as tmp:
+            path = pathlib.Path(tmp) / "token_vocab.bin"
+            self.assertEqual(tokens.save_token_vocab(path, vocab), 4)
+            tokens._TOKEN_HASHES.clear()
+            tokens._BUCKET_TABLES.clear()
+            self.assertEqual(tokens.load_token_vocab(path), 4)
+            with mock.patch.object(tokens.hashlib, "blake2b", side_effect=AssertionError("hashed")):
+                got = {token: tokens.token_bucket(token, 256) for token in vocab}
+                repo_knowledge.vectorize_tf({"alpha": 2, "beta": 1}, {}, 256)
+            self.assertEqual(got, expected)
+
+            path.write_bytes(b"not a vocab file")
+            self.assertEqual(tokens.load_token_vocab(path), 0)
+
+    def test_index_writes_token_vocab(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="rk_vocab_") as tmp:
+            root = pathlib.Path(tmp)
+            (root / "app.py").write_text("def load_config(path):\n    return read(path)\n", encoding="utf-8")
+            out = io.StringIO()
+            with contextlib.redirect_stdout(out), contextlib.redirect_stderr(io.StringIO()):
+                code = repo_knowledge.main(["--root", str(root), "index", "--all-files"])
+            self.assertEqual(code, 0)
+            self.assertGreater(json.loads(out.getvalue())["token_vocab"], 0)
+            vocab_path = root / repo_knowledge.DEFAULT_INDEX_DIR / repo_knowledge.DEFAULT_TOKEN_VOCAB_NAME
+            tokens._TOKEN_HASHES.clear()
+            self.assertGreater(tokens.load_token_vocab(vocab_path), 0)
+            self.assertIn("config", tokens._TOKEN_HASHES)
+
+
+if __name__ == "__main__":
+    unittest.main()
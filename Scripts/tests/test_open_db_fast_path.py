@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import contextlib
+import io
+import json
+import pathlib
+import sqlite3
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+SCRIPT_DIR = pathlib.Path(__file__).resolve().parents[1]
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPT_DIR))
+
+import codex_mem
+
+
+class OpenDbFastPathTests(unittest.TestCase):
+    def test_current_schema_skips_init_schema(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="codex_mem_open_") as tmp:
+            root = pathlib.Path(tmp)
+            conn = codex_mem.open_db(root, ".codex_mem")
+            self.assertEqual(conn.execute("PRAGMA user_version").fetchone()[0], codex_mem.SCHEMA_VERSION)
+            conn.close()
+            with mock.patch.object(codex_mem, "init_schema", side_effect=AssertionError("init_schema ran")):
+                codex_mem.open_db(root, ".codex_mem").close()
+                codex_mem.open_db(root, ".codex_mem", read_only=True).close()
+
+    def test_unversioned_database_is_upgraded_once(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="codex_mem_open_") as tmp:
+            root = pathlib.Path(tmp)
+            codex_mem.open_db(root, ".codex_mem").close()
+            db_path = root / ".codex_mem" / codex_mem.DEFAULT_DB_NAME
+            raw = sqlite3.connect(db_path)
+            raw.execute("PRAGMA user_version=0")
+            raw.execute("DELETE FROM meta")
+            raw.commit()
+            raw.close()
+            conn = codex_mem.open_db(root, ".codex_mem", read_only=True)
+            try:
+                self.assertEqual(conn.execute("PRAGMA user_version").fetchone()[0], codex_mem.SCHEMA_VERSION)
+                self.assertEqual(codex_mem.fetch_meta(conn)["index_version"], codex_mem.INDEX_VERSION)
+            finally:
+                conn.close()
+
+    def test_read_only_connection_never_writes_or_waits_for_writers(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="codex_mem_open_") as tmp:
+            root = pathlib.Path(tmp)
+            reader = codex_mem.open_db(root, ".codex_mem", read_only=True)
+            writer = codex_mem.open_db(root, ".codex_mem")
+            try:
+                writer.execute("BEGIN IMMEDIATE")
+                codex_mem.upsert_meta(writer, "channel", "beta")
+                self.assertEqual(codex_mem.get_runtime_config(reader)["channel"], codex_mem.DEFAULT_CHANNEL)
+                with self.assertRaises(sqlite3.OperationalError):
+                    codex_mem.upsert_meta(reader, "channel", "beta")
+                writer.commit()
+            finally:
+                writer.close()
+                reader.close()
+
+    def test_search_still_seeds_an_empty_database(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="codex_mem_open_") as tmp:
+            root = pathlib.Path(tmp)
+            (root / "README.md").write_text("# demo\n", encoding="utf-8")
+            out = io.StringIO()
+            with contextlib.redirect_stdout(out), contextlib.redirect_stderr(io.StringIO()):
+                code = codex_mem.main(["--root", str(root), "search", "architecture"])
+            self.assertEqual(code, 0)
+            self.assertTrue(json.loads(out.getvalue())["auto_seeded"])
+            with mock.patch.object(codex_mem, "init_schema", side_effect=AssertionError("init_schema ran")):
+                with contextlib.redirect_stdout(io.StringIO()):
+                    self.assertEqual(codex_mem.main(["--root", str(root), "search", "architecture"]), 0)
+                    self.assertEqual(codex_mem.main(["--root", str(root), "timeline", "E1"]), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import contextlib
+import io
+import json
+import pathlib
+import sys
+import tempfile
+import unittest
+from typing import Dict
+from unittest import mock
+
+SCRIPT_DIR = pathlib.Path(__file__).resolve().parents[1]
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPT_DIR))
+
+import codex_mem
+
+
+def _run(root: pathlib.Path, *argv: str, stdin: str | None = None) -> tuple[int, Dict[str, object]]:
+    out = io.StringIO()
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(contextlib.redirect_stdout(out))
+        stack.enter_context(contextlib.redirect_stderr(io.StringIO()))
+        if stdin is not None:
+            stack.enter_context(mock.patch.object(sys, "stdin", io.StringIO(stdin)))
+        code = codex_mem.main(["--root", str(root), *argv])
+    return code, json.loads(out.getvalue())
+
+
+def _jsonl(*records: Dict[str, object]) -> str:
+    return "\n".join(json.dumps(record) for record in records) + "\n"
+
+
+class PostToolUseBatchTests(unittest.TestCase):
+    def test_batch_file_inserts_in_order_and_applies_policies(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="codex_mem_batch_") as tmp:
+            root = pathlib.Path(tmp)
+            batch = root / "events.jsonl"
+            batch.write_text(
+                _jsonl(
+                    {"session_id": "s1", "tool_name": "shell", "content": "ls -la\nREADME.md"},
+                    {"session_id": "s1", "tool_name": "shell", "content": "cat .env", "privacy_tags": ["block"]},
+                    {"session_id": "s2", "tool_name": "http", "content": "api_key=abc123", "privacy_tags": ["redact"]},
+                    {"session_id": "s2", "tool_name": "pytest", "content": "x" * 9000, "compact": True, "tags": ["ci"]},
+                ),
+                encoding="utf-8",
+            )
+            code, payload = _run(root, "post-tool-use", "--batch", str(batch))
+            self.assertEqual(code, 0)
+            self.assertEqual(payload["count"], 4)
+            self.assertEqual(payload["inserted"], 3)
+            ids = payload["event_ids"]
+            self.assertIsNone(ids[1])
+            self.assertEqual([int(str(v)[1:]) for v in ids if v], sorted(int(str(v)[1:]) for v in ids if v))
+
+            conn = codex_mem.open_db(root, codex_mem.DEFAULT_INDEX_DIR)
+            try:
+                rows = {f"E{row['id']}": row for row in conn.execute("SELECT * FROM events ORDER BY id").fetchall()}
+                sessions = {row[0] for row in conn.execute("SELECT session_id FROM sessions")}
+            finally:
+                conn.close()
+            self.assertEqual(list(rows), [ids[0], ids[2], ids[3]])
+            self.assertEqual(sessions, {"s1", "s2"})
+            self.assertNotIn("abc123", rows[ids[2]]["content"])
+            self.assertLess(len(rows[ids[3]]["content"]), 9000)
+            self.assertIn("ci", json.loads(rows[ids[3]]["tags_json"]))
+
+    def test_bad_line_rejects_whole_batch(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="codex_mem_batch_") as tmp:
+            root = pathlib.Path(tmp)
+            stdin = _jsonl({"session_id": "s1", "tool_name": "shell", "content": "ok"}) + "{not json\n"
+            code, payload = _run(root, "post-tool-use", "--batch", "-", stdin=stdin)
+            self.assertEqual(code, 2)
+            self.assertIn("line 2", str(payload["error"]))
+            conn = codex_mem.open_db(root, codex_mem.DEFAULT_INDEX_DIR)
+            try:
+                self.assertEqual(conn.execute("SELECT COUNT(*) FROM events").fetchone()[0], 0)
+            finally:
+                conn.close()
+
+    def test_mistyped_fields_are_reported_per_line(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="codex_mem_batch_") as tmp:
+            root = pathlib.Path(tmp)
+            base = {"session_id": "s1", "tool_name": "shell", "content": "ok"}
+            for field, value in (
+                ("compact", "false"),
+                ("compact", 0),
+                ("compact_chars", "lots"),
+                ("compact_chars", 2.5),
+                ("exit_code", True),
+            ):
+                with self.subTest(field=field, value=value):
+                    stdin = _jsonl(base) + _jsonl({**base, field: value})
+                    code, payload = _run(root, "post-tool-use", "--batch", "-", stdin=stdin)
+                    self.assertEqual(code, 2)
+                    self.assertIn("line 2", str(payload["error"]))
+                    self.assertIn(f"`{field}`", str(payload["error"]))
+
+            stdin = _jsonl({**base, "compact": False, "compact_chars": "500", "exit_code": "1"})
+            code, payload = _run(root, "post-tool-use", "--batch", "-", stdin=stdin)
+            self.assertEqual(code, 0)
+            self.assertEqual(payload["inserted"], 1)
+
+    def test_stdin_records_inherit_positional_defaults(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="codex_mem_batch_") as tmp:
+            root = pathlib.Path(tmp)
+            stdin = _jsonl({"content": "first"}, {"content": "second", "tool_name": "grep"})
+            code, payload = _run(root, "post-tool-use", "sdefault", "shell", "--batch", "-", stdin=stdin)
+            self.assertEqual(code, 0)
+            conn = codex_mem.open_db(root, codex_mem.DEFAULT_INDEX_DIR)
+            try:
+                rows = conn.execute("SELECT session_id, tool_name FROM events ORDER BY id").fetchall()
+            finally:
+                conn.close()
+            self.assertEqual([tuple(row) for row in rows], [("sdefault", "shell"), ("sdefault", "grep")])
+
+
+if __name__ == "__main__":
+    unittest.main()
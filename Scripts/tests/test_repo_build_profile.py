@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import json
+import pathlib
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import unittest
+
+SCRIPT_DIR = pathlib.Path(__file__).resolve().parents[1]
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPT_DIR))
+
+import codex_mem
+import repo_knowledge
+from tests.helpers import run_json, write_repo
+
+
+class BuildProfileTests(unittest.TestCase):
+    def make_repo(self, tmp: str) -> pathlib.Path:
+        files = {f"pkg_{idx % 2}/mod_{idx}.py": f"def handler_{idx}(event):\n    return event.value_{idx}\n" for idx in range(4)}
+        return write_repo(pathlib.Path(tmp) / "repo", files)
+
+    def test_summary_reports_phases_and_throughput(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="rk_profile_") as tmp:
+            root = self.make_repo(tmp)
+            for layout in ("single", "sharded"):
+                with self.subTest(layout=layout):
+                    code, summary, _err = run_json(root, "index", "--all-files", "--layout", layout)
+                    self.assertEqual(code, 0)
+                    profile = summary["profile"]
+                    phases = profile["phases"]
+                    for name in ("discover", "read", "chunk", "tokenize", "vectorize", "write"):
+                        self.assertIn(name, phases)
+                        self.assertGreaterEqual(phases[name]["wall_sec"], 0.0)
+                    self.assertEqual(profile["files"], 4)
+                    self.assertEqual(profile["chunks"], summary["chunk_count"])
+                    self.assertGreater(profile["bytes_read"], 0)
+                    self.assertGreater(profile["files_per_sec"], 0.0)
+                    self.assertNotIn("tracemalloc_peak_bytes", profile)
+
+    def test_trace_memory_and_progress_are_opt_in(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="rk_profile_") as tmp:
+            root = self.make_repo(tmp)
+            code, summary, err = run_json(root, "index", "--all-files", "--trace-memory", "--progress")
+            self.assertEqual(code, 0)
+            self.assertGreater(summary["profile"]["tracemalloc_peak_bytes"], 0)
+            self.assertIn("[index] discover:", err)
+            self.assertIn("[index] drafted 4/4 files", err)
+
+    def test_ensure_index_persists_last_build_profile(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="rk_profile_") as tmp:
+            root = self.make_repo(tmp)
+            subprocess.run(["git", "init", "-q"], cwd=root, check=True, capture_output=True)
+            result = codex_mem.ensure_repo_knowledge_index(
+                root=root,
+                script=SCRIPT_DIR / "repo_knowledge.py",
+                index_dir=repo_knowledge.DEFAULT_INDEX_DIR,
+            )
+            self.assertTrue(result["refreshed"])
+            self.assertIn("phases", result["index_profile"])
+
+            conn = sqlite3.connect(root / repo_knowledge.DEFAULT_INDEX_DIR / repo_knowledge.DEFAULT_DB_NAME)
+            try:
+                row = conn.execute("SELECT value FROM meta WHERE key = 'last_build_profile'").fetchone()
+            finally:
+                conn.close()
+            self.assertEqual(json.loads(row[0]), result["index_profile"])
+
+    def test_build_profile_is_read_from_the_last_summary(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="rk_profile_") as tmp:
+            db_path = pathlib.Path(tmp) / "index.sqlite3"
+            conn = sqlite3.connect(db_path)
+            conn.execute("CREATE TABLE meta(key TEXT PRIMARY KEY, value TEXT)")
+            conn.close()
+            summary = {"chunk_count": 2, "profile": {"files": 2, "phases": {}}}
+            stdout = "warning: skipped {vendor}/lib.js\n" + json.dumps(summary, indent=2) + "\n"
+            self.assertEqual(repo_knowledge.parse_json_summary(stdout), summary)
+            self.assertEqual(codex_mem.store_index_build_profile(db_path, stdout), summary["profile"])
+            self.assertEqual(codex_mem.store_index_build_profile(db_path, "no summary {"), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import contextlib
+import io
+import json
+import pathlib
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+SCRIPT_DIR = pathlib.Path(__file__).resolve().parents[1]
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPT_DIR))
+
+import codex_mem
+import repo_knowledge
+
+
+def _run(root: pathlib.Path, *argv: str) -> tuple[int, str]:
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out), contextlib.redirect_stderr(io.StringIO()):
+        code = repo_knowledge.main(["--root", str(root), *argv])
+    return code, out.getvalue()
+
+
+def _git(root: pathlib.Path, *argv: str) -> None:
+    subprocess.run(
+        ["git", "-c", "user.email=dev@example.com", "-c", "user.name=dev", *argv],
+        cwd=root,
+        check=True,
+        capture_output=True,
+    )
+
+
+class IndexBundleTests(unittest.TestCase):
+    def make_repo(self, tmp: str) -> pathlib.Path:
+        root = pathlib.Path(tmp) / "repo"
+        files = {
+            "app/orders.py": "def place_order(cart):\n    return cart.checkout()\n",
+            "lib/cache.py": "def warm_cache(keys):\n    return [key for key in keys]\n",
+        }
+        for rel, text in files.items():
+            path = root / rel
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(text, encoding="utf-8")
+        (root / ".gitignore").write_text(".codex_knowledge/\n", encoding="utf-8")
+        _git(root, "init", "-q")
+        _git(root, "add", "-A")
+        _git(root, "commit", "-qm", "init")
+        return root
+
+    def test_export_then_import_from_bundle_dir(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="rk_bundle_") as tmp:
+            root = self.make_repo(tmp)
+            bundles = pathlib.Path(tmp) / "bundles"
+            for layout in ("single", "sharded"):
+                with self.subTest(layout=layout):
+                    code, _ = _run(root, "index", "--all-files", "--layout", layout)
+                    self.assertEqual(code, 0)
+                    code, out = _run(root, "export-bundle", str(bundles))
+                    self.assertEqual(code, 0, out)
+                    exported = json.loads(out)
+                    bundle = pathlib.Path(exported["bundle"])
+                    self.assertTrue(bundle.name.endswith(".tar.gz"))
+                    self.assertTrue(pathlib.Path(str(bundle) + ".sha256").exists())
+
+                    shutil.rmtree(root / repo_knowledge.DEFAULT_INDEX_DIR)
+                    code, out = _run(root, "import-bundle", str(bundles), "--all-files", "--layout", layout)
+                    self.assertEqual(code, 0, out)
+                    self.assertEqual(json.loads(out)["restored_from"], str(bundle))
+
+                    code, out = _run(root, "query", "place order checkout", "--json")
+                    self.assertEqual(code, 0)
+                    self.assertEqual(json.loads(out)["chunks"][0]["path"], "app/orders.py")
+
+            # A different indexer config has no bundle.
+            for extra in (["--vector-dim", "64"], ["--chunk-chars", "900"], ["--ignore-dir", "lib"], ["--no-gitignore"]):
+                with self.subTest(extra=extra):
+                    code, _ = _run(root, "import-bundle", str(bundles), "--all-files", "--layout", "sharded", *extra)
+                    self.assertEqual(code, repo_knowledge.BUNDLE_MISS_EXIT_CODE)
+
+    def test_corrupt_bundle_is_rejected(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="rk_bundle_") as tmp:
+            root = self.make_repo(tmp)
+            bundles = pathlib.Path(tmp) / "bundles"
+            _run(root, "index", "--all-files")
+            _code, out = _run(root, "export-bundle", str(bundles))
+            bundle = pathlib.Path(json.loads(out)["bundle"])
+            raw = bytearray(bundle.read_bytes())
+            raw[len(raw) // 2] ^= 0xFF
+            bundle.write_bytes(bytes(raw))
+            code, _ = _run(root, "import-bundle", str(bundle))
+            self.assertEqual(code, 2)
+
+    def test_ensure_index_restores_matching_bundle(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="rk_bundle_") as tmp:
+            root = self.make_repo(tmp)
+            bundles = pathlib.Path(tmp) / "bundles"
+            _run(root, "index", *codex_mem.REPO_KNOWLEDGE_INDEX_ARGS)
+            _run(root, "export-bundle", str(bundles))
+            shutil.rmtree(root / repo_knowledge.DEFAULT_INDEX_DIR)
+
+            result = codex_mem.ensure_repo_knowledge_index(
+                root=root,
+                script=SCRIPT_DIR / "repo_knowledge.py",
+                index_dir=repo_knowledge.DEFAULT_INDEX_DIR,
+                bundle_dir=bundles,
+            )
+            self.assertTrue(result["refreshed"])
+            self.assertTrue(result.get("restored_from_bundle"))
+            self.assertTrue((root / repo_knowledge.DEFAULT_INDEX_DIR / repo_knowledge.DEFAULT_DB_NAME).exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import collections
+import json
+import pathlib
+import sys
+import tempfile
+import unittest
+
+SCRIPT_DIR = pathlib.Path(__file__).resolve().parents[1]
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPT_DIR))
+
+import repo_knowledge
+from tests.helpers import index_repo, repo_output, write_repo
+
+_WORDS = (
+    "alpha beta gamma delta epsilon zeta theta kappa lambda sigma omega vector matrix tensor "
+    "buffer cursor lexer parser scanner emitter visitor walker resolver binder checker folder "
+    "printer reader writer stream socket channel queue stack heap arena pool cache ledger"
+).split()
+LIB_SOURCE = "".join(
+    f"def {_WORDS[idx]}_{_WORDS[idx + 12]}(stream):\n"
+    f"    return stream.{_WORDS[idx + 24]}({_WORDS[idx + 6]}) or {_WORDS[idx + 18]}_{_WORDS[idx + 30]}()\n\n\n"
+    for idx in range(8)
+)
+
+class ChunkDedupTests(unittest.TestCase):
+    def make_repo(self, tmp: str) -> pathlib.Path:
+        files = {
+            "app/main.py": "def main():\n    return run_app()\n",
+            "vendor/alpha/lexer.py": LIB_SOURCE,
+            "vendor/beta/lexer.py": LIB_SOURCE,
+            "third_party/gamma/lexer.py": LIB_SOURCE.replace("(stream):", "(stream, strict=False):", 1),
+        }
+        return write_repo(pathlib.Path(tmp), files)
+
+    def test_identical_copies_become_alias_rows(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="rk_dedup_") as tmp:
+            root = self.make_repo(tmp)
+            summary = index_repo(root)
+            self.assertEqual(summary["dedup"]["exact_aliases"], 1)
+            self.assertEqual(summary["dedup"]["near_aliases"], 0)
+
+            payload = json.loads(repo_output(root, "query", "delta printer stream heap", "--json", "--top-k", "5"))
+            lexer_hits = [item for item in payload["chunks"] if item["path"].endswith("lexer.py")]
+            texts = [item["snippet"] for item in lexer_hits]
+            self.assertEqual(len(texts), len(set(texts)), "copies must not take several top-k slots")
+            canonical = next(item for item in lexer_hits if item["path"] == "vendor/alpha/lexer.py")
+            self.assertEqual(len(canonical["also_at"]), 1)
+            self.assertTrue(canonical["also_at"][0].startswith("vendor/beta/lexer.py:"))
+
+            conn = repo_knowledge.open_db(root, repo_knowledge.DEFAULT_INDEX_DIR)
+            try:
+                meta = repo_knowledge.fetch_meta(conn)
+                dim = int(meta["vector_dim"])
+                q_vec = repo_knowledge.build_query_vector(conn, "delta printer", meta, "local", dim)
+                # A module made only of aliased copies still retrieves the shared chunk.
+                hits = repo_knowledge.retrieve_chunks(conn, "delta printer", 3, ["vendor/beta"], q_vec, dim, 0.5)
+                self.assertTrue(hits)
+                self.assertEqual(hits[0].path, "vendor/alpha/lexer.py")
+            finally:
+                conn.close()
+
+    def test_near_duplicates_collapse_when_enabled(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="rk_neardup_") as tmp:
+            root = self.make_repo(tmp)
+            exact_only = index_repo(root)
+            near = index_repo(root, "--near-dup-distance", "3")
+            # third_party/gamma is indexed first; both vendored copies fold into it.
+            self.assertEqual(near["dedup"]["exact_aliases"], 0)
+            self.assertEqual(near["dedup"]["near_aliases"], 2)
+            self.assertEqual(near["chunk_count"], exact_only["chunk_count"] - 1)
+
+    def test_simhash_distance_tracks_token_overlap(self) -> None:
+        base = repo_knowledge.tokenize(LIB_SOURCE)
+        tweaked = repo_knowledge.tokenize(LIB_SOURCE.replace("(stream):", "(stream, strict=False):", 1))
+        unrelated = repo_knowledge.tokenize("class HttpServer:\n    def serve_forever(self): pass\n")
+        fp = repo_knowledge.chunk_simhash(collections.Counter(base))
+        self.assertLessEqual((fp ^ repo_knowledge.chunk_simhash(collections.Counter(tweaked))).bit_count(), 3)
+        self.assertGreater((fp ^ repo_knowledge.chunk_simhash(collections.Counter(unrelated))).bit_count(), 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import pathlib
+import sys
+import unittest
+from typing import List, Sequence, Tuple
+
+SCRIPT_DIR = pathlib.Path(__file__).resolve().parents[1]
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPT_DIR))
+
+import repo_knowledge
+
+
+def _python_source(count: int) -> str:
+    parts = ["import os\n\n"]
+    for idx in range(count):
+        body = "".join(f"    value_{n} = helper_{idx}(value_{n - 1 if n else 0})\n" for n in range(8))
+        parts.append(f"# helper number {idx}\n@traced\ndef handler_{idx}(arg):\n{body}    return value_7\n\n\n")
+    return "".join(parts)
+
+
+def _typescript_source(count: int) -> str:
+    methods = "".join(
+        f"  // method {idx}\n  handle{idx}(input: string): string {{\n"
+        + "".join(f"    const v{n} = transform{idx}(input, '{{brace}}');\n" for n in range(6))
+        + "    return v5;\n  }\n\n"
+        for idx in range(count)
+    )
+    return f"export class Router {{\n{methods}}}\n\nexport function boot() {{\n  return new Router();\n}}\n"
+
+
+class StructuredChunkerTests(unittest.TestCase):
+    def assert_disjoint_cover(self, chunks: Sequence[Tuple[int, int, str]], line_count: int) -> None:
+        last_end = 0
+        for start, end, _body in chunks:
+            self.assertGreater(start, last_end, "chunks must not overlap")
+            last_end = end
+        self.assertLessEqual(last_end, line_count)
+
+    def test_python_chunks_start_on_definitions(self) -> None:
+        lines = _python_source(12).splitlines(keepends=True)
+        chunks = repo_knowledge.chunk_structured(lines, "python", 600)
+        self.assertIsNotNone(chunks)
+        self.assertGreater(len(chunks), 1)
+        self.assert_disjoint_cover(chunks, len(lines))
+        for _start, _end, body in chunks[1:]:
+            self.assertTrue(body.startswith("# helper number"), body[:40])
+        # Comments and decorators travel with the def they describe.
+        joined: List[str] = [body for _s, _e, body in chunks]
+        for idx in range(12):
+            owner = [body for body in joined if f"def handler_{idx}(" in body]
+            self.assertEqual(len(owner), 1)
+            self.assertIn(f"# helper number {idx}\n@traced\ndef handler_{idx}(", owner[0])
+
+    def test_oversized_function_is_split_on_statements_without_overlap(self) -> None:
+        body = "".join(f"    if flag_{n}:\n        total += compute_{n}(total)\n" for n in range(60))
+        lines = f"def giant(total, **flags):\n{body}    return total\n".splitlines(keepends=True)
+        chunks = repo_knowledge.chunk_structured(lines, "python", 400)
+        self.assertGreater(len(chunks), 1)
+        self.assert_disjoint_cover(chunks, len(lines))
+        for _start, _end, text in chunks[1:]:
+            self.assertTrue(text.startswith("if flag_"), text[:30])
+
+    def test_typescript_class_is_split_on_methods(self) -> None:
+        lines = _typescript_source(8).splitlines(keepends=True)
+        chunks = repo_knowledge.chunk_structured(lines, "typescript", 500)
+        self.assertGreater(len(chunks), 2)
+        self.assert_disjoint_cover(chunks, len(lines))
+        for _start, _end, text in chunks[1:]:
+            self.assertTrue(text.startswith("// method") or text.startswith("}"), text[:30])
+        self.assertTrue(any("export function boot()" in text for _s, _e, text in chunks))
+
+    def test_invalid_python_falls_back_to_indentation(self) -> None:
+        source = _python_source(6).replace("def handler_3(arg):", "def handler_3(arg:")
+        lines = source.splitlines(keepends=True)
+        chunks = repo_knowledge.chunk_structured(lines, "python", 600)
+        self.assertGreater(len(chunks), 1)
+        self.assert_disjoint_cover(chunks, len(lines))
+
+    def test_unsupported_language_defers_to_line_chunker(self) -> None:
+        self.assertIsNone(repo_knowledge.chunk_structured(["# title\n", "text\n"], "markdown", 600))
+
+
+if __name__ == "__main__":
+    unittest.main()
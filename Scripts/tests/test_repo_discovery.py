@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import os
+import pathlib
+import sys
+import tempfile
+import unittest
+from typing import Dict, List
+from unittest import mock
+
+SCRIPT_DIR = pathlib.Path(__file__).resolve().parents[1]
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPT_DIR))
+
+import repo_knowledge
+
+
+class GitignoreRuleTests(unittest.TestCase):
+    def test_patterns_follow_git_semantics(self) -> None:
+        rules = repo_knowledge.parse_gitignore(
+            "# comment\n*.log\n!keep.log\nout/\n/top.md\ndocs/**/gen\n\\#literal.md\n",
+            "",
+        )
+        cases = {
+            ("app.log", False): True,
+            ("src/deep/app.log", False): True,
+            ("src/keep.log", False): False,
+            ("out", True): True,
+            ("out", False): False,
+            ("src/out", True): True,
+            ("top.md", False): True,
+            ("src/top.md", False): False,
+            ("docs/gen", True): True,
+            ("docs/a/b/gen", True): True,
+            ("src/docs/gen", True): False,
+            ("#literal.md", False): True,
+        }
+        for (path, is_dir), expected in cases.items():
+            with self.subTest(path=path, is_dir=is_dir):
+                self.assertEqual(repo_knowledge.gitignore_matches(rules, path, is_dir), expected)
+
+    def test_nested_rules_are_relative_to_their_directory(self) -> None:
+        rules = repo_knowledge.parse_gitignore("/generated.py\n", "pkg")
+        self.assertTrue(repo_knowledge.gitignore_matches(rules, "pkg/generated.py", False))
+        self.assertFalse(repo_knowledge.gitignore_matches(rules, "generated.py", False))
+        self.assertFalse(repo_knowledge.gitignore_matches(rules, "pkg/sub/generated.py", False))
+
+
+class ScandirDiscoveryTests(unittest.TestCase):
+    def make_tree(self, tmp: str) -> pathlib.Path:
+        root = pathlib.Path(tmp)
+        files = {
+            "app/main.py": "print('main')\n",
+            "app/generated.py": "print('generated')\n",
+            "lib/util.py": "print('util')\n",
+            "target/out/bundle.js": "var x = 1;\n",
+            "notes.md": "# notes\n",
+            "debug.log": "noise\n",
+        }
+        for rel, text in files.items():
+            path = root / rel
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(text, encoding="utf-8")
+        (root / ".gitignore").write_text("target/\n*.log\n", encoding="utf-8")
+        (root / "app" / ".gitignore").write_text("generated.py\n", encoding="utf-8")
+        return root
+
+    def discover(self, root: pathlib.Path, **kwargs: object) -> List[str]:
+        return [
+            str(path)
+            for path in repo_knowledge.discover_files(
+                root,
+                use_git_tracked=False,
+                max_file_bytes=repo_knowledge.DEFAULT_MAX_FILE_BYTES,
+                ignored_dirs=set(repo_knowledge.DEFAULT_IGNORED_DIRS),
+                **kwargs,
+            )
+        ]
+
+    def test_gitignored_directories_are_not_visited(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="rk_discover_") as tmp:
+            root = self.make_tree(tmp)
+            visited: List[str] = []
+            real_scandir = os.scandir
+
+            def recording_scandir(path: object):
+                visited.append(pathlib.Path(path).relative_to(root).as_posix())
+                return real_scandir(path)
+
+            stats: Dict[str, os.stat_result] = {}
+            with mock.patch.object(repo_knowledge.os, "scandir", side_effect=recording_scandir):
+                found = self.discover(root, stats=stats)
+            self.assertEqual(found, ["app/main.py", "lib/util.py", "notes.md"])
+            self.assertNotIn("target", visited)
+            self.assertEqual(set(stats), set(found))
+            self.assertEqual(stats["lib/util.py"].st_size, (root / "lib" / "util.py").stat().st_size)
+
+    def test_parallel_walk_matches_serial_and_gitignore_can_be_disabled(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="rk_discover_") as tmp:
+            root = self.make_tree(tmp)
+            self.assertEqual(self.discover(root, workers=4), self.discover(root, workers=1))
+            everything = self.discover(root, honor_gitignore=False)
+            self.assertIn("target/out/bundle.js", everything)
+            self.assertIn("app/generated.py", everything)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import json
+import pathlib
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+SCRIPT_DIR = pathlib.Path(__file__).resolve().parents[1]
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPT_DIR))
+
+import repo_knowledge
+from tests.helpers import run_json, write_repo
+
+
+class StreamingReaderTests(unittest.TestCase):
+    def test_mmap_lines_match_read_text_file(self) -> None:
+        samples = [
+            b"alpha\r\nbeta\rgamma\n\ndelta",
+            ("é" * 700 + "\r\n" * 3 + "tail\x0cform").encode("utf-8") + b"\xff",
+            b"",
+            b"ends with cr\r",
+        ]
+        with tempfile.TemporaryDirectory(prefix="rk_large_") as tmp:
+            path = pathlib.Path(tmp) / "sample.txt"
+            for raw in samples:
+                path.write_bytes(raw)
+                expected = repo_knowledge.read_text_file(path).splitlines(keepends=True)
+                for block_size in (1, 2, 5, 64, 1 << 20):
+                    with self.subTest(raw=raw[:12], block_size=block_size):
+                        self.assertEqual(list(repo_knowledge.iter_text_lines(path, block_size)), expected)
+
+    def test_stream_chunks_do_not_overlap(self) -> None:
+        lines = [f"line {idx} payload\n" if idx % 5 else "\n" for idx in range(200)]
+        chunks = list(repo_knowledge.stream_chunk_lines(iter(lines), 300))
+        self.assertGreater(len(chunks), 5)
+        for (_s, prev_end, _b), (start, _e, _body) in zip(chunks, chunks[1:]):
+            self.assertEqual(start, prev_end + 1)
+        self.assertEqual(chunks[-1][1], 200)
+
+
+class LargeFileTierTests(unittest.TestCase):
+    def make_repo(self, tmp: str) -> pathlib.Path:
+        body = "".join(f"message Filler{idx} {{\n  int32 value = {idx};\n}}\n\n" for idx in range(600))
+        body += "message LedgerReconciliation {\n  string settlement_batch = 1;\n}\n"
+        files = {
+            "src/small.py": "def small_helper():\n    return 1\n",
+            "gen/schema.ts": body,
+            "gen/huge.ts": "message Huge {}\n" * 8000,
+        }
+        return write_repo(pathlib.Path(tmp), files)
+
+    def test_large_file_is_streamed_and_searchable(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="rk_large_") as tmp:
+            root = self.make_repo(tmp)
+            code, summary, _err = run_json(
+                root, "index", "--all-files", "--max-file-bytes", "4000", "--max-large-file-bytes", "100000"
+            )
+            self.assertEqual(code, 0)
+            self.assertEqual(summary["large_files"], ["gen/schema.ts"])
+            self.assertEqual(summary["file_count"], 2)
+
+            conn = sqlite3.connect(root / repo_knowledge.DEFAULT_INDEX_DIR / repo_knowledge.DEFAULT_DB_NAME)
+            try:
+                spans = conn.execute(
+                    "SELECT start_line, end_line FROM chunks WHERE path = 'gen/schema.ts' ORDER BY start_line"
+                ).fetchall()
+                line_count = conn.execute("SELECT line_count FROM files WHERE path = 'gen/schema.ts'").fetchone()[0]
+            finally:
+                conn.close()
+            self.assertEqual(line_count, 2403)
+            self.assertEqual(spans[-1][1], line_count)
+            for (_s, prev_end), (start, _e) in zip(spans, spans[1:]):
+                self.assertEqual(start, prev_end + 1)
+
+            code, payload, _err = run_json(root, "query", "LedgerReconciliation settlement batch", "--json")
+            self.assertEqual(code, 0)
+            self.assertEqual(payload["chunks"][0]["path"], "gen/schema.ts")
+
+    def test_tier_can_be_disabled(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="rk_large_") as tmp:
+            root = self.make_repo(tmp)
+            code, summary, _err = run_json(root, "index", "--all-files", "--max-file-bytes", "4000", "--max-large-file-bytes", "0")
+            self.assertEqual(code, 0)
+            self.assertEqual(summary["file_count"], 1)
+            self.assertNotIn("large_files", summary)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,338 @@
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import http.server
+import io
+import json
+import os
+import pathlib
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from typing import Dict, List
+from unittest import mock
+
+SCRIPT_DIR = pathlib.Path(__file__).resolve().parents[1]
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPT_DIR))
+
+import repo_knowledge
+
+
+def _fake_embedding(text: str, dims: int) -> List[float]:
+    digest = hashlib.blake2b(text.encode("utf-8"), digest_size=dims).digest()
+    return [(b - 127.5) / 127.5 for b in digest]
+
+
+class _StandInEmbeddingsHandler(http.server.BaseHTTPRequestHandler):
+    def log_message(self, fmt: str, *args) -> None:  # noqa: A003
+        return
+
+    def do_POST(self) -> None:  # noqa: N802
+        server = self.server
+        length = int(self.headers.get("Content-Length", "0"))
+        body = json.loads(self.rfile.read(length).decode("utf-8"))
+        inputs = list(body.get("input") or [])
+        dims = int(body.get("dimensions") or 8)
+        with server.lock:  # type: ignore[attr-defined]
+            poisoned = server.poison_text in inputs  # type: ignore[attr-defined]
+            if poisoned or server.failures_left > 0:  # type: ignore[attr-defined]
+                if not poisoned:
+                    server.failures_left -= 1  # type: ignore[attr-defined]
+                self.send_response(server.failure_status)  # type: ignore[attr-defined]
+                self.send_header("Retry-After", "0")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            server.requests.append({"path": self.path, "input": inputs})  # type: ignore[attr-defined]
+            server.in_flight += 1  # type: ignore[attr-defined]
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)  # type: ignore[attr-defined]
+        time.sleep(server.delay_sec)  # type: ignore[attr-defined]
+        with server.lock:  # type: ignore[attr-defined]
+            server.in_flight -= 1  # type: ignore[attr-defined]
+        data = [
+            {"index": idx, "embedding": _fake_embedding(text, dims)}
+            for idx, text in enumerate(inputs)
+        ]
+        raw = json.dumps({"data": data}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+
+class _StandInServer:
+    def __init__(self) -> None:
+        self.httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _StandInEmbeddingsHandler)
+        self.httpd.requests = []  # type: ignore[attr-defined]
+        self.httpd.lock = threading.Lock()  # type: ignore[attr-defined]
+        self.httpd.failures_left = 0  # type: ignore[attr-defined]
+        self.httpd.failure_status = 429  # type: ignore[attr-defined]
+        self.httpd.delay_sec = 0.0  # type: ignore[attr-defined]
+        self.httpd.poison_text = None  # type: ignore[attr-defined]
+        self.httpd.in_flight = 0  # type: ignore[attr-defined]
+        self.httpd.max_in_flight = 0  # type: ignore[attr-defined]
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    @property
+    def requests(self) -> List[Dict[str, object]]:
+        return self.httpd.requests  # type: ignore[attr-defined]
+
+    def sent_texts(self) -> List[str]:
+        return [text for req in self.requests for text in req["input"]]  # type: ignore[union-attr]
+
+    def __enter__(self) -> "_StandInServer":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def _write_repo(root: pathlib.Path, files: Dict[str, str]) -> None:
+    for rel, text in files.items():
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text, encoding="utf-8")
+
+
+def _run_index(root: pathlib.Path, *extra: str) -> Dict[str, object]:
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        code = repo_knowledge.main(
+            [
+                "--root",
+                str(root),
+                "index",
+                "--all-files",
+                "--embedding-provider",
+                "openai",
+                "--openai-dimensions",
+                "8",
+                *extra,
+            ]
+        )
+    assert code == 0, out.getvalue()
+    text = out.getvalue()
+    return json.loads(text[text.index("{\n") :])
+
+
+class OpenAIEmbeddingCacheTests(unittest.TestCase):
+    def test_rebuild_only_requests_changed_chunks(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="rk_embed_cache_") as tmp, _StandInServer() as server:
+            root = pathlib.Path(tmp)
+            _write_repo(
+                root,
+                {
+                    "app/main.py": "def main():\n    return bootstrap()\n",
+                    "app/store.py": "def save(record):\n    return sqlite_write(record)\n",
+                    "vendor/copy_a.py": "def shared():\n    return 1\n",
+                    "vendor/copy_b.py": "def shared():\n    return 1\n",
+                },
+            )
+            env = {"OPENAI_API_KEY": "test-key", "OPENAI_BASE_URL": server.base_url}
+            with mock.patch.dict(os.environ, env):
+                # Query-cache pre-warming is covered separately; keep the request log to chunk texts.
+                first = _run_index(root, "--query-cache-ttl-hours", "0")
+                first_sent = len(server.sent_texts())
+                self.assertTrue(all(req["path"] == "/v1/embeddings" for req in server.requests))
+                # Identical vendored copies collapse into one chunk and are embedded once.
+                self.assertEqual(first["embedding_cache"]["misses"], first_sent)
+                self.assertEqual(first["dedup"]["exact_aliases"], 1)
+                self.assertEqual(sum("def shared()" in text for text in server.sent_texts()), 1)
+
+                second = _run_index(root, "--query-cache-ttl-hours", "0")
+                self.assertEqual(len(server.sent_texts()), first_sent)
+                self.assertEqual(second["embedding_cache"]["misses"], 0)
+
+                (root / "app" / "store.py").write_text(
+                    "def save(record):\n    return sqlite_upsert(record)\n",
+                    encoding="utf-8",
+                )
+                _run_index(root, "--query-cache-ttl-hours", "0")
+                new_texts = server.sent_texts()[first_sent:]
+                self.assertTrue(any("sqlite_upsert" in text for text in new_texts))
+                self.assertFalse(any("bootstrap()" in text for text in new_texts))
+
+    def test_resume_without_cache_reuses_checkpointed_embeddings(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="rk_embed_ckpt_") as tmp, _StandInServer() as server:
+            root = pathlib.Path(tmp)
+            _write_repo(root, {f"app/step_{idx}.py": f"def step_{idx}():\n    return {idx}\n" for idx in range(4)})
+            flags = ["--no-embedding-cache", "--openai-batch-size", "1", "--openai-concurrency", "1",
+                     "--openai-max-retries", "0", "--query-cache-ttl-hours", "0"]
+            env = {"OPENAI_API_KEY": "test-key", "OPENAI_BASE_URL": server.base_url}
+            with mock.patch.dict(os.environ, env):
+                server.httpd.poison_text = "def step_2():\n    return 2"  # type: ignore[attr-defined]
+                with self.assertRaises(RuntimeError), contextlib.redirect_stdout(io.StringIO()):
+                    repo_knowledge.main(["--root", str(root), "index", "--all-files", "--embedding-provider",
+                                         "openai", "--openai-dimensions", "8", *flags])
+                landed = set(server.sent_texts())
+                self.assertTrue(landed)
+
+                server.httpd.poison_text = None  # type: ignore[attr-defined]
+                before = len(server.sent_texts())
+                summary = _run_index(root, "--resume", *flags)
+                self.assertEqual(summary["chunk_count"], 4)
+                self.assertFalse(landed & set(server.sent_texts()[before:]))
+                self.assertFalse((root / repo_knowledge.DEFAULT_INDEX_DIR / repo_knowledge.DEFAULT_CHECKPOINT_EMBEDDINGS_NAME).exists())
+
+    def test_cache_evicts_least_recently_used_rows(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="rk_embed_evict_") as tmp:
+            cache = repo_knowledge.EmbeddingCache(pathlib.Path(tmp) / "cache.sqlite3", max_bytes=64)
+            try:
+                cache.put_many("m", 8, {"old": [0.1] * 8})
+                cache.put_many("m", 8, {"new": [0.2] * 8})
+                cache.get_many("m", 8, ["new"])
+                self.assertEqual(cache.evict(), 0)
+                cache.put_many("m", 8, {"newest": [0.3] * 8})
+                self.assertEqual(cache.evict(), 1)
+                self.assertEqual(set(cache.get_many("m", 8, ["old", "new", "newest"])), {"new", "newest"})
+                self.assertEqual(cache.get_many("other-model", 8, ["new"]), {})
+            finally:
+                cache.close()
+
+
+class QueryEmbeddingCacheTests(unittest.TestCase):
+    def test_facets_are_prewarmed_and_repeat_queries_hit_cache(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="rk_query_cache_") as tmp, _StandInServer() as server:
+            root = pathlib.Path(tmp)
+            _write_repo(root, {"app/main.py": "def main():\n    return bootstrap()\n"})
+            env = {"OPENAI_API_KEY": "test-key", "OPENAI_BASE_URL": server.base_url}
+            with mock.patch.dict(os.environ, env):
+                summary = _run_index(root)
+                self.assertEqual(summary["query_cache_prewarmed"], len(repo_knowledge.ONBOARDING_FACET_VOCABULARY))
+                sent_after_build = len(server.sent_texts())
+
+                conn = repo_knowledge.open_db(root, repo_knowledge.DEFAULT_INDEX_DIR)
+                try:
+                    meta = repo_knowledge.fetch_meta(conn)
+                    dim = int(meta["vector_dim"])
+
+                    def embed(query: str) -> List[float]:
+                        with contextlib.redirect_stdout(io.StringIO()):
+                            return repo_knowledge.build_query_vector(conn, query, meta, "openai", dim)
+
+                    for facet in repo_knowledge.onboarding_facet_queries(root, "learn this project"):
+                        self.assertEqual(len(embed(facet)), dim)
+                    self.assertEqual(len(server.sent_texts()), sent_after_build)
+
+                    first = embed("Where is  the bootstrap?")
+                    again = embed("where is the bootstrap?")
+                    self.assertEqual([round(v, 6) for v in first], [round(v, 6) for v in again])
+                    self.assertEqual(server.sent_texts()[sent_after_build:], ["Where is  the bootstrap?"])
+                finally:
+                    conn.close()
+
+                # A second build finds the facets still fresh and sends nothing for them.
+                second = _run_index(root)
+                self.assertNotIn("query_cache_prewarmed", second)
+
+    def test_expired_rows_are_misses(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="rk_query_ttl_") as tmp:
+            cache = repo_knowledge.QueryVectorCache(pathlib.Path(tmp) / "q.sqlite3", ttl_sec=60)
+            try:
+                cache.put_many("m", 8, {"hello world": [0.5] * 8})
+                self.assertIsNotNone(cache.get("m", 8, "  Hello   WORLD "))
+                with mock.patch.object(repo_knowledge.time, "time", return_value=time.time() + 120):
+                    self.assertIsNone(cache.get("m", 8, "hello world"))
+                self.assertIsNone(cache.get("m", 8, "hello world"))
+            finally:
+                cache.close()
+
+
+class OpenAIEmbeddingDispatcherTests(unittest.TestCase):
+    def test_concurrent_batches_keep_input_order(self) -> None:
+        with _StandInServer() as server:
+            server.httpd.delay_sec = 0.05  # type: ignore[attr-defined]
+            texts = [f"text {idx}" for idx in range(12)]
+            with contextlib.redirect_stdout(io.StringIO()):
+                vectors = repo_knowledge.openai_embed_texts(
+                    texts,
+                    model="m",
+                    api_key="test-key",
+                    timeout_sec=5,
+                    batch_size=2,
+                    dimensions=8,
+                    base_url=server.base_url,
+                    concurrency=4,
+                )
+            self.assertGreater(server.httpd.max_in_flight, 1)  # type: ignore[attr-defined]
+            expected = [repo_knowledge.norm_vector(_fake_embedding(text, 8)) for text in texts]
+            for got, want in zip(vectors, expected):
+                self.assertEqual([round(v, 6) for v in got], [round(v, 6) for v in want])
+
+    def test_retries_rate_limited_and_server_errors(self) -> None:
+        for status in (429, 503):
+            with self.subTest(status=status), _StandInServer() as server:
+                server.httpd.failures_left = 2  # type: ignore[attr-defined]
+                server.httpd.failure_status = status  # type: ignore[attr-defined]
+                with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                    vectors = repo_knowledge.openai_embed_texts(
+                        ["alpha", "beta"],
+                        model="m",
+                        api_key="test-key",
+                        timeout_sec=5,
+                        batch_size=1,
+                        dimensions=8,
+                        base_url=server.base_url,
+                        max_retries=3,
+                    )
+                self.assertEqual(len(vectors), 2)
+                self.assertEqual(server.httpd.failures_left, 0)  # type: ignore[attr-defined]
+
+    def test_failed_run_resumes_from_landed_batches(self) -> None:
+        texts = ["alpha", "beta", "gamma", "delta"]
+        with tempfile.TemporaryDirectory(prefix="rk_embed_resume_") as tmp, _StandInServer() as server:
+            cfg = repo_knowledge.EmbeddingConfig(
+                provider="openai",
+                openai_model="m",
+                openai_dimensions=8,
+                openai_batch_size=1,
+                openai_base_url=server.base_url,
+                openai_max_retries=1,
+            )
+            cache = repo_knowledge.EmbeddingCache(pathlib.Path(tmp) / "cache.sqlite3", max_bytes=1 << 20)
+            try:
+                server.httpd.poison_text = "gamma"  # type: ignore[attr-defined]
+                with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                    with mock.patch.object(repo_knowledge, "DEFAULT_OPENAI_BACKOFF_BASE_SEC", 0.001):
+                        with self.assertRaises(RuntimeError):
+                            repo_knowledge.cached_openai_embed_texts(texts, cfg=cfg, api_key="k", cache=cache)
+                landed = set(server.sent_texts())
+                self.assertIn("alpha", landed)
+                self.assertNotIn("gamma", landed)
+
+                server.httpd.poison_text = None  # type: ignore[attr-defined]
+                before = len(server.sent_texts())
+                stats: Dict[str, int] = {}
+                with contextlib.redirect_stdout(io.StringIO()):
+                    vectors = repo_knowledge.cached_openai_embed_texts(
+                        texts, cfg=cfg, api_key="k", cache=cache, stats=stats
+                    )
+                self.assertEqual(len(vectors), len(texts))
+                resent = server.sent_texts()[before:]
+                self.assertIn("gamma", resent)
+                self.assertFalse(landed & set(resent))
+            finally:
+                cache.close()
+
+    def test_token_bucket_limits_request_rate(self) -> None:
+        bucket = repo_knowledge.TokenBucket(rate_per_sec=50.0, capacity=1)
+        start = time.monotonic()
+        for _ in range(6):
+            bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import pathlib
+import sys
+import tempfile
+import unittest
+from typing import List
+from unittest import mock
+
+SCRIPT_DIR = pathlib.Path(__file__).resolve().parents[1]
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPT_DIR))
+
+import repo_knowledge
+from tests.helpers import run_json, write_repo
+
+INDEX_ARGS = ("index", "--all-files", "--checkpoint-every", "2")
+
+
+class ResumableBuildTests(unittest.TestCase):
+    def make_repo(self, tmp: str) -> pathlib.Path:
+        files = {f"pkg/mod_{idx}.py": f"def handler_{idx}(event):\n    return event.value_{idx}\n" for idx in range(5)}
+        return write_repo(pathlib.Path(tmp), files)
+
+    def interrupted_build(self, root: pathlib.Path) -> None:
+        with mock.patch.object(repo_knowledge, "embed_index_draft", side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                run_json(root, *INDEX_ARGS)
+        self.assertTrue((root / repo_knowledge.DEFAULT_INDEX_DIR / repo_knowledge.DEFAULT_CHECKPOINT_NAME).exists())
+
+    def test_resume_replays_checkpointed_files(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="rk_resume_") as tmp:
+            root = self.make_repo(tmp)
+            self.interrupted_build(root)
+            (root / "pkg" / "mod_3.py").write_text("def handler_3(event):\n    return event.renamed\n", encoding="utf-8")
+
+            reads: List[str] = []
+            real_read = repo_knowledge.read_text_file
+
+            def counting_read(path: pathlib.Path) -> str:
+                reads.append(path.name)
+                return real_read(path)
+
+            with mock.patch.object(repo_knowledge, "read_text_file", side_effect=counting_read):
+                code, summary, _err = run_json(root, *INDEX_ARGS, "--resume")
+            self.assertEqual(code, 0)
+            self.assertEqual(reads, ["mod_3.py"])
+            self.assertEqual(summary["resumed_files"], 4)
+            self.assertEqual(summary["chunk_count"], 5)
+            self.assertFalse((root / repo_knowledge.DEFAULT_INDEX_DIR / repo_knowledge.DEFAULT_CHECKPOINT_NAME).exists())
+
+    def test_changed_file_set_starts_over(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="rk_resume_") as tmp:
+            root = self.make_repo(tmp)
+            self.interrupted_build(root)
+            (root / "pkg" / "mod_9.py").write_text("def extra():\n    return 9\n", encoding="utf-8")
+            code, summary, _err = run_json(root, *INDEX_ARGS, "--resume")
+            self.assertEqual(code, 0)
+            self.assertNotIn("resumed_files", summary)
+            self.assertEqual(summary["file_count"], 6)
+
+    def test_without_resume_checkpoint_is_ignored(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="rk_resume_") as tmp:
+            root = self.make_repo(tmp)
+            self.interrupted_build(root)
+            code, summary, _err = run_json(root, *INDEX_ARGS)
+            self.assertEqual(code, 0)
+            self.assertNotIn("resumed_files", summary)
+
+
+if __name__ == "__main__":
+    unittest.main()
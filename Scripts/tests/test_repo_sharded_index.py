@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import json
+import pathlib
+import sys
+import tempfile
+import unittest
+
+SCRIPT_DIR = pathlib.Path(__file__).resolve().parents[1]
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPT_DIR))
+
+import repo_knowledge
+from tests.helpers import index_repo, repo_output, write_repo
+
+
+class ShardedIndexTests(unittest.TestCase):
+    def make_repo(self, tmp: str) -> pathlib.Path:
+        files = {
+            "frontend/views/page.py": "def render_page(view):\n    return view.template.render()\n",
+            "backend/store/orders.py": "def save_order(db, order):\n    return db.insert_order(order)\n",
+            "backend/api/routes.py": "def order_route(request):\n    return save_order(request.db, request.body)\n",
+            "README.md": "# Shop\n\nOrders flow from the frontend to the backend store.\n",
+        }
+        return write_repo(pathlib.Path(tmp), files)
+
+    def shard_path(self, root: pathlib.Path, name: str) -> pathlib.Path:
+        return root / repo_knowledge.DEFAULT_INDEX_DIR / repo_knowledge.DEFAULT_SHARD_DIR / repo_knowledge.shard_file_name(name)
+
+    def test_refresh_rewrites_only_changed_shard(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="rk_shards_") as tmp:
+            root = self.make_repo(tmp)
+            first = index_repo(root, "--layout", "sharded")
+            self.assertEqual(first["shards"]["rebuilt"], ["_root", "backend", "frontend"])
+            backend = self.shard_path(root, "backend")
+            before = (backend.stat().st_mtime_ns, backend.read_bytes())
+
+            (root / "frontend/views/page.py").write_text(
+                "def render_page(view):\n    return view.template.render()\n\n\ndef render_banner():\n    return 'sale'\n",
+                encoding="utf-8",
+            )
+            second = index_repo(root, "--layout", "sharded")
+            self.assertEqual(second["shards"]["rebuilt"], ["frontend"])
+            self.assertEqual(second["shards"]["reused"], 2)
+            self.assertEqual((backend.stat().st_mtime_ns, backend.read_bytes()), before)
+
+            payload = json.loads(repo_output(root, "query", "render banner", "--json"))
+            self.assertEqual(payload["chunks"][0]["path"], "frontend/views/page.py")
+            self.assertIn("render_banner", payload["chunks"][0]["snippet"])
+
+            (root / "frontend/views/page.py").unlink()
+            third = index_repo(root, "--layout", "sharded")
+            self.assertEqual(third["shards"]["removed"], ["frontend"])
+            self.assertFalse(self.shard_path(root, "frontend").exists())
+
+    def test_query_mounts_only_selected_shards(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="rk_shards_") as tmp:
+            root = self.make_repo(tmp)
+            index_repo(root, "--layout", "sharded")
+            conn = repo_knowledge.open_db(root, repo_knowledge.DEFAULT_INDEX_DIR)
+            try:
+                meta = repo_knowledge.fetch_meta(conn)
+                self.assertEqual(meta["index_layout"], repo_knowledge.INDEX_LAYOUT_SHARDED)
+                self.assertEqual(int(meta["chunk_count"]), 4)
+                self.assertEqual(conn.execute("SELECT COUNT(*) FROM main.chunks").fetchone()[0], 0)
+                dim = int(meta["vector_dim"])
+                q_vec = repo_knowledge.build_query_vector(conn, "save order", meta, "local", dim)
+                hits = repo_knowledge.retrieve_chunks(
+                    conn, "save order", 5, ["backend/store", "backend/api"], q_vec, dim, 0.5
+                )
+                self.assertEqual({hit.path for hit in hits}, {"backend/store/orders.py", "backend/api/routes.py"})
+                attached = [row[1] for row in conn.execute("PRAGMA database_list").fetchall()]
+                self.assertEqual([name for name in attached if name.startswith("shard_")], ["shard_2"])
+                ids = [hit.chunk_id for hit in hits]
+                self.assertTrue(all(cid > repo_knowledge.SHARD_ID_STRIDE for cid in ids))
+            finally:
+                conn.close()
+
+    def test_query_covers_more_shards_than_one_mount(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="rk_shards_") as tmp:
+            root = pathlib.Path(tmp)
+            count = repo_knowledge.MAX_MOUNTED_SHARDS + 2
+            for idx in range(count):
+                path = root / f"mod{idx:02d}" / "handler.py"
+                path.parent.mkdir(parents=True)
+                path.write_text(f"def handler_{idx}():\n    return 'needle'\n", encoding="utf-8")
+            index_repo(root, "--layout", "sharded")
+            conn = repo_knowledge.open_db(root, repo_knowledge.DEFAULT_INDEX_DIR)
+            try:
+                meta = repo_knowledge.fetch_meta(conn)
+                dim = int(meta["vector_dim"])
+                q_vec = repo_knowledge.build_query_vector(conn, "needle", meta, "local", dim)
+                hits = repo_knowledge.retrieve_chunks(conn, "needle", count * 2, [], q_vec, dim, 0.5)
+                self.assertEqual(len({hit.path for hit in hits}), count)
+                with self.assertRaises(ValueError):
+                    repo_knowledge.mount_shards(conn, repo_knowledge.shard_names_for_modules(conn, []))
+            finally:
+                conn.close()
+
+    def test_single_layout_rebuild_drops_shards(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="rk_shards_") as tmp:
+            root = self.make_repo(tmp)
+            index_repo(root, "--layout", "sharded")
+            summary = json.loads(repo_output(root, "index", "--all-files"))
+            self.assertEqual(summary["chunk_count"], 4)
+            self.assertFalse((root / repo_knowledge.DEFAULT_INDEX_DIR / repo_knowledge.DEFAULT_SHARD_DIR).exists())
+            payload = json.loads(repo_output(root, "query", "save order", "--json"))
+            self.assertTrue(payload["chunks"])
+
+
+if __name__ == "__main__":
+    unittest.main()
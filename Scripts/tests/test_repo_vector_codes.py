@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import contextlib
+import io
+import pathlib
+import sys
+import tempfile
+import unittest
+
+SCRIPT_DIR = pathlib.Path(__file__).resolve().parents[1]
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPT_DIR))
+
+import repo_knowledge
+
+
+class TernaryCodeTests(unittest.TestCase):
+    def test_code_cosine_tracks_exact_cosine_on_sparse_vectors(self) -> None:
+        query = repo_knowledge.norm_vector([1.0, 0.0, -1.0, 0.0, 0.0, 1.0, 0.0, 0.0])
+        near = repo_knowledge.norm_vector([1.0, 0.0, -1.0, 0.0, 0.0, 0.0, 0.0, 0.0])
+        far = repo_knowledge.norm_vector([0.0, 1.0, 0.0, 1.0, 0.0, 0.0, -1.0, 0.0])
+        q_code = repo_knowledge._split_code(repo_knowledge.ternary_code(query))
+        near_sim = repo_knowledge.ternary_code_cosine(q_code, repo_knowledge.ternary_code(near))
+        far_sim = repo_knowledge.ternary_code_cosine(q_code, repo_knowledge.ternary_code(far))
+        self.assertAlmostEqual(near_sim, repo_knowledge.cosine_sim(query, near), places=6)
+        self.assertEqual(far_sim, 0.0)
+
+    def test_prefiltered_scores_match_exact_for_rescored_chunks(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="rk_codes_") as tmp:
+            root = pathlib.Path(tmp)
+            for idx in range(12):
+                (root / f"mod_{idx}.py").write_text(
+                    f"def handler_{idx}():\n    return storage_{idx % 3}.save(record_{idx})\n",
+                    encoding="utf-8",
+                )
+            with contextlib.redirect_stdout(io.StringIO()):
+                code = repo_knowledge.main(["--root", str(root), "index", "--all-files", "--vector-dim", "64"])
+            self.assertEqual(code, 0)
+            conn = repo_knowledge.open_db(root, repo_knowledge.DEFAULT_INDEX_DIR)
+            try:
+                meta = repo_knowledge.fetch_meta(conn)
+                self.assertEqual(meta.get("vector_codes"), repo_knowledge.VECTOR_CODES_TERNARY)
+                ids = [int(row["id"]) for row in conn.execute("SELECT id FROM chunks").fetchall()]
+                q_vec = repo_knowledge.build_query_vector(conn, "storage save record", meta, "local", 64)
+                exact = repo_knowledge.semantic_chunk_scores(conn, ids, q_vec, 64, rerank_k=0)
+                quick = repo_knowledge.semantic_chunk_scores(conn, ids, q_vec, 64, rerank_k=4)
+                self.assertEqual(set(quick), set(exact))
+                top = sorted(quick, key=lambda cid: quick[cid], reverse=True)[:4]
+                for chunk_id in top:
+                    self.assertAlmostEqual(quick[chunk_id], exact[chunk_id], places=6)
+                floor = min(quick[cid] for cid in top)
+                self.assertTrue(all(quick[cid] <= floor for cid in quick if cid not in top))
+            finally:
+                conn.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
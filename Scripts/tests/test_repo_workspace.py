@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import contextlib
+import io
+import json
+import pathlib
+import sys
+import tempfile
+import unittest
+
+SCRIPT_DIR = pathlib.Path(__file__).resolve().parents[1]
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPT_DIR))
+
+import repo_knowledge
+
+
+def _run(*argv: str) -> tuple[int, str]:
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        code = repo_knowledge.main(list(argv))
+    return code, out.getvalue()
+
+
+class WorkspaceFederationTests(unittest.TestCase):
+    def make_workspace(self, tmp: str) -> pathlib.Path:
+        base = pathlib.Path(tmp)
+        files = {
+            "service/app/handlers.py": "def checkout_handler(cart):\n    return charge_card(cart.total)\n",
+            "service/app/views.py": "def render_cart(cart):\n    return cart.items\n",
+            "libs/billing/cards.py": "def charge_card(amount):\n    return gateway.capture(amount)\n",
+            "libs/billing/refunds.py": "def refund_card(charge):\n    return gateway.refund(charge)\n",
+        }
+        for rel, text in files.items():
+            path = base / rel
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(text, encoding="utf-8")
+        manifest = base / "workspace.json"
+        manifest.write_text(
+            json.dumps({"roots": [{"name": "service", "path": "service"}, "libs"]}),
+            encoding="utf-8",
+        )
+        return manifest
+
+    def test_index_and_query_fan_out_across_roots(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="rk_workspace_") as tmp:
+            manifest = self.make_workspace(tmp)
+            code, out = _run("--workspace", str(manifest), "index", "--all-files")
+            self.assertEqual(code, 0, out)
+            summary = json.loads(out)
+            self.assertEqual([item["name"] for item in summary["roots"]], ["service", "libs"])
+            self.assertTrue(all(item["summary"]["chunk_count"] == 2 for item in summary["roots"]))
+
+            code, out = _run("--workspace", str(manifest), "query", "charge card gateway capture", "--json")
+            self.assertEqual(code, 0, out)
+            payload = json.loads(out)
+            paths = [item["path"] for item in payload["chunks"]]
+            self.assertEqual(paths[0], "libs/billing/cards.py")
+            self.assertIn("service/app/handlers.py", paths)
+            self.assertEqual({item["root"] for item in payload["modules"]}, {"service", "libs"})
+            scores = [item["score"] for item in payload["chunks"]]
+            self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_missing_root_index_is_reported_not_fatal(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="rk_workspace_") as tmp:
+            manifest = self.make_workspace(tmp)
+            _run("--root", str(manifest.parent / "libs"), "index", "--all-files")
+            code, out = _run("--workspace", str(manifest), "query", "refund card", "--json")
+            self.assertEqual(code, 0, out)
+            payload = json.loads(out)
+            statuses = {item["name"]: item["status"] for item in payload["roots"]}
+            self.assertEqual(statuses, {"service": "missing_index", "libs": "ok"})
+            self.assertEqual(payload["chunks"][0]["path"], "libs/billing/refunds.py")
+
+    def test_manifest_rejects_duplicate_names(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="rk_workspace_") as tmp:
+            manifest = self.make_workspace(tmp)
+            manifest.write_text(json.dumps({"roots": ["libs", {"name": "libs", "path": "service"}]}), encoding="utf-8")
+            with self.assertRaises(ValueError):
+                repo_knowledge.load_workspace_manifest(manifest, repo_knowledge.DEFAULT_INDEX_DIR)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import contextlib
+import io
+import json
+import pathlib
+import sqlite3
+import sys
+import tempfile
+import time
+import unittest
+from typing import List
+from unittest import mock
+
+SCRIPT_DIR = pathlib.Path(__file__).resolve().parents[1]
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPT_DIR))
+
+import codex_mem
+
+
+class SchemaMigrationTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.applied: List[int] = []
+        tmp = tempfile.TemporaryDirectory(prefix="codex_mem_migrate_")
+        self.addCleanup(tmp.cleanup)
+        self.root = pathlib.Path(tmp.name)
+        conn = codex_mem.open_db(self.root, ".codex_mem")
+        codex_mem.ensure_session(conn, "s1", "demo")
+        for idx in range(7):
+            codex_mem.insert_event(
+                conn,
+                session_id="s1",
+                project="demo",
+                event_kind="tool_use",
+                role="tool",
+                title="t" * (idx + 1),
+                content=f"event {idx}",
+                tool_name="shell",
+                file_path=None,
+                tags=[],
+                metadata={},
+            )
+        conn.commit()
+        conn.close()
+
+    def add_title_length(self, conn: sqlite3.Connection) -> None:
+        self.applied.append(1)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(events)")}
+        if "title_len" not in columns:
+            conn.execute("ALTER TABLE events ADD COLUMN title_len INTEGER")
+
+    @staticmethod
+    def backfill_title_length(conn: sqlite3.Connection, after_id: int, limit: int) -> int | None:
+        ids = [int(row[0]) for row in conn.execute("SELECT id FROM events WHERE id > ? ORDER BY id LIMIT ?", (after_id, limit))]
+        if not ids:
+            return None
+        conn.execute(
+            f"UPDATE events SET title_len = length(title) WHERE id IN ({','.join('?' * len(ids))})",
+            ids,
+        )
+        return ids[-1]
+
+    def patched_migrations(self) -> List[codex_mem.SchemaMigration]:
+        version = codex_mem.SCHEMA_VERSION + 1
+        migrations = [
+            *codex_mem.MIGRATIONS,
+            codex_mem.SchemaMigration(version, "title_len", self.add_title_length, self.backfill_title_length),
+        ]
+        for patch in (
+            mock.patch.object(codex_mem, "MIGRATIONS", migrations),
+            mock.patch.object(codex_mem, "SCHEMA_VERSION", version),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+        return migrations
+
+    def raw_connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.root / ".codex_mem" / codex_mem.DEFAULT_DB_NAME)
+
+    def test_latest_migration_matches_schema_version(self) -> None:
+        self.assertEqual(codex_mem.MIGRATIONS[-1].version, codex_mem.SCHEMA_VERSION)
+        versions = [migration.version for migration in codex_mem.MIGRATIONS]
+        self.assertEqual(versions, sorted(set(versions)))
+
+    def test_migration_runs_once_and_backfill_resumes_in_batches(self) -> None:
+        self.patched_migrations()
+        conn = self.raw_connect()
+        self.assertEqual(codex_mem.migrate_schema(conn), ["title_len"])
+        self.assertEqual(codex_mem.migrate_schema(conn), [])
+        self.assertEqual(self.applied, [1])
+        key = next(iter(codex_mem.pending_backfills(conn)))
+
+        status = codex_mem.run_backfills(conn, batch_rows=3, max_batches=1)
+        self.assertEqual(codex_mem.pending_backfills(conn), {key: 3})
+        self.assertNotEqual(status[key], "done")
+        conn.close()
+
+        # A fresh process picks up after the last committed batch.
+        conn = self.raw_connect()
+        self.assertEqual(codex_mem.run_backfills(conn, batch_rows=3), {key: "done"})
+        self.assertEqual(codex_mem.pending_backfills(conn), {})
+        rows = conn.execute("SELECT title_len, length(title) FROM events ORDER BY id").fetchall()
+        conn.close()
+        self.assertEqual([row[0] for row in rows], [row[1] for row in rows])
+
+    def test_open_db_applies_pending_migrations_without_rebuilding(self) -> None:
+        self.patched_migrations()
+        conn = codex_mem.open_db(self.root, ".codex_mem")
+        try:
+            self.assertEqual(conn.execute("PRAGMA user_version").fetchone()[0], codex_mem.SCHEMA_VERSION)
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM events WHERE title_len IS NOT NULL").fetchone()[0], 7)
+        finally:
+            conn.close()
+
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            code = codex_mem.main(["--root", str(self.root), "migrate"])
+        self.assertEqual(code, 0)
+        payload = json.loads(out.getvalue())
+        self.assertEqual(payload["schema_version"], codex_mem.SCHEMA_VERSION)
+        self.assertEqual(payload["pending_backfills"], [])
+        self.assertEqual(self.applied, [1])
+
+    def test_open_db_backfills_a_small_batch_and_idle_hook_daemon_finishes(self) -> None:
+        self.patched_migrations()
+        with mock.patch.object(codex_mem, "DEFAULT_BACKFILL_ROWS_PER_OPEN", 2):
+            conn = codex_mem.open_db(self.root, ".codex_mem")
+        key = next(iter(codex_mem.pending_backfills(conn)))
+        self.assertEqual(codex_mem.pending_backfills(conn), {key: 2})
+        conn.close()
+
+        with mock.patch.object(codex_mem, "DEFAULT_HOOK_IDLE_BACKFILL_SEC", 0.01):
+            daemon = codex_mem.HookDaemon(self.root, ".codex_mem")
+            daemon.start()
+            try:
+                conn = self.raw_connect()
+                deadline = time.monotonic() + 5.0
+                while codex_mem.pending_backfills(conn) and time.monotonic() < deadline:
+                    time.sleep(0.01)
+                self.assertEqual(codex_mem.pending_backfills(conn), {})
+                self.assertEqual(conn.execute("SELECT COUNT(*) FROM events WHERE title_len IS NULL").fetchone()[0], 0)
+                conn.close()
+            finally:
+                daemon.close()
+
+    def test_newer_database_is_refused(self) -> None:
+        conn = self.raw_connect()
+        conn.execute(f"PRAGMA user_version={codex_mem.SCHEMA_VERSION + 5}")
+        conn.commit()
+        with self.assertRaises(sqlite3.OperationalError):
+            codex_mem.migrate_schema(conn)
+        conn.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import json
+import pathlib
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+SCRIPT_DIR = pathlib.Path(__file__).resolve().parents[1]
+if str(SCRIPT_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPT_DIR))
+
+import codex_mem
+from tests.helpers import search_ids
+
+
+class VisibilityColumnTests(unittest.TestCase):
+    def test_v1_database_is_migrated_and_filtered_by_column(self) -> None:
+        with tempfile.TemporaryDirectory(prefix="codex_mem_vis_") as tmp:
+            root = pathlib.Path(tmp)
+            db_dir = root / ".codex_mem"
+            db_dir.mkdir()
+            raw = sqlite3.connect(db_dir / codex_mem.DEFAULT_DB_NAME)
+            raw.executescript(codex_mem.BASELINE_SCHEMA_SQL)
+            raw.execute("PRAGMA user_version=1")
+            raw.execute(
+                "INSERT INTO sessions VALUES('s1', 'demo', 't', '2026-01-01T00:00:00', NULL, 'open', NULL, '{}')"
+            )
+            for idx, privacy in enumerate([{}, {"visibility": "private"}, {"visibility": "PRIVATE"}, {"visibility": "public"}]):
+                raw.execute(
+                    """
+                    INSERT INTO events(session_id, project, event_kind, role, title, content, tags_json, metadata_json, created_at)
+                    VALUES('s1', 'demo', 'tool_use', 'tool', ?, 'deploy step', '[]', ?, ?)
+                    """,
+                    (f"deploy {idx}", json.dumps({"privacy": privacy}), f"2026-01-01T00:00:0{idx}"),
+                )
+                raw.execute(
+                    "INSERT INTO events_fts(rowid, title, content, tags) VALUES(?, ?, 'deploy step', '')",
+                    (idx + 1, f"deploy {idx}"),
+                )
+            raw.commit()
+            raw.close()
+
+            conn = codex_mem.open_db(root, ".codex_mem")
+            try:
+                visibility = [str(row[0]) for row in conn.execute("SELECT visibility FROM events ORDER BY id")]
+                self.assertEqual(visibility, ["public", "private", "private", "public"])
+                self.assertEqual(search_ids(conn, "deploy"), [1, 4])
+                self.assertEqual(search_ids(conn, "deploy", include_private=True), [1, 2, 3, 4])
+
+                new_id = codex_mem.insert_event(
+                    conn,
+                    session_id="s1",
+                    project="demo",
+                    event_kind="tool_use",
+                    role="tool",
+                    title="deploy secret",
+                    content="deploy token",
+                    tool_name="shell",
+                    file_path=None,
+                    tags=[],
+                    metadata={"privacy": {"visibility": "private"}},
+                )
+                row = conn.execute("SELECT visibility FROM events WHERE id = ?", (new_id,)).fetchone()
+                self.assertEqual(row[0], "private")
+                self.assertNotIn(new_id, search_ids(conn, "deploy"))
+
+                plan = " ".join(
+                    str(row[3])
+                    for row in conn.execute(
+                        "EXPLAIN QUERY PLAN SELECT id FROM events WHERE project = ? AND visibility = 'public' "
+                        "ORDER BY created_at DESC LIMIT 5",
+                        ("demo",),
+                    )
+                )
+                self.assertIn("idx_events_project_vis_time", plan)
+                self.assertNotIn("TEMP B-TREE", plan)
+            finally:
+                conn.close()
+
+    def test_metadata_visibility_normalizes_values(self) -> None:
+        self.assertEqual(codex_mem.metadata_visibility(None), "public")
+        self.assertEqual(codex_mem.metadata_visibility({"privacy": {"visibility": "Private"}}), "private")
+        self.assertEqual(codex_mem.metadata_visibility({"privacy": "private"}), "public")
+        self.assertEqual(codex_mem.metadata_visibility({"privacy": {"visibility": "team"}}), "public")
+
+
+if __name__ == "__main__":
+    unittest.main()